@@ -4,7 +4,6 @@ from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from typing import List, Optional
-from jose import JWTError, jwt
 
 from app.db.database import get_db
 from app.db import crud, models
@@ -14,48 +13,17 @@ from app.core.auth import (
     create_access_token,
     get_current_user,
     get_admin_user,
-    ACCESS_TOKEN_EXPIRE_MINUTES,
-    SECRET_KEY,
-    ALGORITHM
+    get_current_user_from_cookie,
+    get_user_from_cookie,
+    ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from fastapi.templating import Jinja2Templates
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 templates = Jinja2Templates(directory="templates")
 
-# Helper function to get current user from cookie
-async def get_current_user_from_cookie(
-    request: Request,
-    db: Session = Depends(get_db)
-):
-    # Get token from cookie
-    token = request.cookies.get("access_token")
-    if not token:
-        return None
-
-    try:
-        # Remove "Bearer " prefix if present
-        if token.startswith("Bearer "):
-            token = token[7:]
-
-        # Decode the token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-
-        # Get the user from database
-        user = crud.get_user_by_email(db, email)
-        return user
-    except JWTError:
-        return None
-    except Exception as e:
-        print(f"Error getting user from cookie: {e}")
-        return None
-
-
 @router.post("/login", response_model=user_schemas.Token)
-async def login_for_access_token(
+def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
@@ -82,12 +50,12 @@ async def login_for_access_token(
 
 
 @router.get("/login-form")
-async def login_form_redirect(request: Request):
+def login_form_redirect(request: Request):
     """Redirect from /api/auth/login-form to /login"""
     return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/login-form")
-async def login_form(
+def login_form(
     request: Request,
     email: str = Form(...),
     password: str = Form(...),
@@ -136,7 +104,7 @@ async def login_form(
 
 
 @router.post("/change-password")
-async def change_password(
+def change_password(
     request: Request,
     current_password: str = Form(...),
     new_password: str = Form(...),
@@ -145,28 +113,11 @@ async def change_password(
 ):
     """Change user password"""
     # Get the current user from the cookie
-    token = request.cookies.get("access_token")
-    if not token or not token.startswith("Bearer "):
+    current_user = get_user_from_cookie(request, db)
+    if not current_user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
     try:
-        # Extract the token
-        token = token[7:]  # Remove "Bearer " prefix
-
-        # Get the user from the token
-        from jose import jwt
-        from app.core.auth import SECRET_KEY, ALGORITHM
-
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-        if not email:
-            return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
-
-        # Get the user from the database
-        current_user = crud.get_user_by_email(db, email)
-        if not current_user:
-            return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
-
         # Check if new password and confirmation match
         if new_password != confirm_password:
             return templates.TemplateResponse(
@@ -236,7 +187,7 @@ async def change_password(
 
 @router.post("/logout")
 @router.get("/logout")
-async def logout():
+def logout():
     """Logout endpoint"""
     response = RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
     response.delete_cookie(key="access_token")
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Form, Request, Body, HTTPException, Query
+from fastapi import APIRouter, Depends, Form, Header, Request, Body, HTTPException, Query
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, FileResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
@@ -7,12 +7,12 @@ from datetime import datetime, date
 import json
 import os
 import traceback
-from sqlalchemy import or_
 
-from app.db import crud, database, models
+from app.db import crud, database
 from app.schemas import customer as customer_schemas
-from app.core.auth import get_current_user_from_cookie
-from app.core.pdf_generator import generate_pdf_customer_details
+from app.core.auth import get_current_user_from_cookie, get_user_from_cookie
+from app.core import idempotency, pdf_cache
+from app.core.pagination import page_links
 
 
 
@@ -20,74 +20,58 @@ router = APIRouter(tags=["Customers"])
 templates = Jinja2Templates(directory="templates")
 
 
+def _load_customers_page(db: Session, search: str, status: str, after: str, before: str, last: bool, limit: int):
+    """Run the filtered, keyset-paginated customer query and return (customers, page)"""
+    result = crud.get_customers_page(db, search, status, after, before, last, limit)
+
+    # Convert to dictionary format
+    customers_list = []
+    for customer in result["rows"]:
+        customers_list.append({
+            "id": customer.id,
+            "customer_code": customer.customer_code,
+            "date": customer.date,
+            "customer_name": customer.customer_name,
+            "phone_no": customer.phone_no,
+            "address": customer.address,
+            "product_description": customer.product_description,
+            "payment_method": customer.payment_method,
+            "payment_status": customer.payment_status,
+            "total_amount": customer.total_amount,
+            "amount_paid": customer.amount_paid
+        })
+
+    return customers_list, result
+
+
 @router.get("/customers", response_class=HTMLResponse)
-async def get_customers_page(
+def get_customers_page(
     request: Request,
     message: str = None,
     error: str = None,
     page: int = 1,
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=500),
     search: str = None,
     status: str = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    last: bool = False,
     db: Session = Depends(database.get_db)
 ):
     """Display the customers page with a list of all customers and the form to add new customers"""
     try:
         # Get current user from cookie
-        user = await get_current_user_from_cookie(request, db)
+        user = get_user_from_cookie(request, db)
 
         # Redirect to login if not authenticated
         if not user:
             return RedirectResponse(url="/login?next=/customers", status_code=303)
 
-        # Calculate offset based on page and limit
-        offset = (page - 1) * limit
-
-        # Build query with filters
-        query = db.query(models.Customer)
-
-        # Apply search filter if provided
-        if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                or_(
-                    models.Customer.customer_name.ilike(search_term),
-                    models.Customer.phone_no.ilike(search_term),
-                    models.Customer.customer_code.ilike(search_term)
-                )
-            )
-
-        # Apply status filter if provided
-        if status and status != "all":
-            query = query.filter(models.Customer.payment_status == status)
-
-        # Get total count for pagination
-        total_customers = query.count()
-
-        # Apply pagination
-        customers = query.order_by(models.Customer.date.desc()).offset(offset).limit(limit).all()
-
-        # Convert to dictionary format
-        customers_list = []
-        for customer in customers:
-            customers_list.append({
-                "id": customer.id,
-                "customer_code": customer.customer_code,
-                "date": customer.date,
-                "customer_name": customer.customer_name,
-                "phone_no": customer.phone_no,
-                "address": customer.address,
-                "product_description": customer.product_description,
-                "payment_method": customer.payment_method,
-                "payment_status": customer.payment_status,
-                "total_amount": customer.total_amount,
-                "amount_paid": customer.amount_paid
-            })
-
-        # Calculate pagination values
-        total_pages = (total_customers + limit - 1) // limit  # Ceiling division
-        if total_pages == 0:
-            total_pages = 1  # At least one page even if empty
+        # Query the customers
+        customers_list, result = _load_customers_page(db, search, status, after, before, last, limit)
+        pagination = page_links(
+            "/customers", {"search": search, "status": status, "limit": limit}, page, limit, result
+        )
 
         # Get today's date for the form
         today = datetime.now().date().isoformat()
@@ -99,10 +83,11 @@ async def get_customers_page(
                 "customers": customers_list,
                 "message": message,
                 "error": error,
-                "page": page,
+                "page": pagination["page"],
                 "limit": limit,
-                "total_pages": total_pages,
-                "total_customers": total_customers,
+                "total_pages": pagination["total_pages"],
+                "total_customers": pagination["total"],
+                "pagination": pagination,
                 "today": today,
                 "user": user,
                 "search_query": search or "",
@@ -227,7 +212,7 @@ async def create_new_customer(
 
 
 @router.get("/customer/{customer_id}", response_class=HTMLResponse)
-async def get_customer_details_page(
+def get_customer_details_page(
     request: Request,
     customer_id: int,
     message: str = None,
@@ -237,7 +222,7 @@ async def get_customer_details_page(
     """Display the customer details page"""
     try:
         # Get current user from cookie
-        user = await get_current_user_from_cookie(request, db)
+        user = get_user_from_cookie(request, db)
 
         # Redirect to login if not authenticated
         if not user:
@@ -369,9 +354,14 @@ async def add_payment(
     request: Request,
     customer_id: int,
     payment_data: customer_schemas.CustomerPaymentCreate,
+    idempotency_key: str = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(database.get_db)
 ):
-    """Add a payment to a customer record"""
+    """Add a payment to a customer record
+
+    A retry sent with the same Idempotency-Key header (or idempotency_key
+    field) gets the first response back instead of adding the payment twice.
+    """
     try:
         # Get current user from cookie
         user = await get_current_user_from_cookie(request, db)
@@ -383,8 +373,28 @@ async def add_payment(
                 content={"success": False, "message": "Authentication required"}
             )
 
+        payment = payment_data.dict(exclude={"idempotency_key"})
+        # Fields the client sent, so a retry relying on the default payment_date matches
+        params = {"customer_id": customer_id, **payment_data.dict(exclude={"idempotency_key"}, exclude_unset=True)}
+        return await idempotency.run_async(
+            db, "customer_payment", idempotency_key or payment_data.idempotency_key, params,
+            lambda: _add_customer_payment(db, customer_id, payment)
+        )
+    except Exception as e:
+        print(f"Error adding payment: {e}")
+        import traceback
+        traceback.print_exc()
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": f"Error adding payment: {str(e)}"}
+        )
+
+
+def _add_customer_payment(db: Session, customer_id: int, payment_data: dict):
+    """Record a customer payment and build the response with the updated totals"""
+    try:
         # Add payment
-        payment = crud.add_customer_payment(db, customer_id, payment_data.dict())
+        payment = crud.add_customer_payment(db, customer_id, payment_data)
         if not payment:
             return JSONResponse(
                 status_code=404,
@@ -423,40 +433,62 @@ async def add_payment(
         )
 
 
+@router.get("/api/customers")
+def api_get_customers(
+    search: str = None,
+    status: str = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    last: bool = False,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(database.get_db)
+):
+    """Page of customers as JSON, newest first
+
+    Pass next_cursor as after (or prev_cursor as before) to move between
+    pages; last=true returns the oldest page. total is a cached count.
+    """
+    try:
+        customers_list, result = _load_customers_page(db, search, status, after, before, last, limit)
+        for customer in customers_list:
+            customer["date"] = customer["date"].isoformat() if customer["date"] else None
+
+        return {
+            "success": True,
+            "customers": customers_list,
+            "next_cursor": result["next_cursor"],
+            "prev_cursor": result["prev_cursor"],
+            "total": result["total"]
+        }
+    except Exception as e:
+        print(f"Error loading customers: {e}")
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": f"Error loading customers: {str(e)}"}
+        )
+
+
 @router.get("/api/customers/export-excel")
-async def export_customers_excel(
+def export_customers_excel(
     search: str = None,
     status: str = None,
     db: Session = Depends(database.get_db)
 ):
     """Export customers to Excel file"""
     try:
-        # Get all customers from database
-        customers = crud.get_all_customers(db)
-
-        # Filter by search query if provided
-        if search:
-            search = search.lower()
-            customers = [c for c in customers if (
-                search in c.customer_name.lower() or
-                search in c.phone_no.lower() or
-                search in c.customer_code.lower()
-            )]
-
-        # Filter by payment status if provided
-        if status and status != "all":
-            customers = [c for c in customers if c.payment_status == status]
+        # Stream every customer matching the filters, not just the first page
+        customers = crud.get_customer_export_rows(db, search, status)
 
         # Use the excel_generator module to create the Excel file
         from app.core.excel_generator import export_customers_to_excel
-        filename, file_path = export_customers_to_excel(customers, status)
+        filename, content = export_customers_to_excel(customers, status, stream=True)
 
-        # Return the Excel file
-        from fastapi.responses import FileResponse
-        return FileResponse(
-            file_path,
+        # Stream the Excel file
+        from fastapi.responses import StreamingResponse
+        return StreamingResponse(
+            content,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            filename=filename
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
     except Exception as e:
         print(f"Error exporting customers to Excel: {e}")
@@ -465,7 +497,7 @@ async def export_customers_excel(
 
 
 @router.delete("/api/customers/{customer_id}")
-async def delete_customer_api(
+def delete_customer_api(
     customer_id: int,
     db: Session = Depends(database.get_db)
 ):
@@ -503,7 +535,7 @@ async def delete_customer_api(
 
 
 @router.post("/customer/{customer_id}/delete")
-async def delete_customer_post(
+def delete_customer_post(
     request: Request,
     customer_id: int,
     db: Session = Depends(database.get_db)
@@ -550,12 +582,11 @@ async def delete_customer_post(
 
 
 
-from app.core.pdf_generator import generate_pdf_customer_details
 
 # Add these new endpoints
 
 @router.get("/customer-pdf/{customer_id}")
-async def view_customer_pdf(
+def view_customer_pdf(
     customer_id: int,
     db: Session = Depends(database.get_db)
 ):
@@ -592,9 +623,9 @@ async def view_customer_pdf(
         # Set PDF path
         pdf_path = f"customers/{customer_id}.pdf"
 
-        # Always regenerate the PDF to ensure it has the latest data
-        print(f"Generating PDF for customer {customer_id}")
-        pdf_path = generate_pdf_customer_details(customer_data)
+        # Serve the cached PDF, rendering it again only if the customer data changed
+        from app.core.pdf_generator import generate_pdf_customer_details
+        pdf_path = pdf_cache.render_cached(db, "customer", customer_id, customer_data, generate_pdf_customer_details)
 
         # Check if PDF exists and has valid size
         if not os.path.exists(pdf_path):
@@ -618,7 +649,7 @@ async def view_customer_pdf(
 
 
 @router.get("/download-customer-pdf/{customer_id}")
-async def download_customer_pdf(
+def download_customer_pdf(
     customer_id: int,
     db: Session = Depends(database.get_db)
 ):
@@ -655,9 +686,9 @@ async def download_customer_pdf(
         # Set PDF path
         pdf_path = f"customers/{customer_id}.pdf"
 
-        # Always regenerate the PDF to ensure it has the latest data
-        print(f"Generating PDF for customer {customer_id}")
-        pdf_path = generate_pdf_customer_details(customer_data)
+        # Serve the cached PDF, rendering it again only if the customer data changed
+        from app.core.pdf_generator import generate_pdf_customer_details
+        pdf_path = pdf_cache.render_cached(db, "customer", customer_id, customer_data, generate_pdf_customer_details)
 
         # Check if PDF exists and has valid size
         if not os.path.exists(pdf_path):
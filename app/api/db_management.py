@@ -16,16 +16,18 @@ import tempfile
 import zipfile
 from datetime import datetime
 from typing import Dict
-from jose import JWTError, jwt
 
 from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form, Path
 from fastapi.responses import FileResponse, RedirectResponse, HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
-from app.db.database import get_db
+from app.db.database import get_db, engine, checkpoint_wal
+from app.db.migrate import run_migrations
+from app.db.search_index import rebuild_search_indexes
 from app.db import crud
-from app.core.auth import SECRET_KEY, ALGORITHM
+from app.core.auth import get_current_user_from_cookie
+from app.core import user_cache
 
 # Create a router
 router = APIRouter(tags=["Database Management"])
@@ -33,43 +35,10 @@ router = APIRouter(tags=["Database Management"])
 # Set up templates
 templates = Jinja2Templates(directory="templates")
 
-# Helper function to get current user from cookie
-async def get_current_user_from_cookie(
-    request: Request,
-    db: Session = Depends(get_db)
-):
-    # Get token from cookie
-    token = request.cookies.get("access_token")
-    if not token:
-        return None
-
-    try:
-        # Remove "Bearer " prefix if present
-        if token.startswith("Bearer "):
-            token = token[7:]
-
-        # Decode the token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-
-        # Get the user from database
-        user = crud.get_user_by_email(db, email)
-        return user
-    except JWTError:
-        return None
-    except Exception as e:
-        print(f"Error getting user from cookie: {e}")
-        return None
-
 # Constants
 DB_FOLDER = "db"  # Database folder
 DB_PATH = os.path.join(DB_FOLDER, "sunmax.db")  # Local database path
 
-# Ensure the database folder exists
-os.makedirs(DB_FOLDER, exist_ok=True)
-
 def get_db_info() -> Dict:
     """Get information about the local database."""
     result = {
@@ -262,6 +231,9 @@ async def download_database(request: Request, db: Session = Depends(get_db)):
     if not os.path.exists(DB_PATH):
         raise HTTPException(status_code=404, detail="Database file not found")
 
+    # Make sure recent commits are in the main file, not only in the WAL
+    checkpoint_wal()
+
     # Return the file as a download
     return FileResponse(
         path=DB_PATH,
@@ -286,9 +258,25 @@ async def upload_database(
     try:
         # Save uploaded file to local filesystem
         content = await database_file.read()
+
+        # Flush the WAL and close pooled connections so none of them keep
+        # pages from the old file once it has been replaced
+        checkpoint_wal()
+        engine.dispose()
         with open(DB_PATH, "wb") as db_file:
             db_file.write(content)
 
+        # Bring older backups up to the current schema version, and re-key the
+        # search indexes in case the file was vacuumed elsewhere
+        run_migrations()
+        rebuild_search_indexes()
+
+        # The uploaded database has its own users, stock and list counts
+        user_cache.invalidate()
+        crud.invalidate_sales_stats()
+        crud.invalidate_catalog_caches()
+        crud.invalidate_page_counts()
+
         print(f"Database uploaded successfully to {DB_PATH}")
         return RedirectResponse(url="/database-management", status_code=303)
     except Exception as e:
@@ -603,6 +591,14 @@ async def clear_table(
         # Close connection
         conn.close()
 
+        # The rows were deleted behind the ORM's back, so recompute the
+        # insight rollups and drop everything cached from the old data
+        crud.rebuild_insight_rollups(db)
+        crud.invalidate_sales_stats()
+        crud.invalidate_catalog_caches()
+        crud.invalidate_page_counts()
+        user_cache.invalidate()
+
         return {"success": True, "message": f"Successfully deleted {deleted_count} records from {table_name}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error clearing table: {str(e)}")
@@ -1,43 +1,50 @@
 from fastapi import APIRouter, Depends, Form, Request, Body, HTTPException, Query, File, UploadFile
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, FileResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import Optional, List, Annotated
 from datetime import datetime, date, timedelta
+import itertools
 import json
 import os
 import csv
 import shutil
+import uuid
 from io import StringIO
 
 from app.db import crud, database, models
 from app.schemas import enquiry as enquiry_schemas
-from app.core.auth import get_current_user_from_cookie  # Import once at the top
+from app.core import sheet_import
+from app.core.auth import get_current_user_from_cookie, get_user_from_cookie  # Import once at the top
+from app.core.pagination import page_links
 
-# Define quotations folder path
+# Define quotations folder path (created by app.main.bootstrap)
 QUOTATIONS_FOLDER = "quotations"
-os.makedirs(QUOTATIONS_FOLDER, exist_ok=True)
 
 router = APIRouter(tags=["Enquiries"])
 templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/enquiries", response_class=HTMLResponse)
-async def get_enquiries_page(
+def get_enquiries_page(
     request: Request,
     message: str = None,
     page: int = 1,
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=500),
     customer_name: str = None,
     date_from: str = None,
     date_to: str = None,
     quotation_given: bool = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    last: bool = False,
     db: Session = Depends(database.get_db)
 ):
     """Display the enquiries page with a list of all enquiries and the form to add new enquiries"""
     try:
         # Get current user from cookie
-        user = await get_current_user_from_cookie(request, db)
+        user = get_user_from_cookie(request, db)
 
         # Redirect to login if not authenticated
         if not user:
@@ -65,31 +72,23 @@ async def get_enquiries_page(
         if quotation_given is not None:
             filter_params["quotation_given"] = quotation_given
 
-        # Calculate offset for pagination
-        offset = (page - 1) * limit
-
-        # Get total count for pagination
-        total_enquiries = crud.get_total_enquiries_count(db)
-
-        # Calculate total pages
-        total_pages = (total_enquiries + limit - 1) // limit if total_enquiries > 0 else 1
-
-        # Ensure page is within valid range
-        if page < 1:
-            page = 1
-        elif page > total_pages:
-            page = total_pages
-
-        # Recalculate offset after page validation
-        offset = (page - 1) * limit
-
-        # Get paginated enquiries from database
-        if filter_params:
-            # If filters are applied, use filtered query
-            enquiries = crud.get_filtered_enquiries(db, filter_params, limit=limit, offset=offset)
-        else:
-            # Otherwise get all enquiries with pagination
-            enquiries = crud.get_paginated_enquiries(db, limit=limit, offset=offset)
+        # Get the page of enquiries after/before the cursor; the total counts
+        # the filtered enquiries, not the whole table
+        result = crud.get_enquiries_page(db, filter_params, after, before, last, limit)
+        enquiries = result["rows"]
+        pagination = page_links(
+            "/enquiries",
+            {
+                "customer_name": customer_name,
+                "date_from": date_from,
+                "date_to": date_to,
+                "quotation_given": None if quotation_given is None else str(quotation_given).lower(),
+                "limit": limit,
+            },
+            page,
+            limit,
+            result,
+        )
 
         # Get today's date for the form
         today = datetime.now().date()
@@ -102,10 +101,11 @@ async def get_enquiries_page(
                 "enquiries": enquiries,
                 "today": today,
                 "message": message,
-                "current_page": page,
-                "total_pages": total_pages,
+                "current_page": pagination["page"],
+                "total_pages": pagination["total_pages"],
                 "limit": limit,
-                "total_items": total_enquiries
+                "total_items": pagination["total"],
+                "pagination": pagination
             }
         )
     except Exception as e:
@@ -117,14 +117,14 @@ async def get_enquiries_page(
 
 
 @router.get("/enquiry/new", response_class=HTMLResponse)
-async def new_enquiry_form(
+def new_enquiry_form(
     request: Request,
     db: Session = Depends(database.get_db)
 ):
     """Display the form to create a new enquiry"""
     try:
         # Get current user from cookie
-        user = await get_current_user_from_cookie(request, db)
+        user = get_user_from_cookie(request, db)
 
         # Redirect to login if not authenticated
         if not user:
@@ -152,7 +152,7 @@ async def new_enquiry_form(
 
 
 @router.get("/enquiry/{enquiry_id}/edit", response_class=HTMLResponse)
-async def edit_enquiry_form(
+def edit_enquiry_form(
     request: Request,
     enquiry_id: int,
     db: Session = Depends(database.get_db)
@@ -160,7 +160,7 @@ async def edit_enquiry_form(
     """Display the form to edit an existing enquiry"""
     try:
         # Get current user from cookie
-        user = await get_current_user_from_cookie(request, db)
+        user = get_user_from_cookie(request, db)
 
         # Redirect to login if not authenticated
         if not user:
@@ -409,7 +409,7 @@ async def update_enquiry(
 
 
 @router.get("/api/enquiries")
-async def api_get_enquiries(
+def api_get_enquiries(
     db: Session = Depends(database.get_db)
 ):
     """Get all enquiries as JSON"""
@@ -435,7 +435,7 @@ async def api_get_enquiries(
 
 
 @router.delete("/api/enquiry/{enquiry_id}")
-async def api_delete_enquiry(
+def api_delete_enquiry(
     enquiry_id: int,
     db: Session = Depends(database.get_db)
 ):
@@ -535,64 +535,118 @@ async def delete_test_page(
 
 
 @router.get("/api/enquiries/export-excel")
-async def export_enquiries_excel(
+def export_enquiries_excel(
     db: Session = Depends(database.get_db)
 ):
     """Export enquiries to Excel"""
     try:
-        # Get all enquiries from database
-        enquiries = crud.get_all_enquiries(db)
+        # Stream every enquiry, not just the first page
+        enquiries = crud.get_enquiry_export_rows(db)
 
         # Use the excel_generator module to create the Excel file
         from app.core.excel_generator import export_enquiries_to_excel
-        filename, file_path = export_enquiries_to_excel(enquiries)
+        filename, content = export_enquiries_to_excel(enquiries, stream=True)
 
-        # Return the Excel file
-        return FileResponse(
-            file_path,
+        # Stream the Excel file
+        return StreamingResponse(
+            content,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            filename=filename
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
     except Exception as e:
         print(f"Error exporting enquiries to Excel: {e}")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
+def _parse_enquiry_frame(df):
+    """
+    Parse a chunk of an enquiry import sheet column by column
+
+    Returns:
+        Tuple of (records, errors); rows missing a customer name or phone
+        number are left out of records, and row numbers in the error messages
+        match the spreadsheet (header is row 1)
+    """
+    import pandas as pd
+
+    errors = []
+    row_numbers = df.index + 2
+
+    dates = sheet_import.date_column(df["date"])
+    for row_number in row_numbers[dates.isna()]:
+        errors.append(f"Row {row_number}: Date parsing error, using today's date")
+    dates = dates.fillna(pd.Timestamp(datetime.now().date())).dt.date
+
+    quotation_given = sheet_import.bool_column(df["quotation_given"])
+    if "quotation_amount" in df.columns:
+        quotation_amount = sheet_import.number_column(df["quotation_amount"])
+        invalid_amount = quotation_given & df["quotation_amount"].notna() & quotation_amount.isna()
+        for row_number in row_numbers[invalid_amount]:
+            errors.append(f"Row {row_number}: Invalid quotation amount, using 0.0")
+        quotation_amount[invalid_amount] = 0.0
+        quotation_amount = quotation_amount.where(quotation_given)
+    else:
+        quotation_amount = pd.Series(None, index=df.index, dtype=float)
+
+    def optional_text(column):
+        if column not in df.columns:
+            return pd.Series("", index=df.index)
+        return sheet_import.text_column(df[column]).fillna("")
+
+    parsed = pd.DataFrame({
+        "customer_name": sheet_import.text_column(df["customer_name"]),
+        "phone_no": sheet_import.text_column(df["phone_no"]),
+        "address": optional_text("address"),
+        "requirements": optional_text("requirements"),
+        "quotation_given": quotation_given,
+        "quotation_amount": quotation_amount,
+        "date": dates
+    })
+
+    # Rows without a customer name or phone number are skipped
+    missing = parsed["customer_name"].isna() | parsed["phone_no"].isna()
+    for row_number in row_numbers[missing]:
+        errors.append(f"Row {row_number}: customer_name and phone_no are required")
+
+    return sheet_import.to_records(parsed[~missing]), errors
+
+
 @router.post("/api/enquiries/import-excel")
 async def import_enquiries_excel(
     file: UploadFile = File(...),
+    import_id: Optional[str] = Form(None),
     db: Session = Depends(database.get_db)
 ):
-    """Import enquiries from Excel file"""
-    try:
-        import pandas as pd
-        import tempfile
-        import os
-        from datetime import datetime
+    """Import enquiries from Excel file
 
-        # Create a temporary file to store the uploaded Excel
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as temp_file:
-            # Write the uploaded file content to the temporary file
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+    Progress can be polled at /api/imports/{import_id}/progress.
+    """
+    try:
+        # Reject oversized uploads before parsing anything
+        size_error = sheet_import.check_upload_size(file)
+        if size_error:
+            return JSONResponse(
+                status_code=413,
+                content={"success": False, "message": size_error}
+            )
 
-        # Read the Excel or CSV file
+        # Parse straight from the uploaded file, a chunk of rows at a time
+        import_id = import_id or uuid.uuid4().hex
+        frames = sheet_import.iter_upload_frames(file, import_id)
         try:
-            file_extension = file.filename.split('.')[-1].lower()
-            if file_extension == 'csv':
-                df = pd.read_csv(temp_file_path)
-            else:
-                df = pd.read_excel(temp_file_path)
+            df = await run_in_threadpool(next, frames, None)
         except Exception as e:
-            os.unlink(temp_file_path)  # Delete the temp file
+            sheet_import.update_progress(import_id, status="failed")
             return JSONResponse(
                 status_code=400,
                 content={"success": False, "message": f"Error reading file: {str(e)}"}
             )
-
-        # Delete the temporary file
-        os.unlink(temp_file_path)
+        if df is None:
+            sheet_import.update_progress(import_id, status="failed")
+            return JSONResponse(
+                status_code=400,
+                content={"success": False, "message": "The file has no rows to import"}
+            )
 
         # Check if the Excel has the required columns
         required_columns = [
@@ -613,71 +667,14 @@ async def import_enquiries_excel(
                 }
             )
 
-        # Process each row in the Excel file
-        success_count = 0
-        error_count = 0
-        errors = []
-
-        for index, row in df.iterrows():
-            try:
-                # Parse date
-                try:
-                    if isinstance(row["date"], str):
-                        # Try different date formats
-                        date_formats = ["%Y-%m-%d", "%d-%m-%Y", "%m/%d/%Y", "%d/%m/%Y"]
-                        date_obj = None
-
-                        for fmt in date_formats:
-                            try:
-                                date_obj = datetime.strptime(row["date"], fmt).date()
-                                break
-                            except ValueError:
-                                continue
-
-                        if date_obj is None:
-                            raise ValueError(f"Could not parse date: {row['date']}")
-                    else:
-                        # If it's already a datetime or date object
-                        date_obj = row["date"].date() if hasattr(row["date"], "date") else row["date"]
-                except Exception as e:
-                    # Default to today if date parsing fails
-                    date_obj = datetime.now().date()
-                    errors.append(f"Row {index+2}: Date parsing error, using today's date: {str(e)}")
-
-                # Convert quotation_given to boolean
-                if isinstance(row["quotation_given"], str):
-                    quotation_given = row["quotation_given"].lower() in ["yes", "true", "1", "y"]
-                else:
-                    quotation_given = bool(row["quotation_given"])
-
-                # Get quotation amount if quotation is given
-                quotation_amount = None
-                if quotation_given and "quotation_amount" in row and pd.notna(row["quotation_amount"]):
-                    try:
-                        quotation_amount = float(row["quotation_amount"])
-                    except (ValueError, TypeError):
-                        quotation_amount = 0.0
-                        errors.append(f"Row {index+2}: Invalid quotation amount, using 0.0")
-
-                # Create enquiry data dictionary
-                enquiry_data = {
-                    "customer_name": str(row["customer_name"]),
-                    "phone_no": str(row["phone_no"]),
-                    "address": str(row["address"]) if "address" in row and pd.notna(row["address"]) else "",
-                    "requirements": str(row["requirements"]) if "requirements" in row and pd.notna(row["requirements"]) else "",
-                    "quotation_given": quotation_given,
-                    "quotation_amount": quotation_amount if quotation_given else None,
-                    "date": date_obj
-                }
-
-                # Create new enquiry
-                crud.create_enquiry(db=db, enquiry_data=enquiry_data)
-                success_count += 1
+        records, errors = await run_in_threadpool(
+            sheet_import.parse_frames, itertools.chain([df], frames), _parse_enquiry_frame
+        )
+        error_count = sheet_import.get_progress(import_id)["rows_read"] - len(records)
 
-            except Exception as e:
-                error_count += 1
-                errors.append(f"Row {index+2}: {str(e)}")
-                continue
+        sheet_import.update_progress(import_id, status="saving")
+        success_count = await run_in_threadpool(crud.bulk_create_enquiries, db, records)
+        sheet_import.update_progress(import_id, status="done", created=success_count, failed=error_count)
 
         # Format errors for display
         formatted_errors = None
@@ -690,7 +687,8 @@ async def import_enquiries_excel(
                 "success": True,
                 "count": success_count,
                 "message": f"Successfully imported {success_count} enquiries. {error_count} failed.",
-                "errors": formatted_errors if formatted_errors else None
+                "errors": formatted_errors if formatted_errors else None,
+                "import_id": import_id
             }
         )
     except Exception as e:
@@ -698,6 +696,7 @@ async def import_enquiries_excel(
         error_details = traceback.format_exc()
         print(f"Error importing enquiries from Excel: {e}")
         print(f"Error details: {error_details}")
+        sheet_import.update_progress(import_id, status="failed", error=str(e))
         return JSONResponse(
             status_code=500,
             content={"success": False, "message": f"Error importing enquiries: {str(e)}"}
@@ -705,7 +704,7 @@ async def import_enquiries_excel(
 
 
 @router.get("/api/enquiries/download-template")
-async def download_enquiry_template():
+def download_enquiry_template():
     """Download a template Excel file for enquiry import"""
     try:
         import openpyxl
@@ -847,16 +846,25 @@ async def download_quotation_file(
         )
 
 @router.get("/api/enquiries/filtered")
-async def api_get_filtered_enquiries(
+def api_get_filtered_enquiries(
     customer_name: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
     quotation_given: Optional[bool] = None,
-    limit: int = 50,
-    offset: int = 0,
+    limit: int = Query(50, ge=1, le=500),
+    offset: Optional[int] = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    last: bool = False,
     db: Session = Depends(database.get_db)
 ):
-    """Get filtered enquiries as JSON"""
+    """
+    Get filtered enquiries as JSON, newest first
+
+    Pages are fetched with the next_cursor / prev_cursor of the previous
+    response passed as after / before. offset is still accepted for older
+    callers but gets slower the deeper the page.
+    """
     filters = {}
 
     if customer_name:
@@ -877,8 +885,16 @@ async def api_get_filtered_enquiries(
     if quotation_given is not None:
         filters["quotation_given"] = quotation_given
 
-    enquiries = crud.get_filtered_enquiries(db, filters, limit, offset)
-    total = crud.get_filtered_enquiries_count(db, filters)
+    next_cursor = prev_cursor = None
+    if offset is not None:
+        enquiries = crud.get_filtered_enquiries(db, filters, limit, offset)
+        total = crud.get_filtered_enquiries_count(db, filters)
+    else:
+        page = crud.get_enquiries_page(db, filters, after, before, last, limit)
+        enquiries = page["rows"]
+        total = page["total"]
+        next_cursor = page["next_cursor"]
+        prev_cursor = page["prev_cursor"]
 
     result = []
     for e in enquiries:
@@ -896,7 +912,7 @@ async def api_get_filtered_enquiries(
             "updated_at": e.updated_at.isoformat()
         })
 
-    return {"total": total, "items": result}
+    return {"total": total, "items": result, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
 
 
 @router.get("/enquiries/export")
@@ -915,7 +931,7 @@ async def export_enquiries(
             return RedirectResponse(url="/login?next=/enquiries/export", status_code=303)
 
         # Get all enquiries
-        enquiries = crud.get_all_enquiries(db)
+        enquiries = await run_in_threadpool(crud.get_all_enquiries, db)
 
         if format.lower() == "json":
             # Convert to JSON
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Form, Depends, Request, Body, UploadFile, File
+from fastapi import APIRouter, Form, Depends, Header, Request, Body, UploadFile, File
 from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.db import crud, database, models
-from app.core.auth import get_current_user_from_cookie
+from app.core import idempotency
+from app.core.auth import get_current_user_from_cookie, get_user_from_cookie
 from datetime import date, datetime
 from pydantic import BaseModel
-import pandas as pd
 import os
 import tempfile
 from typing import List, Optional
@@ -33,7 +34,7 @@ templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/expenses", response_class=HTMLResponse)
-async def expenses_page(
+def expenses_page(
     request: Request,
     expense_type: Optional[str] = None,
     category: Optional[str] = None,
@@ -42,7 +43,7 @@ async def expenses_page(
 ):
     """Expenses management page"""
     # Get current user from cookie
-    user = await get_current_user_from_cookie(request, db=db)
+    user = get_user_from_cookie(request, db)
 
     # Redirect to login if not authenticated
     if not user:
@@ -87,14 +88,14 @@ async def expenses_page(
 
 
 @router.get("/expense/{expense_id}", response_class=HTMLResponse)
-async def expense_details_page(
+def expense_details_page(
     expense_id: int,
     request: Request,
     db: Session = Depends(database.get_db)
 ):
     """Expense details page"""
     # Get current user from cookie
-    user = await get_current_user_from_cookie(request, db=db)
+    user = get_user_from_cookie(request, db)
 
     # Redirect to login if not authenticated
     if not user:
@@ -135,7 +136,7 @@ async def export_expenses_excel(
             return JSONResponse(status_code=401, content={"success": False, "message": "Authentication required"})
 
         # Get all expenses
-        expenses = crud.get_all_expenses(db, limit=10000)
+        expenses = await run_in_threadpool(crud.get_all_expenses, db, limit=10000)
 
         # Apply filters if provided
         if expense_type and expense_type != "all":
@@ -426,9 +427,14 @@ async def search_expenses_api(
 async def add_expense_payment(
     request: Request,
     expense_id: int,
+    idempotency_key: str = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(database.get_db)
 ):
-    """Add a payment to an expense record"""
+    """Add a payment to an expense record
+
+    A retry sent with the same Idempotency-Key header (or idempotency_key
+    field) gets the first response back instead of adding the payment twice.
+    """
     try:
         # Get current user from cookie
         user = await get_current_user_from_cookie(request, db=db)
@@ -477,6 +483,24 @@ async def add_expense_payment(
             "payment_date": payment_date
         }
 
+        body_key = body.pop("idempotency_key", None)
+        return await idempotency.run_async(
+            db, "expense_payment", idempotency_key or body_key, {"expense_id": expense_id, **body},
+            lambda: _add_expense_payment(db, expense_id, payment_data)
+        )
+    except Exception as e:
+        print(f"Error adding payment to expense: {e}")
+        import traceback
+        traceback.print_exc()
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": f"Error adding payment: {str(e)}"}
+        )
+
+
+def _add_expense_payment(db: Session, expense_id: int, payment_data: dict):
+    """Record an expense payment and build the response with the updated totals"""
+    try:
         # Add payment
         payment = crud.add_expense_payment(db, expense_id, payment_data)
         if not payment:
@@ -0,0 +1,26 @@
+"""
+Import progress API for Sunmax Application
+
+Inventory, enquiry and service imports record their progress under an import
+ID (sent by the client with the upload, or returned in the response). This
+module lets the page poll that progress while a large file is being imported.
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core import sheet_import
+
+router = APIRouter()
+
+
+@router.get("/api/imports/{import_id}/progress")
+def get_import_progress(import_id: str):
+    """Get the progress of a running or recently finished import"""
+    progress = sheet_import.get_progress(import_id)
+    if not progress:
+        return JSONResponse(
+            status_code=404,
+            content={"success": False, "message": f"Import {import_id} not found"}
+        )
+    return progress
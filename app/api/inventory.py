@@ -1,13 +1,14 @@
-from fastapi import APIRouter, Form, Depends, Request, Body, UploadFile, File
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi import APIRouter, Form, Depends, Request, Body, UploadFile, File, Query
+from fastapi.responses import JSONResponse, FileResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from app.db import crud, database
+from app.core import sheet_import, typeahead
 from datetime import date
 from pydantic import BaseModel
-import pandas as pd
-import os
-import tempfile
+import itertools
+import uuid
 from typing import List, Optional
 
 
@@ -103,10 +104,85 @@ def add_stock_item(
         )
 
 
-@router.get("/inventory/items", response_class=HTMLResponse)
-def get_all_items(request: Request, db: Session = Depends(database.get_db)):
-    items = crud.get_all_items(db)
-    return templates.TemplateResponse("index.html", {"request": request, "items": items})
+@router.get("/inventory/items")
+def get_inventory_items(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(database.get_db)
+):
+    """Page of inventory items for the home page cards, ordered by item code
+
+    Pass next_cursor from the response as cursor to load the next page.
+    """
+    try:
+        items, next_cursor = crud.get_items_page(db, cursor, limit)
+        items_list = []
+        for item in items:
+            margin = item.margin if item.margin is not None else 20
+            items_list.append({
+                "item_code": item.item_code,
+                "item_name": item.item_name,
+                "gst_rate": item.gst_rate,
+                "purchase_price_per_unit": item.purchase_price_per_unit,
+                "margin": margin,
+                "selling_price": round((item.purchase_price_per_unit or 0) * (1 + margin / 100), 2),
+                "quantity": item.quantity,
+                "unit_of_measurement": item.unit_of_measurement
+            })
+
+        return {"success": True, "items": items_list, "next_cursor": next_cursor}
+    except Exception as e:
+        print(f"Error loading items page: {e}")
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": f"Error loading items: {str(e)}"}
+        )
+
+
+@router.get("/inventory/stock")
+def get_stock_page(
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    last: bool = False,
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(database.get_db)
+):
+    """Page of the stock list as JSON, newest items first
+
+    Pass next_cursor as after (or prev_cursor as before) to move between
+    pages; last=true returns the oldest page. total is a cached count.
+    """
+    try:
+        result = crud.get_stock_page(db, after, before, last, limit)
+        items_list = []
+        for item in result["rows"]:
+            items_list.append({
+                "item_code": item.item_code,
+                "date": item.date.isoformat() if item.date else None,
+                "item_name": item.item_name,
+                "hsn_code": item.hsn_code,
+                "gst_rate": item.gst_rate,
+                "purchase_price_per_unit": item.purchase_price_per_unit,
+                "margin": item.margin,
+                "quantity": item.quantity,
+                "unit_of_measurement": item.unit_of_measurement,
+                "supplier_name": item.supplier_name,
+                "supplier_gst_number": item.supplier_gst_number
+            })
+
+        return {
+            "success": True,
+            "items": items_list,
+            "next_cursor": result["next_cursor"],
+            "prev_cursor": result["prev_cursor"],
+            "total": result["total"]
+        }
+    except Exception as e:
+        print(f"Error loading stock page: {e}")
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": f"Error loading stock: {str(e)}"}
+        )
 
 
 @router.get("/inventory/item/{item_code}")
@@ -149,24 +225,49 @@ def search_items(query: str, db: Session = Depends(database.get_db)):
         )
 
 
+@router.get("/inventory/typeahead")
+def typeahead_items(
+    q: str = "",
+    limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = None,
+    db: Session = Depends(database.get_db)
+):
+    """Top matches for the item search box: code, name, selling price and stock
+
+    Pass next_cursor from the response as cursor to load more results.
+    """
+    try:
+        result = typeahead.lookup(db, "items", q, limit, cursor)
+        return JSONResponse(
+            content={"success": True, **result},
+            headers={"Server-Timing": f"typeahead;dur={result['took_ms']}"}
+        )
+    except Exception as e:
+        print(f"Error in item typeahead: {e}")
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": f"Error searching items: {str(e)}"}
+        )
+
+
 @router.get("/inventory/export-excel")
 def export_inventory_excel(db: Session = Depends(database.get_db)):
     """Export inventory to Excel"""
-    from fastapi.responses import FileResponse
+    from fastapi.responses import StreamingResponse
     from app.core.excel_generator import export_inventory_to_excel
 
     try:
-        # Get all items
-        items = crud.get_all_items(db)
+        # Stream every item, not just the first page
+        items = crud.get_item_export_rows(db)
 
         # Generate Excel file
-        filename, file_path = export_inventory_to_excel(items)
+        filename, content = export_inventory_to_excel(items, stream=True)
 
-        # Return the Excel file
-        return FileResponse(
-            file_path,
+        # Stream the Excel file
+        return StreamingResponse(
+            content,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            filename=filename
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
     except Exception as e:
         import traceback
@@ -274,36 +375,101 @@ def delete_item(item_code: str, db: Session = Depends(database.get_db)):
         )
 
 
+def _validate_inventory_frame(df):
+    """
+    Validate and convert an inventory import sheet column by column
+
+    Returns:
+        Tuple of (rows, errors) where rows is a list of (row_number, item_data)
+        for the valid rows and errors a list of (row_number, message)
+    """
+    import pandas as pd
+
+    # Spreadsheet row numbers (header is row 1)
+    row_numbers = df.index + 2
+    problems = pd.Series("", index=df.index)
+
+    def text(column):
+        return sheet_import.text_column(df[column])
+
+
+    item_name = text("item_name")
+    hsn_code = text("hsn_code")
+    problems[item_name.isna()] += "item_name is required; "
+    problems[hsn_code.isna()] += "hsn_code is required; "
+
+    numbers = {}
+    for column in ("gst_rate", "purchase_price_per_unit", "margin", "quantity"):
+        numbers[column] = sheet_import.number_column(df[column])
+        problems[numbers[column].isna()] += f"{column} must be a number; "
+    problems[numbers["quantity"].notna() & (numbers["quantity"] % 1 != 0)] += "quantity must be a whole number; "
+
+    columns = {
+        "item_name": item_name,
+        "hsn_code": hsn_code,
+        "unit_of_measurement": text("unit_of_measurement"),
+        "supplier_name": text("supplier_name"),
+        "supplier_gst_number": text("supplier_gst_number"),
+        "item_code": text("item_code") if "item_code" in df.columns else pd.Series(pd.NA, index=df.index, dtype="string"),
+        **numbers
+    }
+    valid = problems == ""
+    records = sheet_import.to_records(pd.DataFrame(columns)[valid])
+
+    today = date.today()
+    rows = []
+    for row_number, record in zip(row_numbers[valid], records):
+        record["date"] = today
+        record["quantity"] = int(record["quantity"])
+        record["unit_of_measurement"] = record["unit_of_measurement"] or "No.s"
+        rows.append((int(row_number), record))
+
+    errors = [
+        (int(row_number), message.rstrip("; "))
+        for row_number, message in zip(row_numbers[~valid], problems[~valid])
+    ]
+    return rows, errors
+
+
 @router.post("/inventory/import-excel")
 async def import_inventory_from_excel(
     file: UploadFile = File(...),
+    all_or_nothing: bool = Form(False),
+    import_id: Optional[str] = Form(None),
     db: Session = Depends(database.get_db)
 ):
-    """Import inventory items from Excel file"""
+    """Import inventory items from Excel file
+
+    Rows are validated together and written in batched transactions. With
+    all_or_nothing set, nothing is saved if any row fails to import. Progress
+    can be polled at /api/imports/{import_id}/progress.
+    """
     try:
-        # Create a temporary file to store the uploaded Excel
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as temp_file:
-            # Write the uploaded file content to the temporary file
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-
-        # Read the Excel or CSV file
+        # Reject oversized uploads before parsing anything
+        size_error = sheet_import.check_upload_size(file)
+        if size_error:
+            return JSONResponse(
+                status_code=413,
+                content={"success": False, "message": size_error}
+            )
+
+        # Parse straight from the uploaded file, a chunk of rows at a time
+        import_id = import_id or uuid.uuid4().hex
+        frames = sheet_import.iter_upload_frames(file, import_id)
         try:
-            file_extension = file.filename.split('.')[-1].lower()
-            if file_extension == 'csv':
-                df = pd.read_csv(temp_file_path)
-            else:
-                df = pd.read_excel(temp_file_path)
+            df = await run_in_threadpool(next, frames, None)
         except Exception as e:
-            os.unlink(temp_file_path)  # Delete the temp file
+            sheet_import.update_progress(import_id, status="failed")
             return JSONResponse(
                 status_code=400,
                 content={"success": False, "message": f"Error reading file: {str(e)}"}
             )
-
-        # Delete the temporary file
-        os.unlink(temp_file_path)
+        if df is None:
+            sheet_import.update_progress(import_id, status="failed")
+            return JSONResponse(
+                status_code=400,
+                content={"success": False, "message": "The file has no rows to import"}
+            )
 
         # Check if the Excel has the required columns
         required_columns = [
@@ -326,87 +492,23 @@ async def import_inventory_from_excel(
                 }
             )
 
-        # Process each row in the Excel file
-        success_count = 0
-        update_count = 0
-        error_count = 0
-        errors = []
-
-        for index, row in df.iterrows():
-            try:
-                # Create item data dictionary with explicit date formatting
-                today = date.today()
-                item_data = {
-                    "date": today,  # Ensure date is properly set
-                    "item_name": row["item_name"],
-                    "hsn_code": row["hsn_code"],
-                    "gst_rate": float(row["gst_rate"]),
-                    "purchase_price_per_unit": float(row["purchase_price_per_unit"]),
-                    "margin": float(row["margin"]),
-                    "quantity": int(row["quantity"]),
-                    "unit_of_measurement": row["unit_of_measurement"],
-                    "supplier_name": row["supplier_name"],
-                    "supplier_gst_number": row["supplier_gst_number"]
-                }
-
-                # Check if item_code is provided in the Excel file and is not empty
-                has_item_code = "item_code" in row and row["item_code"] and str(row["item_code"]).strip()
-
-                if has_item_code:
-                    # Convert to string and clean up
-                    item_code = str(row["item_code"]).strip()
-
-                    # Check if this item already exists
-                    existing_item = crud.get_item(db, item_code)
-
-                    if existing_item:
-                        try:
-                            # Update existing item
-                            crud.update_item(db=db, item_code=item_code, item_data=item_data)
-                            # Explicitly commit after each successful update
-                            db.commit()
-                            update_count += 1
-                        except Exception as e:
-                            db.rollback()
-                            error_count += 1
-                            errors.append(f"Row {index+2}: Error updating item: {str(e)}")
-                    else:
-                        try:
-                            # Create new item with provided code
-                            item_data["item_code"] = item_code
-                            crud.create_item(db=db, item_data=item_data)
-                            # Explicitly commit after each successful item creation
-                            db.commit()
-                            success_count += 1
-                        except Exception as e:
-                            db.rollback()
-                            error_count += 1
-                            errors.append(f"Row {index+2}: Error creating item with provided code: {str(e)}")
-                else:
-                    # Generate a new unique item code for this item
-                    try:
-                        item_code = crud.generate_item_code(db)
-
-                        # Add the generated code to the item data
-                        item_data["item_code"] = item_code
-
-                        # Create the item in the database
-                        crud.create_item(db=db, item_data=item_data)
-
-                        # Explicitly commit after each successful item creation
-                        db.commit()
-                        success_count += 1
-
-                        print(f"Created new item with generated code: {item_code}")
-                    except Exception as e:
-                        db.rollback()
-                        error_count += 1
-                        errors.append(f"Row {index+2}: Error creating item with generated code: {str(e)}")
-            except Exception as e:
-                # Rollback the transaction to prevent cascading errors
-                db.rollback()
-                error_count += 1
-                errors.append(f"Row {index+2}: {str(e)}")
+        # Validate the whole sheet up front, then write the valid rows in batches
+        rows, errors = await run_in_threadpool(
+            sheet_import.parse_frames, itertools.chain([df], frames), _validate_inventory_frame
+        )
+        sheet_import.update_progress(import_id, status="saving")
+        if all_or_nothing and errors:
+            result = {"created": 0, "updated": 0, "errors": []}
+        else:
+            result = await run_in_threadpool(crud.bulk_import_items, db, rows, all_or_nothing)
+        errors = sorted(errors + result["errors"])
+        errors = [f"Row {row_number}: {message}" for row_number, message in errors]
+        success_count = result["created"]
+        update_count = result["updated"]
+        error_count = len(errors)
+        sheet_import.update_progress(
+            import_id, status="done", created=success_count, updated=update_count, failed=error_count
+        )
 
         # Get the total count of items in the inventory
         try:
@@ -434,13 +536,18 @@ async def import_inventory_from_excel(
             "success": True,
             "message": f"Imported {success_count} new items and updated {update_count} existing items successfully. {error_count} items failed.",
             "errors": formatted_errors if formatted_errors else None,
-            "items_count": items_count
+            "created_count": success_count,
+            "updated_count": update_count,
+            "error_count": error_count,
+            "items_count": items_count,
+            "import_id": import_id
         }
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
         print(f"Error importing inventory from Excel: {e}")
         print(f"Error details: {error_details}")
+        sheet_import.update_progress(import_id, status="failed", error=str(e))
         return JSONResponse(
             status_code=500,
             content={"success": False, "message": f"Error importing inventory: {str(e)}"}
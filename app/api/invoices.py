@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, Form, Request, Body, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse
+from fastapi import APIRouter, Depends, Form, Header, Request, Body, HTTPException
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from typing import Optional, List
@@ -8,7 +8,8 @@ import os
 import json
 
 from app.db import crud, database, models
-from app.core.pdf_generator import generate_pdf_invoice
+from app.core import idempotency, pdf_jobs
+from app.core.auth import get_current_user
 from app.schemas.invoice import InvoiceCreate, Invoice, PaymentCreate
 
 router = APIRouter(tags=["Invoices"])
@@ -16,7 +17,7 @@ templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/invoices", response_class=HTMLResponse)
-async def invoices_page(
+def invoices_page(
     request: Request,
     payment_status: Optional[str] = None,
     invoice_type: Optional[str] = None,
@@ -46,7 +47,7 @@ async def invoices_page(
 
 
 @router.get("/invoice/{invoice_id}", response_class=HTMLResponse)
-async def invoice_page(request: Request, invoice_id: str, db: Session = Depends(database.get_db)):
+def invoice_page(request: Request, invoice_id: str, db: Session = Depends(database.get_db)):
     """Get a single invoice page"""
     # Check if invoice_id is a number (database ID) or a string (invoice number)
     try:
@@ -71,28 +72,38 @@ async def invoice_page(request: Request, invoice_id: str, db: Session = Depends(
 
 
 @router.get("/invoices/export-excel")
-async def export_invoices_excel(
+def export_invoices_excel(
     payment_status: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    invoice_type: Optional[str] = None,
     db: Session = Depends(database.get_db)
 ):
     """Export invoices to Excel file with detailed information for GST filing"""
     try:
-        # Get all invoices from database
-        invoices = crud.get_all_invoices(db)
-
-        # Filter by payment status if provided
-        if payment_status and payment_status != "all":
-            invoices = [inv for inv in invoices if inv["payment_status"] == payment_status]
+        # Parse the date range (YYYY-MM-DD)
+        start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "Dates must be in YYYY-MM-DD format"})
 
-        # Use the excel_generator module to create the Excel file
+    try:
+        # Use the excel_generator module to create the Excel file; the filters are applied in SQL
         from app.core.excel_generator import export_invoices_to_excel
-        filename, file_path = export_invoices_to_excel(invoices, db, payment_status)
+        filename, content = export_invoices_to_excel(
+            db,
+            payment_status=payment_status,
+            start_date=start,
+            end_date=end,
+            invoice_type=invoice_type,
+            stream=True
+        )
 
-        # Return the Excel file
-        return FileResponse(
-            file_path,
+        # Stream the Excel file
+        return StreamingResponse(
+            content,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            filename=filename
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
     except Exception as e:
         print(f"Error exporting invoices to Excel: {e}")
@@ -100,14 +111,29 @@ async def export_invoices_excel(
 
 
 @router.post("/invoices/payment/{invoice_id}")
-async def add_payment_to_invoice(
+def add_payment_to_invoice(
     invoice_id: str,
     amount: float = Form(...),
     payment_method: str = Form(...),
     notes: str = Form(""),
+    idempotency_key: str = Form(None),
+    idempotency_key_header: str = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(database.get_db)
 ):
-    """Add a payment to an existing invoice"""
+    """Add a payment to an existing invoice
+
+    A retry sent with the same Idempotency-Key header (or idempotency_key
+    field) gets the first response back instead of adding the payment twice.
+    """
+    payment = {"invoice_id": invoice_id, "amount": amount, "payment_method": payment_method, "notes": notes}
+    return idempotency.run(
+        db, "invoice_payment", idempotency_key_header or idempotency_key, payment,
+        lambda: _add_invoice_payment(db, **payment)
+    )
+
+
+def _add_invoice_payment(db: Session, invoice_id: str, amount: float, payment_method: str, notes: str):
+    """Record a payment against an invoice and queue its PDF for re-rendering"""
     try:
         # Create payment data
         payment_data = {
@@ -123,9 +149,8 @@ async def add_payment_to_invoice(
         if not invoice:
             return JSONResponse(status_code=404, content={"success": False, "message": "Invoice not found"})
 
-        # Regenerate the PDF with updated payment information
-        invoice_data = crud.get_invoice(db, invoice_id)
-        generate_pdf_invoice(invoice_data)
+        # Re-render the PDF with updated payment information
+        pdf_jobs.enqueue_invoice_pdf(db, invoice_id)
 
         return JSONResponse(content={
             "success": True,
@@ -141,7 +166,7 @@ async def add_payment_to_invoice(
 
 
 @router.delete("/invoices/delete/{invoice_id}")
-async def delete_invoice_api(invoice_id: str, db: Session = Depends(database.get_db)):
+def delete_invoice_api(invoice_id: str, db: Session = Depends(database.get_db)):
     """Delete an invoice"""
     try:
         # Get invoice from database
@@ -167,8 +192,54 @@ async def delete_invoice_api(invoice_id: str, db: Session = Depends(database.get
         return JSONResponse(status_code=500, content={"error": f"Error deleting invoice: {str(e)}"})
 
 
+@router.get("/invoices/export-pdf-zip")
+def export_invoice_pdfs_zip(
+    request: Request,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Download the PDFs of all invoices in a date range as a single ZIP file"""
+    try:
+        # Parse the date range (YYYY-MM-DD)
+        start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "Dates must be in YYYY-MM-DD format"})
+
+    try:
+        invoice_numbers = crud.get_invoice_numbers(db, start, end, payment_status)
+        if not invoice_numbers:
+            return JSONResponse(status_code=404, content={"error": "No invoices found for the selected filters"})
+
+        # Load everything from the database before streaming starts
+        from app.core import pdf_archive
+        documents = pdf_archive.prepare_invoice_documents(db, invoice_numbers)
+
+        # Build a descriptive filename
+        filename_parts = ["invoices"]
+        if start_date:
+            filename_parts.append(start_date)
+        if end_date:
+            filename_parts.append(end_date)
+        if payment_status and payment_status != "all":
+            filename_parts.append(payment_status.replace(" ", "_"))
+        filename = "_".join(filename_parts) + ".zip"
+
+        return StreamingResponse(
+            pdf_archive.stream_invoice_zip_response(request, documents),
+            media_type="application/zip",
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+    except Exception as e:
+        print(f"Error exporting invoice PDFs: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
 @router.get("/invoices/view/{invoice_id}")
-async def view_invoice_pdf(invoice_id: str, db: Session = Depends(database.get_db)):
+def view_invoice_pdf(invoice_id: str, db: Session = Depends(database.get_db)):
     """View an invoice PDF in the browser"""
     try:
         # Get invoice from database
@@ -179,19 +250,14 @@ async def view_invoice_pdf(invoice_id: str, db: Session = Depends(database.get_d
         # Get PDF path
         pdf_path = invoice.get("pdf_path", f"invoices/{invoice_id}.pdf")
 
-        # Check if PDF exists and has valid size
-        if not os.path.exists(pdf_path) or os.path.getsize(pdf_path) < 1000:
-            print(f"PDF file missing or too small: {pdf_path}")
-
-            # Generate the PDF
-            print(f"Generating PDF for invoice {invoice_id}")
-            pdf_path = generate_pdf_invoice(invoice)
+        # Wait for a queued render, or queue one if the PDF is missing or too small
+        pdf_jobs.ensure_invoice_pdf(db, invoice_id, pdf_path)
 
-            # Check again if PDF exists and has valid size
-            if not os.path.exists(pdf_path):
-                return JSONResponse(status_code=404, content={"error": "Invoice PDF not found and could not be generated"})
-            elif os.path.getsize(pdf_path) < 1000:
-                return JSONResponse(status_code=500, content={"error": "Generated PDF file is too small and may be corrupted"})
+        # Check if PDF exists and has valid size
+        if not os.path.exists(pdf_path):
+            return JSONResponse(status_code=404, content={"error": "Invoice PDF not found and could not be generated"})
+        elif os.path.getsize(pdf_path) < 1000:
+            return JSONResponse(status_code=500, content={"error": "Generated PDF file is too small and may be corrupted"})
 
         # Serve the file for viewing in the browser (inline)
         return FileResponse(
@@ -209,7 +275,7 @@ async def view_invoice_pdf(invoice_id: str, db: Session = Depends(database.get_d
 
 
 @router.get("/invoices/download/{invoice_id}")
-async def download_invoice_pdf(invoice_id: str, db: Session = Depends(database.get_db)):
+def download_invoice_pdf(invoice_id: str, db: Session = Depends(database.get_db)):
     """Download an invoice PDF to the user's device"""
     try:
         # Get invoice from database
@@ -220,19 +286,14 @@ async def download_invoice_pdf(invoice_id: str, db: Session = Depends(database.g
         # Get PDF path
         pdf_path = invoice.get("pdf_path", f"invoices/{invoice_id}.pdf")
 
-        # Check if PDF exists and has valid size
-        if not os.path.exists(pdf_path) or os.path.getsize(pdf_path) < 1000:
-            print(f"PDF file missing or too small: {pdf_path}")
-
-            # Generate the PDF
-            print(f"Generating PDF for invoice {invoice_id}")
-            pdf_path = generate_pdf_invoice(invoice)
+        # Wait for a queued render, or queue one if the PDF is missing or too small
+        pdf_jobs.ensure_invoice_pdf(db, invoice_id, pdf_path)
 
-            # Check again if PDF exists and has valid size
-            if not os.path.exists(pdf_path):
-                return JSONResponse(status_code=404, content={"error": "Invoice PDF not found and could not be generated"})
-            elif os.path.getsize(pdf_path) < 1000:
-                return JSONResponse(status_code=500, content={"error": "Generated PDF file is too small and may be corrupted"})
+        # Check if PDF exists and has valid size
+        if not os.path.exists(pdf_path):
+            return JSONResponse(status_code=404, content={"error": "Invoice PDF not found and could not be generated"})
+        elif os.path.getsize(pdf_path) < 1000:
+            return JSONResponse(status_code=500, content={"error": "Generated PDF file is too small and may be corrupted"})
 
         # Serve the file for download (attachment)
         return FileResponse(
@@ -250,7 +311,7 @@ async def download_invoice_pdf(invoice_id: str, db: Session = Depends(database.g
 
 
 @router.post("/invoices/update/{invoice_id}")
-async def update_invoice_api(
+def update_invoice_api(
     invoice_id: str,
     invoice_data: dict = Body(...),
     db: Session = Depends(database.get_db)
@@ -273,16 +334,19 @@ async def update_invoice_api(
                     content={"success": False, "message": f"Invalid date format: {e}"}
                 )
         
-        # Update invoice attributes
+        # Update invoice attributes, moving the invoice between rollup buckets
+        # in case the date, amount or payment method changed
+        crud.record_invoice_rollup(db, invoice_obj, sign=-1)
         for key, value in invoice_data.items():
             if hasattr(invoice_obj, key):
                 setattr(invoice_obj, key, value)
+        crud.record_invoice_rollup(db, invoice_obj)
         
         db.commit()
+        crud.invalidate_sales_stats()
         
-        # Regenerate PDF with updated information
-        invoice = crud.get_invoice(db, invoice_id)
-        generate_pdf_invoice(invoice)
+        # Re-render the PDF with updated information
+        pdf_jobs.enqueue_invoice_pdf(db, invoice_id)
         
         return JSONResponse(content={"success": True, "message": "Invoice updated successfully"})
     except Exception as e:
@@ -291,3 +355,13 @@ async def update_invoice_api(
             status_code=500,
             content={"success": False, "message": str(e)}
         )
+
+
+@router.get("/pdf-jobs/metrics")
+def get_pdf_job_metrics(db: Session = Depends(database.get_db)):
+    """Queue depth and render time figures for background invoice PDFs"""
+    try:
+        return pdf_jobs.get_render_metrics(db)
+    except Exception as e:
+        print(f"Error getting PDF job metrics: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
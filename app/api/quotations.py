@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from fastapi.responses import RedirectResponse, FileResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
@@ -7,14 +7,12 @@ import os
 
 from app.db.database import get_db
 from app.db import models
+from app.core import idempotency
 from app.core.auth import get_current_user_from_cookie
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
-# Create quotations directory if it doesn't exist
-os.makedirs("quotations", exist_ok=True)
-
 
 @router.get("/quotations")
 async def get_quotations(
@@ -139,26 +137,8 @@ async def create_quotation(
     data = await request.json()
 
     # Generate unique quote number (QN001, QN002, etc.)
-    # Get the last quote number
-    last_quote = db.query(models.Quotation).order_by(models.Quotation.id.desc()).first()
-
-    if last_quote and (last_quote.quote_number.startswith("QN") or last_quote.quote_number.startswith("QT")):
-        # Extract the sequence number and increment
-        try:
-            # Extract numeric part after prefix
-            numeric_part = ''.join(filter(str.isdigit, last_quote.quote_number))
-            if numeric_part:
-                seq_num = int(numeric_part) + 1
-            else:
-                seq_num = 1
-        except ValueError:
-            # If we can't parse the number, start from 1
-            seq_num = 1
-    else:
-        # Start with 1
-        seq_num = 1
-
-    quote_number = f"QN{seq_num:03d}"
+    from app.db import crud
+    quote_number = crud.generate_quote_number(db)
 
     # Create new quotation
     new_quotation = models.Quotation(
@@ -199,7 +179,7 @@ async def create_quotation(
 
 
 @router.get("/api/quotations")
-async def api_get_quotations(
+def api_get_quotations(
     db: Session = Depends(get_db)
 ):
     """Get all quotations as JSON."""
@@ -222,7 +202,7 @@ async def api_get_quotations(
 
 
 @router.get("/api/quotation/{quote_id}")
-async def api_get_quotation(
+def api_get_quotation(
     quote_id: int,
     db: Session = Depends(get_db)
 ):
@@ -273,7 +253,7 @@ async def api_get_quotation(
 
 
 @router.post("/api/generate-quotation-pdf/{quote_id}")
-async def generate_quotation_pdf(
+def generate_quotation_pdf(
     quote_id: int,
     db: Session = Depends(get_db)
 ):
@@ -331,11 +311,24 @@ async def generate_quotation_pdf(
 
 
 @router.post("/api/convert-quotation-to-invoice/{quote_id}")
-async def convert_quotation_to_invoice(
+def convert_quotation_to_invoice(
     quote_id: int,
+    idempotency_key: str = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db)
 ):
-    """Convert a quotation to an invoice."""
+    """Convert a quotation to an invoice.
+
+    A retry sent with the same Idempotency-Key header gets the invoice from
+    the first request instead of a second one.
+    """
+    return idempotency.run(
+        db, "quotation_conversion", idempotency_key, {"quote_id": quote_id},
+        lambda: _convert_quotation(db, quote_id)
+    )
+
+
+def _convert_quotation(db: Session, quote_id: int):
+    """Create an invoice from a quotation and queue its PDF."""
     try:
         # Get quotation from database
         quotation = db.query(models.Quotation).filter(models.Quotation.id == quote_id).first()
@@ -398,11 +391,11 @@ async def convert_quotation_to_invoice(
         # Create invoice
         invoice = crud.create_invoice(db, invoice_data)
 
-        # Generate PDF for the invoice
-        from app.utils.pdf_generator import generate_pdf_invoice
-        generate_pdf_invoice(invoice)
+        # Queue the PDF for the invoice in the background
+        from app.core import pdf_jobs
+        pdf_jobs.enqueue_invoice_pdf(db, invoice.invoice_number)
 
-        return {"success": True, "invoice_id": invoice.invoice_number}
+        return {"success": True, "invoice_id": invoice.invoice_number, "pdf_status": "pending"}
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
@@ -412,7 +405,7 @@ async def convert_quotation_to_invoice(
 
 
 @router.get("/api/quotations/export-excel")
-async def export_quotations_excel(
+def export_quotations_excel(
     db: Session = Depends(get_db)
 ):
     """Export quotations to Excel file."""
@@ -441,7 +434,7 @@ async def export_quotations_excel(
 
 
 @router.get("/quotation-pdf/{quote_number}")
-async def view_quotation_pdf(
+def view_quotation_pdf(
     quote_number: str,
     db: Session = Depends(get_db)
 ):
@@ -452,43 +445,42 @@ async def view_quotation_pdf(
         if not quotation:
             raise HTTPException(status_code=404, detail="Quotation not found")
 
-        # Check if PDF exists
-        if not quotation.pdf_path or not os.path.exists(quotation.pdf_path):
-            # Generate PDF if it doesn't exist
-            from app.utils.pdf_generator import generate_pdf_quotation
-
-            # Get quotation items
-            items = db.query(models.QuotationItem).filter(models.QuotationItem.quotation_id == quotation.id).all()
-
-            # Prepare quotation data for PDF generation
-            quotation_data = {
-                "id": quotation.id,
-                "quote_number": quotation.quote_number,
-                "date": quotation.date,
-                "customer_name": quotation.customer_name,
-                "customer_phone": quotation.customer_phone,
-                "customer_email": quotation.customer_email,
-                "customer_address": quotation.customer_address,
-                "asked_about": quotation.asked_about,
-                "subtotal": quotation.subtotal,
-                "total_gst": quotation.total_gst,
-                "total_amount": quotation.total_amount,
-                "items": [
-                    {
-                        "item_name": item.item_name,
-                        "quantity": item.quantity,
-                        "price": item.price,
-                        "gst_rate": item.gst_rate,
-                        "gst_amount": item.gst_amount,
-                        "total": item.total
-                    } for item in items
-                ]
-            }
+        from app.utils.pdf_generator import generate_pdf_quotation
+        from app.core import pdf_cache
+
+        # Get quotation items
+        items = db.query(models.QuotationItem).filter(models.QuotationItem.quotation_id == quotation.id).all()
+
+        # Prepare quotation data for PDF generation
+        quotation_data = {
+            "id": quotation.id,
+            "quote_number": quotation.quote_number,
+            "date": quotation.date,
+            "customer_name": quotation.customer_name,
+            "customer_phone": quotation.customer_phone,
+            "customer_email": quotation.customer_email,
+            "customer_address": quotation.customer_address,
+            "asked_about": quotation.asked_about,
+            "subtotal": quotation.subtotal,
+            "total_gst": quotation.total_gst,
+            "total_amount": quotation.total_amount,
+            "items": [
+                {
+                    "item_name": item.item_name,
+                    "quantity": item.quantity,
+                    "price": item.price,
+                    "gst_rate": item.gst_rate,
+                    "gst_amount": item.gst_amount,
+                    "total": item.total
+                } for item in items
+            ]
+        }
 
-            # Generate PDF
-            pdf_path = generate_pdf_quotation(quotation_data)
+        # Serve the cached PDF, rendering it again only if the quotation changed
+        pdf_path = pdf_cache.render_cached(db, "quotation", quotation.quote_number, quotation_data, generate_pdf_quotation)
 
-            # Update quotation with PDF path
+        # Update quotation with PDF path
+        if pdf_path and quotation.pdf_path != pdf_path:
             quotation.pdf_path = pdf_path
             db.commit()
 
@@ -508,7 +500,7 @@ async def view_quotation_pdf(
 
 
 @router.get("/download-quotation-pdf/{quote_number}")
-async def download_quotation_pdf(
+def download_quotation_pdf(
     quote_number: str,
     db: Session = Depends(get_db)
 ):
@@ -519,43 +511,42 @@ async def download_quotation_pdf(
         if not quotation:
             raise HTTPException(status_code=404, detail="Quotation not found")
 
-        # Check if PDF exists
-        if not quotation.pdf_path or not os.path.exists(quotation.pdf_path):
-            # Generate PDF if it doesn't exist
-            from app.utils.pdf_generator import generate_pdf_quotation
-
-            # Get quotation items
-            items = db.query(models.QuotationItem).filter(models.QuotationItem.quotation_id == quotation.id).all()
-
-            # Prepare quotation data for PDF generation
-            quotation_data = {
-                "id": quotation.id,
-                "quote_number": quotation.quote_number,
-                "date": quotation.date,
-                "customer_name": quotation.customer_name,
-                "customer_phone": quotation.customer_phone,
-                "customer_email": quotation.customer_email,
-                "customer_address": quotation.customer_address,
-                "asked_about": quotation.asked_about,
-                "subtotal": quotation.subtotal,
-                "total_gst": quotation.total_gst,
-                "total_amount": quotation.total_amount,
-                "items": [
-                    {
-                        "item_name": item.item_name,
-                        "quantity": item.quantity,
-                        "price": item.price,
-                        "gst_rate": item.gst_rate,
-                        "gst_amount": item.gst_amount,
-                        "total": item.total
-                    } for item in items
-                ]
-            }
+        from app.utils.pdf_generator import generate_pdf_quotation
+        from app.core import pdf_cache
 
-            # Generate PDF
-            pdf_path = generate_pdf_quotation(quotation_data)
+        # Get quotation items
+        items = db.query(models.QuotationItem).filter(models.QuotationItem.quotation_id == quotation.id).all()
 
-            # Update quotation with PDF path
+        # Prepare quotation data for PDF generation
+        quotation_data = {
+            "id": quotation.id,
+            "quote_number": quotation.quote_number,
+            "date": quotation.date,
+            "customer_name": quotation.customer_name,
+            "customer_phone": quotation.customer_phone,
+            "customer_email": quotation.customer_email,
+            "customer_address": quotation.customer_address,
+            "asked_about": quotation.asked_about,
+            "subtotal": quotation.subtotal,
+            "total_gst": quotation.total_gst,
+            "total_amount": quotation.total_amount,
+            "items": [
+                {
+                    "item_name": item.item_name,
+                    "quantity": item.quantity,
+                    "price": item.price,
+                    "gst_rate": item.gst_rate,
+                    "gst_amount": item.gst_amount,
+                    "total": item.total
+                } for item in items
+            ]
+        }
+
+        # Serve the cached PDF, rendering it again only if the quotation changed
+        pdf_path = pdf_cache.render_cached(db, "quotation", quotation.quote_number, quotation_data, generate_pdf_quotation)
+
+        # Update quotation with PDF path
+        if pdf_path and quotation.pdf_path != pdf_path:
             quotation.pdf_path = pdf_path
             db.commit()
 
@@ -575,7 +566,7 @@ async def download_quotation_pdf(
 
 
 @router.delete("/api/quotations/delete/{quote_number}")
-async def delete_quotation(
+def delete_quotation(
     quote_number: str,
     db: Session = Depends(get_db)
 ):
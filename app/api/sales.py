@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Form, Request, Body, HTTPException
+from fastapi import APIRouter, Depends, Form, Header, Body, HTTPException
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
@@ -6,6 +6,7 @@ from typing import Optional, List
 from datetime import datetime
 import json
 
+from app.core import idempotency
 from app.db import crud, database, models
 from app.schemas.sale import SaleCreate, Sale, SaleItem
 
@@ -14,7 +15,7 @@ templates = Jinja2Templates(directory="templates")
 
 
 @router.post("/checkout")
-async def process_checkout(
+def process_checkout(
     buyer_name: str = Form(...),
     buyer_gst: str = Form(""),  # Optional field
     buyer_address: str = Form(...),
@@ -25,9 +26,50 @@ async def process_checkout(
     payment_status: str = Form(...),  # Fully Paid, Partially Paid, Unpaid
     amount_paid: str = Form(None),  # Optional, will be set based on payment_status
     cart_items: str = Form(...),
+    cart_id: str = Form(None),  # Cart whose stock holds this sale uses
+    idempotency_key: str = Form(None),
+    idempotency_key_header: str = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(database.get_db)
 ):
-    """Process checkout and create invoice"""
+    """Process checkout and create invoice
+
+    A retry sent with the same Idempotency-Key header (or idempotency_key
+    field) gets the first request's invoice back instead of a new one.
+    """
+    checkout = {
+        "buyer_name": buyer_name,
+        "buyer_gst": buyer_gst,
+        "buyer_address": buyer_address,
+        "buyer_phone": buyer_phone,
+        "buyer_email": buyer_email,
+        "invoice_date": invoice_date,
+        "payment_method": payment_method,
+        "payment_status": payment_status,
+        "amount_paid": amount_paid,
+        "cart_items": cart_items,
+        "cart_id": cart_id,
+    }
+    return idempotency.run(
+        db, "checkout", idempotency_key_header or idempotency_key, checkout,
+        lambda: _create_checkout_invoice(db, **checkout)
+    )
+
+
+def _create_checkout_invoice(
+    db: Session,
+    buyer_name: str,
+    buyer_gst: str,
+    buyer_address: str,
+    buyer_phone: str,
+    buyer_email: str,
+    invoice_date: str,
+    payment_method: str,
+    payment_status: str,
+    amount_paid: Optional[str],
+    cart_items: str,
+    cart_id: Optional[str]
+):
+    """Create the invoice for a checkout form"""
     try:
         # Parse cart items
         items = json.loads(cart_items)
@@ -133,6 +175,9 @@ async def process_checkout(
             "invoice_type": invoice_type
         }
 
+        # Look up the HSN codes of every cart line with one query
+        hsn_codes = crud.get_item_hsn_codes(db, [item["id"] for item in items])
+
         # Add items to invoice
         for item in items:
             item_subtotal = item["price"] * item["quantity"]
@@ -152,9 +197,7 @@ async def process_checkout(
             # Calculate total with GST
             item_total = round(discounted_subtotal + item_gst, 2)
 
-            # Get item details from database
-            db_item = crud.get_item(db, item["id"])
-            hsn_code = db_item.hsn_code if db_item else "N/A"
+            hsn_code = hsn_codes.get(item["id"]) or "N/A"
 
             # Determine item type
             item_type = item.get("item_type", "product")
@@ -174,92 +217,102 @@ async def process_checkout(
                 "item_type": item_type
             })
 
-        # Save invoice to database
-        invoice = crud.create_invoice(db, invoice_data)
+        # Products sold, to be taken from the cart's stock holds
+        quantities = {}
+        for item in items:
+            if item.get("item_type", "product") == "product":
+                quantities[item["id"]] = quantities.get(item["id"], 0) + item["quantity"]
 
-        # Generate PDF invoice
-        from app.core.pdf_generator import generate_pdf_invoice
-        generate_pdf_invoice(invoice)
+        # Save the invoice, stock, sales counter and PDF job in one transaction
+        try:
+            # Without a cart ID there are no holds and the stock comes straight from inventory
+            invoice, job = crud.create_checkout_invoice(db, invoice_data, cart_id, quantities)
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
 
-        # Update sales counter
-        crud.update_sales_counter(db, total)
+        # Render the PDF in the background so the response does not wait on it
+        from app.core import pdf_jobs
+        pdf_jobs.start_job(job)
 
-        return {"success": True, "invoice_id": invoice.invoice_number}
+        return {"success": True, "invoice_id": invoice.invoice_number, "pdf_status": "pending"}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
+def _hold_request(data: dict):
+    """Read the cart ID, item code and quantity of a reserve/release request"""
+    item_code = data.get("item_code")
+    cart_id = str(data["cart_id"]) if data.get("cart_id") else None
+    try:
+        quantity = int(data.get("quantity", 1))
+    except (TypeError, ValueError):
+        quantity = 0
+    return cart_id, item_code, quantity
+
+
 @router.post("/reserve-stock")
-async def reserve_stock(
-    request: Request,
+def reserve_stock(
     data: dict = Body(...),
     db: Session = Depends(database.get_db)
 ):
-    """Temporarily reserve stock for an item"""
+    """Hold stock of an item for a cart"""
     try:
-        item_code = data.get("item_code")
-        quantity = data.get("quantity", 1)
+        cart_id, item_code, quantity = _hold_request(data)
 
+        # Holds belong to one page's cart, so other pages can never claim them
+        if not cart_id:
+            return JSONResponse(status_code=400, content={"success": False, "message": "Cart ID is required"})
         if not item_code:
             return JSONResponse(status_code=400, content={"success": False, "message": "Item code is required"})
+        if quantity <= 0:
+            return JSONResponse(status_code=400, content={"success": False, "message": "Quantity must be a positive number"})
 
-        # Get the item from the database
-        item = crud.get_item(db, item_code)
-        if not item:
+        # A single conditional UPDATE takes the stock, so concurrent carts can't oversell
+        reserved, available = crud.reserve_stock(db, cart_id, item_code, quantity)
+        if available is None:
             return JSONResponse(status_code=404, content={"success": False, "message": "Item not found"})
-
-        # Check if there's enough stock
-        if item.quantity < quantity:
+        if not reserved:
             return JSONResponse(status_code=400, content={
                 "success": False,
-                "message": f"Not enough stock. Only {item.quantity} units available."
+                "message": f"Not enough stock. Only {available} units available."
             })
 
-        # Temporarily reduce the stock
-        result = crud.update_item_quantity(db, item_code, -quantity)
-        if result:
-            # Return the updated quantity in the response
-            return JSONResponse(content={
-                "success": True,
-                "message": "Stock reserved successfully",
-                "new_quantity": result.quantity
-            })
-        else:
-            return JSONResponse(status_code=500, content={"success": False, "message": "Failed to reserve stock"})
+        return JSONResponse(content={
+            "success": True,
+            "message": "Stock reserved successfully",
+            "new_quantity": available
+        })
     except Exception as e:
         print(f"Error reserving stock: {e}")
         return JSONResponse(status_code=500, content={"success": False, "message": str(e)})
 
 
 @router.post("/release-stock")
-async def release_stock(
+def release_stock(
     data: dict = Body(...),
     db: Session = Depends(database.get_db)
 ):
-    """Release reserved stock for an item"""
+    """Hand back stock a cart holds of an item"""
     try:
-        item_code = data.get("item_code")
-        quantity = data.get("quantity", 1)
+        cart_id, item_code, quantity = _hold_request(data)
 
+        if not cart_id:
+            return JSONResponse(status_code=400, content={"success": False, "message": "Cart ID is required"})
         if not item_code:
             return JSONResponse(status_code=400, content={"success": False, "message": "Item code is required"})
+        if quantity <= 0:
+            return JSONResponse(status_code=400, content={"success": False, "message": "Quantity must be a positive number"})
 
-        # Get the item from the database
-        item = crud.get_item(db, item_code)
-        if not item:
+        released, available = crud.release_stock(db, cart_id, item_code, quantity)
+        if available is None:
             return JSONResponse(status_code=404, content={"success": False, "message": "Item not found"})
 
-        # Return the stock
-        result = crud.update_item_quantity(db, item_code, quantity)
-        if result:
-            # Return the updated quantity in the response
-            return JSONResponse(content={
-                "success": True,
-                "message": "Stock released successfully",
-                "new_quantity": result.quantity
-            })
-        else:
-            return JSONResponse(status_code=500, content={"success": False, "message": "Failed to release stock"})
+        return JSONResponse(content={
+            "success": True,
+            "message": "Stock released successfully",
+            "released": released,
+            "new_quantity": available
+        })
     except Exception as e:
         print(f"Error releasing stock: {e}")
         return JSONResponse(status_code=500, content={"success": False, "message": str(e)})
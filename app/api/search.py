@@ -0,0 +1,90 @@
+"""
+Global search API for Sunmax Application
+
+Searches inventory, services, customers, enquiries and expenses in one
+request through their full-text search indexes, returning the best few
+matches of each kind. Also exposes the typeahead metrics.
+"""
+
+from fastapi import APIRouter, Depends, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+from app.core import typeahead
+from app.db import crud, database, models, search_index
+from app.core.auth import get_current_user_from_cookie
+
+router = APIRouter()
+
+
+def _item_result(item):
+    return {"key": item.item_code, "title": item.item_name,
+            "subtitle": f"{item.item_code} | Qty {item.quantity}"}
+
+
+def _service_result(service):
+    return {"key": service.id, "title": service.service_name,
+            "subtitle": f"{service.service_code} | {service.employee_name}"}
+
+
+def _customer_result(customer):
+    return {"key": customer.id, "title": customer.customer_name,
+            "subtitle": f"{customer.customer_code} | {customer.phone_no}"}
+
+
+def _enquiry_result(enquiry):
+    return {"key": enquiry.id, "title": enquiry.customer_name,
+            "subtitle": f"{enquiry.enquiry_number} | {enquiry.phone_no}"}
+
+
+def _expense_result(expense):
+    return {"key": expense.id, "title": expense.vendor_name,
+            "subtitle": f"{expense.expense_code} | {expense.expense_type}"}
+
+
+# Result group -> (model, LIKE search used when the index can't be, formatter)
+SEARCH_SOURCES = {
+    "items": (models.InventoryItem, crud.search_items, _item_result),
+    "services": (models.Service, crud.search_services, _service_result),
+    "customers": (models.Customer, crud.search_customers, _customer_result),
+    "enquiries": (models.Enquiry, crud.search_enquiries, _enquiry_result),
+    "expenses": (models.Expense, crud.search_expenses, _expense_result),
+}
+
+
+def _search_everything(db: Session, q: str, limit: int):
+    """Run the search against every source and format the top matches"""
+    results = {}
+    for group, (model, fallback, to_result) in SEARCH_SOURCES.items():
+        rows = search_index.ranked_search(db, model, q, limit=limit)
+        if rows is None:
+            rows = fallback(db, q)[:limit]
+        results[group] = [to_result(row) for row in rows]
+    return results
+
+
+@router.get("/api/search")
+async def global_search(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(5, ge=1, le=50),
+    db: Session = Depends(database.get_db)
+):
+    """Search every kind of record at once, best matches first"""
+    user = await get_current_user_from_cookie(request, db)
+    if not user:
+        return JSONResponse(status_code=401, content={"success": False, "message": "Authentication required"})
+
+    try:
+        results = await run_in_threadpool(_search_everything, db, q, limit)
+        return {"success": True, "query": q, "results": results}
+    except Exception as e:
+        print(f"Error running global search: {e}")
+        return JSONResponse(status_code=500, content={"success": False, "message": str(e)})
+
+
+@router.get("/api/typeahead/metrics")
+def typeahead_metrics():
+    """Cache hit rate and lookup timings of the typeahead endpoints"""
+    return typeahead.get_metrics()
@@ -1,170 +1,36 @@
-from fastapi import APIRouter, Depends, Request, Form, Body, UploadFile, File
+from fastapi import APIRouter, Depends, Request, Form, Body, UploadFile, File, Query
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, FileResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from app.db import crud, database, models
-from app.core.pdf_generator import generate_pdf_invoice
+from app.core import pdf_jobs, sheet_import, typeahead
 from datetime import date, datetime
-import sqlite3
-import os
-import pandas as pd
-import tempfile
+import itertools
+import uuid
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
-# Function to ensure the services table exists
-def ensure_services_table_exists():
-    """Check if the services table exists and create it if it doesn't"""
-    try:
-        # Connect to the SQLite database
-        DB_FOLDER = "db"  # Database folder
-        db_path = os.path.join(os.getcwd(), DB_FOLDER, "sunmax.db")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Check if the services table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='services'")
-        if not cursor.fetchone():
-            print("Creating services table...")
-            # Create the services table
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS services (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                service_code TEXT UNIQUE NOT NULL,
-                date DATE NOT NULL,
-                service_name TEXT NOT NULL,
-                employee_name TEXT NOT NULL,
-                description TEXT,
-                price REAL NOT NULL,
-                gst_rate REAL DEFAULT 18.0,
-                payment_method TEXT,
-                payment_status TEXT DEFAULT 'Unpaid',
-                invoice_id INTEGER,
-                pdf_path TEXT,
-                FOREIGN KEY (invoice_id) REFERENCES invoices (id)
-            )
-            """)
-            conn.commit()
-            print("Services table created successfully.")
-        else:
-            # Check if required columns exist
-            cursor.execute("PRAGMA table_info(services)")
-            columns = cursor.fetchall()
-            column_names = [column[1] for column in columns]
-
-            # Check for missing columns
-            missing_columns = []
-            if "service_code" not in column_names:
-                missing_columns.append("service_code")
-            if "service_name" not in column_names:
-                missing_columns.append("service_name")
-            if "price" not in column_names:
-                missing_columns.append("price")
-            if "gst_rate" not in column_names:
-                missing_columns.append("gst_rate")
-
-            # If service_code column doesn't exist, recreate the table (major schema change)
-            if "service_code" not in column_names or "service_name" not in column_names:
-                print("Recreating services table with correct schema...")
-
-                # Check if services_old table exists and drop it if it does
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='services_old'")
-                if cursor.fetchone():
-                    cursor.execute("DROP TABLE services_old")
-                    conn.commit()
-                    print("Dropped existing services_old table")
-
-                # Rename the old table
-                cursor.execute("ALTER TABLE services RENAME TO services_old")
-
-                # Create the new table with correct schema
-                cursor.execute("""
-                CREATE TABLE services (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    service_code TEXT UNIQUE NOT NULL,
-                    date DATE NOT NULL,
-                    service_name TEXT NOT NULL,
-                    employee_name TEXT NOT NULL,
-                    description TEXT,
-                    price REAL NOT NULL,
-                    gst_rate REAL DEFAULT 18.0,
-                    payment_method TEXT,
-                    payment_status TEXT DEFAULT 'Unpaid',
-                    invoice_id INTEGER,
-                    pdf_path TEXT,
-                    FOREIGN KEY (invoice_id) REFERENCES invoices (id)
-                )
-                """)
-
-                # Try to copy data from old table if possible
-                try:
-                    cursor.execute("""
-                    INSERT INTO services (id, date, employee_name, description,
-                                         payment_method, payment_status, invoice_id, pdf_path)
-                    SELECT id, date, employee_name, description,
-                           payment_method, payment_status, invoice_id, pdf_path
-                    FROM services_old
-                    """)
-
-                    # Update service_code and service_name for existing records
-                    cursor.execute("SELECT id FROM services")
-                    service_ids = cursor.fetchall()
-                    for i, (service_id,) in enumerate(service_ids):
-                        service_code = f"SRV{str(i+1).zfill(3)}"
-                        service_name = f"Service {i+1}"
-                        price = 0.0
-                        cursor.execute("UPDATE services SET service_code = ?, service_name = ?, price = ? WHERE id = ?",
-                                      (service_code, service_name, price, service_id))
-                except Exception as e:
-                    print(f"Error copying data from old table: {e}")
-
-                conn.commit()
-                print("Services table recreated successfully.")
-            # If only some columns are missing, add them as new columns
-            else:
-                if "price" not in column_names:
-                    print("Adding price column to services table...")
-                    cursor.execute("ALTER TABLE services ADD COLUMN price REAL DEFAULT 0")
-                    # Try to copy total_amount to price if it exists
-                    if "total_amount" in column_names:
-                        cursor.execute("UPDATE services SET price = total_amount")
-                    conn.commit()
-                    print("Added price column to services table")
-
-                if "gst_rate" not in column_names:
-                    print("Adding gst_rate column to services table...")
-                    cursor.execute("ALTER TABLE services ADD COLUMN gst_rate REAL DEFAULT 18.0")
-                    conn.commit()
-                    print("Added gst_rate column to services table")
-
-        # Close the connection
-        conn.close()
-    except Exception as e:
-        print(f"Error ensuring services table exists: {e}")
-
-# Ensure the services table exists when the module is loaded
-ensure_services_table_exists()
-
 @router.get("/services/export-excel")
-async def export_services_excel(db: Session = Depends(database.get_db)):
+def export_services_excel(db: Session = Depends(database.get_db)):
     """Export services to Excel"""
-    from fastapi.responses import FileResponse
+    from fastapi.responses import StreamingResponse
     from app.core.excel_generator import export_services_to_excel
 
     try:
-        # Get all services
-        services = crud.get_all_services(db)
+        # Stream every service, not just the first page
+        services = crud.get_service_export_rows(db)
 
         # Generate Excel file
-        filename, file_path = export_services_to_excel(services)
+        filename, content = export_services_to_excel(services, stream=True)
 
-        # Return the Excel file
-        return FileResponse(
-            file_path,
+        # Stream the Excel file
+        return StreamingResponse(
+            content,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            filename=filename
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
     except Exception as e:
         import traceback
@@ -174,33 +40,91 @@ async def export_services_excel(db: Session = Depends(database.get_db)):
         return JSONResponse(status_code=500, content={"error": f"Error exporting services to Excel: {str(e)}"})
 
 
+def _parse_service_frame(df):
+    """
+    Parse a chunk of a service import sheet column by column
+
+    Returns:
+        Tuple of (records, errors); rows with an invalid date or price, or
+        without a service or employee name, are left out of records
+    """
+    import pandas as pd
+
+    errors = []
+    row_numbers = df.index + 1
+
+    def optional_column(column, default):
+        if column not in df.columns:
+            return pd.Series(default, index=df.index)
+        return df[column]
+
+    dates = sheet_import.date_column(df['date'], formats=['%Y-%m-%d', '%d-%m-%Y'])
+    prices = sheet_import.number_column(df['price'])
+    gst_rates = sheet_import.number_column(optional_column('gst_rate', 18.0))
+
+    parsed = pd.DataFrame({
+        "service_name": sheet_import.text_column(df['service_name']),
+        "employee_name": sheet_import.text_column(df['employee_name']),
+        "description": sheet_import.text_column(optional_column('description', '')).fillna(''),
+        "price": prices,
+        "date": dates.dt.date,
+        "gst_rate": gst_rates.fillna(18.0),
+        "payment_method": sheet_import.text_column(optional_column('payment_method', '')).fillna(''),
+        "payment_status": sheet_import.text_column(optional_column('payment_status', 'Unpaid')).fillna('Unpaid')
+    })
+
+    # Rows with an invalid date, price or missing names are skipped
+    checks = [
+        (dates.isna(), "Invalid date format. Use YYYY-MM-DD or DD-MM-YYYY."),
+        (prices.isna(), "Invalid price"),
+        (parsed["service_name"].isna() | parsed["employee_name"].isna(),
+         "service_name and employee_name are required")
+    ]
+    invalid = pd.Series(False, index=df.index)
+    for mask, message in checks:
+        for row_number in row_numbers[mask & ~invalid]:
+            errors.append(f"Row {row_number}: {message}")
+        invalid |= mask
+
+    return sheet_import.to_records(parsed[~invalid]), errors
+
+
 @router.post("/api/services/import-excel")
-async def import_services_excel(file: UploadFile = File(...), db: Session = Depends(database.get_db)):
-    """Import services from Excel"""
+async def import_services_excel(
+    file: UploadFile = File(...),
+    import_id: Optional[str] = Form(None),
+    db: Session = Depends(database.get_db)
+):
+    """Import services from Excel
+
+    Progress can be polled at /api/imports/{import_id}/progress.
+    """
     try:
-        # Create a temporary file to store the uploaded file
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            # Write the uploaded file content to the temporary file
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-
-        # Read the Excel or CSV file
+        # Reject oversized uploads before parsing anything
+        size_error = sheet_import.check_upload_size(file)
+        if size_error:
+            return JSONResponse(
+                status_code=413,
+                content={"success": False, "message": size_error}
+            )
+
+        # Parse straight from the uploaded file, a chunk of rows at a time
+        import_id = import_id or uuid.uuid4().hex
+        frames = sheet_import.iter_upload_frames(file, import_id)
         try:
-            file_extension = file.filename.split('.')[-1].lower()
-            if file_extension == 'csv':
-                df = pd.read_csv(temp_file_path)
-            else:
-                df = pd.read_excel(temp_file_path)
+            df = await run_in_threadpool(next, frames, None)
         except Exception as e:
-            os.unlink(temp_file_path)  # Delete the temp file
+            sheet_import.update_progress(import_id, status="failed")
             return JSONResponse(
                 status_code=400,
                 content={"success": False, "message": f"Error reading file: {str(e)}"}
             )
-
-        # Delete the temporary file
-        os.unlink(temp_file_path)
+        if df is None:
+            sheet_import.update_progress(import_id, status="failed")
+            return JSONResponse(
+                status_code=400,
+                content={"success": False, "message": "The file has no rows to import"}
+            )
 
         # Check if required columns exist
         required_columns = ['service_name', 'employee_name', 'price', 'date']
@@ -216,45 +140,15 @@ async def import_services_excel(file: UploadFile = File(...), db: Session = Depe
                 }
             )
 
-        # Process the data and create service records
-        success_count = 0
-        errors = []
-
-        for index, row in df.iterrows():
-            try:
-                # Convert date string to date object if it's a string
-                service_date = row['date']
-                if isinstance(service_date, str):
-                    try:
-                        service_date = datetime.strptime(service_date, '%Y-%m-%d').date()
-                    except ValueError:
-                        try:
-                            service_date = datetime.strptime(service_date, '%d-%m-%Y').date()
-                        except ValueError:
-                            errors.append(f"Row {index+1}: Invalid date format. Use YYYY-MM-DD or DD-MM-YYYY.")
-                            continue
-
-                # Create service data dictionary
-                service_data = {
-                    "service_name": str(row['service_name']),
-                    "employee_name": str(row['employee_name']),
-                    "description": str(row.get('description', '')),
-                    "price": float(row['price']),
-                    "date": service_date,
-                    "gst_rate": float(row.get('gst_rate', 18.0)),
-                    "payment_method": str(row.get('payment_method', '')),
-                    "payment_status": str(row.get('payment_status', 'Unpaid'))
-                }
-
-                # Generate a unique service code
-                service_count = db.query(models.Service).count()
-                service_data["service_code"] = f"SRV{str(service_count + 1).zfill(3)}"
+        records, errors = await run_in_threadpool(
+            sheet_import.parse_frames, itertools.chain([df], frames), _parse_service_frame
+        )
 
-                # Create service record
-                service = crud.create_service(db, service_data)
-                success_count += 1
-            except Exception as e:
-                errors.append(f"Row {index+1}: {str(e)}")
+        sheet_import.update_progress(import_id, status="saving")
+        success_count = await run_in_threadpool(crud.bulk_create_services, db, records)
+        sheet_import.update_progress(
+            import_id, status="done", created=success_count, failed=len(errors)
+        )
 
         # Return response
         if success_count > 0:
@@ -262,7 +156,8 @@ async def import_services_excel(file: UploadFile = File(...), db: Session = Depe
                 content={
                     "success": True,
                     "message": f"Successfully imported {success_count} services",
-                    "errors": errors
+                    "errors": errors,
+                    "import_id": import_id
                 }
             )
         else:
@@ -271,7 +166,8 @@ async def import_services_excel(file: UploadFile = File(...), db: Session = Depe
                 content={
                     "success": False,
                     "message": "No services were imported",
-                    "errors": errors
+                    "errors": errors,
+                    "import_id": import_id
                 }
             )
     except Exception as e:
@@ -279,6 +175,7 @@ async def import_services_excel(file: UploadFile = File(...), db: Session = Depe
         error_details = traceback.format_exc()
         print(f"Error importing services from Excel: {e}")
         print(f"Error details: {error_details}")
+        sheet_import.update_progress(import_id, status="failed", error=str(e))
         return JSONResponse(
             status_code=500,
             content={"success": False, "message": f"Error importing services: {str(e)}"}
@@ -294,7 +191,7 @@ async def get_services_page(
 ):
     """Render the services listing page"""
     # Get current user from cookie
-    from app.main import get_current_user_from_cookie
+    from app.core.auth import get_current_user_from_cookie
 
     user = await get_current_user_from_cookie(request, db)
 
@@ -326,7 +223,7 @@ async def get_service_cards_page(
 ):
     """Render the service cards page"""
     # Get current user from cookie
-    from app.main import get_current_user_from_cookie
+    from app.core.auth import get_current_user_from_cookie
 
     user = await get_current_user_from_cookie(request, db)
 
@@ -350,7 +247,7 @@ async def get_service_cards_page(
     )
 
 @router.get("/api/services/item/{service_id}")
-async def get_service_details(service_id: int, db: Session = Depends(database.get_db)):
+def get_service_details(service_id: int, db: Session = Depends(database.get_db)):
     """Get service details for modal display"""
     try:
         print(f"Fetching service details for ID: {service_id}, Type: {type(service_id)}")
@@ -369,7 +266,7 @@ async def get_service_details(service_id: int, db: Session = Depends(database.ge
 
 
 @router.get("/api/services/search")
-async def search_services(q: str, db: Session = Depends(database.get_db)):
+def search_services(q: str, db: Session = Depends(database.get_db)):
     """Search for services by service code or name"""
     try:
         print(f"Searching services with query: {q}")
@@ -402,8 +299,60 @@ async def search_services(q: str, db: Session = Depends(database.get_db)):
         return JSONResponse(status_code=500, content={"error": f"Error searching services: {str(e)}"})
 
 
+@router.get("/api/services/typeahead")
+def typeahead_services(
+    q: str = "",
+    limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = None,
+    db: Session = Depends(database.get_db)
+):
+    """Top matches for the service search box: code, name and price
+
+    Pass next_cursor from the response as cursor to load more results.
+    """
+    try:
+        result = typeahead.lookup(db, "services", q, limit, cursor)
+        return JSONResponse(
+            content={"success": True, **result},
+            headers={"Server-Timing": f"typeahead;dur={result['took_ms']}"}
+        )
+    except Exception as e:
+        print(f"Error in service typeahead: {e}")
+        return JSONResponse(status_code=500, content={"error": f"Error searching services: {str(e)}"})
+
+
+@router.get("/api/services/items")
+def get_service_items(
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(database.get_db)
+):
+    """Page of services for the home page cards, newest first
+
+    Pass next_cursor from the response as cursor to load the next page.
+    """
+    try:
+        services, next_cursor = crud.get_services_page(db, cursor, limit)
+        services_list = []
+        for service in services:
+            services_list.append({
+                "id": service.id,
+                "service_code": service.service_code,
+                "service_name": service.service_name,
+                "employee_name": service.employee_name,
+                "price": service.price,
+                "gst_rate": service.gst_rate,
+                "total_price": round(service.price * (1 + (service.gst_rate or 0) / 100), 2)
+            })
+
+        return {"success": True, "services": services_list, "next_cursor": next_cursor}
+    except Exception as e:
+        print(f"Error loading services page: {e}")
+        return JSONResponse(status_code=500, content={"error": f"Error loading services: {str(e)}"})
+
+
 @router.get("/api/services/{service_id}")
-async def get_service_by_id(service_id: int, db: Session = Depends(database.get_db)):
+def get_service_by_id(service_id: int, db: Session = Depends(database.get_db)):
     """Get service details by ID"""
     try:
         print(f"Fetching service with ID: {service_id}")
@@ -445,7 +394,7 @@ async def get_edit_service_page(
 ):
     """Render the edit service form page"""
     # Get current user from cookie
-    from app.main import get_current_user_from_cookie
+    from app.core.auth import get_current_user_from_cookie
 
     user = await get_current_user_from_cookie(request, db)
 
@@ -485,7 +434,7 @@ async def update_service(
     """Update a service record"""
     try:
         # Get current user from cookie
-        from app.main import get_current_user_from_cookie
+        from app.core.auth import get_current_user_from_cookie
 
         user = await get_current_user_from_cookie(request, db)
 
@@ -540,8 +489,8 @@ async def update_service(
 
                 db.commit()
 
-                # Regenerate PDF
-                generate_pdf_invoice(invoice)
+                # Re-render the PDF in the background
+                pdf_jobs.enqueue_invoice_pdf(db, invoice.invoice_number)
 
         # Redirect to services page with success message
         return RedirectResponse(url="/services?message=Service+updated+successfully", status_code=303)
@@ -561,7 +510,7 @@ async def update_service(
         )
 
 @router.post("/api/services/{service_id}/update")
-async def api_update_service(
+def api_update_service(
     service_id: int,
     date: str = Form(...),
     service_name: str = Form(...),
@@ -618,8 +567,8 @@ async def api_update_service(
 
                 db.commit()
 
-                # Regenerate PDF
-                generate_pdf_invoice(invoice)
+                # Re-render the PDF in the background
+                pdf_jobs.enqueue_invoice_pdf(db, invoice.invoice_number)
 
         return {"success": True, "message": "Service updated successfully"}
     except Exception as e:
@@ -634,7 +583,7 @@ async def delete_service(
 ):
     """Delete a service record"""
     # Get current user from cookie
-    from app.main import get_current_user_from_cookie
+    from app.core.auth import get_current_user_from_cookie
 
     user = await get_current_user_from_cookie(request, db)
 
@@ -652,7 +601,7 @@ async def delete_service(
         return RedirectResponse(url="/services?error=Error+deleting+service", status_code=303)
 
 @router.post("/service/{service_id}/update")
-async def update_service(
+def update_service(
     service_id: int,
     service_data: dict = Body(...),
     db: Session = Depends(database.get_db)
@@ -708,7 +657,7 @@ async def update_service(
 
 
 @router.delete("/service/{service_id}/delete")
-async def delete_service(
+def delete_service(
     service_id: int,
     db: Session = Depends(database.get_db)
 ):
@@ -731,7 +680,7 @@ async def delete_service(
 
 
 @router.get("/service/{service_id}/generate-invoice")
-async def generate_service_invoice(
+def generate_service_invoice(
     request: Request,
     service_id: int,
     db: Session = Depends(database.get_db)
@@ -739,9 +688,9 @@ async def generate_service_invoice(
     """Generate an invoice for a service record"""
     try:
         # Get current user from cookie
-        from app.main import get_current_user_from_cookie
+        from app.core.auth import get_user_from_cookie
 
-        user = await get_current_user_from_cookie(request, db)
+        user = get_user_from_cookie(request, db)
 
         # Redirect to login if not authenticated
         if not user:
@@ -801,8 +750,8 @@ async def generate_service_invoice(
         # Update service with invoice ID
         crud.update_service(db, service.id, {"invoice_id": invoice.id})
 
-        # Generate PDF
-        generate_pdf_invoice(invoice)
+        # Queue the PDF in the background
+        pdf_jobs.enqueue_invoice_pdf(db, invoice.invoice_number)
 
         # Redirect to invoice page
         return RedirectResponse(url=f"/invoice/{invoice.id}?message=Invoice+generated+successfully", status_code=303)
@@ -815,7 +764,7 @@ async def generate_service_invoice(
 async def get_new_service_page(request: Request, db: Session = Depends(database.get_db)):
     """Render the new service form page"""
     # Get current user from cookie
-    from app.main import get_current_user_from_cookie
+    from app.core.auth import get_current_user_from_cookie
 
     user = await get_current_user_from_cookie(request, db)
 
@@ -851,7 +800,7 @@ async def create_new_service(
     """Create a new service record"""
     try:
         # Get current user from cookie
-        from app.main import get_current_user_from_cookie
+        from app.core.auth import get_current_user_from_cookie
 
         user = await get_current_user_from_cookie(request, db)
 
@@ -860,7 +809,7 @@ async def create_new_service(
             return RedirectResponse(url="/login?next=/service/new", status_code=303)
 
         # Generate service code
-        service_code = f"SRV{str(crud.get_next_service_id(db)).zfill(3)}"
+        service_code = crud.generate_service_code(db)
 
         # Create service data dictionary
         service_data = {
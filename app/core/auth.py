@@ -3,12 +3,21 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
 from app.db import crud, models
+from app.core import user_cache
+from app.core.config import (
+    PASSWORD_HASH_SCHEME,
+    BCRYPT_ROUNDS,
+    ARGON2_TIME_COST,
+    ARGON2_MEMORY_COST_KB,
+    ARGON2_PARALLELISM,
+)
 from app.schemas.user import TokenData
 
 # Security configuration
@@ -17,7 +26,23 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# New hashes use the configured scheme and cost. Other schemes are kept only
+# to verify existing hashes, and min/max rounds equal to the configured cost
+# make hashes with any other cost count as outdated, so authenticate_user()
+# rehashes them on the next successful login
+pwd_context = CryptContext(
+    schemes=list(dict.fromkeys([PASSWORD_HASH_SCHEME, "argon2", "bcrypt"])),
+    default=PASSWORD_HASH_SCHEME,
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+    argon2__rounds=ARGON2_TIME_COST,
+    argon2__min_rounds=ARGON2_TIME_COST,
+    argon2__max_rounds=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST_KB,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
@@ -48,12 +73,38 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 
 def authenticate_user(db: Session, email: str, password: str):
-    """Authenticate a user by email and password."""
+    """
+    Authenticate a user by email and password.
+
+    Hashing is CPU-bound, so call this from a sync route or through
+    run_in_threadpool, never directly on the event loop. If the stored hash
+    uses an old scheme or cost it is replaced with a current one.
+    """
     user = crud.get_user_by_email(db, email)
     if not user:
         return False
-    if not verify_password(password, user.password):
+
+    valid, new_hash = pwd_context.verify_and_update(password, user.password)
+    if not valid:
         return False
+
+    if new_hash:
+        try:
+            user.password = new_hash
+            db.commit()
+            user_cache.invalidate(user.email)
+        except Exception as e:
+            db.rollback()
+            print(f"Error upgrading password hash for {email}: {e}")
+    return user
+
+
+def get_token_user(db: Session, email: str):
+    """Get the user named in an access token, from the user cache if possible"""
+    user = user_cache.get(db, email)
+    if user is None:
+        user = crud.get_user_by_email(db, email)
+        user_cache.put(user)
     return user
 
 
@@ -74,7 +125,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
 
-    user = crud.get_user_by_email(db, email=token_data.email)
+    # A cached user is returned straight away; on a cache miss the
+    # users-table query runs in the threadpool, off the event loop
+    user = user_cache.get(db, token_data.email)
+    if user is None:
+        user = await run_in_threadpool(get_token_user, db, token_data.email)
     if user is None:
         raise credentials_exception
 
@@ -101,9 +156,8 @@ async def get_admin_user(current_user: models.User = Depends(get_current_user)):
     return current_user
 
 
-async def get_current_user_from_cookie(request, db):
-    """Get the current user from the session cookie."""
-    # Get token from cookie
+def _cookie_email(request: Request) -> Optional[str]:
+    """Email (token subject) from the access_token cookie, or None if it is missing or invalid"""
     token = request.cookies.get("access_token")
     if not token:
         return None
@@ -115,15 +169,48 @@ async def get_current_user_from_cookie(request, db):
 
         # Decode the token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
+        return payload.get("sub")
+    except JWTError:
+        return None
+
+
+def get_user_from_cookie(request: Request, db: Session):
+    """
+    Get the current user from the session cookie, for plain def routes.
+
+    Those run in the threadpool, so the user lookup can query the database
+    directly. Returns None if the request isn't authenticated.
+    """
+    try:
+        email = _cookie_email(request)
         if email is None:
             return None
 
-        # Get the user from database
-        user = crud.get_user_by_email(db, email)
-        return user
-    except JWTError:
+        # Get the user from the cache or the database
+        return get_token_user(db, email)
+    except Exception as e:
+        print(f"Error getting user from cookie: {e}")
         return None
+
+
+async def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)):
+    """
+    Get the current user from the session cookie.
+
+    Can be called directly with a request and session, or used as a
+    dependency. Returns None if the request isn't authenticated. A cached
+    user is returned straight away; on a cache miss the users-table query
+    runs in the threadpool so it doesn't block the event loop.
+    """
+    try:
+        email = _cookie_email(request)
+        if email is None:
+            return None
+
+        user = user_cache.get(db, email)
+        if user is None:
+            user = await run_in_threadpool(get_token_user, db, email)
+        return user
     except Exception as e:
         print(f"Error getting user from cookie: {e}")
         return None
@@ -15,3 +15,71 @@ print("Using SQLite database")
 # Other configuration settings
 DEBUG = os.getenv("DEBUG", "false").lower() == "true"
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-for-development-only")
+
+# Number of worker threads for sync routes and run_in_threadpool calls
+# (database queries, PDF and Excel generation, password hashing)
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+# SQLite PRAGMA profile applied to every new connection
+# WAL lets readers carry on while a checkout is committing, and with WAL
+# synchronous=NORMAL is still safe against corruption (only the last
+# transactions can be lost on power failure, never on an app crash)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # Page cache per connection
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 0 disables memory mapping
+SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # Wait for locks instead of failing
+SQLITE_FOREIGN_KEYS = os.getenv("SQLITE_FOREIGN_KEYS", "ON")  # SQLite ignores REFERENCES unless enabled
+
+# Background workers that render invoice PDFs
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+PDF_RENDER_WAIT_SECONDS = float(os.getenv("PDF_RENDER_WAIT_SECONDS", "30"))  # How long a PDF view waits on a job
+
+# Processes used to render missing PDFs for batch ZIP exports
+PDF_EXPORT_PROCESSES = int(os.getenv("PDF_EXPORT_PROCESSES", str(min(os.cpu_count() or 1, 4))))
+
+# Connection pool sizing
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+
+# Spreadsheet imports (inventory, enquiries, services)
+IMPORT_MAX_UPLOAD_MB = int(os.getenv("IMPORT_MAX_UPLOAD_MB", "50"))
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "5000"))  # Rows parsed per chunk
+
+# Typeahead search results kept in memory (one entry per query and page)
+TYPEAHEAD_CACHE_SIZE = int(os.getenv("TYPEAHEAD_CACHE_SIZE", "256"))
+
+# When set, every distinct SQL statement is appended to this file (JSON lines)
+# so python -m app.db.index_advisor can check them for full table scans
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", "")
+
+# Apply pending schema migrations when the app starts. Deployments run
+# python -m app.db.migrate once instead and can turn this off
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() == "true"
+
+# Seconds an authenticated user is cached between requests (0 disables the cache)
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+
+# Password hashing. New hashes use PASSWORD_HASH_SCHEME ("bcrypt" or "argon2",
+# which needs argon2-cffi); hashes made with another scheme or cost are
+# replaced the next time their user logs in
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST_KB = int(os.getenv("ARGON2_MEMORY_COST_KB", "19456"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+
+# Stock held for a cart is returned to inventory if the cart is left alone
+# this long; the sweeper checks for expired holds every STOCK_HOLD_SWEEP_SECONDS
+STOCK_HOLD_TTL_MINUTES = int(os.getenv("STOCK_HOLD_TTL_MINUTES", "30"))
+STOCK_HOLD_SWEEP_SECONDS = int(os.getenv("STOCK_HOLD_SWEEP_SECONDS", "60"))
+
+# Responses to requests sent with an Idempotency-Key are kept this long so
+# retries replay them; a retry arriving while the first request is still
+# running waits up to IDEMPOTENCY_WAIT_SECONDS for its result
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+IDEMPOTENCY_WAIT_SECONDS = int(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+
+# Seconds the row counts shown on the stock, customer and enquiry list pages
+# are cached for (writes that add or remove rows clear them sooner)
+PAGE_COUNT_CACHE_SECONDS = int(os.getenv("PAGE_COUNT_CACHE_SECONDS", "30"))
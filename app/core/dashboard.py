@@ -0,0 +1,53 @@
+"""
+Summary figures for the home page dashboard.
+
+The home page used to load every inventory item and service just to count
+stock and categories. The summary is now computed with SQL aggregates and
+kept in memory until an item or service write clears it through
+crud.invalidate_catalog_caches(). The sales stats shown with it have their
+own cache (crud.get_sales_stats), so invoice writes don't clear the summary.
+The item and service lists are loaded page by page from
+/api/inventory/items and /api/services/items.
+"""
+
+import threading
+
+# Cached summary and a generation counter bumped on every invalidation, so
+# a summary computed while a write was happening isn't cached
+_summary = None
+_generation = 0
+_lock = threading.Lock()
+
+
+def get_summary(db):
+    """
+    Dashboard summary: inventory totals, categories, service count and sales stats
+
+    Returns:
+        Dictionary with total_items, total_inventory, low_stock_items,
+        out_of_stock_items, categories (name -> item count), total_services
+        and sales_stats
+    """
+    from app.db import crud
+
+    global _summary
+    with _lock:
+        summary = _summary
+        generation = _generation
+
+    if summary is None:
+        summary = crud.get_inventory_summary(db)
+        summary["total_services"] = crud.get_services_count(db)
+        with _lock:
+            if generation == _generation:
+                _summary = summary
+
+    return {**summary, "sales_stats": crud.get_sales_stats(db)}
+
+
+def invalidate():
+    """Drop the cached summary; called when inventory items or services change"""
+    global _summary, _generation
+    with _lock:
+        _generation += 1
+        _summary = None
@@ -1,201 +1,238 @@
 """
 Excel generation utilities for exporting data to Excel files.
+
+Exports use openpyxl's write-only mode: rows are written one at a time and
+flushed to a temporary file, and cells share a few named styles instead of
+carrying their own font/fill/border objects. This keeps memory flat for
+large exports.
 """
 
 import os
+import tempfile
 import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 from datetime import datetime
 from sqlalchemy.orm import Session
-from app.db import models
+from app.db import crud
+
+# Size of the chunks a finished workbook is streamed in
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Workbooks smaller than this are kept in memory while streaming
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+def _thin_border():
+    side = Side(style='thin')
+    return Border(left=side, right=side, top=side, bottom=side)
+
+
+def _new_export_workbook():
+    """Create a write-only workbook with the shared export styles registered"""
+    wb = openpyxl.Workbook(write_only=True)
+
+    header_style = NamedStyle(name="export_header")
+    header_style.font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
+    header_style.fill = PatternFill(start_color='003366', end_color='003366', fill_type='solid')
+    header_style.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+    header_style.border = _thin_border()
+    wb.add_named_style(header_style)
+
+    cell_style = NamedStyle(name="export_cell")
+    cell_style.border = _thin_border()
+    wb.add_named_style(cell_style)
+
+    number_style = NamedStyle(name="export_number")
+    number_style.border = _thin_border()
+    number_style.alignment = Alignment(horizontal='right')
+    wb.add_named_style(number_style)
+
+    return wb
+
+
+def _add_table_sheet(wb, title, headers, rows, widths=None, numeric_columns=()):
+    """
+    Write a styled table to a new sheet one row at a time
+
+    Args:
+        wb: Workbook from _new_export_workbook()
+        title: Sheet title
+        headers: Column headers
+        rows: Iterable of row value lists
+        widths: Optional dict of column letter to width (default 15)
+        numeric_columns: 1-based column numbers to right-align
+
+    Returns:
+        The worksheet
+    """
+    ws = wb.create_sheet(title=title)
+
+    # Column widths must be set before any rows are written
+    for col_num in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = 15
+    for column_letter, width in (widths or {}).items():
+        ws.column_dimensions[column_letter].width = width
+
+    column_styles = [
+        "export_number" if col_num in numeric_columns else "export_cell"
+        for col_num in range(1, len(headers) + 1)
+    ]
+
+    header_row = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.style = "export_header"
+        header_row.append(cell)
+    ws.append(header_row)
+
+    for values in rows:
+        row = []
+        for value, style_name in zip(values, column_styles):
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = style_name
+            row.append(cell)
+        ws.append(row)
+
+    return ws
+
+
+def _iter_file(file_obj):
+    """Yield a saved workbook in chunks and close it afterwards"""
+    try:
+        while True:
+            chunk = file_obj.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file_obj.close()
+
+
+def _finish_export(wb, filename, stream=False):
+    """
+    Save a finished workbook
+
+    Returns:
+        Tuple of (filename, file_path), or (filename, iterator of bytes) when
+        stream is True
+    """
+    if stream:
+        # Save now so errors are raised before the response starts
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        wb.save(output)
+        output.seek(0)
+        return filename, _iter_file(output)
+
+    # Create directory for exports if it doesn't exist
+    os.makedirs("exports", exist_ok=True)
+    file_path = os.path.join("exports", filename)
+
+    # Save the workbook to a file
+    wb.save(file_path)
+
+    return filename, file_path
+
 
+def _format_date(value):
+    return value.strftime('%d-%m-%Y') if hasattr(value, 'strftime') else str(value)
 
-def export_services_to_excel(services):
+
+def export_services_to_excel(services, stream=False):
     """
     Export service records to Excel file
 
     Args:
         services: List of service records
+        stream: Return the file contents as an iterator instead of saving to exports/
 
     Returns:
-        Tuple of (filename, file_path)
+        Tuple of (filename, file_path), or (filename, iterator of bytes) when streaming
     """
     try:
-        # Create a new workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Services"
-
-        # Define styles
-        header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='003366', end_color='003366', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-
-        # Define borders
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-
-        # Add headers
+        wb = _new_export_workbook()
+
         headers = [
             "Service Code", "Date", "Service Name", "Employee Name",
             "Description", "Price (₹)", "GST Rate (%)", "Total Price (₹)"
         ]
 
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-
-        # Add data rows
-        row_num = 2
-        for service in services:
-            # Calculate total price with GST
-            price = service.price
-            gst_rate = service.gst_rate if hasattr(service, 'gst_rate') and service.gst_rate is not None else 18.0
-            total_price = price + (price * gst_rate / 100)
-
-            # Format date
-            date_str = service.date.strftime('%d-%m-%Y') if hasattr(service.date, 'strftime') else str(service.date)
-
-            # Add service data
-            ws.cell(row=row_num, column=1).value = service.service_code
-            ws.cell(row=row_num, column=2).value = date_str
-            ws.cell(row=row_num, column=3).value = service.service_name
-            ws.cell(row=row_num, column=4).value = service.employee_name
-            ws.cell(row=row_num, column=5).value = service.description
-            ws.cell(row=row_num, column=6).value = price
-            ws.cell(row=row_num, column=7).value = gst_rate
-            ws.cell(row=row_num, column=8).value = round(total_price, 2)
-
-            # Apply borders to all cells in the row
-            for col_num in range(1, len(headers) + 1):
-                ws.cell(row=row_num, column=col_num).border = thin_border
-
-                # Right-align numeric columns
-                if col_num in [6, 7, 8]:
-                    ws.cell(row=row_num, column=col_num).alignment = Alignment(horizontal='right')
-
-            row_num += 1
-
-        # Auto-adjust column widths
-        for col_num, _ in enumerate(headers, 1):
-            column_letter = get_column_letter(col_num)
-            ws.column_dimensions[column_letter].width = 15
+        def rows():
+            for service in services:
+                # Calculate total price with GST
+                price = service.price
+                gst_rate = service.gst_rate if hasattr(service, 'gst_rate') and service.gst_rate is not None else 18.0
+                total_price = price + (price * gst_rate / 100)
+
+                yield [
+                    service.service_code,
+                    _format_date(service.date),
+                    service.service_name,
+                    service.employee_name,
+                    service.description,
+                    price,
+                    gst_rate,
+                    round(total_price, 2)
+                ]
 
         # Make the description column wider
-        ws.column_dimensions['E'].width = 40
+        _add_table_sheet(wb, "Services", headers, rows(), widths={'E': 40}, numeric_columns=(6, 7, 8))
 
         # Generate filename with date
         current_date = datetime.now().strftime('%Y%m%d')
         filename = f"Sunmax_Services_{current_date}.xlsx"
 
-        # Create directory for exports if it doesn't exist
-        os.makedirs("exports", exist_ok=True)
-        file_path = os.path.join("exports", filename)
-
-        # Save the workbook to a file
-        wb.save(file_path)
-
-        return filename, file_path
+        return _finish_export(wb, filename, stream)
     except Exception as e:
         print(f"Error exporting services to Excel: {e}")
         raise
 
 
-def export_inventory_to_excel(items):
+def export_inventory_to_excel(items, stream=False):
     """
     Export inventory items to Excel file
 
     Args:
         items: List of inventory items
+        stream: Return the file contents as an iterator instead of saving to exports/
 
     Returns:
-        Tuple of (filename, file_path)
+        Tuple of (filename, file_path), or (filename, iterator of bytes) when streaming
     """
     try:
-        # Create a new workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Inventory"
-
-        # Define styles
-        header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='003366', end_color='003366', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-
-        # Define borders
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-
-        # Add headers
+        wb = _new_export_workbook()
+
         headers = [
             "Item Code", "Item Name", "HSN Code", "Purchase Price (₹)",
             "Margin (%)", "Selling Price (₹)", "GST Rate (%)", "Quantity",
             "Unit", "Supplier Name", "Supplier GST", "Date Added"
         ]
 
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-
-        # Add data rows
-        row_num = 2
-        for item in items:
-            # Calculate selling price
-            purchase_price = item.purchase_price_per_unit
-            margin = item.margin if hasattr(item, 'margin') and item.margin is not None else 20
-            selling_price = purchase_price * (1 + (margin / 100))
-
-            # Format date
-            date_str = item.date.strftime('%d-%m-%Y') if hasattr(item.date, 'strftime') else str(item.date)
-
-            # Add item data
-            ws.cell(row=row_num, column=1).value = item.item_code
-            ws.cell(row=row_num, column=2).value = item.item_name
-            ws.cell(row=row_num, column=3).value = item.hsn_code
-            ws.cell(row=row_num, column=4).value = item.purchase_price_per_unit
-            ws.cell(row=row_num, column=5).value = margin
-            ws.cell(row=row_num, column=6).value = round(selling_price, 2)
-            ws.cell(row=row_num, column=7).value = item.gst_rate
-            ws.cell(row=row_num, column=8).value = item.quantity
-            ws.cell(row=row_num, column=9).value = item.unit_of_measurement
-            ws.cell(row=row_num, column=10).value = item.supplier_name
-            ws.cell(row=row_num, column=11).value = item.supplier_gst_number
-            ws.cell(row=row_num, column=12).value = date_str
-
-            # Apply borders to all cells in the row
-            for col_num in range(1, len(headers) + 1):
-                ws.cell(row=row_num, column=col_num).border = thin_border
-
-                # Right-align numeric columns
-                if col_num in [4, 5, 6, 7, 8]:
-                    ws.cell(row=row_num, column=col_num).alignment = Alignment(horizontal='right')
-
-            row_num += 1
-
-        # Auto-adjust column widths
-        for col_num, _ in enumerate(headers, 1):
-            column_letter = get_column_letter(col_num)
-            ws.column_dimensions[column_letter].width = 15
+        def rows():
+            for item in items:
+                # Calculate selling price
+                purchase_price = item.purchase_price_per_unit
+                margin = item.margin if hasattr(item, 'margin') and item.margin is not None else 20
+                selling_price = purchase_price * (1 + (margin / 100))
+
+                yield [
+                    item.item_code,
+                    item.item_name,
+                    item.hsn_code,
+                    item.purchase_price_per_unit,
+                    margin,
+                    round(selling_price, 2),
+                    item.gst_rate,
+                    item.quantity,
+                    item.unit_of_measurement,
+                    item.supplier_name,
+                    item.supplier_gst_number,
+                    _format_date(item.date)
+                ]
 
         # Make the item name column wider
-        ws.column_dimensions['B'].width = 30
+        _add_table_sheet(wb, "Inventory", headers, rows(), widths={'B': 30}, numeric_columns=(4, 5, 6, 7, 8))
 
         # Create an import template sheet
         template_ws = wb.create_sheet(title="Import Template")
@@ -205,88 +242,63 @@ def export_inventory_to_excel(items):
             "supplier_gst_number"
         ]
 
+        # Adjust column widths
+        for col in range(1, len(template_headers) + 1):
+            template_ws.column_dimensions[get_column_letter(col)].width = 20
+
         # Add headers to template worksheet
-        for col_num, header in enumerate(template_headers, 1):
-            cell = template_ws.cell(row=1, column=col_num)
-            cell.value = header
+        template_header_row = []
+        for header in template_headers:
+            cell = WriteOnlyCell(template_ws, value=header)
             cell.font = Font(bold=True)
             cell.fill = PatternFill(start_color="DDDDDD", end_color="DDDDDD", fill_type="solid")
             cell.alignment = Alignment(horizontal="center")
-            cell.border = Border(
-                left=Side(style="thin"), right=Side(style="thin"),
-                top=Side(style="thin"), bottom=Side(style="thin")
-            )
+            cell.border = _thin_border()
+            template_header_row.append(cell)
+        template_ws.append(template_header_row)
 
-        # Add note about item_code
-        note_cell = template_ws.cell(row=2, column=1)
-        note_cell.value = "Optional - leave blank for new items, provide for updating existing items"
+        # Add note about item_code (write-only sheets cannot merge cells, the text overflows instead)
+        note_cell = WriteOnlyCell(template_ws, value="Optional - leave blank for new items, provide for updating existing items")
         note_cell.font = Font(italic=True, color="FF0000")
-        template_ws.merge_cells(start_row=2, start_column=1, end_row=2, end_column=10)
+        template_ws.append([note_cell])
 
         # Add sample data row
-        sample_data = [
+        template_ws.append([
             "", "Sample Item", "12345678", 1000.00, 20.0,
             18.0, 10, "No.s", "Supplier Name", "GSTIN12345"
-        ]
-
-        for col_num, value in enumerate(sample_data, 1):
-            cell = template_ws.cell(row=3, column=col_num)
-            cell.value = value
-
-        # Adjust column widths
-        for col in range(1, len(template_headers) + 1):
-            template_ws.column_dimensions[get_column_letter(col)].width = 20
+        ])
 
         # Generate filename with date
         current_date = datetime.now().strftime('%Y%m%d')
         filename = f"Sunmax_Inventory_{current_date}.xlsx"
 
-        # Create directory for exports if it doesn't exist
-        os.makedirs("exports", exist_ok=True)
-        file_path = os.path.join("exports", filename)
-
-        # Save the workbook to a file
-        wb.save(file_path)
-
-        return filename, file_path
+        return _finish_export(wb, filename, stream)
     except Exception as e:
         print(f"Error exporting inventory to Excel: {e}")
         raise
 
 
-def export_invoices_to_excel(invoices, db: Session, payment_status=None):
+def export_invoices_to_excel(db: Session, payment_status=None, start_date=None, end_date=None,
+                             invoice_type=None, stream=False):
     """
     Export invoices to Excel file with detailed information for GST filing
 
+    Invoices and their items are read with a single query; the filters are
+    applied in SQL.
+
     Args:
-        invoices: List of invoice dictionaries
         db: Database session
         payment_status: Optional filter for payment status
+        start_date: Optional first invoice date to include
+        end_date: Optional last invoice date to include
+        invoice_type: Optional filter for invoice type ("product" or "service")
+        stream: Return the file contents as an iterator instead of saving to exports/
 
     Returns:
-        Tuple of (filename, file_path)
+        Tuple of (filename, file_path), or (filename, iterator of bytes) when streaming
     """
     try:
-        # Create a new workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Invoices"
-
-        # Define styles
-        header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='003366', end_color='003366', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-
-        # Define borders
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-
-        # Create a single sheet with all invoice and item details
-        ws.title = "Invoice Data"
+        wb = _new_export_workbook()
 
         # Add headers - Updated format with requested columns
         headers = [
@@ -295,239 +307,140 @@ def export_invoices_to_excel(invoices, db: Session, payment_status=None):
             "Subtotal", "Discount", "Taxable Amount", "GST", "Total"
         ]
 
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-
         # Add data - Each item gets its own row
-        row_num = 2
-        for invoice in invoices:
-
-            # Get invoice items directly from the database for more reliable data
-            invoice_items_db = db.query(models.InvoiceItem).join(
-                models.Invoice, models.Invoice.id == models.InvoiceItem.invoice_id
-            ).filter(
-                models.Invoice.invoice_number == invoice["invoice_number"]
-            ).all()
-
-            # If no items, add one row for the invoice
-            if not invoice_items_db:
-                # Add invoice data with HSN Code first
-                ws.cell(row=row_num, column=1).value = "N/A"  # HSN Code (N/A for no items)
-                ws.cell(row=row_num, column=2).value = invoice["invoice_number"]
-                ws.cell(row=row_num, column=3).value = invoice["date"].strftime('%d-%m-%Y') if hasattr(invoice["date"], 'strftime') else str(invoice["date"])
-                ws.cell(row=row_num, column=4).value = invoice["customer_name"]
-                ws.cell(row=row_num, column=5).value = invoice["customer_gst"]
-                ws.cell(row=row_num, column=6).value = invoice["payment_method"]
-                ws.cell(row=row_num, column=7).value = invoice["payment_status"]
-                ws.cell(row=row_num, column=8).value = "No items"  # Item Code
-                ws.cell(row=row_num, column=9).value = "No items"  # Item Name
-                ws.cell(row=row_num, column=10).value = 0  # Quantity
-                ws.cell(row=row_num, column=11).value = f"Rs.{invoice['subtotal']:.1f}"  # Subtotal
-                ws.cell(row=row_num, column=12).value = f"Rs.{invoice.get('discount', 0):.1f}"  # Discount
-
-                # Calculate taxable amount (subtotal - discount)
-                taxable_amount = invoice["subtotal"] - invoice.get("discount", 0)
-                ws.cell(row=row_num, column=13).value = f"Rs.{taxable_amount:.1f}"  # Taxable Amount
-
-                ws.cell(row=row_num, column=14).value = f"Rs.{invoice['total_gst']:.1f}"  # GST
-                ws.cell(row=row_num, column=15).value = f"Rs.{invoice['total_amount']:.1f}"  # Total
-
-                # Apply borders to all cells
-                for col_num in range(1, len(headers) + 1):
-                    ws.cell(row=row_num, column=col_num).border = thin_border
-
-                row_num += 1
-            else:
-                # Add a row for each item
-                for item in invoice_items_db:
-                    # Add invoice data with HSN Code first (repeated for each item)
-                    ws.cell(row=row_num, column=1).value = item.hsn_code  # HSN Code first
-                    ws.cell(row=row_num, column=2).value = invoice["invoice_number"]
-                    ws.cell(row=row_num, column=3).value = invoice["date"].strftime('%d-%m-%Y') if hasattr(invoice["date"], 'strftime') else str(invoice["date"])
-                    ws.cell(row=row_num, column=4).value = invoice["customer_name"]
-                    ws.cell(row=row_num, column=5).value = invoice["customer_gst"]
-                    ws.cell(row=row_num, column=6).value = invoice["payment_method"]
-                    ws.cell(row=row_num, column=7).value = invoice["payment_status"]
-
-                    # Add item data
-                    ws.cell(row=row_num, column=8).value = item.item_code
-                    ws.cell(row=row_num, column=9).value = item.item_name
-                    ws.cell(row=row_num, column=10).value = item.quantity
-
-                    # Add calculation fields
-                    item_subtotal = item.price * item.quantity
-                    ws.cell(row=row_num, column=11).value = f"Rs.{item_subtotal:.1f}"  # Subtotal
-
-                    # Get discount - check multiple possible fields
-                    discount = getattr(item, 'discount', 0)
-                    if discount == 0:
-                        discount_percent = getattr(item, 'discount_percent', 0)
-                        if discount_percent > 0:
-                            discount = item_subtotal * (discount_percent / 100)
-                        else:
-                            discount_amount = getattr(item, 'discount_amount', 0)
-                            if discount_amount > 0:
-                                discount = discount_amount
-
-                    ws.cell(row=row_num, column=12).value = f"Rs.{discount:.1f}"  # Discount
-
-                    # Calculate taxable amount
-                    taxable_amount = item_subtotal - discount
-                    ws.cell(row=row_num, column=13).value = f"Rs.{taxable_amount:.1f}"  # Taxable Amount
-
-                    # GST amount
-                    gst_amount = item.gst_amount if hasattr(item, 'gst_amount') else (taxable_amount * (item.gst_rate / 100))
-                    ws.cell(row=row_num, column=14).value = f"Rs.{gst_amount:.1f}"  # GST
-
-                    # Total
-                    total = taxable_amount + gst_amount
-                    ws.cell(row=row_num, column=15).value = f"Rs.{total:.1f}"  # Total
-
-                    # Apply borders to all cells
-                    for col_num in range(1, len(headers) + 1):
-                        ws.cell(row=row_num, column=col_num).border = thin_border
-
-                    row_num += 1
-
-            # No individual invoice sheets - all data is in the main sheet
-
-        # Auto-adjust column widths for the single sheet
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2) * 1.2
-            ws.column_dimensions[column_letter].width = adjusted_width
+        def rows():
+            export_rows = crud.get_invoice_export_rows(
+                db,
+                start_date=start_date,
+                end_date=end_date,
+                payment_status=payment_status,
+                invoice_type=invoice_type
+            )
+
+            for invoice, item in export_rows:
+                invoice_columns = [
+                    invoice.invoice_number,
+                    _format_date(invoice.date),
+                    invoice.customer_name,
+                    invoice.customer_gst,
+                    invoice.payment_method,
+                    invoice.payment_status
+                ]
+
+                # If no items, add one row for the invoice
+                if item is None:
+                    # Invoices carry no separate discount, so the taxable amount is the subtotal
+                    yield ["N/A"] + invoice_columns + [  # HSN Code (N/A for no items)
+                        "No items",  # Item Code
+                        "No items",  # Item Name
+                        0,  # Quantity
+                        f"Rs.{invoice.subtotal:.1f}",  # Subtotal
+                        f"Rs.{0:.1f}",  # Discount
+                        f"Rs.{invoice.subtotal:.1f}",  # Taxable Amount
+                        f"Rs.{invoice.total_gst:.1f}",  # GST
+                        f"Rs.{invoice.total_amount:.1f}"  # Total
+                    ]
+                    continue
+
+                item_subtotal = item.price * item.quantity
+
+                # Get discount - check multiple possible fields
+                discount = getattr(item, 'discount', 0)
+                if discount == 0:
+                    discount_percent = item.discount_percent or 0
+                    if discount_percent > 0:
+                        discount = item_subtotal * (discount_percent / 100)
+                    else:
+                        discount_amount = item.discount_amount or 0
+                        if discount_amount > 0:
+                            discount = discount_amount
+
+                # Calculate taxable amount
+                taxable_amount = item_subtotal - discount
+
+                # GST amount
+                gst_amount = item.gst_amount if item.gst_amount is not None else (taxable_amount * (item.gst_rate / 100))
+
+                # Total
+                total = taxable_amount + gst_amount
+
+                yield [item.hsn_code] + invoice_columns + [  # HSN Code first (repeated for each item)
+                    item.item_code,
+                    item.item_name,
+                    item.quantity,
+                    f"Rs.{item_subtotal:.1f}",  # Subtotal
+                    f"Rs.{discount:.1f}",  # Discount
+                    f"Rs.{taxable_amount:.1f}",  # Taxable Amount
+                    f"Rs.{gst_amount:.1f}",  # GST
+                    f"Rs.{total:.1f}"  # Total
+                ]
+
+        # Rows are streamed, so widths are fixed up front rather than fitted to the data
+        widths = {'B': 16, 'C': 12, 'D': 30, 'E': 20, 'F': 16, 'G': 16, 'H': 14, 'I': 30, 'J': 10}
+        _add_table_sheet(wb, "Invoice Data", headers, rows(), widths=widths)
 
         # Generate filename with date
         current_date = datetime.now().strftime('%Y%m%d')
         status_suffix = f"_{payment_status}" if payment_status and payment_status != "all" else ""
         filename = f"Sunmax_Invoices{status_suffix}_{current_date}.xlsx"
 
-        # Create directory for exports if it doesn't exist
-        os.makedirs("exports", exist_ok=True)
-        file_path = os.path.join("exports", filename)
-
-        # Save the workbook to a file
-        wb.save(file_path)
-
-        return filename, file_path
+        return _finish_export(wb, filename, stream)
     except Exception as e:
         print(f"Error exporting invoices to Excel: {e}")
         raise
 
 
-def export_customers_to_excel(customers, status_filter=None):
+def export_customers_to_excel(customers, status_filter=None, stream=False):
     """
     Export customer records to Excel file
 
     Args:
         customers: List of customer records
         status_filter: Optional filter for payment status
+        stream: Return the file contents as an iterator instead of saving to exports/
 
     Returns:
-        Tuple of (filename, file_path)
+        Tuple of (filename, file_path), or (filename, iterator of bytes) when streaming
     """
     try:
-        # Create a new workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Customers"
-
-        # Define styles
-        header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='003366', end_color='003366', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-
-        # Define borders
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-
-        # Add headers
+        wb = _new_export_workbook()
+
         headers = [
             "Customer Code", "Date", "Customer Name", "Phone Number", "Address",
             "Product Description", "Payment Method", "Payment Status",
             "Total Amount (₹)", "Amount Paid (₹)", "Balance Due (₹)"
         ]
 
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-
-        # Add data rows
-        row_num = 2
-        for customer in customers:
-            # Calculate balance due
-            total_amount = customer.total_amount if hasattr(customer, 'total_amount') else 0
-            amount_paid = customer.amount_paid if hasattr(customer, 'amount_paid') else 0
-            balance_due = total_amount - amount_paid
-
-            # Format date
-            date_str = customer.date.strftime('%d-%m-%Y') if hasattr(customer.date, 'strftime') else str(customer.date)
-
-            # Add customer data
-            ws.cell(row=row_num, column=1).value = customer.customer_code
-            ws.cell(row=row_num, column=2).value = date_str
-            ws.cell(row=row_num, column=3).value = customer.customer_name
-            ws.cell(row=row_num, column=4).value = customer.phone_no
-            ws.cell(row=row_num, column=5).value = customer.address if hasattr(customer, 'address') else ""
-            ws.cell(row=row_num, column=6).value = customer.product_description if hasattr(customer, 'product_description') else ""
-            ws.cell(row=row_num, column=7).value = customer.payment_method if hasattr(customer, 'payment_method') else ""
-            ws.cell(row=row_num, column=8).value = customer.payment_status
-            ws.cell(row=row_num, column=9).value = total_amount
-            ws.cell(row=row_num, column=10).value = amount_paid
-            ws.cell(row=row_num, column=11).value = balance_due
-
-            # Apply borders to all cells in the row
-            for col_num in range(1, len(headers) + 1):
-                ws.cell(row=row_num, column=col_num).border = thin_border
-
-                # Right-align numeric columns
-                if col_num in [9, 10, 11]:
-                    ws.cell(row=row_num, column=col_num).alignment = Alignment(horizontal='right')
-
-            row_num += 1
-
-        # Auto-adjust column widths
-        for col_num, _ in enumerate(headers, 1):
-            column_letter = get_column_letter(col_num)
-            ws.column_dimensions[column_letter].width = 15
+        def rows():
+            for customer in customers:
+                # Calculate balance due
+                total_amount = customer.total_amount if hasattr(customer, 'total_amount') else 0
+                amount_paid = customer.amount_paid if hasattr(customer, 'amount_paid') else 0
+                balance_due = total_amount - amount_paid
+
+                yield [
+                    customer.customer_code,
+                    _format_date(customer.date),
+                    customer.customer_name,
+                    customer.phone_no,
+                    customer.address if hasattr(customer, 'address') else "",
+                    customer.product_description if hasattr(customer, 'product_description') else "",
+                    customer.payment_method if hasattr(customer, 'payment_method') else "",
+                    customer.payment_status,
+                    total_amount,
+                    amount_paid,
+                    balance_due
+                ]
 
         # Make the address and product description columns wider
-        ws.column_dimensions['E'].width = 30
-        ws.column_dimensions['F'].width = 30
+        _add_table_sheet(wb, "Customers", headers, rows(), widths={'E': 30, 'F': 30}, numeric_columns=(9, 10, 11))
 
         # Generate filename with date
         current_date = datetime.now().strftime('%Y%m%d')
         status_suffix = f"_{status_filter}" if status_filter and status_filter != "all" else ""
         filename = f"Sunmax_Customers{status_suffix}_{current_date}.xlsx"
 
-        # Create directory for exports if it doesn't exist
-        os.makedirs("exports", exist_ok=True)
-        file_path = os.path.join("exports", filename)
-
-        # Save the workbook to a file
-        wb.save(file_path)
-
-        return filename, file_path
+        return _finish_export(wb, filename, stream)
     except Exception as e:
         print(f"Error exporting customers to Excel: {e}")
         raise
@@ -631,97 +544,46 @@ def export_quotations_to_excel(quotations):
     return filename, file_path
 
 
-def export_enquiries_to_excel(enquiries):
+def export_enquiries_to_excel(enquiries, stream=False):
     """
     Export enquiries to Excel with formatting
 
     Args:
         enquiries: List of enquiry objects
+        stream: Return the file contents as an iterator instead of saving to exports/
 
     Returns:
-        tuple: (filename, file_path)
+        tuple: (filename, file_path), or (filename, iterator of bytes) when streaming
     """
     try:
-        # Create a new workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Enquiries"
-
-        # Define styles
-        header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='003366', end_color='003366', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-
-        # Define borders
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-
-        # Add headers
+        wb = _new_export_workbook()
+
         headers = [
             "Enquiry Number", "Date", "Customer Name", "Phone Number",
             "Address", "Requirements", "Quotation Given", "Quotation Amount (₹)"
         ]
 
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-
-        # Add data rows
-        row_num = 2
-        for enquiry in enquiries:
-            # Format date
-            date_str = enquiry.date.strftime('%d-%m-%Y') if hasattr(enquiry.date, 'strftime') else str(enquiry.date)
-
-            # Add enquiry data
-            ws.cell(row=row_num, column=1).value = enquiry.enquiry_number
-            ws.cell(row=row_num, column=2).value = date_str
-            ws.cell(row=row_num, column=3).value = enquiry.customer_name
-            ws.cell(row=row_num, column=4).value = enquiry.phone_no
-            ws.cell(row=row_num, column=5).value = enquiry.address
-            ws.cell(row=row_num, column=6).value = enquiry.requirements
-            ws.cell(row=row_num, column=7).value = "Yes" if enquiry.quotation_given else "No"
-            ws.cell(row=row_num, column=8).value = enquiry.quotation_amount if enquiry.quotation_given else "-"
-
-            # Apply borders to all cells in the row
-            for col_num in range(1, len(headers) + 1):
-                ws.cell(row=row_num, column=col_num).border = thin_border
-
-                # Right-align numeric columns
-                if col_num == 8:
-                    ws.cell(row=row_num, column=col_num).alignment = Alignment(horizontal='right')
-
-            row_num += 1
-
-        # Auto-adjust column widths
-        for col_num, _ in enumerate(headers, 1):
-            column_letter = get_column_letter(col_num)
-            ws.column_dimensions[column_letter].width = 15
-
-        # Make the requirements column wider
-        ws.column_dimensions['F'].width = 40
-        # Make the address column wider
-        ws.column_dimensions['E'].width = 30
+        def rows():
+            for enquiry in enquiries:
+                yield [
+                    enquiry.enquiry_number,
+                    _format_date(enquiry.date),
+                    enquiry.customer_name,
+                    enquiry.phone_no,
+                    enquiry.address,
+                    enquiry.requirements,
+                    "Yes" if enquiry.quotation_given else "No",
+                    enquiry.quotation_amount if enquiry.quotation_given else "-"
+                ]
+
+        # Make the address and requirements columns wider
+        _add_table_sheet(wb, "Enquiries", headers, rows(), widths={'E': 30, 'F': 40}, numeric_columns=(8,))
 
         # Generate filename with date
         current_date = datetime.now().strftime('%Y%m%d')
         filename = f"Sunmax_Enquiries_{current_date}.xlsx"
 
-        # Create directory for exports if it doesn't exist
-        os.makedirs("exports", exist_ok=True)
-        file_path = os.path.join("exports", filename)
-
-        # Save the workbook to a file
-        wb.save(file_path)
-
-        return filename, file_path
+        return _finish_export(wb, filename, stream)
     except Exception as e:
         print(f"Error exporting enquiries to Excel: {e}")
         raise
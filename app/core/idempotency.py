@@ -0,0 +1,205 @@
+"""
+Idempotency keys for requests that create invoices or record payments.
+
+A double-click or a retry on a flaky network can send the same checkout or
+payment twice. Clients send an Idempotency-Key header (or idempotency_key
+field) with these requests; the first request with a key does the work and
+its response is stored in the idempotency_keys table for
+IDEMPOTENCY_KEY_TTL_HOURS. A retry with the same key gets the stored
+response back instead of doing the work again, and a retry that arrives
+while the first request is still running waits for its result.
+
+Every commit the work makes also marks the key as completed, in the same
+transaction. A claim whose work was committed is never run again, even if
+the server stops before the response is stored: a retry then gets a 409
+saying the response was lost, rather than a second invoice or payment.
+
+Only successful responses are stored. If the work fails without committing
+anything, the key is released so the client can retry with it.
+"""
+
+import asyncio
+import hashlib
+import inspect
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+
+from app.core.config import IDEMPOTENCY_KEY_TTL_HOURS, IDEMPOTENCY_WAIT_SECONDS
+from app.db import crud
+
+# A claim this old whose request never stored a response (e.g. the server
+# stopped mid-request) can be taken over by a retry
+STALE_CLAIM = timedelta(minutes=5)
+
+MAX_KEY_LENGTH = 255
+
+_POLL_SECONDS = 0.1
+
+
+def _fingerprint(params) -> str:
+    """Hash of the request parameters, to catch a key reused for another request"""
+    payload = json.dumps(jsonable_encoder(params), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _error(status_code: int, message: str):
+    return JSONResponse(status_code=status_code, content={"success": False, "message": message})
+
+
+def _attempt(db, scope: str, key: str, request_hash: str):
+    """
+    Try to claim a key, or get the response stored for it
+
+    Returns:
+        Tuple of (claimed, response): claimed is True if this request should
+        do the work; response is what to return instead, or None if another
+        request with the key is still running
+    """
+    ttl = timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+    if crud.claim_idempotency_key(db, scope, key, request_hash, ttl, STALE_CLAIM):
+        return True, None
+
+    record = crud.get_idempotency_key(db, scope, key)
+    if record is None:
+        # Released by a request that failed; try to claim it again
+        return False, None
+    if record.request_hash != request_hash:
+        return False, _error(422, "Idempotency key was already used for a different request")
+    if record.status_code is None:
+        if record.completed_at is not None and record.created_at < datetime.now() - STALE_CLAIM:
+            # The work was committed but the server stopped before storing the response
+            return False, _error(409, "This request was already processed, but its response was lost")
+        return False, None
+
+    return False, JSONResponse(
+        status_code=record.status_code,
+        content=json.loads(record.response_body),
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def _stored_response(response):
+    """(status code, JSON body) to store for a response, or None if it shouldn't be replayed"""
+    if isinstance(response, dict):
+        status_code, content = 200, jsonable_encoder(response)
+    elif isinstance(response, JSONResponse):
+        status_code, content = response.status_code, json.loads(response.body)
+    else:
+        return None
+
+    if status_code >= 400 or (isinstance(content, dict) and content.get("success") is False):
+        return None
+    return status_code, json.dumps(content)
+
+
+@contextmanager
+def _marking_commits(db, scope: str, key: str):
+    """Mark the key completed in every transaction the handler commits"""
+    def mark(session):
+        crud.mark_idempotency_key_completed(session, scope, key)
+
+    event.listen(db, "before_commit", mark)
+    try:
+        yield
+    finally:
+        event.remove(db, "before_commit", mark)
+
+
+def _finish(db, scope: str, key: str, response):
+    stored = _stored_response(response)
+    if stored is None:
+        crud.release_idempotency_key(db, scope, key)
+    else:
+        crud.save_idempotent_response(db, scope, key, *stored)
+    return response
+
+
+def _check_key(key: str):
+    if len(key) > MAX_KEY_LENGTH:
+        return _error(400, f"Idempotency key must be at most {MAX_KEY_LENGTH} characters")
+    return None
+
+
+async def _call(handler):
+    response = handler()
+    if inspect.isawaitable(response):
+        response = await response
+    return response
+
+
+def run(db, scope: str, key: str, params, handler):
+    """
+    Run a request handler at most once per idempotency key
+
+    Args:
+        db: Database session
+        scope: Name of the operation, e.g. "checkout"; keys are per scope
+        key: Idempotency key sent by the client (None or "" to always run)
+        params: Request parameters; a retry must send the same ones
+        handler: Function doing the work through db, returning a dict or
+            JSONResponse; its commits also mark the key completed
+
+    Returns:
+        The handler's response, or the stored response of an earlier request
+        with the same key
+    """
+    if not key:
+        return handler()
+    invalid = _check_key(key)
+    if invalid:
+        return invalid
+
+    request_hash = _fingerprint(params)
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        claimed, response = _attempt(db, scope, key, request_hash)
+        if claimed:
+            break
+        if response is not None:
+            return response
+        if time.monotonic() >= deadline:
+            return _error(409, "A request with this idempotency key is still being processed")
+        time.sleep(_POLL_SECONDS)
+
+    try:
+        with _marking_commits(db, scope, key):
+            response = handler()
+    except Exception:
+        crud.release_idempotency_key(db, scope, key)
+        raise
+    return _finish(db, scope, key, response)
+
+
+async def run_async(db, scope: str, key: str, params, handler):
+    """Same as run(), for async routes; handler may be a plain or async function"""
+    if not key:
+        return await _call(handler)
+    invalid = _check_key(key)
+    if invalid:
+        return invalid
+
+    request_hash = _fingerprint(params)
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        claimed, response = _attempt(db, scope, key, request_hash)
+        if claimed:
+            break
+        if response is not None:
+            return response
+        if time.monotonic() >= deadline:
+            return _error(409, "A request with this idempotency key is still being processed")
+        await asyncio.sleep(_POLL_SECONDS)
+
+    try:
+        with _marking_commits(db, scope, key):
+            response = await _call(handler)
+    except Exception:
+        crud.release_idempotency_key(db, scope, key)
+        raise
+    return _finish(db, scope, key, response)
@@ -0,0 +1,55 @@
+"""
+Links for the First / Previous / Next / Last controls of the list pages.
+
+The stock, customer and enquiry pages are paged with keyset cursors (see
+crud.keyset_page) rather than page numbers, so each link carries the cursor
+of the page next to it. The page number is only shown to the user; it is
+passed along in the links and corrected at either end of the list.
+"""
+
+from urllib.parse import urlencode
+
+
+def page_links(path: str, params: dict, page: int, limit: int, result: dict) -> dict:
+    """
+    Build the pagination links for one page of a list
+
+    Args:
+        path: Path of the list page, e.g. "/customers"
+        params: Filters and page size to keep in every link (empty values are dropped)
+        page: Page number the user is on, as passed in the link they followed
+        limit: Rows per page
+        result: Page returned by a crud *_page function (next_cursor, prev_cursor, total)
+
+    Returns:
+        Dictionary with page, total_pages, total and first_url, prev_url,
+        next_url and last_url (None where there is no such page)
+    """
+    total = result["total"]
+    next_cursor = result["next_cursor"]
+    prev_cursor = result["prev_cursor"]
+
+    total_pages = max((total + limit - 1) // limit, 1)
+    if not prev_cursor:
+        page = 1
+    elif not next_cursor:
+        page = max(total_pages, 2)
+    else:
+        # The count is cached, so keep the number in range if rows were added
+        page = max(page, 2)
+        total_pages = max(total_pages, page + 1)
+
+    base = {key: value for key, value in params.items() if value not in (None, "")}
+
+    def url(**extra):
+        return f"{path}?{urlencode({**base, **extra})}"
+
+    return {
+        "page": page,
+        "total_pages": max(total_pages, page),
+        "total": total,
+        "first_url": url(page=1) if prev_cursor else None,
+        "prev_url": url(before=prev_cursor, page=page - 1) if prev_cursor else None,
+        "next_url": url(after=next_cursor, page=page + 1) if next_cursor else None,
+        "last_url": url(last="true", page=total_pages) if next_cursor else None,
+    }
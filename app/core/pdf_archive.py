@@ -0,0 +1,180 @@
+"""
+Streaming ZIP archives of invoice PDFs.
+
+PDFs that are already cached for the current invoice data are added straight
+away; the rest are rendered in parallel in a process pool and added as each
+one finishes. The archive is written to the response chunk by chunk and never
+stored on disk.
+
+All exports share one process pool, started on first use with the spawn start
+method so workers never inherit the server's threads or open database handles.
+"""
+
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from starlette.concurrency import iterate_in_threadpool
+
+from app.core import pdf_cache
+from app.core.config import PDF_EXPORT_PROCESSES
+from app.core.pdf_generator import generate_pdf_invoice
+from app.db import crud
+from app.db.database import SessionLocal
+
+# Size of the pieces file contents are copied into the archive in
+CHUNK_SIZE = 64 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Return the shared render pool, starting it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXPORT_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown():
+    """Stop the render pool, dropping renders that have not started yet"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+class _ZipStream:
+    """Write-only file object that collects what zipfile writes so it can be yielded"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def prepare_invoice_documents(db, invoice_numbers):
+    """
+    Load the data needed to archive each invoice while the request session is open
+
+    Returns:
+        List of (invoice_number, payload, cached_pdf_path) tuples; the cached
+        path is None when the PDF has to be rendered first
+    """
+    documents = []
+    for invoice_number in invoice_numbers:
+        payload = pdf_cache.invoice_payload(db, invoice_number)
+        if payload:
+            cached_path = pdf_cache.get_fresh_pdf(db, "invoice", invoice_number, payload)
+            documents.append((invoice_number, payload, cached_path))
+    return documents
+
+
+def _add_file(archive, stream, pdf_path: str, arcname: str):
+    """Copy a PDF into the archive, yielding compressed output as it is produced"""
+    with open(pdf_path, "rb") as source, archive.open(arcname, "w") as target:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            target.write(chunk)
+            data = stream.pop()
+            if data:
+                yield data
+    yield stream.pop()
+
+
+def stream_invoice_zip(documents, cancelled: threading.Event = None):
+    """
+    Generate the bytes of a ZIP archive holding one PDF per invoice
+
+    Args:
+        documents: Output of prepare_invoice_documents()
+        cancelled: Set to stop before the next entry; renders not yet started are dropped
+
+    Yields:
+        Chunks of the ZIP archive
+    """
+    cancelled = cancelled or threading.Event()
+    stream = _ZipStream()
+    pending = [(number, payload) for number, payload, cached_path in documents if not cached_path]
+
+    with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        # Cached PDFs can go out while the missing ones are rendering
+        for invoice_number, payload, cached_path in documents:
+            if cancelled.is_set():
+                return
+            if cached_path and os.path.exists(cached_path):
+                yield from _add_file(archive, stream, cached_path, f"Invoice_{invoice_number}.pdf")
+
+        if pending:
+            db = SessionLocal()
+            pool = _get_pool()
+            futures = {
+                pool.submit(generate_pdf_invoice, payload): (invoice_number, payload)
+                for invoice_number, payload in pending
+            }
+            try:
+                for future in as_completed(futures):
+                    if cancelled.is_set():
+                        return
+                    invoice_number, payload = futures[future]
+                    try:
+                        pdf_path = future.result()
+                    except Exception as e:
+                        print(f"Error rendering PDF for invoice {invoice_number}: {e}")
+                        continue
+
+                    if not pdf_path or not os.path.exists(pdf_path):
+                        print(f"PDF for invoice {invoice_number} could not be generated, skipping")
+                        continue
+
+                    crud.save_pdf_cache_entry(
+                        db, "invoice", invoice_number, pdf_cache.content_hash(payload), pdf_path
+                    )
+                    yield from _add_file(archive, stream, pdf_path, f"Invoice_{invoice_number}.pdf")
+            finally:
+                # The pool is shared, so give back the slots of renders nobody will read
+                for future in futures:
+                    future.cancel()
+                db.close()
+
+    # Central directory written when the archive is closed
+    yield stream.pop()
+
+
+async def stream_invoice_zip_response(request, documents):
+    """
+    Async body for a StreamingResponse of stream_invoice_zip()
+
+    The archive is built in the threadpool. The client connection is checked
+    between chunks, and the export stops once the client has gone away.
+    """
+    cancelled = threading.Event()
+    chunks = stream_invoice_zip(documents, cancelled)
+    try:
+        async for chunk in iterate_in_threadpool(chunks):
+            yield chunk
+            if await request.is_disconnected():
+                print("Client disconnected, stopping invoice PDF export")
+                break
+    finally:
+        cancelled.set()
@@ -0,0 +1,98 @@
+"""
+Content-addressed cache for generated PDFs.
+
+Each rendered PDF is recorded in the pdf_cache table together with a hash of
+the data it was drawn from. A PDF is served from disk while the hash of the
+current data still matches, and re-rendered only once the invoice, quotation
+or customer behind it has changed.
+"""
+
+import hashlib
+import json
+import os
+from datetime import date, datetime
+
+from app.db import crud, models
+
+# Bump when the PDF layouts change so existing files are re-rendered
+PDF_LAYOUT_VERSION = 1
+
+
+def _plain(value):
+    """Convert a payload into JSON-friendly values with a stable representation"""
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "__table__"):
+        # ORM rows, e.g. payment records passed along with a customer
+        return {column.name: _plain(getattr(value, column.name)) for column in value.__table__.columns}
+    return value
+
+
+def content_hash(payload) -> str:
+    """Hash the data a PDF is rendered from"""
+    data = json.dumps(
+        {"layout": PDF_LAYOUT_VERSION, "data": _plain(payload)},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def get_fresh_pdf(db, document_type: str, document_key: str, payload):
+    """
+    Return the cached PDF path if it was rendered from the same content
+
+    Returns:
+        The PDF path, or None if there is no PDF for this content yet
+    """
+    entry = crud.get_pdf_cache_entry(db, document_type, document_key)
+    if entry and entry.content_hash == content_hash(payload) and os.path.exists(entry.pdf_path):
+        return entry.pdf_path
+    return None
+
+
+def render_cached(db, document_type: str, document_key: str, payload, render):
+    """
+    Serve a PDF from the cache, rendering it only when the content changed
+
+    Args:
+        db: Database session
+        document_type: "invoice", "quotation" or "customer"
+        document_key: Invoice number, quote number or customer ID
+        payload: Data passed to the render function
+        render: PDF generator taking the payload and returning the file path
+
+    Returns:
+        The PDF path, or None if rendering failed
+    """
+    pdf_path = get_fresh_pdf(db, document_type, document_key, payload)
+    if pdf_path:
+        return pdf_path
+
+    pdf_path = render(payload)
+    if pdf_path and os.path.exists(pdf_path):
+        crud.save_pdf_cache_entry(db, document_type, document_key, content_hash(payload), pdf_path)
+    return pdf_path
+
+
+def invoice_payload(db, invoice_number: str):
+    """Invoice data used to render and hash an invoice PDF, including payments"""
+    invoice = crud.get_invoice(db, invoice_number)
+    if not invoice:
+        return None
+
+    payments = db.query(models.Payment).filter(
+        models.Payment.invoice_id == invoice["id"]
+    ).order_by(models.Payment.id).all()
+    invoice["payments"] = [
+        {
+            "amount": payment.amount,
+            "payment_method": payment.payment_method,
+            "payment_date": payment.payment_date
+        } for payment in payments
+    ]
+    return invoice
@@ -0,0 +1,159 @@
+"""
+Background rendering of invoice PDFs.
+
+Render jobs are stored in the pdf_render_jobs table and executed by a small
+in-process worker pool, so checkout does not wait on reportlab. Jobs left
+unfinished when the server stops are picked up again by resume_pending_jobs().
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.core.config import PDF_RENDER_WORKERS, PDF_RENDER_WAIT_SECONDS
+from app.db import crud
+from app.db.database import SessionLocal
+
+_executor = ThreadPoolExecutor(max_workers=PDF_RENDER_WORKERS, thread_name_prefix="pdf-render")
+
+# Futures of the jobs submitted by this process, keyed by job ID
+_futures = {}
+_futures_lock = threading.Lock()
+
+
+def _render_job(job_id: int):
+    """Render the PDF for one job in a worker thread"""
+    from app.core.pdf_generator import generate_pdf_invoice
+    from app.core import pdf_cache
+
+    db = SessionLocal()
+    try:
+        job = crud.get_pdf_render_job(db, job_id)
+        if not job or job.status == "done":
+            return
+
+        crud.update_pdf_render_job(db, job_id, {
+            "status": "running",
+            "attempts": (job.attempts or 0) + 1,
+            "started_at": datetime.now()
+        })
+
+        start = time.perf_counter()
+        try:
+            invoice = pdf_cache.invoice_payload(db, job.invoice_number)
+            if not invoice:
+                raise ValueError(f"Invoice {job.invoice_number} not found")
+
+            # Skips drawing if the PDF on disk already matches the invoice data.
+            # generate_pdf_invoice reports errors by returning None
+            if not pdf_cache.render_cached(db, "invoice", job.invoice_number, invoice, generate_pdf_invoice):
+                raise RuntimeError("PDF generation failed")
+
+            crud.update_pdf_render_job(db, job_id, {
+                "status": "done",
+                "error": None,
+                "render_ms": (time.perf_counter() - start) * 1000,
+                "finished_at": datetime.now()
+            })
+        except Exception as e:
+            print(f"Error rendering PDF for invoice {job.invoice_number}: {e}")
+            db.rollback()
+            crud.update_pdf_render_job(db, job_id, {
+                "status": "failed",
+                "error": str(e),
+                "render_ms": (time.perf_counter() - start) * 1000,
+                "finished_at": datetime.now()
+            })
+    finally:
+        db.close()
+        with _futures_lock:
+            _futures.pop(job_id, None)
+
+
+def _submit(job_id: int):
+    """Hand a job to the worker pool unless this process is already running it"""
+    with _futures_lock:
+        future = _futures.get(job_id)
+        if future is None:
+            future = _executor.submit(_render_job, job_id)
+            _futures[job_id] = future
+        return future
+
+
+def enqueue_invoice_pdf(db, invoice_number: str):
+    """
+    Queue an invoice PDF for background rendering
+
+    Args:
+        db: Database session
+        invoice_number: Invoice number to render
+
+    Returns:
+        The queued PdfRenderJob
+    """
+    job = crud.create_pdf_render_job(db, invoice_number)
+    _submit(job.id)
+    return job
+
+
+def start_job(job):
+    """Start rendering a job that was committed as part of a larger transaction"""
+    _submit(job.id)
+    return job
+
+
+def ensure_invoice_pdf(db, invoice_number: str, pdf_path: str, timeout: float = PDF_RENDER_WAIT_SECONDS):
+    """
+    Make sure the invoice PDF on disk matches the current invoice data
+
+    If a job for the invoice is still pending or running it is waited on.
+    If the cached PDF was rendered from different content (or is missing)
+    afterwards, a new job is queued and waited on.
+
+    Returns:
+        The PDF path if the file exists once rendering has finished, otherwise None
+    """
+    from app.core import pdf_cache
+
+    job = crud.get_latest_pdf_render_job(db, invoice_number)
+    if job and job.status in ("pending", "running"):
+        _wait(job.id, timeout)
+
+    payload = pdf_cache.invoice_payload(db, invoice_number)
+    if payload and not pdf_cache.get_fresh_pdf(db, "invoice", invoice_number, payload):
+        print(f"PDF for invoice {invoice_number} is missing or out of date, queueing render")
+        job = enqueue_invoice_pdf(db, invoice_number)
+        _wait(job.id, timeout)
+
+    return pdf_path if os.path.exists(pdf_path) else None
+
+
+def _wait(job_id: int, timeout: float):
+    """Block until a job finishes or the timeout expires"""
+    try:
+        _submit(job_id).result(timeout=timeout)
+    except Exception as e:
+        print(f"Timed out waiting for PDF render job {job_id}: {e}")
+
+
+def resume_pending_jobs():
+    """Resubmit jobs that were still queued or running when the server stopped"""
+    db = SessionLocal()
+    try:
+        for job in crud.get_unfinished_pdf_render_jobs(db):
+            _submit(job.id)
+    except Exception as e:
+        print(f"Error resuming PDF render jobs: {e}")
+    finally:
+        db.close()
+
+
+def get_render_metrics(db):
+    """Queue depth and render timings for the PDF render pipeline"""
+    stats = crud.get_pdf_render_stats(db)
+    with _futures_lock:
+        stats["in_process_queue"] = len(_futures)
+    stats["workers"] = PDF_RENDER_WORKERS
+    return stats
@@ -0,0 +1,198 @@
+"""
+Reading and column-wise parsing helpers for Excel/CSV imports.
+
+Uploads are parsed straight from the spooled upload file in chunks of rows
+(CSV via pandas, xlsx via read-only openpyxl), so a large sheet is neither
+copied to a second temporary file nor held in memory twice. Each parsing
+helper takes a whole pandas column and returns a converted column, so a chunk
+is parsed with a handful of vectorized operations instead of Python code per
+cell.
+
+pandas is imported by the functions that use it, so importing this module
+(e.g. for the progress endpoint) doesn't load it at startup.
+"""
+
+import os
+import threading
+
+from app.core.config import IMPORT_CHUNK_ROWS, IMPORT_MAX_UPLOAD_MB
+
+MAX_UPLOAD_BYTES = IMPORT_MAX_UPLOAD_MB * 1024 * 1024
+
+# Progress of recent imports, keyed by import ID, for the progress endpoint
+_progress = {}
+_progress_lock = threading.Lock()
+MAX_TRACKED_IMPORTS = 100
+
+# Date formats accepted in text cells, tried in order
+DATE_FORMATS = ["%Y-%m-%d", "%d-%m-%Y", "%m/%d/%Y", "%d/%m/%Y"]
+
+TRUE_VALUES = {"yes", "true", "1", "y", "1.0"}
+
+
+def upload_size(upload) -> int:
+    """Size in bytes of an uploaded file, measured without reading it"""
+    upload.file.seek(0, os.SEEK_END)
+    size = upload.file.tell()
+    upload.file.seek(0)
+    return size
+
+
+def check_upload_size(upload):
+    """
+    Check an upload against the import size limit before parsing it
+
+    Returns:
+        An error message if the file is too large, otherwise None
+    """
+    if upload_size(upload) > MAX_UPLOAD_BYTES:
+        return f"File is too large. The import limit is {IMPORT_MAX_UPLOAD_MB} MB."
+    return None
+
+
+def update_progress(import_id: str, **fields):
+    """Record the progress of an import (status, rows_read, bytes_read, ...)"""
+    if not import_id:
+        return
+    with _progress_lock:
+        entry = _progress.setdefault(import_id, {"import_id": import_id})
+        entry.update(fields)
+        while len(_progress) > MAX_TRACKED_IMPORTS:
+            _progress.pop(next(iter(_progress)))
+
+
+def get_progress(import_id: str):
+    """Progress of an import, or None if it is unknown"""
+    with _progress_lock:
+        entry = _progress.get(import_id)
+        return dict(entry) if entry else None
+
+
+def iter_upload_frames(upload, import_id: str = None, chunksize: int = IMPORT_CHUNK_ROWS):
+    """
+    Read an uploaded CSV or Excel file in DataFrames of up to chunksize rows
+
+    The index of each frame continues across chunks and is the spreadsheet
+    row number minus 2 (the header is row 1), as with a single read_csv or
+    read_excel call.
+
+    Yields:
+        DataFrames; at least one (possibly empty) frame for Excel files
+    """
+    import pandas as pd
+
+    total_bytes = upload_size(upload)
+    update_progress(import_id, status="reading", rows_read=0, bytes_read=0, bytes_total=total_bytes)
+
+    rows_read = 0
+    if upload.filename.split('.')[-1].lower() == 'csv':
+        for frame in pd.read_csv(upload.file, chunksize=chunksize):
+            rows_read += len(frame)
+            update_progress(import_id, rows_read=rows_read, bytes_read=min(upload.file.tell(), total_bytes))
+            yield frame
+        return
+
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(upload.file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        columns = [
+            str(name).strip() if name is not None else f"Unnamed: {position}"
+            for position, name in enumerate(header)
+        ]
+
+        batch, index = [], []
+        yielded = False
+        for sheet_row, values in enumerate(rows, start=2):
+            # Blank rows (including formatted but empty trailing rows) are skipped
+            if all(value is None for value in values):
+                continue
+            values = tuple(values[:len(columns)])
+            batch.append(values + (None,) * (len(columns) - len(values)))
+            index.append(sheet_row - 2)
+            if len(batch) >= chunksize:
+                rows_read += len(batch)
+                update_progress(import_id, rows_read=rows_read)
+                yield pd.DataFrame.from_records(batch, columns=columns, index=index)
+                batch, index = [], []
+                yielded = True
+
+        if batch or not yielded:
+            rows_read += len(batch)
+            update_progress(import_id, rows_read=rows_read)
+            yield pd.DataFrame.from_records(batch, columns=columns, index=index)
+        update_progress(import_id, bytes_read=total_bytes)
+    finally:
+        workbook.close()
+
+
+def parse_frames(frames, parse):
+    """
+    Run a chunk parser over every frame and combine the results
+
+    Args:
+        frames: Iterable of DataFrames from iter_upload_frames()
+        parse: Function taking a DataFrame and returning (records, errors)
+
+    Returns:
+        Tuple of (records, errors) for the whole upload
+    """
+    records, errors = [], []
+    for frame in frames:
+        frame_records, frame_errors = parse(frame)
+        records.extend(frame_records)
+        errors.extend(frame_errors)
+    return records, errors
+
+
+def text_column(values):
+    """
+    Strip text cells, turning empty cells into NA
+
+    Numbers read from a sheet (e.g. HSN codes or phone numbers) come back as
+    floats; their trailing ".0" is dropped.
+    """
+    values = values.astype("string").str.strip()
+    values = values.str.replace(r"^(\d+)\.0$", r"\1", regex=True)
+    return values.mask(values == "")
+
+
+def date_column(values, formats=DATE_FORMATS):
+    """
+    Parse a column of dates given as text or as spreadsheet dates
+
+    Returns:
+        Column of Timestamps, with NaT where a cell could not be parsed
+    """
+    import pandas as pd
+
+    is_text = values.map(lambda value: isinstance(value, str))
+    parsed = pd.to_datetime(values.where(~is_text), errors="coerce")
+
+    text = values.astype(object).where(is_text).str.strip()
+    for date_format in formats:
+        parsed = parsed.fillna(pd.to_datetime(text, format=date_format, errors="coerce"))
+    return parsed
+
+
+def bool_column(values):
+    """Parse yes/no style cells; anything not recognised as true is False"""
+    is_text = values.map(lambda value: isinstance(value, str))
+    from_text = values.astype(object).where(is_text).str.strip().str.lower().isin(TRUE_VALUES)
+    from_other = values.where(~is_text).fillna(0).astype(bool)
+    return from_text.where(is_text, from_other)
+
+
+def number_column(values):
+    """Parse numbers, with NaN where a cell is empty or not a number"""
+    import pandas as pd
+
+    return pd.to_numeric(values, errors="coerce")
+
+
+def to_records(frame) -> list:
+    """Convert a parsed frame to row dicts with None in place of NA values"""
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None).to_dict("records")
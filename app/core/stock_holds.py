@@ -0,0 +1,54 @@
+"""
+Background expiry of cart stock holds.
+
+Carts live in the browser, so an abandoned cart never releases the stock it
+reserved. A daemon thread started with the app returns the stock of holds
+that have passed their expiry time (see crud.expire_stock_holds).
+"""
+
+import threading
+
+from app.core.config import STOCK_HOLD_SWEEP_SECONDS
+from app.db import crud
+from app.db.database import SessionLocal
+
+_stop = threading.Event()
+_thread = None
+
+
+def sweep_expired_holds() -> int:
+    """Return the stock of every expired hold; returns the number expired"""
+    db = SessionLocal()
+    try:
+        expired = crud.expire_stock_holds(db)
+        if expired:
+            print(f"Released {expired} expired stock hold(s)")
+        return expired
+    except Exception as e:
+        print(f"Error sweeping stock holds: {e}")
+        return 0
+    finally:
+        db.close()
+
+
+def _run():
+    while not _stop.is_set():
+        sweep_expired_holds()
+        _stop.wait(STOCK_HOLD_SWEEP_SECONDS)
+
+
+def start_sweeper():
+    """Start the sweeper thread (once per process)"""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="stock-hold-sweeper", daemon=True)
+    _thread.start()
+
+
+def stop_sweeper():
+    """Stop the sweeper thread, waiting for a sweep in progress to finish"""
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=5)
@@ -0,0 +1,167 @@
+"""
+Typeahead lookups for the inventory and service search boxes.
+
+Returns a page of lightweight matches (code, name, price, stock) instead of
+full records, in name order. The opaque cursor for fetching more holds the
+(name, code) of the last match, so later pages are found with a keyset
+condition instead of an OFFSET. Recent pages are kept in a small LRU cache
+that crud.invalidate_catalog_caches() clears whenever inventory items or
+services change, and every lookup is timed for the metrics endpoint.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import or_, tuple_
+from sqlalchemy.exc import OperationalError
+
+from app.core.config import TYPEAHEAD_CACHE_SIZE
+from app.db import models, search_index
+
+# LRU cache of result pages, keyed by (kind, normalised query, limit, cursor)
+_cache = OrderedDict()
+_lock = threading.Lock()
+# Bumped on every invalidation so a lookup that raced with a write doesn't
+# put its stale page back in the cache
+_generation = 0
+
+_stats = {"requests": 0, "cache_hits": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+
+def _item_match(item):
+    price = (item.purchase_price_per_unit or 0) * (1 + (item.margin or 0) / 100)
+    return {
+        "code": item.item_code,
+        "name": item.item_name,
+        "price": round(price, 2),
+        "stock": item.quantity,
+        "unit": item.unit_of_measurement,
+    }
+
+
+def _service_match(service):
+    return {
+        "code": service.service_code,
+        "name": service.service_name,
+        "price": service.price,
+        "stock": None,
+        "id": service.id,
+    }
+
+
+# kind -> (model, code column, name column, formatter)
+SOURCES = {
+    "items": (models.InventoryItem, models.InventoryItem.item_code, models.InventoryItem.item_name, _item_match),
+    "services": (models.Service, models.Service.service_code, models.Service.service_name, _service_match),
+}
+
+
+def _normalise(query: str) -> str:
+    return " ".join((query or "").lower().split())
+
+
+def _fetch(db, kind: str, query: str, limit: int, cursor: str):
+    """
+    Load one page of matches after the cursor
+
+    Returns:
+        Tuple of (matches, next_cursor); next_cursor is None on the last page
+    """
+    from app.db.crud import decode_cursor, encode_cursor
+
+    model, code_column, name_column, to_match = SOURCES[kind]
+    condition = search_index.match_condition(model, query)
+    if condition is None:
+        return [], None
+
+    sort_key = (name_column, code_column)
+    after = decode_cursor(cursor, sort_key) if cursor else None
+
+    def page(condition):
+        page_query = db.query(model).filter(condition)
+        if after is not None:
+            page_query = page_query.filter(tuple_(*sort_key) > tuple_(*after))
+        # One extra row tells whether there is another page
+        return page_query.order_by(*sort_key).limit(limit + 1).all()
+
+    try:
+        rows = page(condition)
+    except OperationalError as e:
+        # Search index missing: fall back to a LIKE query
+        print(f"Search index for {model.__tablename__} unavailable, falling back to LIKE search: {e}")
+        term = query.strip()
+        rows = page(or_(code_column.ilike(f"{term}%"), name_column.ilike(f"%{term}%")))
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in sort_key])
+    return [to_match(row) for row in rows[:limit]], next_cursor
+
+
+def lookup(db, kind: str, query: str, limit: int = 10, cursor: str = None):
+    """
+    Find the top matches for a typeahead query
+
+    Args:
+        db: Database session
+        kind: "items" or "services"
+        query: Text typed so far
+        limit: Number of matches per page
+        cursor: next_cursor from the previous page, to fetch more results
+
+    Returns:
+        Dictionary with the matches, next_cursor (None on the last page),
+        whether the page came from the cache, and the lookup time in ms
+    """
+    start = time.perf_counter()
+    key = (kind, _normalise(query), limit, cursor or None)
+
+    with _lock:
+        page = _cache.get(key)
+        if page is not None:
+            _cache.move_to_end(key)
+        generation = _generation
+
+    cached = page is not None
+    if not cached:
+        matches, next_cursor = _fetch(db, kind, query, limit, cursor)
+        page = {"matches": matches, "next_cursor": next_cursor}
+        with _lock:
+            if generation == _generation:
+                _cache[key] = page
+                while len(_cache) > TYPEAHEAD_CACHE_SIZE:
+                    _cache.popitem(last=False)
+
+    took_ms = (time.perf_counter() - start) * 1000
+    with _lock:
+        _stats["requests"] += 1
+        _stats["cache_hits"] += 1 if cached else 0
+        _stats["total_ms"] += took_ms
+        _stats["max_ms"] = max(_stats["max_ms"], took_ms)
+
+    return {**page, "cached": cached, "took_ms": round(took_ms, 2)}
+
+
+def invalidate():
+    """Drop every cached page; called when inventory items or services change"""
+    global _generation
+    with _lock:
+        _generation += 1
+        _cache.clear()
+
+
+def get_metrics():
+    """Request count, cache hit rate and lookup timings since startup"""
+    with _lock:
+        requests = _stats["requests"]
+        return {
+            "requests": requests,
+            "cache_hits": _stats["cache_hits"],
+            "cache_hit_rate": round(_stats["cache_hits"] / requests, 3) if requests else 0.0,
+            "avg_ms": round(_stats["total_ms"] / requests, 2) if requests else 0.0,
+            "max_ms": round(_stats["max_ms"], 2),
+            "cached_pages": len(_cache),
+            "cache_size": TYPEAHEAD_CACHE_SIZE,
+        }
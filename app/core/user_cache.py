@@ -0,0 +1,66 @@
+"""
+Short-lived cache of authenticated users.
+
+Every page load and API call resolves the user named in the access token.
+Users are cached by email (the token subject) for AUTH_USER_CACHE_TTL
+seconds, so most authenticated requests skip the users-table query. The
+crud functions that change or delete a user drop its entry. Other server
+processes keep their entry until the TTL runs out, which bounds how long a
+role change or deleted account can go unnoticed there.
+"""
+
+import threading
+import time
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core.config import AUTH_USER_CACHE_TTL
+
+# email -> (detached User, expiry time)
+_users = {}
+_lock = threading.Lock()
+
+
+def get(db, email: str):
+    """
+    Cached user for an email, attached to the given session
+
+    Returns:
+        The user, or None if it isn't cached or its entry has expired
+    """
+    with _lock:
+        entry = _users.get(email)
+        if entry is None:
+            return None
+        user, expires = entry
+        if expires < time.monotonic():
+            del _users[email]
+            return None
+
+    # Copy the cached state into this session without querying, so the
+    # request gets a normal persistent user it can update or lazy-load from
+    return db.merge(user, load=False)
+
+
+def put(user):
+    """Cache a copy of a user loaded from the database"""
+    if AUTH_USER_CACHE_TTL <= 0 or user is None:
+        return
+
+    # Keep a detached copy of the column values so the request's session and
+    # the cache never share an instance
+    model = type(user)
+    cached = model(**{column.key: getattr(user, column.key) for column in inspect(model).column_attrs})
+    make_transient_to_detached(cached)
+    with _lock:
+        _users[user.email] = (cached, time.monotonic() + AUTH_USER_CACHE_TTL)
+
+
+def invalidate(email: str = None):
+    """Drop the cached user for an email, or every cached user if email is None"""
+    with _lock:
+        if email is None:
+            _users.clear()
+        else:
+            _users.pop(email, None)
@@ -0,0 +1,360 @@
+"""
+Frozen schema of the baseline migrations.
+
+These statements are the tables and indexes as they stood at schema version
+2, copied out of the models of that release. The migrations run this SQL
+rather than Base.metadata, so changing a model later can never change what
+an old migration creates; schema changes get their own migration in
+app/db/migrate.py instead. Never edit these statements.
+"""
+
+BASELINE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS inventory (
+        item_code VARCHAR NOT NULL,
+        date DATE NOT NULL,
+        item_name VARCHAR NOT NULL,
+        hsn_code VARCHAR NOT NULL,
+        gst_rate FLOAT NOT NULL,
+        purchase_price_per_unit FLOAT,
+        margin FLOAT,
+        quantity INTEGER NOT NULL,
+        unit_of_measurement VARCHAR,
+        supplier_name VARCHAR,
+        supplier_gst_number VARCHAR,
+        PRIMARY KEY (item_code)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS invoices (
+        id INTEGER NOT NULL,
+        invoice_number VARCHAR NOT NULL,
+        date DATE NOT NULL,
+        customer_name VARCHAR NOT NULL,
+        customer_address VARCHAR,
+        customer_phone VARCHAR,
+        customer_email VARCHAR,
+        customer_gst VARCHAR,
+        payment_method VARCHAR,
+        subtotal FLOAT NOT NULL,
+        total_gst FLOAT NOT NULL,
+        total_amount FLOAT NOT NULL,
+        amount_paid FLOAT,
+        payment_status VARCHAR,
+        invoice_type VARCHAR,
+        pdf_path VARCHAR,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sales_counter (
+        id INTEGER NOT NULL,
+        total_sales INTEGER,
+        total_revenue FLOAT,
+        last_updated DATETIME,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sequences (
+        name VARCHAR NOT NULL,
+        value INTEGER NOT NULL,
+        PRIMARY KEY (name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS pdf_render_jobs (
+        id INTEGER NOT NULL,
+        invoice_number VARCHAR NOT NULL,
+        status VARCHAR NOT NULL,
+        attempts INTEGER,
+        error TEXT,
+        render_ms FLOAT,
+        created_at DATETIME,
+        started_at DATETIME,
+        finished_at DATETIME,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS pdf_cache (
+        id INTEGER NOT NULL,
+        document_type VARCHAR NOT NULL,
+        document_key VARCHAR NOT NULL,
+        content_hash VARCHAR NOT NULL,
+        pdf_path VARCHAR NOT NULL,
+        rendered_at DATETIME,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_pdf_cache_document UNIQUE (document_type, document_key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_monthly_sales (
+        id INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        invoice_count INTEGER,
+        revenue FLOAT,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_rollup_monthly_sales_period UNIQUE (year, month)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_payment_methods (
+        id INTEGER NOT NULL,
+        payment_method VARCHAR NOT NULL,
+        invoice_count INTEGER,
+        revenue FLOAT,
+        amount_collected FLOAT,
+        PRIMARY KEY (id),
+        UNIQUE (payment_method)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_monthly_customers (
+        id INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        new_customers INTEGER,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_rollup_monthly_customers_period UNIQUE (year, month)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_monthly_enquiries (
+        id INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        enquiries INTEGER,
+        conversions INTEGER,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_rollup_monthly_enquiries_period UNIQUE (year, month)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS quotations (
+        id INTEGER NOT NULL,
+        quote_number VARCHAR NOT NULL,
+        date DATE NOT NULL,
+        customer_name VARCHAR NOT NULL,
+        customer_address VARCHAR,
+        customer_phone VARCHAR,
+        customer_email VARCHAR,
+        subtotal FLOAT NOT NULL,
+        total_gst FLOAT NOT NULL,
+        total_amount FLOAT NOT NULL,
+        asked_about TEXT,
+        created_at DATETIME,
+        pdf_path VARCHAR,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER NOT NULL,
+        email VARCHAR NOT NULL,
+        password VARCHAR NOT NULL,
+        name VARCHAR NOT NULL,
+        phone VARCHAR,
+        role VARCHAR NOT NULL,
+        first_login BOOLEAN,
+        created_at DATETIME,
+        last_login DATETIME,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS enquiries (
+        id INTEGER NOT NULL,
+        enquiry_number VARCHAR NOT NULL,
+        date DATE NOT NULL,
+        customer_name VARCHAR NOT NULL,
+        phone_no VARCHAR NOT NULL,
+        address VARCHAR,
+        requirements TEXT,
+        quotation_given BOOLEAN,
+        quotation_amount FLOAT,
+        quotation_file_path VARCHAR,
+        created_at DATETIME,
+        updated_at DATETIME,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS customers (
+        id INTEGER NOT NULL,
+        customer_code VARCHAR NOT NULL,
+        date DATE NOT NULL,
+        customer_name VARCHAR NOT NULL,
+        phone_no VARCHAR NOT NULL,
+        address VARCHAR,
+        product_description TEXT,
+        payment_method VARCHAR,
+        payment_status VARCHAR,
+        total_amount FLOAT NOT NULL,
+        amount_paid FLOAT,
+        created_at DATETIME,
+        updated_at DATETIME,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS expenses (
+        id INTEGER NOT NULL,
+        expense_code VARCHAR NOT NULL,
+        date DATE NOT NULL,
+        expense_type VARCHAR NOT NULL,
+        vendor_name VARCHAR NOT NULL,
+        vendor_gst VARCHAR,
+        vendor_address TEXT,
+        vendor_phone VARCHAR,
+        description TEXT,
+        amount FLOAT NOT NULL,
+        gst_rate FLOAT,
+        gst_amount FLOAT,
+        total_amount FLOAT NOT NULL,
+        amount_paid FLOAT,
+        payment_method VARCHAR NOT NULL,
+        payment_status VARCHAR,
+        category VARCHAR,
+        receipt_path VARCHAR,
+        notes TEXT,
+        created_at DATETIME,
+        updated_at DATETIME,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS invoice_items (
+        id INTEGER NOT NULL,
+        invoice_id INTEGER NOT NULL,
+        item_code VARCHAR NOT NULL,
+        item_name VARCHAR NOT NULL,
+        hsn_code VARCHAR NOT NULL,
+        quantity INTEGER NOT NULL,
+        price FLOAT NOT NULL,
+        discount_percent FLOAT,
+        discount_amount FLOAT,
+        discounted_subtotal FLOAT NOT NULL,
+        gst_rate FLOAT NOT NULL,
+        gst_amount FLOAT NOT NULL,
+        total FLOAT NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(invoice_id) REFERENCES invoices (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS payments (
+        id INTEGER NOT NULL,
+        invoice_id INTEGER NOT NULL,
+        payment_date DATETIME,
+        amount FLOAT NOT NULL,
+        payment_method VARCHAR NOT NULL,
+        notes VARCHAR,
+        PRIMARY KEY (id),
+        FOREIGN KEY(invoice_id) REFERENCES invoices (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS services (
+        id INTEGER NOT NULL,
+        service_code VARCHAR NOT NULL,
+        date DATE NOT NULL,
+        service_name VARCHAR NOT NULL,
+        employee_name VARCHAR NOT NULL,
+        description VARCHAR,
+        price FLOAT NOT NULL,
+        gst_rate FLOAT,
+        payment_method VARCHAR,
+        payment_status VARCHAR,
+        invoice_id INTEGER,
+        pdf_path VARCHAR,
+        PRIMARY KEY (id),
+        FOREIGN KEY(invoice_id) REFERENCES invoices (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS quotation_items (
+        id INTEGER NOT NULL,
+        quotation_id INTEGER NOT NULL,
+        item_code VARCHAR NOT NULL,
+        item_name VARCHAR NOT NULL,
+        quantity INTEGER NOT NULL,
+        price FLOAT NOT NULL,
+        gst_rate FLOAT NOT NULL,
+        gst_amount FLOAT NOT NULL,
+        total FLOAT NOT NULL,
+        item_type VARCHAR NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(quotation_id) REFERENCES quotations (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS customer_payments (
+        id INTEGER NOT NULL,
+        customer_id INTEGER NOT NULL,
+        payment_date DATETIME,
+        amount FLOAT NOT NULL,
+        payment_method VARCHAR NOT NULL,
+        notes VARCHAR,
+        PRIMARY KEY (id),
+        FOREIGN KEY(customer_id) REFERENCES customers (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS expense_payments (
+        id INTEGER NOT NULL,
+        expense_id INTEGER NOT NULL,
+        payment_date DATETIME,
+        amount FLOAT NOT NULL,
+        payment_method VARCHAR NOT NULL,
+        notes VARCHAR,
+        PRIMARY KEY (id),
+        FOREIGN KEY(expense_id) REFERENCES expenses (id)
+    )
+    """,
+]
+
+BASELINE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_inventory_item_code ON inventory (item_code)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_invoices_invoice_number ON invoices (invoice_number)",
+    "CREATE INDEX IF NOT EXISTS ix_invoices_payment_status_date ON invoices (payment_status, date)",
+    "CREATE INDEX IF NOT EXISTS ix_invoices_id ON invoices (id)",
+    "CREATE INDEX IF NOT EXISTS ix_invoices_customer_name_date ON invoices (customer_name, date)",
+    "CREATE INDEX IF NOT EXISTS ix_invoices_date ON invoices (date, id)",
+    "CREATE INDEX IF NOT EXISTS ix_sales_counter_id ON sales_counter (id)",
+    "CREATE INDEX IF NOT EXISTS ix_pdf_render_jobs_invoice_number ON pdf_render_jobs (invoice_number)",
+    "CREATE INDEX IF NOT EXISTS ix_pdf_render_jobs_id ON pdf_render_jobs (id)",
+    "CREATE INDEX IF NOT EXISTS ix_pdf_cache_id ON pdf_cache (id)",
+    "CREATE INDEX IF NOT EXISTS ix_rollup_monthly_sales_id ON rollup_monthly_sales (id)",
+    "CREATE INDEX IF NOT EXISTS ix_rollup_payment_methods_id ON rollup_payment_methods (id)",
+    "CREATE INDEX IF NOT EXISTS ix_rollup_monthly_customers_id ON rollup_monthly_customers (id)",
+    "CREATE INDEX IF NOT EXISTS ix_rollup_monthly_enquiries_id ON rollup_monthly_enquiries (id)",
+    "CREATE INDEX IF NOT EXISTS ix_quotations_id ON quotations (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_quotations_quote_number ON quotations (quote_number)",
+    "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+    "CREATE INDEX IF NOT EXISTS ix_enquiries_id ON enquiries (id)",
+    "CREATE INDEX IF NOT EXISTS ix_enquiries_date ON enquiries (date)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_enquiries_enquiry_number ON enquiries (enquiry_number)",
+    "CREATE INDEX IF NOT EXISTS ix_customers_id ON customers (id)",
+    "CREATE INDEX IF NOT EXISTS ix_customers_date ON customers (date)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_customers_customer_code ON customers (customer_code)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_expenses_expense_code ON expenses (expense_code)",
+    "CREATE INDEX IF NOT EXISTS ix_expenses_id ON expenses (id)",
+    "CREATE INDEX IF NOT EXISTS ix_expenses_expense_type_date ON expenses (expense_type, date)",
+    "CREATE INDEX IF NOT EXISTS ix_expenses_category_date ON expenses (category, date)",
+    "CREATE INDEX IF NOT EXISTS ix_expenses_date ON expenses (date)",
+    "CREATE INDEX IF NOT EXISTS ix_invoice_items_id ON invoice_items (id)",
+    "CREATE INDEX IF NOT EXISTS ix_invoice_items_item_code ON invoice_items (item_code)",
+    "CREATE INDEX IF NOT EXISTS ix_invoice_items_invoice_id ON invoice_items (invoice_id)",
+    "CREATE INDEX IF NOT EXISTS ix_payments_invoice_id ON payments (invoice_id)",
+    "CREATE INDEX IF NOT EXISTS ix_payments_id ON payments (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_services_service_code ON services (service_code)",
+    "CREATE INDEX IF NOT EXISTS ix_services_id ON services (id)",
+    "CREATE INDEX IF NOT EXISTS ix_quotation_items_id ON quotation_items (id)",
+    "CREATE INDEX IF NOT EXISTS ix_customer_payments_customer_id ON customer_payments (customer_id)",
+    "CREATE INDEX IF NOT EXISTS ix_customer_payments_id ON customer_payments (id)",
+    "CREATE INDEX IF NOT EXISTS ix_expense_payments_expense_id ON expense_payments (expense_id)",
+    "CREATE INDEX IF NOT EXISTS ix_expense_payments_id ON expense_payments (id)",
+]
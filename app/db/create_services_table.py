@@ -0,0 +1,140 @@
+"""
+Script to create the services table in the database.
+"""
+
+import sqlite3
+import os
+
+
+def create_services_table():
+    """Check if the services table exists and create it if it doesn't"""
+    try:
+        # Connect to the SQLite database
+        DB_FOLDER = "db"  # Database folder
+        db_path = os.path.join(os.getcwd(), DB_FOLDER, "sunmax.db")
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+
+        # Check if the services table exists
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='services'")
+        if not cursor.fetchone():
+            print("Creating services table...")
+            # Create the services table
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS services (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                service_code TEXT UNIQUE NOT NULL,
+                date DATE NOT NULL,
+                service_name TEXT NOT NULL,
+                employee_name TEXT NOT NULL,
+                description TEXT,
+                price REAL NOT NULL,
+                gst_rate REAL DEFAULT 18.0,
+                payment_method TEXT,
+                payment_status TEXT DEFAULT 'Unpaid',
+                invoice_id INTEGER,
+                pdf_path TEXT,
+                FOREIGN KEY (invoice_id) REFERENCES invoices (id)
+            )
+            """)
+            conn.commit()
+            print("Services table created successfully.")
+        else:
+            # Check if required columns exist
+            cursor.execute("PRAGMA table_info(services)")
+            columns = cursor.fetchall()
+            column_names = [column[1] for column in columns]
+
+            # Check for missing columns
+            missing_columns = []
+            if "service_code" not in column_names:
+                missing_columns.append("service_code")
+            if "service_name" not in column_names:
+                missing_columns.append("service_name")
+            if "price" not in column_names:
+                missing_columns.append("price")
+            if "gst_rate" not in column_names:
+                missing_columns.append("gst_rate")
+
+            # If service_code column doesn't exist, recreate the table (major schema change)
+            if "service_code" not in column_names or "service_name" not in column_names:
+                print("Recreating services table with correct schema...")
+
+                # Check if services_old table exists and drop it if it does
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='services_old'")
+                if cursor.fetchone():
+                    cursor.execute("DROP TABLE services_old")
+                    conn.commit()
+                    print("Dropped existing services_old table")
+
+                # Rename the old table
+                cursor.execute("ALTER TABLE services RENAME TO services_old")
+
+                # Create the new table with correct schema
+                cursor.execute("""
+                CREATE TABLE services (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    service_code TEXT UNIQUE NOT NULL,
+                    date DATE NOT NULL,
+                    service_name TEXT NOT NULL,
+                    employee_name TEXT NOT NULL,
+                    description TEXT,
+                    price REAL NOT NULL,
+                    gst_rate REAL DEFAULT 18.0,
+                    payment_method TEXT,
+                    payment_status TEXT DEFAULT 'Unpaid',
+                    invoice_id INTEGER,
+                    pdf_path TEXT,
+                    FOREIGN KEY (invoice_id) REFERENCES invoices (id)
+                )
+                """)
+
+                # Try to copy data from old table if possible
+                try:
+                    cursor.execute("""
+                    INSERT INTO services (id, date, employee_name, description,
+                                         payment_method, payment_status, invoice_id, pdf_path)
+                    SELECT id, date, employee_name, description,
+                           payment_method, payment_status, invoice_id, pdf_path
+                    FROM services_old
+                    """)
+
+                    # Update service_code and service_name for existing records
+                    cursor.execute("SELECT id FROM services")
+                    service_ids = cursor.fetchall()
+                    for i, (service_id,) in enumerate(service_ids):
+                        service_code = f"SRV{str(i+1).zfill(3)}"
+                        service_name = f"Service {i+1}"
+                        price = 0.0
+                        cursor.execute("UPDATE services SET service_code = ?, service_name = ?, price = ? WHERE id = ?",
+                                      (service_code, service_name, price, service_id))
+                except Exception as e:
+                    print(f"Error copying data from old table: {e}")
+
+                conn.commit()
+                print("Services table recreated successfully.")
+            # If only some columns are missing, add them as new columns
+            else:
+                if "price" not in column_names:
+                    print("Adding price column to services table...")
+                    cursor.execute("ALTER TABLE services ADD COLUMN price REAL DEFAULT 0")
+                    # Try to copy total_amount to price if it exists
+                    if "total_amount" in column_names:
+                        cursor.execute("UPDATE services SET price = total_amount")
+                    conn.commit()
+                    print("Added price column to services table")
+
+                if "gst_rate" not in column_names:
+                    print("Adding gst_rate column to services table...")
+                    cursor.execute("ALTER TABLE services ADD COLUMN gst_rate REAL DEFAULT 18.0")
+                    conn.commit()
+                    print("Added gst_rate column to services table")
+
+        # Close the connection
+        conn.close()
+    except Exception as e:
+        print(f"Error ensuring services table exists: {e}")
+
+
+if __name__ == "__main__":
+    create_services_table()
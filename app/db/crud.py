@@ -1,74 +1,293 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
-from datetime import datetime
-from app.db import models
+import copy
+import threading
+from datetime import datetime, timedelta
+from app.db import models, search_index
 from sqlalchemy.sql import func
 from app.core.auth import get_password_hash
+from app.core import dashboard, typeahead, user_cache
+from app.core.config import PAGE_COUNT_CACHE_SECONDS, STOCK_HOLD_TTL_MINUTES
+
+
+def current_fiscal_year(on_date=None) -> str:
+    """Return the Indian fiscal year (April to March) for a date, e.g. 2025-26"""
+    on_date = on_date or datetime.now().date()
+    start_year = on_date.year if on_date.month >= 4 else on_date.year - 1
+    return f"{start_year}-{str(start_year + 1)[-2:]}"
+
+
+def allocate_sequence(db: Session, prefix: str, source_column=None, seed_prefixes=None, fiscal_year: str = None,
+                      count: int = 1) -> int:
+    """Atomically allocate the next number for a document prefix
+
+    Numbers come from the sequences table and are handed out with a single
+    ``UPDATE ... RETURNING`` inside a ``BEGIN IMMEDIATE`` transaction on its
+    own connection, so concurrent requests can never receive the same number.
+    The allocation is committed straight away; a request that fails after
+    allocating leaves a gap rather than holding the write lock.
+
+    The first time a prefix is used its counter is seeded from the highest
+    numeric suffix already stored in ``source_column`` (compared as integers,
+    so SUN1000 sorts after SUN999).
+
+    Args:
+        db: Database session (only used to find the engine)
+        prefix: Document prefix such as "INV" or "SUN"
+        source_column: Model column holding existing codes, used for seeding
+        seed_prefixes: Prefixes to consider when seeding (defaults to [prefix])
+        fiscal_year: Optional fiscal year; numbering restarts for each year
+        count: How many consecutive numbers to reserve (for bulk imports)
+
+    Returns:
+        The allocated number; with count > 1 the last number of the block,
+        which covers ``value - count + 1`` to ``value``
+    """
+    name = f"{prefix}:{fiscal_year}" if fiscal_year else prefix
+
+    connection = db.get_bind().raw_connection()
+    try:
+        sqlite_connection = connection.driver_connection
+        previous_isolation_level = sqlite_connection.isolation_level
+        # Manage the transaction ourselves so it can be started as IMMEDIATE
+        sqlite_connection.isolation_level = None
+        cursor = sqlite_connection.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                row = cursor.execute(
+                    "UPDATE sequences SET value = value + ? WHERE name = ? RETURNING value",
+                    (count, name)
+                ).fetchone()
+
+                if row is None:
+                    # First use of this prefix: seed from the existing codes
+                    seed = 0
+                    if source_column is not None and not fiscal_year:
+                        table = source_column.class_.__tablename__
+                        column = source_column.key
+                        for seed_prefix in seed_prefixes or [prefix]:
+                            existing = cursor.execute(
+                                f"SELECT MAX(CAST(SUBSTR({column}, ?) AS INTEGER)) FROM {table} WHERE {column} LIKE ?",
+                                (len(seed_prefix) + 1, f"{seed_prefix}%")
+                            ).fetchone()[0]
+                            seed = max(seed, existing or 0)
+                    value = seed + count
+                    cursor.execute("INSERT INTO sequences (name, value) VALUES (?, ?)", (name, value))
+                else:
+                    value = row[0]
+
+                cursor.execute("COMMIT")
+                return value
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        finally:
+            cursor.close()
+            sqlite_connection.isolation_level = previous_isolation_level
+    finally:
+        connection.close()
 
 
 def generate_item_code(db: Session) -> str:
     """Generate a unique item code with format SUN001, SUN002, etc.
 
-    This function finds the highest existing item code and increments it by 1.
-    It uses 3 digits to allow for up to 999 unique codes.
+    The number comes from the atomic sequence allocator. It is zero-padded to
+    3 digits and keeps growing past SUN999.
     """
-    try:
-        # Get the last item by item_code in descending order
-        last_item = db.query(models.InventoryItem).order_by(
-            models.InventoryItem.item_code.desc()
-        ).first()
-
-        if last_item and last_item.item_code.startswith("SUN"):
-            # Extract the numeric part after "SUN"
-            numeric_part = ''.join(filter(str.isdigit, last_item.item_code))
-            if numeric_part:
-                number = int(numeric_part) + 1
-            else:
-                number = 1
-        else:
-            number = 1
+    number = allocate_sequence(db, "SUN", models.InventoryItem.item_code)
+    return f"SUN{str(number).zfill(3)}"
+
+
+def _allocate_codes(db: Session, prefix: str, source_column, count: int) -> list:
+    """Reserve a block of consecutive codes (e.g. SUN001, SUN002) in one allocation"""
+    if count <= 0:
+        return []
+    last = allocate_sequence(db, prefix, source_column, count=count)
+    return [f"{prefix}{str(number).zfill(3)}" for number in range(last - count + 1, last + 1)]
 
-        # Use 3 digits (zfill(3)) to allow for up to 999 items
-        return f"SUN{str(number).zfill(3)}"
-    except Exception as e:
-        print(f"Error generating item code: {e}")
-        # Fallback to a timestamp-based code if there's an error
-        import time
-        timestamp = int(time.time()) % 10000  # Last 4 digits of timestamp
-        return f"SUN{timestamp}"
+
+def generate_item_codes(db: Session, count: int) -> list:
+    """Reserve a block of item codes for a bulk import"""
+    return _allocate_codes(db, "SUN", models.InventoryItem.item_code, count)
+
+
+def advance_sequence(db: Session, prefix: str, value: int, source_column=None):
+    """Move a sequence forward so it never hands out a number at or below value
+
+    Used after importing codes that were supplied rather than generated.
+    """
+    # Make sure the row exists, seeded from the existing codes
+    allocate_sequence(db, prefix, source_column, count=0)
+    db.execute(
+        models.Sequence.__table__.update()
+        .where(models.Sequence.name == prefix)
+        .values(value=func.max(models.Sequence.value, value))
+    )
+    db.commit()
 
 
 def generate_service_code(db: Session) -> str:
-    try:
-        last_service = db.query(models.Service).order_by(
-            models.Service.service_code.desc()
-        ).first()
-        if last_service and last_service.service_code.startswith("SRV"):
-            number = int(last_service.service_code[3:]) + 1
-        else:
-            number = 1
-        return f"SRV{str(number).zfill(3)}"
-    except Exception as e:
-        print(f"Error generating service code: {e}")
-        # Fallback to a default number if there's an error
-        return f"SRV001"
+    """Generate a unique service code with format SRV001, SRV002, etc."""
+    number = allocate_sequence(db, "SRV", models.Service.service_code)
+    return f"SRV{str(number).zfill(3)}"
+
+
+def generate_service_codes(db: Session, count: int) -> list:
+    """Reserve a block of service codes for a bulk import"""
+    return _allocate_codes(db, "SRV", models.Service.service_code, count)
 
 
 def generate_customer_code(db: Session) -> str:
     """Generate a unique customer code with format CUST001, CUST002, etc."""
+    number = allocate_sequence(db, "CUST", models.Customer.customer_code)
+    return f"CUST{str(number).zfill(3)}"
+
+
+def generate_quote_number(db: Session) -> str:
+    """Generate a unique quotation number with format QN001, QN002, etc.
+
+    Older quotations used the QT prefix, so both are considered when the
+    sequence is first seeded.
+    """
+    number = allocate_sequence(db, "QN", models.Quotation.quote_number, seed_prefixes=["QN", "QT"])
+    return f"QN{number:03d}"
+
+
+# Keyset pagination
+#
+# List pages are ordered newest first by (date, id) and fetch the next page
+# with WHERE (date, id) < (last row on this page) instead of OFFSET, so a deep
+# page costs the same as the first one. A cursor is an opaque string holding
+# the (date, id) of the row at the edge of a page.
+
+def encode_cursor(values) -> str:
+    """Encode the sort key of a row as a URL-safe cursor"""
+    import base64
+    import json
+
+    raw = json.dumps([value.isoformat() if hasattr(value, "isoformat") else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, columns):
+    """Decode a cursor into values for the sort columns; None if it is invalid"""
+    import base64
+    import json
+    from datetime import date
+
     try:
-        last_customer = db.query(models.Customer).order_by(
-            models.Customer.customer_code.desc()
-        ).first()
-        if last_customer and last_customer.customer_code.startswith("CUST"):
-            number = int(last_customer.customer_code[4:]) + 1
-        else:
-            number = 1
-        return f"CUST{str(number).zfill(3)}"
-    except Exception as e:
-        print(f"Error generating customer code: {e}")
-        # Fallback to a default number if there's an error
-        return f"CUST001"
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+
+        decoded = []
+        for column, value in zip(columns, values):
+            python_type = column.type.python_type
+            if python_type is date:
+                value = date.fromisoformat(value)
+            elif python_type is datetime:
+                value = datetime.fromisoformat(value)
+            else:
+                value = python_type(value)
+            decoded.append(value)
+        return tuple(decoded)
+    except (ValueError, TypeError, NotImplementedError):
+        return None
+
+
+def keyset_page(query, columns, after: str = None, before: str = None, last: bool = False, limit: int = 50):
+    """Fetch one page of a query ordered newest first by the given columns
+
+    Args:
+        query: Query with any filters applied, but no ordering or limit
+        columns: Sort columns, most significant first, ending with a unique one (e.g. date, id)
+        after: next_cursor of the previous page, to get the page after it
+        before: prev_cursor of the next page, to get the page before it
+        last: Get the last (oldest) page
+        limit: Rows per page
+
+    Returns:
+        Dictionary with rows, next_cursor and prev_cursor (None when there is
+        no page in that direction)
+    """
+    from sqlalchemy import tuple_
+
+    key = tuple_(*columns)
+    after_values = decode_cursor(after, columns) if after else None
+    before_values = decode_cursor(before, columns) if before else None
+
+    if before_values is not None or (last and after_values is None):
+        # Walk backwards from the cursor (or from the oldest row) and flip the result
+        if before_values is not None:
+            query = query.filter(key > tuple_(*before_values))
+        rows = query.order_by(*[column.asc() for column in columns]).limit(limit + 1).all()
+        has_previous = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+        has_next = before_values is not None
+    else:
+        if after_values is not None:
+            query = query.filter(key < tuple_(*after_values))
+        rows = query.order_by(*[column.desc() for column in columns]).limit(limit + 1).all()
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        has_previous = after_values is not None
+
+    def cursor_for(row):
+        return encode_cursor([getattr(row, column.key) for column in columns])
+
+    return {
+        "rows": rows,
+        "next_cursor": cursor_for(rows[-1]) if rows and has_next else None,
+        "prev_cursor": cursor_for(rows[0]) if rows and has_previous else None,
+    }
+
+
+# Row counts shown by the list pages, cached for PAGE_COUNT_CACHE_SECONDS so
+# paging through a list doesn't run COUNT(*) on every page. Writes that add
+# or remove rows clear the counts of their table.
+_page_counts = {}
+
+
+def cached_count(name: str, query, filters=None) -> int:
+    """Row count of a filtered list query, cached per table and filter values"""
+    import time
+
+    key = (name, repr(sorted((filters or {}).items())))
+    entry = _page_counts.get(key)
+    if entry is not None and entry[1] > time.monotonic():
+        return entry[0]
+
+    count = query.order_by(None).count()
+    _page_counts[key] = (count, time.monotonic() + PAGE_COUNT_CACHE_SECONDS)
+    return count
+
+
+def invalidate_page_counts(name: str = None):
+    """Drop the cached counts of one list (e.g. "customers"), or of all lists"""
+    for key in list(_page_counts):
+        if name is None or key[0] == name:
+            _page_counts.pop(key, None)
+
+
+def invalidate_catalog_caches():
+    """Drop the cached views of items and services: typeahead pages and the dashboard summary"""
+    typeahead.invalidate()
+    dashboard.invalidate()
+
+
+def _inventory_changed(rows_changed: bool = False):
+    """Invalidate what an inventory write can change
+
+    Sales stats include the inventory investment and cost of goods sold, so
+    price and stock changes clear them too. The stock list count is only
+    dropped when items were added or removed.
+    """
+    invalidate_sales_stats()
+    invalidate_catalog_caches()
+    if rows_changed:
+        invalidate_page_counts("inventory")
 
 
 def create_item(db: Session, item_data: dict):
@@ -76,6 +295,7 @@ def create_item(db: Session, item_data: dict):
     db.add(item)
     db.commit()
     db.refresh(item)
+    _inventory_changed(rows_changed=True)
     return item
 
 
@@ -84,11 +304,100 @@ def get_all_items(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.InventoryItem).offset(skip).limit(limit).all()
 
 
+def get_item_export_rows(db: Session, batch_size: int = 1000):
+    """Get every inventory item for the Excel export, fetched in batches"""
+    return db.query(models.InventoryItem).order_by(models.InventoryItem.item_code).yield_per(batch_size)
+
+
 def get_items_count(db: Session):
     """Get the total count of items in the inventory"""
     return db.query(models.InventoryItem).count()
 
 
+def get_items_page(db: Session, after: str = None, limit: int = 50):
+    """Get a page of inventory items ordered by item code
+
+    Args:
+        after: Item code of the last item on the previous page (None for the first page)
+
+    Returns:
+        Tuple of (items, next_after): next_after is None on the last page
+    """
+    query = db.query(models.InventoryItem)
+    if after:
+        query = query.filter(models.InventoryItem.item_code > after)
+    items = query.order_by(models.InventoryItem.item_code).limit(limit + 1).all()
+    if len(items) > limit:
+        return items[:limit], items[limit - 1].item_code
+    return items, None
+
+
+def get_stock_page(db: Session, after: str = None, before: str = None, last: bool = False, limit: int = 100):
+    """Get a page of the stock list, newest items first (see keyset_page)
+
+    Returns:
+        Dictionary with rows, next_cursor, prev_cursor and total (cached count)
+    """
+    query = db.query(models.InventoryItem)
+    page = keyset_page(
+        query, (models.InventoryItem.date, models.InventoryItem.item_code), after, before, last, limit
+    )
+    page["total"] = cached_count("inventory", query)
+    return page
+
+
+def get_inventory_summary(db: Session):
+    """Item count, total stock and categories of the inventory, computed in SQL
+
+    Items have no category column, so the first word of the item name is
+    used as the category.
+    """
+    from sqlalchemy import case
+
+    total_items, total_inventory, low_stock, out_of_stock = db.query(
+        func.count(models.InventoryItem.item_code),
+        func.coalesce(func.sum(models.InventoryItem.quantity), 0),
+        func.coalesce(func.sum(case((models.InventoryItem.quantity < 5, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((models.InventoryItem.quantity <= 0, 1), else_=0)), 0),
+    ).one()
+
+    name = func.trim(models.InventoryItem.item_name)
+    space = func.instr(name, " ")
+    category = case((space > 0, func.substr(name, 1, space - 1)), else_=name).label("category")
+    categories = db.query(
+        category,
+        func.count(),
+        func.coalesce(func.sum(models.InventoryItem.quantity * models.InventoryItem.purchase_price_per_unit), 0.0)
+    ).filter(name != "").group_by(category).order_by(category).all()
+
+    return {
+        "total_items": total_items,
+        "total_inventory": total_inventory,
+        "low_stock_items": low_stock,
+        "out_of_stock_items": out_of_stock,
+        "categories": {name: count for name, count, _ in categories},
+        "category_values": {name: round(value, 2) for name, _, value in categories},
+    }
+
+
+def get_low_stock_items(db: Session, threshold: int = 5):
+    """Get the items with less than `threshold` units in stock, lowest first"""
+    return db.query(models.InventoryItem).filter(
+        models.InventoryItem.quantity < threshold
+    ).order_by(models.InventoryItem.quantity, models.InventoryItem.item_code).all()
+
+
+def get_item_hsn_codes(db: Session, item_codes) -> dict:
+    """Look up the HSN codes of several items with one query (item_code -> hsn_code)"""
+    item_codes = list(set(item_codes))
+    if not item_codes:
+        return {}
+    rows = db.query(models.InventoryItem.item_code, models.InventoryItem.hsn_code).filter(
+        models.InventoryItem.item_code.in_(item_codes)
+    )
+    return dict(rows.all())
+
+
 def get_item(db: Session, item_code: str):
     """Get a specific item by its code"""
     return db.query(models.InventoryItem).filter(models.InventoryItem.item_code == item_code).first()
@@ -98,7 +407,8 @@ def search_items(db: Session, query: str):
     """Search for items by item code or name
 
     This function searches across the entire inventory, not just the current page.
-    It uses case-insensitive LIKE queries to find partial matches in both item_code and item_name.
+    It uses the inventory_fts index to match word prefixes, best matches first,
+    and falls back to case-insensitive LIKE queries when the index can't be used.
 
     Args:
         db: Database session
@@ -107,6 +417,10 @@ def search_items(db: Session, query: str):
     Returns:
         List of items matching the search criteria
     """
+    items = search_index.ranked_search(db, models.InventoryItem, query)
+    if items is not None:
+        return items
+
     from sqlalchemy import or_
 
     # Convert query to lowercase for case-insensitive search
@@ -148,6 +462,7 @@ def update_item(db: Session, item_code: str, item_data: dict):
         # Commit the changes
         db.commit()
         db.refresh(item)
+        _inventory_changed()
         return item
     except Exception as e:
         # If there's an error, rollback the transaction
@@ -179,9 +494,201 @@ def update_item_quantity(db: Session, item_code: str, quantity_change: int, is_a
 
     db.commit()
     db.refresh(item)
+    _inventory_changed()
     return item
 
 
+# Stock reservations
+#
+# Adding a product to a cart takes the stock out of inventory.quantity straight
+# away and records it as a hold for that cart. Holds are turned into a sale at
+# checkout, handed back on release, or handed back by the sweeper once the cart
+# has been idle for STOCK_HOLD_TTL_MINUTES. Every change starts with a single
+# conditional UPDATE/DELETE, so concurrent carts can never take the same units.
+
+def _take_stock(db: Session, item_code: str, quantity: int):
+    """Deduct stock only if enough is on hand; returns the new quantity or None"""
+    from sqlalchemy import update
+
+    row = db.execute(
+        update(models.InventoryItem)
+        .where(models.InventoryItem.item_code == item_code, models.InventoryItem.quantity >= quantity)
+        .values(quantity=models.InventoryItem.quantity - quantity)
+        .returning(models.InventoryItem.quantity)
+        .execution_options(synchronize_session=False)
+    ).first()
+    return row.quantity if row else None
+
+
+def _return_stock(db: Session, item_code: str, quantity: int):
+    """Put stock back; returns the new quantity or None if the item is gone"""
+    from sqlalchemy import update
+
+    row = db.execute(
+        update(models.InventoryItem)
+        .where(models.InventoryItem.item_code == item_code)
+        .values(quantity=models.InventoryItem.quantity + quantity)
+        .returning(models.InventoryItem.quantity)
+        .execution_options(synchronize_session=False)
+    ).first()
+    return row.quantity if row else None
+
+
+def _take_hold(db: Session, cart_id: str, item_code: str) -> int:
+    """Remove a cart's hold on an item and return the quantity it held"""
+    from sqlalchemy import delete
+
+    row = db.execute(
+        delete(models.StockHold)
+        .where(models.StockHold.cart_id == cart_id, models.StockHold.item_code == item_code)
+        .returning(models.StockHold.quantity)
+        .execution_options(synchronize_session=False)
+    ).first()
+    return row.quantity if row else 0
+
+
+def reserve_stock(db: Session, cart_id: str, item_code: str, quantity: int):
+    """Hold stock of an item for a cart
+
+    Also pushes back the expiry of every hold of the cart, so a cart that is
+    still being worked on keeps its stock.
+
+    Returns:
+        Tuple of (reserved, available): whether the stock was held, and the
+        quantity left in inventory (None if the item doesn't exist)
+    """
+    from sqlalchemy import update
+    from sqlalchemy.dialects.sqlite import insert
+
+    try:
+        available = _take_stock(db, item_code, quantity)
+        if available is None:
+            db.rollback()
+            item = get_item(db, item_code)
+            return False, item.quantity if item else None
+
+        now = datetime.now()
+        expires_at = now + timedelta(minutes=STOCK_HOLD_TTL_MINUTES)
+        db.execute(
+            insert(models.StockHold)
+            .values(cart_id=cart_id, item_code=item_code, quantity=quantity, created_at=now, expires_at=expires_at)
+            .on_conflict_do_update(
+                index_elements=["cart_id", "item_code"],
+                set_={"quantity": models.StockHold.quantity + quantity, "expires_at": expires_at},
+            )
+        )
+        db.execute(
+            update(models.StockHold)
+            .where(models.StockHold.cart_id == cart_id)
+            .values(expires_at=expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error reserving stock of {item_code} for cart {cart_id}: {e}")
+        raise
+
+    _inventory_changed()
+    return True, available
+
+
+def release_stock(db: Session, cart_id: str, item_code: str, quantity: int):
+    """Hand back up to quantity units a cart holds of an item
+
+    Only stock the cart actually holds is returned, so a repeated release or
+    one for an expired hold can't inflate inventory.
+
+    Returns:
+        Tuple of (released, available): the number of units returned and the
+        quantity now in inventory (None if the item doesn't exist)
+    """
+    try:
+        held = _take_hold(db, cart_id, item_code)
+        released = min(held, quantity)
+        if held > released:
+            # Keep holding the rest
+            db.add(models.StockHold(
+                cart_id=cart_id, item_code=item_code, quantity=held - released,
+                expires_at=datetime.now() + timedelta(minutes=STOCK_HOLD_TTL_MINUTES)
+            ))
+
+        available = _return_stock(db, item_code, released) if released else None
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error releasing stock of {item_code} for cart {cart_id}: {e}")
+        raise
+
+    if available is None:
+        item = get_item(db, item_code)
+        available = item.quantity if item else None
+    else:
+        _inventory_changed()
+    return released, available
+
+
+def claim_cart_stock(db: Session, cart_id: str, quantities: dict):
+    """Turn a cart's holds into sold stock as part of a checkout
+
+    Holds are removed; any shortfall (a hold that expired, or a quantity
+    changed without a reservation) is taken from inventory and any excess is
+    returned. Nothing is committed, so the caller can commit this together
+    with the invoice or roll it all back.
+
+    Args:
+        db: Database session
+        cart_id: Cart the holds were made for, or None to take all the stock
+            from inventory
+        quantities: item_code -> quantity being sold
+
+    Raises:
+        ValueError: If there is not enough stock to cover a shortfall
+    """
+    for item_code, quantity in quantities.items():
+        held = _take_hold(db, cart_id, item_code) if cart_id else 0
+        if quantity > held:
+            if _take_stock(db, item_code, quantity - held) is None:
+                raise ValueError(f"Not enough stock for item {item_code}")
+        elif held > quantity:
+            _return_stock(db, item_code, held - quantity)
+
+
+def expire_stock_holds(db: Session, now: datetime = None) -> int:
+    """Return the stock of every expired hold to inventory
+
+    Holds are deleted with DELETE ... RETURNING, so if two processes sweep at
+    once each hold is only returned by the one that deleted it.
+
+    Returns:
+        Number of holds expired
+    """
+    from sqlalchemy import delete
+
+    try:
+        expired = db.execute(
+            delete(models.StockHold)
+            .where(models.StockHold.expires_at < (now or datetime.now()))
+            .returning(models.StockHold.item_code, models.StockHold.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        totals = {}
+        for item_code, quantity in expired:
+            totals[item_code] = totals.get(item_code, 0) + quantity
+        for item_code, quantity in totals.items():
+            _return_stock(db, item_code, quantity)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error expiring stock holds: {e}")
+        raise
+
+    if expired:
+        _inventory_changed()
+    return len(expired)
+
+
 def update_item(db: Session, item_code: str, item_data: dict):
     """Update an item in the inventory
 
@@ -204,9 +711,102 @@ def update_item(db: Session, item_code: str, item_data: dict):
 
     db.commit()
     db.refresh(item)
+    _inventory_changed()
     return item
 
 
+def bulk_import_items(db: Session, rows: list, all_or_nothing: bool = False, batch_size: int = 500):
+    """Create or update many inventory items in batched transactions
+
+    Existing codes are looked up with a few IN queries, codes for new items are
+    reserved in one block, and rows are written with executemany-style bulk
+    INSERT/UPDATE statements of batch_size rows each.
+
+    Args:
+        db: Database session
+        rows: List of (row_number, item_data) tuples; item_data may include an
+            item_code to update (or create) a specific item
+        all_or_nothing: If True, everything is committed in one transaction and
+            nothing is saved when any batch fails
+        batch_size: Number of rows written per statement
+
+    Returns:
+        Dictionary with created and updated counts and a list of
+        (row_number, message) errors
+    """
+    from sqlalchemy import insert, update
+
+    # Look up which supplied codes already exist, in chunks to stay under
+    # SQLite's bound parameter limit
+    supplied_codes = list({data["item_code"] for _, data in rows if data.get("item_code")})
+    existing_codes = set()
+    for start in range(0, len(supplied_codes), 500):
+        chunk = supplied_codes[start:start + 500]
+        existing_codes.update(
+            code for (code,) in db.query(models.InventoryItem.item_code)
+            .filter(models.InventoryItem.item_code.in_(chunk))
+        )
+
+    # Move the sequence past any SUN codes supplied in the file first, so the
+    # codes reserved for new items cannot collide with them
+    supplied_numbers = [
+        int(code[3:]) for code in supplied_codes
+        if code.startswith("SUN") and code[3:].isdigit()
+    ]
+    if supplied_numbers:
+        advance_sequence(db, "SUN", max(supplied_numbers), models.InventoryItem.item_code)
+
+    # Reserve codes for all new items at once
+    new_rows = [data for _, data in rows if not data.get("item_code")]
+    for data, item_code in zip(new_rows, generate_item_codes(db, len(new_rows))):
+        data["item_code"] = item_code
+
+    # A code repeated in the file creates the item once and updates it afterwards
+    inserts, updates = [], []
+    for row_number, data in rows:
+        if data["item_code"] in existing_codes:
+            updates.append((row_number, data))
+        else:
+            inserts.append((row_number, data))
+            existing_codes.add(data["item_code"])
+
+    result = {"created": 0, "updated": 0, "errors": []}
+    for key, statement, batch_rows in (
+        ("created", insert(models.InventoryItem), inserts),
+        ("updated", update(models.InventoryItem), updates)
+    ):
+        for start in range(0, len(batch_rows), batch_size):
+            batch = batch_rows[start:start + batch_size]
+            try:
+                db.execute(statement, [data for _, data in batch])
+                if not all_or_nothing:
+                    db.commit()
+                result[key] += len(batch)
+            except Exception as e:
+                db.rollback()
+                if all_or_nothing:
+                    print(f"Error importing items, rolling back the whole import: {e}")
+                    result["errors"].append((batch[0][0], f"Import cancelled, batch failed: {e}"))
+                    result["created"] = result["updated"] = 0
+                    return result
+
+                # Retry the failed batch row by row to find the rows at fault
+                for row_number, data in batch:
+                    try:
+                        db.execute(statement, [data])
+                        db.commit()
+                        result[key] += 1
+                    except Exception as row_error:
+                        db.rollback()
+                        result["errors"].append((row_number, str(row_error)))
+
+    if all_or_nothing:
+        db.commit()
+
+    _inventory_changed(rows_changed=True)
+    return result
+
+
 def delete_item(db: Session, item_code: str):
     """Delete an item from the inventory
 
@@ -222,12 +822,18 @@ def delete_item(db: Session, item_code: str):
         return False
 
     try:
+        # Carts can't keep holding an item that no longer exists; foreign
+        # keys are enforced, so the holds have to go first
+        db.query(models.StockHold).filter(models.StockHold.item_code == item_code).delete(
+            synchronize_session=False
+        )
         # Delete the item
         db.delete(item)
         # Ensure the transaction is committed
         db.commit()
         # Flush the session to ensure changes are applied immediately
         db.flush()
+        _inventory_changed(rows_changed=True)
         print(f"Item {item_code} successfully deleted from database")
         return True
     except Exception as e:
@@ -237,8 +843,8 @@ def delete_item(db: Session, item_code: str):
         return False
 
 
-def create_invoice(db: Session, invoice_data: dict):
-    """Create a new invoice"""
+def _add_invoice(db: Session, invoice_data: dict):
+    """Add an invoice with its items and rollup changes to the session without committing"""
     # Use provided invoice number or generate one
     invoice_number = invoice_data.get("invoice_number") or generate_invoice_number(db)
 
@@ -262,13 +868,10 @@ def create_invoice(db: Session, invoice_data: dict):
     )
 
     db.add(invoice)
-    db.commit()
-    db.refresh(invoice)
 
-    # Create invoice items
+    # Create invoice items; they are inserted with the invoice on flush
     for item_data in invoice_data.get("items", []):
-        invoice_item = models.InvoiceItem(
-            invoice_id=invoice.id,
+        invoice.items.append(models.InvoiceItem(
             item_code=item_data.get("item_code", ""),
             item_name=item_data.get("item_name", ""),
             hsn_code=item_data.get("hsn_code", ""),
@@ -280,37 +883,68 @@ def create_invoice(db: Session, invoice_data: dict):
             gst_rate=item_data.get("gst_rate", 0),
             gst_amount=item_data.get("gst_amount", 0),
             total=item_data.get("total", 0)
-        )
-        db.add(invoice_item)
+        ))
 
-        # Stock is already reserved when added to cart, so we don't need to update it again
-        # Just log the item for record-keeping
-        print(f"Recording invoice item: {item_data.get('item_name')} x {item_data.get('quantity')}")
+    record_invoice_rollup(db, invoice)
+    return invoice
 
-    db.commit()
+
+def create_invoice(db: Session, invoice_data: dict):
+    """Create a new invoice with its items in a single commit"""
+    try:
+        invoice = _add_invoice(db, invoice_data)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    invalidate_sales_stats()
     return invoice
 
 
-def generate_invoice_number(db: Session) -> str:
-    """Generate a unique invoice number starting from INV01"""
-    # Get the last invoice
-    last_invoice = db.query(models.Invoice).order_by(desc(models.Invoice.id)).first()
+def create_checkout_invoice(db: Session, invoice_data: dict, cart_id: str = None, stock_quantities: dict = None):
+    """Record a sale in one transaction
+
+    The invoice header and items, the stock claimed from the cart's holds,
+    the sales counter, the rollups and the PDF render job are written
+    together in a single commit, so a failure leaves nothing behind.
+
+    Args:
+        db: Database session
+        invoice_data: Invoice fields and items, as for create_invoice()
+        cart_id: Cart whose stock holds are turned into the sale; without
+            one the stock is taken straight from inventory
+        stock_quantities: item_code -> quantity sold, for the products in the cart
+
+    Returns:
+        Tuple of (invoice, pdf_render_job); start the job once this returns
+
+    Raises:
+        ValueError: If there is not enough stock to complete the sale
+    """
+    try:
+        if stock_quantities:
+            claim_cart_stock(db, cart_id, stock_quantities)
+
+        invoice = _add_invoice(db, invoice_data)
+        _add_to_sales_counter(db, invoice.total_amount)
+
+        job = models.PdfRenderJob(invoice_number=invoice.invoice_number, status="pending")
+        db.add(job)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    invalidate_sales_stats()
+    if stock_quantities:
+        # Claiming the cart's holds can take more stock
+        invalidate_catalog_caches()
+    return invoice, job
 
-    if last_invoice and last_invoice.invoice_number.startswith("INV"):
-        # Try to extract the sequence number
-        try:
-            # Extract numeric part after "INV"
-            numeric_part = ''.join(filter(str.isdigit, last_invoice.invoice_number))
-            if numeric_part:
-                seq_num = int(numeric_part) + 1
-            else:
-                seq_num = 1
-        except ValueError:
-            # If we can't parse the number, start from 1
-            seq_num = 1
-    else:
-        seq_num = 1
 
+def generate_invoice_number(db: Session) -> str:
+    """Generate a unique invoice number starting from INV01"""
+    seq_num = allocate_sequence(db, "INV", models.Invoice.invoice_number)
     return f"INV{seq_num:02d}"
 
 
@@ -343,6 +977,47 @@ def get_all_invoices(db: Session, skip: int = 0, limit: int = 100):
 
     return result
 
+def get_invoice_numbers(db: Session, start_date=None, end_date=None, payment_status: str = None):
+    """Get invoice numbers in a date range, optionally filtered by payment status"""
+    query = db.query(models.Invoice.invoice_number)
+
+    if start_date:
+        query = query.filter(models.Invoice.date >= start_date)
+    if end_date:
+        query = query.filter(models.Invoice.date <= end_date)
+    if payment_status and payment_status != "all":
+        query = query.filter(models.Invoice.payment_status == payment_status)
+
+    return [row.invoice_number for row in query.order_by(models.Invoice.date, models.Invoice.id).all()]
+
+
+def get_invoice_export_rows(db: Session, start_date=None, end_date=None, payment_status: str = None,
+                            invoice_type: str = None, batch_size: int = 1000):
+    """
+    Get (invoice, invoice item) pairs for the invoice Excel export in one query
+
+    Invoices without items come back once with None as the item. Rows are
+    ordered by invoice and fetched in batches, so large exports do not load
+    everything into memory at once.
+    """
+    query = db.query(models.Invoice, models.InvoiceItem).outerjoin(
+        models.InvoiceItem, models.InvoiceItem.invoice_id == models.Invoice.id
+    )
+
+    if start_date:
+        query = query.filter(models.Invoice.date >= start_date)
+    if end_date:
+        query = query.filter(models.Invoice.date <= end_date)
+    if payment_status and payment_status != "all":
+        query = query.filter(models.Invoice.payment_status == payment_status)
+    if invoice_type and invoice_type != "all":
+        query = query.filter(func.coalesce(models.Invoice.invoice_type, "product") == invoice_type)
+
+    return query.order_by(
+        models.Invoice.date.desc(), models.Invoice.id, models.InvoiceItem.id
+    ).yield_per(batch_size)
+
+
 def get_invoice(db: Session, invoice_number: str):
     """Get an invoice by its number"""
     invoice = db.query(models.Invoice).filter(
@@ -431,9 +1106,13 @@ def delete_invoice(db: Session, invoice_number: str):
 
     # We don't need to store the invoice amount anymore since we're calculating totals directly
 
-    # Delete the invoice
+    # Delete the invoice and its payments, and remove them from the rollups
+    record_invoice_rollup(db, invoice, sign=-1)
+    for payment in invoice.payments:
+        db.delete(payment)
     db.delete(invoice)
     db.commit()
+    invalidate_sales_stats()
 
     # Check if this was the last invoice
     remaining_invoices = db.query(models.Invoice).count()
@@ -472,6 +1151,7 @@ def create_service(db: Session, service_data: dict):
         db.add(service)
         db.commit()
         db.refresh(service)
+        invalidate_catalog_caches()
         return service
     except Exception as e:
         db.rollback()
@@ -479,11 +1159,76 @@ def create_service(db: Session, service_data: dict):
         raise
 
 
+def bulk_create_services(db: Session, records: list, batch_size: int = 1000) -> int:
+    """Create many services in a single transaction
+
+    Service codes are reserved in one block and the rows are inserted with
+    batched INSERT statements. Nothing is saved if any batch fails.
+
+    Args:
+        db: Database session
+        records: List of service data dictionaries without service codes
+        batch_size: Number of rows per INSERT
+
+    Returns:
+        Number of services created
+    """
+    from sqlalchemy import insert
+
+    if not records:
+        return 0
+
+    try:
+        for data, service_code in zip(records, generate_service_codes(db, len(records))):
+            data["service_code"] = service_code
+
+        for start in range(0, len(records), batch_size):
+            db.execute(insert(models.Service), records[start:start + batch_size])
+
+        db.commit()
+        invalidate_catalog_caches()
+        return len(records)
+    except Exception as e:
+        db.rollback()
+        print(f"Error importing services: {e}")
+        raise
+
+
 def get_all_services(db: Session, skip: int = 0, limit: int = 100):
     """Get all services"""
     return db.query(models.Service).order_by(models.Service.date.desc()).offset(skip).limit(limit).all()
 
 
+def get_service_export_rows(db: Session, batch_size: int = 1000):
+    """Get every service for the Excel export, newest first, fetched in batches"""
+    return db.query(models.Service).order_by(
+        models.Service.date.desc(), models.Service.id.desc()
+    ).yield_per(batch_size)
+
+
+def get_services_page(db: Session, after: int = None, limit: int = 50):
+    """Get a page of services, newest first
+
+    Args:
+        after: ID of the last service on the previous page (None for the first page)
+
+    Returns:
+        Tuple of (services, next_after): next_after is None on the last page
+    """
+    query = db.query(models.Service)
+    if after:
+        query = query.filter(models.Service.id < after)
+    services = query.order_by(models.Service.id.desc()).limit(limit + 1).all()
+    if len(services) > limit:
+        return services[:limit], services[limit - 1].id
+    return services, None
+
+
+def get_services_count(db: Session):
+    """Get the total count of services"""
+    return db.query(func.count(models.Service.id)).scalar()
+
+
 def get_service(db: Session, service_id: int):
     """Get a specific service by ID"""
     return db.query(models.Service).filter(models.Service.id == service_id).first()
@@ -517,6 +1262,7 @@ def update_service(db: Session, service_id: int, service_data: dict):
 
         db.commit()
         db.refresh(service)
+        invalidate_catalog_caches()
         return service
     except Exception as e:
         db.rollback()
@@ -533,6 +1279,7 @@ def delete_service(db: Session, service_id: int):
     try:
         db.delete(service)
         db.commit()
+        invalidate_catalog_caches()
         return True
     except Exception as e:
         db.rollback()
@@ -544,7 +1291,8 @@ def search_services(db: Session, query: str):
     """Search for services by service code or name
 
     This function searches across all services, looking for matches in service_code and service_name.
-    It uses case-insensitive LIKE queries to find partial matches.
+    It uses the services_fts index to match word prefixes, best matches first,
+    and falls back to case-insensitive LIKE queries when the index can't be used.
 
     Args:
         db: Database session
@@ -553,6 +1301,10 @@ def search_services(db: Session, query: str):
     Returns:
         List of services matching the search criteria
     """
+    services = search_index.ranked_search(db, models.Service, query)
+    if services is not None:
+        return services
+
     from sqlalchemy import or_
 
     # Convert query to lowercase for case-insensitive search
@@ -570,15 +1322,30 @@ def search_services(db: Session, query: str):
     return services
 
 
+def _add_to_sales_counter(db: Session, order_amount: float):
+    """Count a sale with a single UPDATE, creating the counter row if needed (no commit)"""
+    from sqlalchemy import update
+
+    now = datetime.now()
+    updated = db.execute(
+        update(models.SalesCounter)
+        .values(
+            total_sales=models.SalesCounter.total_sales + 1,
+            total_revenue=models.SalesCounter.total_revenue + order_amount,
+            last_updated=now
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        db.add(models.SalesCounter(total_sales=1, total_revenue=order_amount, last_updated=now))
+
+
 def update_sales_counter(db: Session, order_amount: float):
     """Update the sales counter with a new sale"""
-    counter = get_sales_counter(db)
-    counter.total_sales += 1
-    counter.total_revenue += order_amount
-    counter.last_updated = datetime.now()
+    _add_to_sales_counter(db, order_amount)
     db.commit()
-    db.refresh(counter)
-    return counter
+    invalidate_sales_stats()
+    return get_sales_counter(db)
 
 
 def add_payment(db: Session, invoice_number: str, payment_data: dict):
@@ -610,6 +1377,7 @@ def add_payment(db: Session, invoice_number: str, payment_data: dict):
     )
 
     db.add(payment)
+    record_payment_rollup(db, payment.payment_method, payment.amount)
 
     # Update invoice payment status
     invoice.amount_paid += payment.amount
@@ -629,20 +1397,48 @@ def add_payment(db: Session, invoice_number: str, payment_data: dict):
 
     db.commit()
     db.refresh(invoice)
+    invalidate_sales_stats()
 
     return invoice
 
 
+# Cached result of get_sales_stats. Cleared by invalidate_sales_stats() whenever
+# invoices, payments or inventory prices/quantities change. The generation is
+# bumped on every invalidation so stats computed while a write was happening
+# aren't cached.
+_sales_stats_cache = None
+_sales_stats_generation = 0
+_sales_stats_lock = threading.Lock()
+
+
+def invalidate_sales_stats():
+    """Drop the cached sales statistics so the next call recomputes them"""
+    global _sales_stats_cache, _sales_stats_generation
+    with _sales_stats_lock:
+        _sales_stats_generation += 1
+        _sales_stats_cache = None
+
+
 def get_sales_stats(db: Session):
-    """Get sales statistics"""
+    """Get sales statistics
+
+    The result is cached in-process and only recomputed after a write that
+    invalidates it (checkout, payment, invoice delete or inventory change).
+    """
+    global _sales_stats_cache
+    with _sales_stats_lock:
+        if _sales_stats_cache is not None:
+            return copy.deepcopy(_sales_stats_cache)
+        generation = _sales_stats_generation
+
     # Get the counter for last_updated timestamp
     counter = get_sales_counter(db)
 
-    # Count the total number of invoices (sales)
-    total_sales = db.query(models.Invoice).count()
-
-    # Calculate the total revenue from all invoices
-    total_revenue = db.query(func.sum(models.Invoice.total_amount)).scalar() or 0.0
+    # Count the total number of invoices (sales) and the total revenue in one pass
+    total_sales, total_revenue = db.query(
+        func.count(models.Invoice.id),
+        func.coalesce(func.sum(models.Invoice.total_amount), 0.0)
+    ).one()
 
     # Get total number of products sold
     total_products_sold = db.query(func.sum(models.InvoiceItem.quantity)).scalar() or 0
@@ -662,20 +1458,15 @@ def get_sales_stats(db: Session):
         func.sum(models.InventoryItem.purchase_price_per_unit * models.InventoryItem.quantity)
     ).scalar() or 0.0
 
-    # Calculate total profit (revenue - cost)
-    # First, get the cost of goods sold
-    invoice_items = db.query(models.InvoiceItem).all()
-    cost_of_goods_sold = 0.0
-
-    for item in invoice_items:
-        # Get the purchase price of the item
-        inventory_item = db.query(models.InventoryItem).filter(
-            models.InventoryItem.item_code == item.item_code
-        ).first()
-
-        if inventory_item:
-            item_cost = inventory_item.purchase_price_per_unit * item.quantity
-            cost_of_goods_sold += item_cost
+    # Calculate the cost of goods sold with a single joined aggregate
+    # (invoice_items joined to inventory on item_code). Items that are no
+    # longer in the inventory contribute no cost, as before.
+    cost_of_goods_sold = db.query(
+        func.sum(models.InventoryItem.purchase_price_per_unit * models.InvoiceItem.quantity)
+    ).select_from(models.InvoiceItem).join(
+        models.InventoryItem,
+        models.InventoryItem.item_code == models.InvoiceItem.item_code
+    ).scalar() or 0.0
 
     # Calculate profit
     total_profit = total_revenue - cost_of_goods_sold
@@ -709,7 +1500,7 @@ def get_sales_stats(db: Session):
         db.commit()
         db.refresh(counter)
 
-    return {
+    stats = {
         "total_sales": total_sales,
         "total_revenue": total_revenue,
         "total_products_sold": total_products_sold,
@@ -724,6 +1515,465 @@ def get_sales_stats(db: Session):
         "top_sellers": [{"name": seller[0], "revenue": round(seller[1], 2)} for seller in top_sellers]
     }
 
+    with _sales_stats_lock:
+        if generation == _sales_stats_generation:
+            _sales_stats_cache = stats
+    return copy.deepcopy(stats)
+
+
+# Insights rollup operations
+#
+# The rollup tables hold pre-aggregated monthly figures for the insights page.
+# They are updated in the same transaction as the write that changes them, so
+# the page never has to scan invoice/customer/enquiry history.
+
+def _get_rollup_row(db: Session, model, **keys):
+    """Get the rollup row for the given key columns, creating an empty one if needed
+
+    The row is created with INSERT ... ON CONFLICT DO NOTHING, so two
+    transactions adding the first row of a period can't both insert it. The
+    insert also takes SQLite's write lock, so the row read afterwards can't
+    be changed by another writer before this transaction commits.
+    """
+    from sqlalchemy.dialects.sqlite import insert
+
+    # Initialise counters explicitly; column defaults only apply to ORM inserts
+    values = {
+        column.name: 0 for column in model.__table__.columns
+        if column.name not in keys and column.name != "id"
+    }
+    db.execute(insert(model).values(**keys, **values).on_conflict_do_nothing())
+    return db.query(model).filter_by(**keys).one()
+
+
+def record_invoice_rollup(db: Session, invoice, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) an invoice from the sales rollups
+
+    The amount paid at checkout counts as collected with the invoice's
+    payment method. Later payments are counted under their own methods, by
+    record_payment_rollup as they come in and here with the same sign as the
+    invoice, so removing and re-adding an invoice around an edit keeps them.
+    """
+    amount = (invoice.total_amount or 0) * sign
+    later_payments = list(invoice.payments) if invoice.id is not None else []
+    paid_at_checkout = (invoice.amount_paid or 0) - sum(payment.amount or 0 for payment in later_payments)
+
+    month_row = _get_rollup_row(
+        db, models.MonthlySalesRollup, year=invoice.date.year, month=invoice.date.month
+    )
+    month_row.invoice_count += sign
+    month_row.revenue = round(month_row.revenue + amount, 2)
+
+    method_row = _get_rollup_row(
+        db, models.PaymentMethodRollup, payment_method=invoice.payment_method or "Unknown"
+    )
+    method_row.invoice_count += sign
+    method_row.revenue = round(method_row.revenue + amount, 2)
+    method_row.amount_collected = round(method_row.amount_collected + paid_at_checkout * sign, 2)
+
+    for payment in later_payments:
+        record_payment_rollup(db, payment.payment_method, (payment.amount or 0) * sign)
+
+
+def record_payment_rollup(db: Session, payment_method: str, amount: float):
+    """Add a received invoice payment to the payment method rollup"""
+    method_row = _get_rollup_row(
+        db, models.PaymentMethodRollup, payment_method=payment_method or "Unknown"
+    )
+    method_row.amount_collected = round(method_row.amount_collected + amount, 2)
+
+
+def record_customer_rollup(db: Session, created_at: datetime, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) a customer from the customer growth rollup"""
+    row = _get_rollup_row(
+        db, models.MonthlyCustomerRollup, year=created_at.year, month=created_at.month
+    )
+    row.new_customers += sign
+
+
+def record_enquiry_rollup(db: Session, created_at: datetime, enquiries: int = 0, conversions: int = 0):
+    """Apply enquiry and conversion count changes to the enquiry rollup"""
+    row = _get_rollup_row(
+        db, models.MonthlyEnquiryRollup, year=created_at.year, month=created_at.month
+    )
+    row.enquiries += enquiries
+    row.conversions += conversions
+
+
+def rebuild_insight_rollups(db: Session):
+    """Recompute every rollup table from the source tables
+
+    Used to backfill the rollups for an existing database. Each table is
+    rebuilt with a single GROUP BY query.
+    """
+    from sqlalchemy import extract, case
+
+    try:
+        db.query(models.MonthlySalesRollup).delete()
+        db.query(models.PaymentMethodRollup).delete()
+        db.query(models.MonthlyCustomerRollup).delete()
+        db.query(models.MonthlyEnquiryRollup).delete()
+
+        invoice_year = extract("year", models.Invoice.date)
+        invoice_month = extract("month", models.Invoice.date)
+        for year, month, count, revenue in db.query(
+            invoice_year, invoice_month, func.count(models.Invoice.id), func.sum(models.Invoice.total_amount)
+        ).group_by(invoice_year, invoice_month):
+            db.add(models.MonthlySalesRollup(
+                year=year, month=month, invoice_count=count, revenue=round(revenue or 0, 2)
+            ))
+
+        # Payments received after checkout, by their own method
+        collected = dict(db.query(
+            models.Payment.payment_method, func.sum(models.Payment.amount)
+        ).join(models.Invoice, models.Invoice.id == models.Payment.invoice_id).group_by(
+            models.Payment.payment_method
+        ).all())
+        later_paid = db.query(
+            models.Payment.invoice_id, func.sum(models.Payment.amount).label("amount")
+        ).group_by(models.Payment.invoice_id).subquery()
+        method_rows = {}
+        for method, count, revenue, paid_at_checkout in db.query(
+            models.Invoice.payment_method, func.count(models.Invoice.id), func.sum(models.Invoice.total_amount),
+            func.sum(func.coalesce(models.Invoice.amount_paid, 0) - func.coalesce(later_paid.c.amount, 0))
+        ).outerjoin(later_paid, later_paid.c.invoice_id == models.Invoice.id).group_by(models.Invoice.payment_method):
+            key = method or "Unknown"
+            row = method_rows.setdefault(key, models.PaymentMethodRollup(
+                payment_method=key, invoice_count=0, revenue=0.0, amount_collected=0.0
+            ))
+            row.invoice_count += count
+            row.revenue = round(row.revenue + (revenue or 0), 2)
+            row.amount_collected = round(row.amount_collected + (paid_at_checkout or 0), 2)
+        for method, amount in collected.items():
+            key = method or "Unknown"
+            row = method_rows.setdefault(key, models.PaymentMethodRollup(
+                payment_method=key, invoice_count=0, revenue=0.0, amount_collected=0.0
+            ))
+            row.amount_collected = round(row.amount_collected + (amount or 0), 2)
+        db.add_all(method_rows.values())
+
+        customer_year = extract("year", models.Customer.created_at)
+        customer_month = extract("month", models.Customer.created_at)
+        for year, month, count in db.query(
+            customer_year, customer_month, func.count(models.Customer.id)
+        ).filter(models.Customer.created_at.isnot(None)).group_by(customer_year, customer_month):
+            db.add(models.MonthlyCustomerRollup(year=year, month=month, new_customers=count))
+
+        enquiry_year = extract("year", models.Enquiry.created_at)
+        enquiry_month = extract("month", models.Enquiry.created_at)
+        for year, month, count, converted in db.query(
+            enquiry_year, enquiry_month, func.count(models.Enquiry.id),
+            func.sum(case((models.Enquiry.quotation_given == True, 1), else_=0))  # noqa: E712
+        ).filter(models.Enquiry.created_at.isnot(None)).group_by(enquiry_year, enquiry_month):
+            db.add(models.MonthlyEnquiryRollup(
+                year=year, month=month, enquiries=count, conversions=converted or 0
+            ))
+
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error rebuilding insight rollups: {e}")
+        raise
+
+
+def ensure_insight_rollups(db: Session):
+    """Backfill the rollup tables if they are empty but source data exists"""
+    has_rollups = (
+        db.query(models.MonthlySalesRollup.id).first()
+        or db.query(models.MonthlyCustomerRollup.id).first()
+        or db.query(models.MonthlyEnquiryRollup.id).first()
+    )
+    if has_rollups:
+        return
+
+    has_data = (
+        db.query(models.Invoice.id).first()
+        or db.query(models.Customer.id).first()
+        or db.query(models.Enquiry.id).first()
+    )
+    if has_data:
+        print("Backfilling insight rollup tables...")
+        rebuild_insight_rollups(db)
+
+
+def get_insight_rollups(db: Session, year: int):
+    """Get the pre-aggregated insights data for the given year
+
+    Returns monthly lists (January..December) for sales, customer growth,
+    enquiries and conversions, plus all-time totals derived from the rollups.
+    """
+    monthly_sales = [0.0] * 12
+    for row in db.query(models.MonthlySalesRollup).filter(models.MonthlySalesRollup.year == year):
+        monthly_sales[row.month - 1] = round(row.revenue, 2)
+
+    monthly_customers = [0] * 12
+    for row in db.query(models.MonthlyCustomerRollup).filter(models.MonthlyCustomerRollup.year == year):
+        monthly_customers[row.month - 1] = row.new_customers
+
+    monthly_enquiries = [0] * 12
+    monthly_conversions = [0] * 12
+    for row in db.query(models.MonthlyEnquiryRollup).filter(models.MonthlyEnquiryRollup.year == year):
+        monthly_enquiries[row.month - 1] = row.enquiries
+        monthly_conversions[row.month - 1] = row.conversions
+
+    payment_methods = [
+        {"method": row.payment_method, "revenue": round(row.revenue, 2), "collected": round(row.amount_collected, 2)}
+        for row in db.query(models.PaymentMethodRollup).filter(
+            models.PaymentMethodRollup.invoice_count > 0
+        ).order_by(models.PaymentMethodRollup.payment_method)
+    ]
+
+    total_enquiries, total_conversions = db.query(
+        func.coalesce(func.sum(models.MonthlyEnquiryRollup.enquiries), 0),
+        func.coalesce(func.sum(models.MonthlyEnquiryRollup.conversions), 0)
+    ).one()
+
+    return {
+        "monthly_sales": monthly_sales,
+        "monthly_customers": monthly_customers,
+        "monthly_enquiries": monthly_enquiries,
+        "monthly_conversions": monthly_conversions,
+        "payment_methods": payment_methods,
+        "total_enquiries": total_enquiries,
+        "total_conversions": total_conversions
+    }
+
+
+def get_customer_stats(db: Session):
+    """Get customer totals, receivables and payment status counts via SQL aggregates"""
+    status_counts = dict(db.query(
+        models.Customer.payment_status, func.count(models.Customer.id)
+    ).group_by(models.Customer.payment_status).all())
+
+    total_receivable = db.query(
+        func.sum(models.Customer.total_amount - func.coalesce(models.Customer.amount_paid, 0))
+    ).scalar() or 0.0
+
+    return {
+        "total_customers": sum(status_counts.values()),
+        "total_receivable": total_receivable,
+        "fully_paid_count": status_counts.get("Fully Paid", 0),
+        "partially_paid_count": status_counts.get("Partially Paid", 0),
+        "unpaid_count": status_counts.get("Unpaid", 0)
+    }
+
+
+# PDF render job operations
+
+def create_pdf_render_job(db: Session, invoice_number: str):
+    """Queue a render job for an invoice PDF, reusing one that has not started yet"""
+    job = db.query(models.PdfRenderJob).filter(
+        models.PdfRenderJob.invoice_number == invoice_number,
+        models.PdfRenderJob.status == "pending"
+    ).first()
+
+    if not job:
+        job = models.PdfRenderJob(invoice_number=invoice_number, status="pending")
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+
+    return job
+
+
+def get_pdf_render_job(db: Session, job_id: int):
+    """Get a PDF render job by ID"""
+    return db.query(models.PdfRenderJob).filter(models.PdfRenderJob.id == job_id).first()
+
+
+def get_latest_pdf_render_job(db: Session, invoice_number: str):
+    """Get the most recent render job for an invoice"""
+    return db.query(models.PdfRenderJob).filter(
+        models.PdfRenderJob.invoice_number == invoice_number
+    ).order_by(models.PdfRenderJob.id.desc()).first()
+
+
+def get_unfinished_pdf_render_jobs(db: Session):
+    """Get jobs that were queued or running, e.g. when the server last stopped"""
+    return db.query(models.PdfRenderJob).filter(
+        models.PdfRenderJob.status.in_(["pending", "running"])
+    ).order_by(models.PdfRenderJob.id).all()
+
+
+def update_pdf_render_job(db: Session, job_id: int, job_data: dict):
+    """Update the status fields of a PDF render job"""
+    job = get_pdf_render_job(db, job_id)
+    if job:
+        for key, value in job_data.items():
+            setattr(job, key, value)
+        db.commit()
+        db.refresh(job)
+    return job
+
+
+def get_pdf_render_stats(db: Session):
+    """Get queue depth and render time figures for the PDF render jobs"""
+    counts = dict(
+        db.query(models.PdfRenderJob.status, func.count(models.PdfRenderJob.id))
+        .group_by(models.PdfRenderJob.status)
+        .all()
+    )
+
+    avg_ms, max_ms = db.query(
+        func.avg(models.PdfRenderJob.render_ms),
+        func.max(models.PdfRenderJob.render_ms)
+    ).filter(models.PdfRenderJob.status == "done").one()
+
+    return {
+        "pending": counts.get("pending", 0),
+        "running": counts.get("running", 0),
+        "done": counts.get("done", 0),
+        "failed": counts.get("failed", 0),
+        "avg_render_ms": round(avg_ms or 0.0, 1),
+        "max_render_ms": round(max_ms or 0.0, 1)
+    }
+
+
+# PDF cache operations
+
+def get_pdf_cache_entry(db: Session, document_type: str, document_key: str):
+    """Get the cache entry for a rendered PDF"""
+    return db.query(models.PdfCacheEntry).filter(
+        models.PdfCacheEntry.document_type == document_type,
+        models.PdfCacheEntry.document_key == str(document_key)
+    ).first()
+
+
+def save_pdf_cache_entry(db: Session, document_type: str, document_key: str, content_hash: str, pdf_path: str):
+    """Record the content hash a PDF was rendered from"""
+    try:
+        entry = get_pdf_cache_entry(db, document_type, document_key)
+        if not entry:
+            entry = models.PdfCacheEntry(document_type=document_type, document_key=str(document_key))
+            db.add(entry)
+
+        entry.content_hash = content_hash
+        entry.pdf_path = pdf_path
+        db.commit()
+        return entry
+    except Exception as e:
+        # Another request cached the same document first; the next view re-checks the hash
+        db.rollback()
+        print(f"Error saving PDF cache entry for {document_type} {document_key}: {e}")
+        return None
+
+
+# Idempotency key operations
+#
+# A request sent with an idempotency key first claims the key with an insert;
+# only the request that inserted the row does the work. Its response is then
+# saved on the row, and retries with the same key get that response back.
+
+def claim_idempotency_key(db: Session, scope: str, key: str, request_hash: str,
+                          ttl: timedelta, stale_after: timedelta) -> bool:
+    """Claim a key for a request about to do its work
+
+    Expired keys are deleted first. A claim whose request never finished
+    (e.g. the server stopped mid-request) is taken over once it is older
+    than stale_after, as long as the retry is for the same request and the
+    first request never committed its work.
+
+    Returns:
+        True if this request owns the key and should do the work
+    """
+    from sqlalchemy import delete, update
+    from sqlalchemy.dialects.sqlite import insert
+
+    now = datetime.now()
+    try:
+        db.execute(
+            delete(models.IdempotencyKey)
+            .where(models.IdempotencyKey.expires_at < now)
+            .execution_options(synchronize_session=False)
+        )
+        claimed = db.execute(
+            insert(models.IdempotencyKey)
+            .values(scope=scope, key=key, request_hash=request_hash, created_at=now, expires_at=now + ttl)
+            .on_conflict_do_nothing()
+        ).rowcount == 1
+        if not claimed:
+            claimed = db.execute(
+                update(models.IdempotencyKey)
+                .where(
+                    models.IdempotencyKey.scope == scope,
+                    models.IdempotencyKey.key == key,
+                    models.IdempotencyKey.request_hash == request_hash,
+                    models.IdempotencyKey.status_code.is_(None),
+                    models.IdempotencyKey.completed_at.is_(None),
+                    models.IdempotencyKey.created_at < now - stale_after,
+                )
+                .values(created_at=now, expires_at=now + ttl)
+                .execution_options(synchronize_session=False)
+            ).rowcount == 1
+        db.commit()
+        return claimed
+    except Exception as e:
+        db.rollback()
+        print(f"Error claiming idempotency key {scope}/{key}: {e}")
+        raise
+
+
+def get_idempotency_key(db: Session, scope: str, key: str):
+    """Get the stored claim/response for a key, read fresh from the database"""
+    db.expire_all()
+    return db.get(models.IdempotencyKey, (scope, key))
+
+
+def mark_idempotency_key_completed(db: Session, scope: str, key: str):
+    """Record that a key's request has done its work, without committing
+
+    Called inside the transaction that commits the work, so the claim can
+    never be taken over to do it again.
+    """
+    from sqlalchemy import update
+
+    db.execute(
+        update(models.IdempotencyKey)
+        .where(models.IdempotencyKey.scope == scope, models.IdempotencyKey.key == key)
+        .values(completed_at=datetime.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def save_idempotent_response(db: Session, scope: str, key: str, status_code: int, response_body: str):
+    """Store the response of the request that owns a key"""
+    from sqlalchemy import update
+
+    try:
+        db.execute(
+            update(models.IdempotencyKey)
+            .where(models.IdempotencyKey.scope == scope, models.IdempotencyKey.key == key)
+            .values(status_code=status_code, response_body=response_body)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    except Exception as e:
+        # The work is done either way; a retry is told its response was lost
+        db.rollback()
+        print(f"Error saving response for idempotency key {scope}/{key}: {e}")
+
+
+def release_idempotency_key(db: Session, scope: str, key: str):
+    """Drop a claim whose request committed nothing, so it can be retried with the same key"""
+    from sqlalchemy import delete
+
+    try:
+        db.rollback()
+        db.execute(
+            delete(models.IdempotencyKey)
+            .where(
+                models.IdempotencyKey.scope == scope,
+                models.IdempotencyKey.key == key,
+                models.IdempotencyKey.status_code.is_(None),
+                models.IdempotencyKey.completed_at.is_(None),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error releasing idempotency key {scope}/{key}: {e}")
+
 
 # User CRUD operations
 
@@ -768,6 +2018,7 @@ def update_user(db: Session, user_id: int, user_data: dict):
     user = get_user(db, user_id)
     if not user:
         return None
+    previous_email = user.email
 
     # Update user attributes
     for key, value in user_data.items():
@@ -780,6 +2031,8 @@ def update_user(db: Session, user_id: int, user_data: dict):
 
     db.commit()
     db.refresh(user)
+    user_cache.invalidate(previous_email)
+    user_cache.invalidate(user.email)
     return user
 
 
@@ -795,6 +2048,7 @@ def update_password(db: Session, user_id: int, new_password: str):
 
     db.commit()
     db.refresh(user)
+    user_cache.invalidate(user.email)
     return user
 
 
@@ -816,8 +2070,10 @@ def delete_user(db: Session, user_id: int):
     if not user:
         return False
 
+    email = user.email
     db.delete(user)
     db.commit()
+    user_cache.invalidate(email)
     return True
 
 
@@ -825,30 +2081,13 @@ def delete_user(db: Session, user_id: int):
 
 def generate_enquiry_number(db: Session) -> str:
     """Generate a unique enquiry number with format ENQ001, ENQ002, etc."""
-    try:
-        # Get the last enquiry by enquiry_number in descending order
-        last_enquiry = db.query(models.Enquiry).order_by(
-            models.Enquiry.enquiry_number.desc()
-        ).first()
-
-        if last_enquiry and last_enquiry.enquiry_number.startswith("ENQ"):
-            # Extract the numeric part after "ENQ"
-            numeric_part = ''.join(filter(str.isdigit, last_enquiry.enquiry_number))
-            if numeric_part:
-                number = int(numeric_part) + 1
-            else:
-                number = 1
-        else:
-            number = 1
+    number = allocate_sequence(db, "ENQ", models.Enquiry.enquiry_number)
+    return f"ENQ{str(number).zfill(3)}"
 
-        # Use 3 digits (zfill(3)) to allow for up to 999 enquiries
-        return f"ENQ{str(number).zfill(3)}"
-    except Exception as e:
-        print(f"Error generating enquiry number: {e}")
-        # Fallback to a timestamp-based code if there's an error
-        import time
-        timestamp = int(time.time()) % 10000  # Last 4 digits of timestamp
-        return f"ENQ{timestamp}"
+
+def generate_enquiry_numbers(db: Session, count: int) -> list:
+    """Reserve a block of enquiry numbers for a bulk import"""
+    return _allocate_codes(db, "ENQ", models.Enquiry.enquiry_number, count)
 
 
 def create_enquiry(db: Session, enquiry_data: dict):
@@ -861,7 +2100,12 @@ def create_enquiry(db: Session, enquiry_data: dict):
         # Create enquiry record
         enquiry = models.Enquiry(**enquiry_data)
         db.add(enquiry)
+        record_enquiry_rollup(
+            db, enquiry.created_at or datetime.now(),
+            enquiries=1, conversions=1 if enquiry.quotation_given else 0
+        )
         db.commit()
+        invalidate_page_counts("enquiries")
         db.refresh(enquiry)
         return enquiry
     except Exception as e:
@@ -870,11 +2114,61 @@ def create_enquiry(db: Session, enquiry_data: dict):
         raise
 
 
+def bulk_create_enquiries(db: Session, records: list, batch_size: int = 1000) -> int:
+    """Create many enquiries in a single transaction
+
+    Enquiry numbers are reserved in one block and the rows are inserted with
+    batched INSERT statements. Nothing is saved if any batch fails.
+
+    Args:
+        db: Database session
+        records: List of enquiry data dictionaries without enquiry numbers
+        batch_size: Number of rows per INSERT
+
+    Returns:
+        Number of enquiries created
+    """
+    from sqlalchemy import insert
+
+    if not records:
+        return 0
+
+    try:
+        now = datetime.now()
+        for data, enquiry_number in zip(records, generate_enquiry_numbers(db, len(records))):
+            data["enquiry_number"] = enquiry_number
+            data["created_at"] = now
+            data["updated_at"] = now
+
+        for start in range(0, len(records), batch_size):
+            db.execute(insert(models.Enquiry), records[start:start + batch_size])
+
+        record_enquiry_rollup(
+            db, now,
+            enquiries=len(records),
+            conversions=sum(1 for data in records if data.get("quotation_given"))
+        )
+        db.commit()
+        invalidate_page_counts("enquiries")
+        return len(records)
+    except Exception as e:
+        db.rollback()
+        print(f"Error importing enquiries: {e}")
+        raise
+
+
 def get_all_enquiries(db: Session, skip: int = 0, limit: int = 100):
     """Get all enquiries with pagination"""
     return db.query(models.Enquiry).order_by(models.Enquiry.date.desc()).offset(skip).limit(limit).all()
 
 
+def get_enquiry_export_rows(db: Session, batch_size: int = 1000):
+    """Get every enquiry for the Excel export, newest first, fetched in batches"""
+    return db.query(models.Enquiry).order_by(
+        models.Enquiry.date.desc(), models.Enquiry.id.desc()
+    ).yield_per(batch_size)
+
+
 def get_enquiry(db: Session, enquiry_id: int):
     """Get a specific enquiry by ID"""
     return db.query(models.Enquiry).filter(models.Enquiry.id == enquiry_id).first()
@@ -892,12 +2186,21 @@ def update_enquiry(db: Session, enquiry_id: int, enquiry_data: dict):
         if not enquiry:
             return None
 
+        was_converted = bool(enquiry.quotation_given)
+
         # Update enquiry attributes
         for key, value in enquiry_data.items():
             if hasattr(enquiry, key):
                 setattr(enquiry, key, value)
 
+        # Keep the conversion rollup in step with quotation_given
+        if bool(enquiry.quotation_given) != was_converted and enquiry.created_at:
+            record_enquiry_rollup(
+                db, enquiry.created_at, conversions=1 if enquiry.quotation_given else -1
+            )
+
         db.commit()
+        invalidate_page_counts("enquiries")
         db.refresh(enquiry)
         return enquiry
     except Exception as e:
@@ -913,8 +2216,14 @@ def delete_enquiry(db: Session, enquiry_id: int):
         return False
 
     try:
+        if enquiry.created_at:
+            record_enquiry_rollup(
+                db, enquiry.created_at,
+                enquiries=-1, conversions=-1 if enquiry.quotation_given else 0
+            )
         db.delete(enquiry)
         db.commit()
+        invalidate_page_counts("enquiries")
         return True
     except Exception as e:
         db.rollback()
@@ -946,7 +2255,9 @@ def create_customer(db: Session, customer_data: dict):
         )
 
         db.add(customer)
+        record_customer_rollup(db, customer.created_at)
         db.commit()
+        invalidate_page_counts("customers")
         db.refresh(customer)
 
         # If there's an initial payment, create a payment record
@@ -974,6 +2285,53 @@ def get_all_customers(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Customer).order_by(models.Customer.date.desc()).offset(skip).limit(limit).all()
 
 
+def get_customer_export_rows(db: Session, search: str = None, status: str = None, batch_size: int = 1000):
+    """Get every customer matching a search and payment status for the Excel export, fetched in batches"""
+    from sqlalchemy import or_
+
+    query = db.query(models.Customer)
+
+    if search:
+        pattern = f"%{search}%"
+        query = query.filter(or_(
+            models.Customer.customer_name.ilike(pattern),
+            models.Customer.phone_no.ilike(pattern),
+            models.Customer.customer_code.ilike(pattern),
+        ))
+    if status and status != "all":
+        query = query.filter(models.Customer.payment_status == status)
+
+    return query.order_by(models.Customer.date.desc(), models.Customer.id.desc()).yield_per(batch_size)
+
+
+def get_customers_page(db: Session, search: str = None, status: str = None, after: str = None,
+                       before: str = None, last: bool = False, limit: int = 50):
+    """Get a page of customers matching a search and payment status, newest first (see keyset_page)
+
+    Returns:
+        Dictionary with rows, next_cursor, prev_cursor and total (cached
+        count of the matching customers)
+    """
+    from sqlalchemy import or_
+
+    query = db.query(models.Customer)
+    if search:
+        search_term = f"%{search}%"
+        query = query.filter(
+            or_(
+                models.Customer.customer_name.ilike(search_term),
+                models.Customer.phone_no.ilike(search_term),
+                models.Customer.customer_code.ilike(search_term)
+            )
+        )
+    if status and status != "all":
+        query = query.filter(models.Customer.payment_status == status)
+
+    page = keyset_page(query, (models.Customer.date, models.Customer.id), after, before, last, limit)
+    page["total"] = cached_count("customers", query, {"search": search, "status": status})
+    return page
+
+
 def get_customer(db: Session, customer_id: int):
     """Get a specific customer by ID"""
     return db.query(models.Customer).filter(models.Customer.id == customer_id).first()
@@ -1000,6 +2358,7 @@ def update_customer(db: Session, customer_id: int, customer_data: dict):
         customer.updated_at = datetime.now()
 
         db.commit()
+        invalidate_page_counts("customers")
         db.refresh(customer)
         return customer
     except Exception as e:
@@ -1020,9 +2379,12 @@ def delete_customer(db: Session, customer_id: int):
             models.CustomerPayment.customer_id == customer_id
         ).delete()
 
-        # Delete the customer
+        # Delete the customer and remove it from the growth rollup
+        if customer.created_at:
+            record_customer_rollup(db, customer.created_at, sign=-1)
         db.delete(customer)
         db.commit()
+        invalidate_page_counts("customers")
         return True
     except Exception as e:
         db.rollback()
@@ -1062,6 +2424,7 @@ def add_customer_payment(db: Session, customer_id: int, payment_data: dict):
         customer.updated_at = datetime.now()
 
         db.commit()
+        invalidate_page_counts("customers")
         db.refresh(payment)
         return payment
     except Exception as e:
@@ -1078,7 +2441,14 @@ def get_customer_payments(db: Session, customer_id: int):
 
 
 def search_customers(db: Session, query: str):
-    """Search for customers by name, code, or phone number"""
+    """Search for customers by name, code, or phone number
+
+    Uses the customers_fts index, falling back to LIKE queries when it can't be used.
+    """
+    customers = search_index.ranked_search(db, models.Customer, query)
+    if customers is not None:
+        return customers
+
     from sqlalchemy import or_
 
     search_term = f"%{query}%"
@@ -1097,6 +2467,8 @@ def search_customers(db: Session, query: str):
 def search_enquiries(db: Session, query: str):
     """Search for enquiries by customer name, phone number, or enquiry number
 
+    Uses the enquiries_fts index, falling back to LIKE queries when it can't be used.
+
     Args:
         db: Database session
         query: Search query string
@@ -1104,6 +2476,10 @@ def search_enquiries(db: Session, query: str):
     Returns:
         List of enquiries matching the search criteria
     """
+    enquiries = search_index.ranked_search(db, models.Enquiry, query)
+    if enquiries is not None:
+        return enquiries
+
     from sqlalchemy import or_
 
     # Convert query to lowercase for case-insensitive search
@@ -1129,8 +2505,8 @@ def get_total_enquiries_count(db: Session):
     """Get total count of enquiries for pagination"""
     return db.query(models.Enquiry).count()
 
-def get_filtered_enquiries(db: Session, filters: dict, limit: int = 50, offset: int = 0):
-    """Get filtered and paginated enquiries"""
+def _filtered_enquiries_query(db: Session, filters: dict):
+    """Enquiry query with the customer name, date range and quotation filters applied"""
     query = db.query(models.Enquiry)
 
     if "customer_name" in filters and filters["customer_name"]:
@@ -1145,25 +2521,30 @@ def get_filtered_enquiries(db: Session, filters: dict, limit: int = 50, offset:
     if "quotation_given" in filters:
         query = query.filter(models.Enquiry.quotation_given == filters["quotation_given"])
 
+    return query
+
+def get_filtered_enquiries(db: Session, filters: dict, limit: int = 50, offset: int = 0):
+    """Get filtered and paginated enquiries"""
+    query = _filtered_enquiries_query(db, filters)
     return query.order_by(models.Enquiry.date.desc()).offset(offset).limit(limit).all()
 
 def get_filtered_enquiries_count(db: Session, filters: dict):
     """Get count of filtered enquiries"""
-    query = db.query(models.Enquiry)
-
-    if "customer_name" in filters and filters["customer_name"]:
-        query = query.filter(models.Enquiry.customer_name.ilike(f"%{filters['customer_name']}%"))
-
-    if "date_from" in filters and filters["date_from"]:
-        query = query.filter(models.Enquiry.date >= filters["date_from"])
+    return _filtered_enquiries_query(db, filters).count()
 
-    if "date_to" in filters and filters["date_to"]:
-        query = query.filter(models.Enquiry.date <= filters["date_to"])
-
-    if "quotation_given" in filters:
-        query = query.filter(models.Enquiry.quotation_given == filters["quotation_given"])
+def get_enquiries_page(db: Session, filters: dict = None, after: str = None, before: str = None,
+                       last: bool = False, limit: int = 50):
+    """Get a page of filtered enquiries, newest first (see keyset_page)
 
-    return query.count()
+    Returns:
+        Dictionary with rows, next_cursor, prev_cursor and total (cached
+        count of the filtered enquiries)
+    """
+    filters = filters or {}
+    query = _filtered_enquiries_query(db, filters)
+    page = keyset_page(query, (models.Enquiry.date, models.Enquiry.id), after, before, last, limit)
+    page["total"] = cached_count("enquiries", query, filters)
+    return page
 
 
 
@@ -1192,9 +2573,12 @@ def delete_customer(db: Session, customer_id: int) -> bool:
             print(f"Customer with ID {customer_id} not found")
             return False
 
-        # Delete the customer
+        # Delete the customer and remove it from the growth rollup
+        if customer.created_at:
+            record_customer_rollup(db, customer.created_at, sign=-1)
         db.delete(customer)
         db.commit()
+        invalidate_page_counts("customers")
 
         print(f"Customer with ID {customer_id} deleted successfully")
         return True
@@ -1210,30 +2594,8 @@ def delete_customer(db: Session, customer_id: int) -> bool:
 
 def generate_expense_code(db: Session) -> str:
     """Generate a unique expense code with format EXP001, EXP002, etc."""
-    try:
-        # Get the last expense by expense_code in descending order
-        last_expense = db.query(models.Expense).order_by(
-            models.Expense.expense_code.desc()
-        ).first()
-
-        if last_expense and last_expense.expense_code.startswith("EXP"):
-            # Extract the numeric part after "EXP"
-            numeric_part = ''.join(filter(str.isdigit, last_expense.expense_code))
-            if numeric_part:
-                number = int(numeric_part) + 1
-            else:
-                number = 1
-        else:
-            number = 1
-
-        # Use 3 digits (zfill(3)) to allow for up to 999 expenses
-        return f"EXP{str(number).zfill(3)}"
-    except Exception as e:
-        print(f"Error generating expense code: {e}")
-        # Fallback to a timestamp-based code if there's an error
-        import time
-        timestamp = int(time.time()) % 10000  # Last 4 digits of timestamp
-        return f"EXP{timestamp}"
+    number = allocate_sequence(db, "EXP", models.Expense.expense_code)
+    return f"EXP{str(number).zfill(3)}"
 
 
 def create_expense(db: Session, expense_data: dict):
@@ -1351,7 +2713,14 @@ def delete_expense(db: Session, expense_id: int):
 
 
 def search_expenses(db: Session, query: str):
-    """Search for expenses by expense code, vendor name, or description"""
+    """Search for expenses by expense code, vendor name, or description
+
+    Uses the expenses_fts index, falling back to LIKE queries when it can't be used.
+    """
+    expenses = search_index.ranked_search(db, models.Expense, query)
+    if expenses is not None:
+        return expenses
+
     from sqlalchemy import or_
 
     # Convert query to lowercase for case-insensitive search
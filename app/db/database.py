@@ -1,12 +1,25 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import json
 import os
-from app.core.config import IN_GCP
+import threading
+from app.core.config import (
+    IN_GCP,
+    THREADPOOL_SIZE,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE,
+    SQLITE_TEMP_STORE,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_FOREIGN_KEYS,
+    DB_POOL_SIZE,
+    QUERY_LOG_PATH,
+)
 
-# Ensure db directory exists
+# Created by app.main.bootstrap() and the migrate command, not on import
 DB_FOLDER = "db"
-os.makedirs(DB_FOLDER, exist_ok=True)
 
 # Use SQLite for local development
 SQLITE_DATABASE_URL = f"sqlite:///./db/sunmax.db"
@@ -14,9 +27,67 @@ SQLITE_DATABASE_URL = f"sqlite:///./db/sunmax.db"
 # Create engine with SQLite
 engine = create_engine(
     SQLITE_DATABASE_URL,
-    connect_args={"check_same_thread": False},
+    connect_args={
+        "check_same_thread": False,
+        "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+    },
     pool_pre_ping=True,  # Helps with connection drops
+    pool_size=DB_POOL_SIZE,
+    max_overflow=max(THREADPOOL_SIZE - DB_POOL_SIZE, 0),  # Allow one connection per worker thread
 )
+
+
+@event.listens_for(engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the configured PRAGMA profile to each new SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        # A negative cache_size is measured in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA temp_store={SQLITE_TEMP_STORE}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA foreign_keys={SQLITE_FOREIGN_KEYS}")
+    finally:
+        cursor.close()
+
+
+# Statements already written to the query log by this process
+_logged_statements = set()
+_query_log_lock = threading.Lock()
+
+
+def log_query(conn, cursor, statement, parameters, context, executemany):
+    """Append each distinct statement (with its first parameters) to the query log"""
+    if statement in _logged_statements:
+        return
+    with _query_log_lock:
+        if statement in _logged_statements:
+            return
+        _logged_statements.add(statement)
+        if executemany and parameters:
+            parameters = parameters[0]
+        try:
+            with open(QUERY_LOG_PATH, "a", encoding="utf-8") as log_file:
+                log_file.write(json.dumps({"sql": statement, "params": parameters}, default=str) + "\n")
+        except Exception as e:
+            print(f"Error writing query log: {e}")
+
+
+if QUERY_LOG_PATH:
+    event.listen(engine, "before_cursor_execute", log_query)
+
+
+def checkpoint_wal():
+    """Fold the WAL file back into the main database file
+
+    In WAL mode recent commits live in sunmax.db-wal until a checkpoint,
+    so this must run before the database file is copied or replaced.
+    """
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
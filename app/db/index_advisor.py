@@ -0,0 +1,125 @@
+"""
+Index advisor for the SQLite database.
+
+Replays the statements recorded in the query log (see QUERY_LOG_PATH) through
+EXPLAIN QUERY PLAN and reports the ones that scan a whole table or sort
+without an index, so new queries can be given an index before the tables
+grow.
+
+Usage:
+    QUERY_LOG_PATH=db/query_log.jsonl uvicorn app.main:app   # exercise the app
+    python -m app.db.index_advisor db/query_log.jsonl [--database db/sunmax.db] [--min-rows 1000]
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+
+from app.core.config import QUERY_LOG_PATH
+
+DEFAULT_DATABASE = "db/sunmax.db"
+
+# "SCAN invoices" / "SCAN TABLE invoices AS i" (older SQLite) without USING INDEX
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+TEMP_SORT = re.compile(r"^USE TEMP B-TREE FOR (?:ORDER BY|GROUP BY|DISTINCT)")
+
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+
+def read_query_log(path: str):
+    """Load the distinct (sql, params) entries from a query log file"""
+    entries = {}
+    with open(path, encoding="utf-8") as log_file:
+        for line in log_file:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if entry["sql"].lstrip().upper().startswith(EXPLAINABLE):
+                entries.setdefault(entry["sql"], entry.get("params") or [])
+    return list(entries.items())
+
+
+def explain(connection, sql: str, params):
+    """Return the detail lines of the query plan for a statement"""
+    rows = connection.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def analyse(connection, entries, min_rows: int = 0):
+    """
+    Check each logged statement's query plan for full scans and unindexed sorts
+
+    Args:
+        connection: sqlite3 connection to the database
+        entries: (sql, params) pairs from read_query_log()
+        min_rows: Ignore scans of tables with fewer rows than this
+
+    Returns:
+        List of findings, each a dict with sql, problems and plan
+    """
+    tables = {
+        name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    row_counts = {}
+
+    def row_count(table):
+        if table not in row_counts:
+            row_counts[table] = connection.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+        return row_counts[table]
+
+    findings = []
+    for sql, params in entries:
+        try:
+            plan = explain(connection, sql, params)
+        except sqlite3.Error as e:
+            print(f"Could not explain statement ({e}): {sql[:120]}")
+            continue
+
+        problems = []
+        for detail in plan:
+            scan = FULL_SCAN.match(detail)
+            if scan and scan.group(1) in tables and row_count(scan.group(1)) >= min_rows:
+                problems.append(f"full scan of {scan.group(1)} ({row_count(scan.group(1))} rows)")
+            elif TEMP_SORT.match(detail):
+                problems.append(detail.lower().replace("use temp b-tree for", "unindexed"))
+
+        if problems:
+            findings.append({"sql": sql, "problems": problems, "plan": plan})
+    return findings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flag logged queries that scan whole tables")
+    parser.add_argument("query_log", nargs="?", default=QUERY_LOG_PATH, help="Query log written via QUERY_LOG_PATH")
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help="SQLite database to explain against")
+    parser.add_argument("--min-rows", type=int, default=0, help="Ignore scans of tables smaller than this")
+    args = parser.parse_args(argv)
+
+    if not args.query_log:
+        parser.error("no query log given and QUERY_LOG_PATH is not set")
+
+    entries = read_query_log(args.query_log)
+    connection = sqlite3.connect(f"file:{args.database}?mode=ro", uri=True)
+    try:
+        findings = analyse(connection, entries, args.min_rows)
+    finally:
+        connection.close()
+
+    for finding in findings:
+        print("-" * 80)
+        print(finding["sql"].strip())
+        for problem in finding["problems"]:
+            print(f"  ! {problem}")
+        for detail in finding["plan"]:
+            print(f"    plan: {detail}")
+
+    print("-" * 80)
+    print(f"Checked {len(entries)} statements, {len(findings)} need attention")
+    return 1 if findings else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
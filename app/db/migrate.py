@@ -1,27 +1,319 @@
 """
-Simplified database migration script.
+Versioned database migrations.
 
-This script is now a simple wrapper around the database initialization process.
-For more complex migrations, use the setup_database.py script.
+The database records its schema version in the schema_version table. Each
+migration in MIGRATIONS runs once, in order, and is recorded there, so
+starting the app against an up-to-date database costs a single query and
+no schema introspection.
+
+Run the pending migrations at deploy time with:
+
+    python -m app.db.migrate                   # apply pending migrations
+    python -m app.db.migrate --status          # show applied and pending migrations
+    python -m app.db.migrate --rebuild-search  # refill the search indexes, e.g. after a VACUUM
+
+To change the schema, update the models and append a new migration to
+MIGRATIONS with the next version number. A migration spells out its own SQL
+(e.g. add_column() for a new column) instead of reading the models, so what
+it does never changes after it ships. Never edit or reorder a migration that
+has already shipped; existing databases won't run it again.
 """
 
-from app.db.database import Base, engine
+import argparse
+import os
+import sys
+
+from sqlalchemy.exc import OperationalError
+
+from app.core.config import AUTO_MIGRATE
+from app.db.database import DB_FOLDER, SessionLocal, engine
+
+
+def _execute(statements):
+    """Run SQL statements in one transaction"""
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+
+
+def add_column(connection, table: str, column: str, definition: str) -> bool:
+    """
+    Add a column to a table unless it already has it
+
+    Args:
+        connection: Connection inside the migration's transaction
+        table: Table name
+        column: Column name
+        definition: Type and constraints, e.g. "VARCHAR" or "FLOAT DEFAULT 0.0"
+
+    Returns:
+        True if the column was added
+    """
+    existing = {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")}
+    if column in existing:
+        return False
+    connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+
+def _baseline():
+    """Create the baseline tables and repair tables from older releases"""
+    from app.db.baseline_schema import BASELINE_TABLES
+    from app.db.create_customers_table import create_customers_table
+    from app.db.create_enquiries_table import create_enquiries_table
+    from app.db.create_services_table import create_services_table
+
+    _execute(BASELINE_TABLES)
+    create_enquiries_table()
+    create_customers_table()
+    create_services_table()
+    # Before migration 2 indexes them
+    _baseline_columns()
+
+
+def _secondary_indexes():
+    """
+    Create the baseline indexes the database doesn't have yet
+
+    Tables from older releases were created without some of them (e.g.
+    ix_invoices_date).
+    """
+    from app.db.baseline_schema import BASELINE_INDEXES
+
+    _execute(BASELINE_INDEXES)
+
+
+def _search_indexes():
+    """Create the FTS5 search tables and their triggers"""
+    from app.db.search_index import ensure_search_indexes
+
+    ensure_search_indexes()
+
+
+def _insight_rollups():
+    """Backfill the insights rollup tables from existing invoices and enquiries"""
+    from app.db import crud
 
-def run_migrations():
+    db = SessionLocal()
+    try:
+        crud.ensure_insight_rollups(db)
+    finally:
+        db.close()
+
+
+def _stock_holds():
+    """Create the stock_holds table for cart reservations"""
+    _execute([
+        """
+        CREATE TABLE IF NOT EXISTS stock_holds (
+            id INTEGER NOT NULL,
+            cart_id VARCHAR NOT NULL,
+            item_code VARCHAR NOT NULL,
+            quantity INTEGER NOT NULL,
+            created_at DATETIME,
+            expires_at DATETIME NOT NULL,
+            PRIMARY KEY (id),
+            CONSTRAINT uq_stock_holds_cart_item UNIQUE (cart_id, item_code),
+            FOREIGN KEY(item_code) REFERENCES inventory (item_code)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_stock_holds_id ON stock_holds (id)",
+        "CREATE INDEX IF NOT EXISTS ix_stock_holds_expires_at ON stock_holds (expires_at)",
+    ])
+
+
+def _idempotency_keys():
+    """Create the idempotency_keys table for replaying retried requests"""
+    _execute([
+        """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            scope VARCHAR NOT NULL,
+            "key" VARCHAR NOT NULL,
+            request_hash VARCHAR NOT NULL,
+            status_code INTEGER,
+            response_body TEXT,
+            created_at DATETIME,
+            expires_at DATETIME NOT NULL,
+            PRIMARY KEY (scope, "key")
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expires_at ON idempotency_keys (expires_at)",
+    ])
+
+
+def _pagination_indexes():
+    """Index the stock page's keyset order (date, item_code)"""
+    _execute(["CREATE INDEX IF NOT EXISTS ix_inventory_date_item_code ON inventory (date, item_code)"])
+
+
+def _baseline_columns():
     """
-    Run database migrations.
+    Add the baseline columns missing from tables made by older releases
 
-    This is now a simplified function that just ensures tables exist.
-    For more complex migrations, use the setup_database.py script.
+    The baseline migration only creates tables that don't exist, so a table
+    from before it keeps its old columns. Nullable columns and columns with a
+    default are added; a missing NOT NULL column without one can't be added
+    to a table with rows and is reported instead. The baseline migration runs
+    this too; migration 8 covers databases that ran it before it did.
     """
-    print("Running database migrations...")
+    import sqlite3
+
+    from app.db.baseline_schema import BASELINE_TABLES
+
+    # Read the column definitions back from the frozen CREATE TABLE statements
+    reference = sqlite3.connect(":memory:")
+    try:
+        for statement in BASELINE_TABLES:
+            reference.execute(statement)
+        tables = [row[0] for row in reference.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        columns = {table: reference.execute(f"PRAGMA table_info({table})").fetchall() for table in tables}
+    finally:
+        reference.close()
+
+    with engine.begin() as connection:
+        for table, table_columns in columns.items():
+            for _, name, column_type, not_null, default, primary_key in table_columns:
+                if primary_key:
+                    continue
+                if not_null and default is None:
+                    existing = {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")}
+                    if name not in existing:
+                        print(f"Column {table}.{name} is missing and NOT NULL, add it by hand")
+                    continue
+                definition = column_type + (f" DEFAULT {default}" if default is not None else "")
+                if add_column(connection, table, name, definition):
+                    print(f"Added column {table}.{name}")
+
+
+def _code_search_indexes():
+    """Create the trigram indexes that find text anywhere in a record's code"""
+    from app.db.search_index import ensure_search_indexes
+
+    ensure_search_indexes()
+
+
+def _idempotency_completion():
+    """Record when a request with an idempotency key committed its work"""
+    with engine.begin() as connection:
+        add_column(connection, "idempotency_keys", "completed_at", "DATETIME")
+
+
+# (version, name, migration) in the order they are applied
+MIGRATIONS = [
+    (1, "baseline", _baseline),
+    (2, "secondary_indexes", _secondary_indexes),
+    (3, "search_indexes", _search_indexes),
+    (4, "insight_rollups", _insight_rollups),
+    (5, "stock_holds", _stock_holds),
+    (6, "idempotency_keys", _idempotency_keys),
+    (7, "pagination_indexes", _pagination_indexes),
+    (8, "baseline_columns", _baseline_columns),
+    (9, "code_search_indexes", _code_search_indexes),
+    (10, "idempotency_completion", _idempotency_completion),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version() -> int:
+    """Version of the last migration applied to the database (0 if none)"""
+    try:
+        with engine.connect() as connection:
+            return connection.exec_driver_sql("SELECT MAX(version) FROM schema_version").scalar() or 0
+    except OperationalError:
+        # No schema_version table: a new database or one from before migrations
+        return 0
+
+
+def pending_migrations():
+    """Migrations not yet applied to the database, in order"""
+    current = get_schema_version()
+    return [migration for migration in MIGRATIONS if migration[0] > current]
+
+
+def run_migrations() -> bool:
+    """
+    Apply every pending migration in order
+
+    Each migration is recorded as soon as it succeeds, so if one fails the
+    next run resumes from it.
+
+    Returns:
+        True if the database is now up to date
+    """
+    pending = pending_migrations()
+    if not pending:
+        return True
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, "
+            "name TEXT NOT NULL, "
+            "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        )
+
+    for version, name, migration in pending:
+        print(f"Applying migration {version}: {name}...")
+        try:
+            migration()
+            with engine.begin() as connection:
+                connection.exec_driver_sql(
+                    "INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name)
+                )
+        except Exception as e:
+            print(f"Error applying migration {version} ({name}): {e}")
+            return False
+
+    print(f"Database migrated to version {LATEST_VERSION}.")
+    return True
+
+
+def check_schema() -> bool:
+    """
+    Make sure the database schema is current when the app starts
+
+    Pending migrations are applied if AUTO_MIGRATE is on; otherwise a
+    warning is printed and the app starts on the old schema.
+
+    Returns:
+        True if the database is up to date
+    """
+    pending = pending_migrations()
+    if not pending:
+        return True
+    if AUTO_MIGRATE:
+        return run_migrations()
+
+    print(f"Database schema is {len(pending)} migration(s) behind. Run: python -m app.db.migrate")
+    return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply pending database migrations")
+    parser.add_argument("--status", action="store_true", help="Show the schema version without migrating")
+    parser.add_argument("--rebuild-search", action="store_true",
+                        help="Refill the search indexes after migrating (run after a VACUUM)")
+    args = parser.parse_args(argv)
+
+    # Run on its own at deploy time, before the app has created any folders
+    os.makedirs(DB_FOLDER, exist_ok=True)
+
+    if args.status:
+        current = get_schema_version()
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:>4}  {name:<24} {'applied' if version <= current else 'pending'}")
+        return 0
+
+    if not run_migrations():
+        return 1
+    if args.rebuild_search:
+        from app.db.search_index import rebuild_search_indexes
 
-    # Simply create tables if they don't exist
-    # This is a safe operation that won't affect existing data
-    Base.metadata.create_all(bind=engine, checkfirst=True)
+        rebuild_search_indexes()
+        print("Search indexes rebuilt.")
+    return 0
 
-    print("Database migrations completed.")
-    print("Note: For schema changes, use the setup_database.py script.")
 
 if __name__ == "__main__":
-    run_migrations()
+    sys.exit(main())
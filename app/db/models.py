@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, Date, ForeignKey, DateTime, Boolean, Text
+from sqlalchemy import Column, String, Integer, Float, Date, ForeignKey, DateTime, Boolean, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 from datetime import datetime
@@ -6,6 +6,8 @@ from datetime import datetime
 
 class InventoryItem(Base):
     __tablename__ = "inventory"
+    # Keyset pagination of the stock page, newest first
+    __table_args__ = (Index("ix_inventory_date_item_code", "date", "item_code"),)
 
     item_code = Column(String, primary_key=True, index=True)
     date = Column(Date, nullable=False)
@@ -45,6 +47,13 @@ class Invoice(Base):
     payments = relationship("Payment", back_populates="invoice")
     services = relationship("Service", back_populates="invoice")
 
+    # Invoice list and exports sort by date and filter by status or customer
+    __table_args__ = (
+        Index("ix_invoices_date", "date", "id"),
+        Index("ix_invoices_payment_status_date", "payment_status", "date"),
+        Index("ix_invoices_customer_name_date", "customer_name", "date"),
+    )
+
 
 class InvoiceItem(Base):
     __tablename__ = "invoice_items"
@@ -66,6 +75,11 @@ class InvoiceItem(Base):
     # Relationship with invoice
     invoice = relationship("Invoice", back_populates="items")
 
+    __table_args__ = (
+        Index("ix_invoice_items_invoice_id", "invoice_id"),
+        Index("ix_invoice_items_item_code", "item_code"),
+    )
+
 
 class Payment(Base):
     __tablename__ = "payments"
@@ -80,6 +94,8 @@ class Payment(Base):
     # Relationship with invoice
     invoice = relationship("Invoice", back_populates="payments")
 
+    __table_args__ = (Index("ix_payments_invoice_id", "invoice_id"),)
+
 
 class SalesCounter(Base):
     __tablename__ = "sales_counter"
@@ -90,6 +106,114 @@ class SalesCounter(Base):
     last_updated = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
 
+class Sequence(Base):
+    __tablename__ = "sequences"
+
+    name = Column(String, primary_key=True)  # Document prefix, optionally suffixed with a fiscal year
+    value = Column(Integer, nullable=False, default=0)  # Last number handed out
+
+
+class StockHold(Base):
+    """Stock set aside for an open cart until checkout, release or expiry"""
+    __tablename__ = "stock_holds"
+    __table_args__ = (
+        UniqueConstraint("cart_id", "item_code", name="uq_stock_holds_cart_item"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    cart_id = Column(String, nullable=False)
+    item_code = Column(String, ForeignKey("inventory.item_code"), nullable=False)
+    quantity = Column(Integer, nullable=False)  # Already deducted from inventory.quantity
+    created_at = Column(DateTime, default=datetime.now)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class IdempotencyKey(Base):
+    """Result of a request sent with an idempotency key, replayed on retries"""
+    __tablename__ = "idempotency_keys"
+
+    scope = Column(String, primary_key=True)  # Operation, e.g. "checkout"
+    key = Column(String, primary_key=True)  # Client-generated key
+    request_hash = Column(String, nullable=False)  # Fingerprint of the request parameters
+    status_code = Column(Integer)  # None while the first request is still running
+    response_body = Column(Text)  # JSON response returned to the first request
+    completed_at = Column(DateTime)  # Set in the same transaction as the request's work
+    created_at = Column(DateTime, default=datetime.now)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class PdfRenderJob(Base):
+    __tablename__ = "pdf_render_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    invoice_number = Column(String, index=True, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, running, done, failed
+    attempts = Column(Integer, default=0)
+    error = Column(Text)
+    render_ms = Column(Float)  # Time spent drawing and writing the PDF
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class PdfCacheEntry(Base):
+    __tablename__ = "pdf_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_type = Column(String, nullable=False)  # "invoice", "quotation" or "customer"
+    document_key = Column(String, nullable=False)  # Invoice number, quote number or customer ID
+    content_hash = Column(String, nullable=False)  # Hash of the data the PDF was rendered from
+    pdf_path = Column(String, nullable=False)
+    rendered_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    __table_args__ = (UniqueConstraint("document_type", "document_key", name="uq_pdf_cache_document"),)
+
+
+class MonthlySalesRollup(Base):
+    __tablename__ = "rollup_monthly_sales"
+
+    id = Column(Integer, primary_key=True, index=True)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    invoice_count = Column(Integer, default=0)
+    revenue = Column(Float, default=0.0)
+
+    __table_args__ = (UniqueConstraint("year", "month", name="uq_rollup_monthly_sales_period"),)
+
+
+class PaymentMethodRollup(Base):
+    __tablename__ = "rollup_payment_methods"
+
+    id = Column(Integer, primary_key=True, index=True)
+    payment_method = Column(String, unique=True, nullable=False)
+    invoice_count = Column(Integer, default=0)
+    revenue = Column(Float, default=0.0)  # Invoiced amount for invoices raised with this method
+    amount_collected = Column(Float, default=0.0)  # Paid at checkout or later via add_payment with this method
+
+
+class MonthlyCustomerRollup(Base):
+    __tablename__ = "rollup_monthly_customers"
+
+    id = Column(Integer, primary_key=True, index=True)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    new_customers = Column(Integer, default=0)
+
+    __table_args__ = (UniqueConstraint("year", "month", name="uq_rollup_monthly_customers_period"),)
+
+
+class MonthlyEnquiryRollup(Base):
+    __tablename__ = "rollup_monthly_enquiries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    enquiries = Column(Integer, default=0)
+    conversions = Column(Integer, default=0)  # Enquiries where a quotation was given
+
+    __table_args__ = (UniqueConstraint("year", "month", name="uq_rollup_monthly_enquiries_period"),)
+
+
 class Service(Base):
     __tablename__ = "services"
 
@@ -179,6 +303,8 @@ class Enquiry(Base):
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
+    __table_args__ = (Index("ix_enquiries_date", "date"),)
+
 
 class Customer(Base):
     __tablename__ = "customers"
@@ -200,6 +326,8 @@ class Customer(Base):
     # Relationship with customer payments
     payments = relationship("CustomerPayment", back_populates="customer", cascade="all, delete-orphan")
 
+    __table_args__ = (Index("ix_customers_date", "date"),)
+
 
 class CustomerPayment(Base):
     __tablename__ = "customer_payments"
@@ -214,6 +342,8 @@ class CustomerPayment(Base):
     # Relationship with customer
     customer = relationship("Customer", back_populates="payments")
 
+    __table_args__ = (Index("ix_customer_payments_customer_id", "customer_id"),)
+
 
 class Expense(Base):
     __tablename__ = "expenses"
@@ -243,6 +373,13 @@ class Expense(Base):
     # Relationship with expense payments
     payments = relationship("ExpensePayment", back_populates="expense", cascade="all, delete-orphan")
 
+    # Expense lists sort by date, optionally filtered by type or category
+    __table_args__ = (
+        Index("ix_expenses_date", "date"),
+        Index("ix_expenses_expense_type_date", "expense_type", "date"),
+        Index("ix_expenses_category_date", "category", "date"),
+    )
+
 
 class ExpensePayment(Base):
     __tablename__ = "expense_payments"
@@ -256,3 +393,5 @@ class ExpensePayment(Base):
 
     # Relationship with expense
     expense = relationship("Expense", back_populates="payments")
+
+    __table_args__ = (Index("ix_expense_payments_expense_id", "expense_id"),)
@@ -0,0 +1,284 @@
+"""
+SQLite FTS5 search indexes.
+
+Each searchable table gets an external-content FTS5 table (named
+<table>_fts) holding the text columns the search functions look at. Triggers
+on the source table keep the index in sync on every insert, delete and
+update of an indexed column, so the application code never writes to it.
+
+Queries match every word of the search text as a prefix ("sola pan" finds
+"Solar Panel 540W") and rows come back ordered by bm25 rank, or newest first
+for very broad queries. A single word with a digit and at least three
+characters is also looked up anywhere in the record's code ("001" finds
+SUN001) through a second, trigram index on the code (<table>_code_fts).
+Other words only match the start of a code, through the word index. Code
+matches are listed first, and no search falls back to scanning the table.
+
+The inventory table has no integer primary key, so its index is keyed on the
+implicit rowid, which a VACUUM may renumber. Call rebuild_search_indexes()
+after anything that may have rewritten the file: uploading a database does,
+and after a manual VACUUM run ``python -m app.db.migrate --rebuild-search``.
+"""
+
+import re
+
+from sqlalchemy import or_, text
+from sqlalchemy.exc import OperationalError
+
+from app.db.database import engine
+
+# Source table -> columns indexed for search; the first is the record's code
+SEARCH_INDEXES = {
+    "inventory": ["item_code", "item_name", "supplier_name"],
+    "services": ["service_code", "service_name", "employee_name"],
+    "customers": ["customer_code", "customer_name", "phone_no"],
+    "enquiries": ["enquiry_number", "customer_name", "phone_no", "requirements"],
+    "expenses": ["expense_code", "vendor_name", "description", "expense_type"],
+}
+
+# Prefix lengths with their own index entries, so short prefixes stay fast
+PREFIX_LENGTHS = "2 3 4"
+
+# Shortest text the trigram code index can look up
+CODE_MATCH_MIN_LENGTH = 3
+
+# Queries matching more rows than this are not ranked (see ranked_search)
+RANK_MAX_MATCHES = 1000
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def _fts_table(table: str) -> str:
+    return f"{table}_fts"
+
+
+def _code_fts_table(table: str) -> str:
+    return f"{table}_code_fts"
+
+
+def _create_statements(table: str, columns: list, fts: str = None, options: str = None) -> list:
+    """SQL creating the FTS table and the triggers that keep it in sync"""
+    fts = fts or _fts_table(table)
+    options = options or f"prefix='{PREFIX_LENGTHS}', tokenize='unicode61 remove_diacritics 2'"
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+
+    # inventory has no integer primary key, so the index is keyed on the
+    # implicit rowid (see the module docstring)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5("
+        f"{column_list}, content='{table}', content_rowid='rowid', {options})",
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.rowid, {new_values}); END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values}); END",
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {column_list} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.rowid, {new_values}); END",
+    ]
+
+
+def _index_definitions():
+    """(source table, FTS table, create statements) of every search index"""
+    for table, columns in SEARCH_INDEXES.items():
+        yield table, _fts_table(table), _create_statements(table, columns)
+        code_fts = _code_fts_table(table)
+        yield table, code_fts, _create_statements(table, columns[:1], code_fts, "tokenize='trigram'")
+
+
+def ensure_search_indexes():
+    """
+    Create any missing FTS indexes and fill them from their source tables
+
+    Indexes whose definition has changed (e.g. a column was added to
+    SEARCH_INDEXES) are dropped and rebuilt; add a migration calling this
+    when SEARCH_INDEXES changes.
+    """
+    try:
+        with engine.begin() as connection:
+            existing = dict(connection.exec_driver_sql(
+                "SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'trigger')"
+            ).fetchall())
+
+            for table, fts, statements in _index_definitions():
+                if table not in existing:
+                    continue
+
+                if existing.get(fts) == statements[0]:
+                    continue
+
+                print(f"Building search index {fts}...")
+                for trigger in ("insert", "delete", "update"):
+                    connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {fts}_{trigger}")
+                connection.exec_driver_sql(f"DROP TABLE IF EXISTS {fts}")
+                for statement in statements:
+                    connection.exec_driver_sql(statement)
+                connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    except Exception as e:
+        print(f"Error creating search indexes: {e}")
+        raise
+
+
+def rebuild_search_indexes():
+    """Refill every FTS index from its source table, e.g. after a VACUUM renumbered rowids"""
+    with engine.begin() as connection:
+        existing = {row[0] for row in connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )}
+        for _, fts, _ in _index_definitions():
+            if fts in existing:
+                connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def build_match_query(query: str):
+    """
+    Turn search box text into an FTS5 MATCH expression
+
+    Every word must match the start of a word in one of the indexed columns.
+
+    Returns:
+        The MATCH expression, or None if the text has no searchable words
+    """
+    tokens = TOKEN_PATTERN.findall(query or "")
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _code_condition(model, query: str):
+    """
+    Condition matching a single-word query anywhere in the record's code
+
+    Codes are single tokens to the word index ("sun001"), so "001" can't find
+    SUN001 there; the trigram index on the code can, case-insensitively.
+    Only words with a digit are looked up: what sets codes apart is their
+    number, and plain words would mostly cost an index lookup for nothing.
+
+    Returns:
+        The condition, or None if the query is more than one word, has no
+        digit or is too short for the trigram index
+    """
+    tokens = TOKEN_PATTERN.findall(query or "")
+    if len(tokens) != 1 or len(tokens[0]) < CODE_MATCH_MIN_LENGTH:
+        return None
+    if not any(character.isdigit() for character in tokens[0]):
+        return None
+
+    table = model.__tablename__
+    code_fts = _code_fts_table(table)
+    return text(
+        f"{table}.rowid IN (SELECT rowid FROM {code_fts} WHERE {code_fts} MATCH :code_match)"
+    ).bindparams(code_match=f'"{tokens[0]}"')
+
+
+def match_condition(model, query: str):
+    """
+    SQL condition selecting the rows of model that match the search text
+
+    For queries that need their own ordering (e.g. keyset pagination) rather
+    than ranked_search()'s bm25 ranking. Raises OperationalError when the
+    query runs if the index is missing.
+
+    Returns:
+        The condition, or None if the text has no searchable words
+    """
+    match = build_match_query(query)
+    if match is None:
+        return None
+
+    table = model.__tablename__
+    fts = _fts_table(table)
+    condition = text(
+        f"{table}.rowid IN (SELECT rowid FROM {fts} WHERE {fts} MATCH :match)"
+    ).bindparams(match=match)
+
+    code_condition = _code_condition(model, query)
+    return condition if code_condition is None else or_(condition, code_condition)
+
+
+def _code_matches(db, model, query: str, limit: int = None) -> list:
+    """
+    Rows whose code contains a single-word query, for listing first
+
+    Codes starting with the word come first, from a range on the code's own
+    index (codes are stored in upper case); then codes containing it
+    elsewhere, from the trigram index. Each group is in code order.
+    """
+    tokens = TOKEN_PATTERN.findall(query or "")
+    if len(tokens) != 1:
+        return []
+
+    code_column = getattr(model, SEARCH_INDEXES[model.__tablename__][0])
+    prefix = tokens[0].upper()
+    starts_with = (code_column >= prefix) & (code_column < prefix + "\uffff")
+    prefix_query = db.query(model).filter(starts_with).order_by(code_column)
+    rows = (prefix_query if limit is None else prefix_query.limit(limit)).all()
+
+    contains = _code_condition(model, query)
+    if contains is None or (limit is not None and len(rows) >= limit):
+        return rows
+    contains_query = db.query(model).filter(contains, ~starts_with).order_by(code_column)
+    if limit is not None:
+        contains_query = contains_query.limit(limit - len(rows))
+    return rows + contains_query.all()
+
+
+def ranked_search(db, model, query: str, limit: int = None, offset: int = 0):
+    """
+    Find rows of model matching the search text, best matches first
+
+    For a single word, rows whose code contains it come first (see
+    _code_matches).
+
+    Args:
+        db: Database session
+        model: Model of one of the tables in SEARCH_INDEXES
+        query: Search text
+        limit: Maximum number of rows to return (all matches if None)
+        offset: Number of matches to skip, for paging through results
+
+    Returns:
+        List of model instances, or None if the index can't be used for this
+        query (no searchable words, or the index is missing) and the caller
+        should fall back to a LIKE search
+    """
+    match = build_match_query(query)
+    if match is None:
+        return None
+
+    table = model.__tablename__
+    fts = _fts_table(table)
+
+    try:
+        code_matches = _code_matches(db, model, query, None if limit is None else offset + limit)
+
+        # Fetch enough ranked rows to fill the page after the code matches
+        fts_limit = None if limit is None else len(code_matches) + offset + limit
+        params = {"match": match, "limit": -1 if fts_limit is None else fts_limit}
+
+        # bm25 has to score every match, so very broad queries (one or two
+        # letters) are returned newest first instead of ranked. Counting
+        # stops as soon as the query is known to be broad
+        matches = db.execute(
+            text(f"SELECT count(*) FROM (SELECT 1 FROM {fts} WHERE {fts} MATCH :match LIMIT :cap)"),
+            {"match": match, "cap": RANK_MAX_MATCHES + 1}
+        ).scalar()
+        order = "rank" if matches <= RANK_MAX_MATCHES else "rowid DESC"
+
+        # Order and limit inside the FTS table first so only the returned rows
+        # are joined back to the source table
+        sql = (
+            f"SELECT {table}.* FROM ("
+            f"SELECT rowid, rank FROM {fts} WHERE {fts} MATCH :match ORDER BY {order} LIMIT :limit"
+            f") AS hits JOIN {table} ON {table}.rowid = hits.rowid ORDER BY hits.{order}"
+        )
+        ranked = db.query(model).from_statement(text(sql)).params(**params).all()
+    except OperationalError as e:
+        print(f"Search index for {table} unavailable, falling back to LIKE search: {e}")
+        return None
+
+    # The session returns the same object for a row found both ways
+    listed = set(code_matches)
+    rows = code_matches + [row for row in ranked if row not in listed]
+    return rows[offset:] if limit is None else rows[offset:offset + limit]
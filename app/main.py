@@ -1,15 +1,16 @@
 # app/main.py
 
-from fastapi import FastAPI, Request, Depends, Form, File, UploadFile, Body, Cookie, Query
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse
+from fastapi import FastAPI, Request, Depends, Form, File, UploadFile, Cookie, Query
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
 from datetime import datetime
 import os
-import json
 import signal
 import subprocess
 import atexit
@@ -23,8 +24,7 @@ from sqlalchemy import func, desc
 from io import BytesIO
 
 # Import core modules
-from app.core.pdf_generator import generate_pdf_invoice, generate_pdf_quotation
-from app.core.excel_generator import export_invoices_to_excel
+from app.core import dashboard, pdf_jobs, stock_holds, user_cache
 
 from app.api import inventory  # Import inventory route module
 from app.api import auth  # Import authentication routes
@@ -36,9 +36,13 @@ from app.api import quotations  # Import quotations routes
 from app.api import enquiries  # Import enquiries routes
 from app.api import customers  # Import customers routes
 from app.api import expenses  # Import expenses routes
+from app.api import imports  # Import progress routes
+from app.api import search  # Global search routes
 from app.db import crud, database, models
-from app.db.migrate import run_migrations
-from app.core.auth import get_current_user_from_cookie
+from app.db.migrate import check_schema
+from app.db.ensure_top_user import ensure_top_user_exists
+from app.core.auth import get_current_user_from_cookie, get_user_from_cookie
+from app.core.pagination import page_links
 
 # Helper function to get current user from cookie is defined below after app initialization
 
@@ -46,72 +50,9 @@ from app.core.auth import get_current_user_from_cookie
 DB_FOLDER = "db"  # Database folder
 DB_PATH = os.path.join(DB_FOLDER, "sunmax.db")  # Local database path
 
-# Ensure the database folder exists
-os.makedirs(DB_FOLDER, exist_ok=True)
-
 # Set debug mode for verbose logging (comment this out to reduce logs)
 # os.environ['DEBUG'] = 'true'
 
-# Initialize the database - this will create tables if they don't exist
-database.init_db()
-
-# Create the enquiries table
-from app.db.create_enquiries_table import create_enquiries_table
-create_enquiries_table()
-
-# Create the customers table
-from app.db.create_customers_table import create_customers_table
-create_customers_table()
-
-# Create the expenses table
-from app.db.create_expenses_table import create_expenses_table
-create_expenses_table()
-
-# Ensure the top user account exists
-try:
-    # Create a temporary session to ensure top user exists
-    from sqlalchemy.orm import Session
-    from app.db.database import SessionLocal
-    from app.db import crud
-    from app.core.auth import get_password_hash
-
-    # Top user credentials
-    TOP_USER_EMAIL = "contactsunmax@gmail.com"
-    TOP_USER_PASSWORD = "Sunmax@123"
-    TOP_USER_NAME = "Sunmax Administrator"
-    TOP_USER_ROLE = "top_user"
-
-    db = SessionLocal()
-    try:
-        # Check if top user exists
-        top_user = crud.get_user_by_email(db, TOP_USER_EMAIL)
-
-        if not top_user:
-            # Create top user
-            print(f"Creating top user account: {TOP_USER_EMAIL}")
-
-            # Create user data
-            user_data = {
-                "email": TOP_USER_EMAIL,
-                "password": TOP_USER_PASSWORD,
-                "name": TOP_USER_NAME,
-                "role": TOP_USER_ROLE,
-                "first_login": False  # Don't require password change
-            }
-
-            # Create the user
-            crud.create_user(db, user_data)
-            print(f"Top user account created successfully")
-    finally:
-        db.close()
-except Exception as e:
-    print(f"Error ensuring top user exists: {e}")
-    print("Application will continue, but top user may not be available")
-
-# Create invoices directory if it doesn't exist
-os.makedirs("invoices", exist_ok=True)
-# We'll call this after the app is initialized
-
 # Simple SIGTERM handler
 def handle_sigterm(*args):
     """Handle SIGTERM signal by shutting down gracefully."""
@@ -129,7 +70,51 @@ def exit_handler():
 # Register the exit handler
 atexit.register(exit_handler)
 
-app = FastAPI()
+def bootstrap():
+    """
+    Prepare the folders and database the app needs
+
+    Runs once per process when the app starts (see lifespan) rather than on
+    import, so importing app.main stays fast and touches nothing on disk.
+    """
+    for folder in (DB_FOLDER, "invoices", "quotations"):
+        os.makedirs(folder, exist_ok=True)
+
+    # Check the schema version; applies pending migrations if AUTO_MIGRATE is on
+    check_schema()
+
+    # Ensure the top user account exists
+    db = database.SessionLocal()
+    try:
+        ensure_top_user_exists(db)
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup and shutdown of the application"""
+    from anyio import to_thread
+    from app.core.config import THREADPOOL_SIZE
+
+    # Size the threadpool that sync routes and run_in_threadpool calls share
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+    await run_in_threadpool(bootstrap)
+
+    # Pick up invoice PDF renders left unfinished by the last run
+    pdf_jobs.resume_pending_jobs()
+
+    # Return stock held by abandoned carts
+    stock_holds.start_sweeper()
+    yield
+    stock_holds.stop_sweeper()
+
+    from app.core import pdf_archive
+    pdf_archive.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -150,17 +135,11 @@ app.add_middleware(
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Create invoices directory if it doesn't exist
-os.makedirs("invoices", exist_ok=True)
-
-# Create quotations directory if it doesn't exist
-os.makedirs("quotations", exist_ok=True)
+# Mount invoices directory as static files (created by bootstrap())
+app.mount("/invoice-files", StaticFiles(directory="invoices", check_dir=False), name="invoices")
 
-# Mount invoices directory as static files
-app.mount("/invoice-files", StaticFiles(directory="invoices"), name="invoices")
-
-# Mount quotations directory as static files
-app.mount("/quotation-files", StaticFiles(directory="quotations"), name="quotations")
+# Mount quotations directory as static files (created by bootstrap())
+app.mount("/quotation-files", StaticFiles(directory="quotations", check_dir=False), name="quotations")
 
 # Set up templates
 templates = Jinja2Templates(directory="templates")
@@ -175,9 +154,11 @@ app.include_router(quotations.router, tags=["Quotations"])
 app.include_router(enquiries.router, tags=["Enquiries"])
 app.include_router(customers.router, tags=["Customers"])
 app.include_router(expenses.router, tags=["Expenses"])
+app.include_router(imports.router, tags=["Imports"])
+app.include_router(search.router, tags=["Search"])
 
 @app.delete("/api/services/delete/{service_id}")
-async def delete_service_api(service_id: int, db: Session = Depends(database.get_db)):
+def delete_service_api(service_id: int, db: Session = Depends(database.get_db)):
     """Delete a service directly via API"""
     try:
         print(f"Attempting to delete service with ID: {service_id}")
@@ -210,93 +191,62 @@ app.include_router(db_management.router, prefix="", tags=["Database"])
 # Helper function to get current user from cookie is now imported from app.core.auth
 
 @app.get("/", response_class=HTMLResponse)
-async def read_root(request: Request, db: Session = Depends(database.get_db)):
+def read_root(request: Request, db: Session = Depends(database.get_db)):
     # Get current user from cookie
-    user = await get_current_user_from_cookie(request, db=db)
+    user = get_user_from_cookie(request, db)
 
     # Redirect to login if not authenticated
     if not user:
         return RedirectResponse(url="/login", status_code=303)
 
-    # Get items from database
-    items = crud.get_all_items(db)
-
-    # Get services from database
-    services = crud.get_all_services(db)
-
-    # Get sales statistics
-    sales_stats = crud.get_sales_stats(db)
-
-    # Calculate total inventory count
-    total_inventory = sum(item.quantity for item in items)
-
-    # Calculate unique categories count
-    categories = set()
-    for item in items:
-        if hasattr(item, 'category') and item.category:
-            categories.add(item.category)
-
-    # If no categories are found, try to extract from item names
-    if not categories:
-        for item in items:
-            # Extract first word as category (simplified approach)
-            if hasattr(item, 'item_name') and item.item_name:
-                category = item.item_name.split()[0] if item.item_name.split() else ""
-                if category:
-                    categories.add(category)
+    # Totals, categories and sales stats from SQL aggregates (cached until the
+    # next inventory/invoice write). The item and service cards are loaded by
+    # the page from the paginated APIs.
+    summary = dashboard.get_summary(db)
 
     return templates.TemplateResponse("index.html", {
         "request": request,
         "user": user,
-        "items": items,
-        "services": services,
-        "sales_stats": sales_stats,
-        "total_inventory": total_inventory,
-        "categories": len(categories),
-        "categories_list": list(categories)
+        "summary": summary,
+        "sales_stats": summary["sales_stats"],
+        "total_inventory": summary["total_inventory"],
+        "categories": len(summary["categories"]),
+        "categories_list": list(summary["categories"])
     })
 
 @app.get("/stock", response_class=HTMLResponse)
-async def stock_page(
+def stock_page(
     request: Request,
     page: int = Query(1, ge=1),
     limit: int = Query(100, ge=10, le=500),
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    last: bool = False,
     db: Session = Depends(database.get_db)
 ):
     # Get current user from cookie
-    user = await get_current_user_from_cookie(request, db=db)
+    user = get_user_from_cookie(request, db)
 
     # Redirect to login if not authenticated
     if not user:
         return RedirectResponse(url="/login", status_code=303)
 
-    # Get total count of items
-    total_items = crud.get_items_count(db)
-
-    # Calculate total pages
-    total_pages = (total_items + limit - 1) // limit
-
-    # Ensure page is valid
-    if page > total_pages and total_pages > 0:
-        page = total_pages
-
-    # Calculate offset
-    offset = (page - 1) * limit
-
-    # Get items for current page
-    items = crud.get_all_items(db, skip=offset, limit=limit)
+    # Get items for the current page (keyset paginated, newest first)
+    result = crud.get_stock_page(db, after, before, last, limit)
+    pagination = page_links("/stock", {"limit": limit}, page, limit, result)
 
     return templates.TemplateResponse(
         "stock.html",
         {
             "request": request,
             "user": user,
-            "items": items,
+            "items": result["rows"],
             "today": datetime.now().date(),
-            "current_page": page,
-            "total_pages": total_pages,
-            "total_items": total_items,
-            "limit": limit
+            "current_page": pagination["page"],
+            "total_pages": pagination["total_pages"],
+            "total_items": pagination["total"],
+            "limit": limit,
+            "pagination": pagination
         }
     )
 
@@ -323,14 +273,14 @@ async def checkout_page(request: Request, db: Session = Depends(database.get_db)
     return templates.TemplateResponse("checkout.html", {"request": request, "user": user})
 
 @app.get("/invoices", response_class=HTMLResponse)
-async def invoices_page(
+def invoices_page(
     request: Request,
     payment_status: Optional[str] = None,
     invoice_type: Optional[str] = None,
     db: Session = Depends(database.get_db)
 ):
     # Get current user from cookie
-    user = await get_current_user_from_cookie(request, db=db)
+    user = get_user_from_cookie(request, db)
 
     # Redirect to login if not authenticated
     if not user:
@@ -359,37 +309,47 @@ async def invoices_page(
     )
 
 @app.get("/api/invoices/export-excel")
-async def export_invoices_excel(
+def export_invoices_excel(
     payment_status: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    invoice_type: Optional[str] = None,
     db: Session = Depends(database.get_db)
 ):
     """Export invoices to Excel file with detailed information for GST filing"""
     try:
-        # Get all invoices from database
-        invoices = crud.get_all_invoices(db)
-
-        # Filter by payment status if provided
-        if payment_status and payment_status != "all":
-            invoices = [inv for inv in invoices if inv["payment_status"] == payment_status]
+        # Parse the date range (YYYY-MM-DD)
+        start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "Dates must be in YYYY-MM-DD format"})
 
-        # Use the excel_generator module to create the Excel file
+    try:
+        # Use the excel_generator module to create the Excel file; the filters are applied in SQL
         from app.core.excel_generator import export_invoices_to_excel
-        filename, file_path = export_invoices_to_excel(invoices, db, payment_status)
+        filename, content = export_invoices_to_excel(
+            db,
+            payment_status=payment_status,
+            start_date=start,
+            end_date=end,
+            invoice_type=invoice_type,
+            stream=True
+        )
 
-        # Return the Excel file
-        return FileResponse(
-            file_path,
+        # Stream the Excel file
+        return StreamingResponse(
+            content,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            filename=filename
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
     except Exception as e:
         print(f"Error exporting invoices to Excel: {e}")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 @app.get("/invoice/{invoice_id}", response_class=HTMLResponse)
-async def invoice_page(request: Request, invoice_id: str, db: Session = Depends(database.get_db)):
+def invoice_page(request: Request, invoice_id: str, db: Session = Depends(database.get_db)):
     # Get current user from cookie
-    user = await get_current_user_from_cookie(request, db=db)
+    user = get_user_from_cookie(request, db)
 
     # Redirect to login if not authenticated
     if not user:
@@ -478,9 +438,9 @@ async def profile_page(request: Request, db: Session = Depends(database.get_db))
 
 
 @app.get("/users", response_class=HTMLResponse)
-async def users_page(request: Request, db: Session = Depends(database.get_db)):
+def users_page(request: Request, db: Session = Depends(database.get_db)):
     # Get current user from cookie
-    user = await get_current_user_from_cookie(request, db=db)
+    user = get_user_from_cookie(request, db)
 
     # Redirect to login if not authenticated
     if not user:
@@ -504,10 +464,10 @@ async def users_page(request: Request, db: Session = Depends(database.get_db)):
 
 # User management page - only accessible by top_user
 @app.get("/user-management", response_class=HTMLResponse)
-async def user_management_page(request: Request, db: Session = Depends(database.get_db)):
+def user_management_page(request: Request, db: Session = Depends(database.get_db)):
     try:
         # Get current user from cookie
-        user = await get_current_user_from_cookie(request, db=db)
+        user = get_user_from_cookie(request, db)
         print(f"Current user: {user}")
 
         # Redirect to login if not authenticated
@@ -585,7 +545,7 @@ async def add_user_page(request: Request, db: Session = Depends(database.get_db)
 
 # User Management API Endpoints for top_user role
 @app.post("/api/users/create")
-async def create_user_api(
+def create_user_api(
     request: Request,
     name: str = Form(...),
     email: str = Form(...),
@@ -598,7 +558,7 @@ async def create_user_api(
         print(f"Received create user request with data: name={name}, email={email}, phone={phone}, role={role}")
 
         # Get current user from cookie
-        current_user = await get_current_user_from_cookie(request, db=db)
+        current_user = get_user_from_cookie(request, db)
         print(f"Current user: {current_user}")
 
         if not current_user or current_user.role not in ["top_user", "admin"]:
@@ -678,7 +638,7 @@ async def create_user_api(
 
 
 @app.post("/api/users/update/{user_id}")
-async def update_user_api(
+def update_user_api(
     user_id: int,
     request: Request,
     name: str = Form(None),
@@ -692,7 +652,7 @@ async def update_user_api(
         print(f"Received update user request for ID {user_id} with data: name={name}, email={email}, phone={phone}, role={role}")
 
         # Get current user from cookie
-        current_user = await get_current_user_from_cookie(request, db=db)
+        current_user = get_user_from_cookie(request, db)
         print(f"Current user: {current_user}")
 
         if not current_user or current_user.role not in ["top_user", "admin"]:
@@ -762,7 +722,7 @@ async def update_user_api(
         )
 
 @app.post("/api/users/delete/{user_id}")
-async def delete_user_api(
+def delete_user_api(
     user_id: int,
     request: Request,
     db: Session = Depends(database.get_db)
@@ -770,7 +730,7 @@ async def delete_user_api(
     """Delete a user"""
     try:
         # Get current user from cookie
-        current_user = await get_current_user_from_cookie(request, db=db)
+        current_user = get_user_from_cookie(request, db)
         if not current_user or current_user.role not in ["top_user", "admin"]:
             print(f"Authorization failed: User is {'not authenticated' if not current_user else f'not authorized (role: {current_user.role})'}")
             return JSONResponse(
@@ -815,7 +775,7 @@ async def delete_user_api(
         )
 
 @app.get("/api/users/{user_id}")
-async def get_user_api(
+def get_user_api(
     user_id: int,
     request: Request,
     db: Session = Depends(database.get_db)
@@ -825,7 +785,7 @@ async def get_user_api(
         print(f"Fetching user with ID: {user_id}")
 
         # Get current user from cookie
-        current_user = await get_current_user_from_cookie(request, db=db)
+        current_user = get_user_from_cookie(request, db)
         print(f"Current user: {current_user}")
 
         if not current_user or current_user.role not in ["top_user", "admin"]:
@@ -866,7 +826,7 @@ async def get_user_api(
         )
 
 @app.post("/api/users/reset-password/{user_id}")
-async def reset_password_api(
+def reset_password_api(
     user_id: int,
     request: Request,
     db: Session = Depends(database.get_db)
@@ -874,7 +834,7 @@ async def reset_password_api(
     """Reset a user's password and set first_login flag to true"""
     try:
         # Get current user from cookie
-        current_user = await get_current_user_from_cookie(request, db=db)
+        current_user = get_user_from_cookie(request, db)
         if not current_user or current_user.role not in ["top_user", "admin"]:
             print(f"Authorization failed: User is {'not authenticated' if not current_user else f'not authorized (role: {current_user.role})'}")
             return JSONResponse(
@@ -905,6 +865,7 @@ async def reset_password_api(
         user.first_login = True
         db.commit()
         db.refresh(user)
+        user_cache.invalidate(user.email)
 
         return JSONResponse(
             content={
@@ -921,97 +882,45 @@ async def reset_password_api(
         )
 
 
-@app.get("/insights", response_class=HTMLResponse)
-async def insights_page(request: Request, db: Session = Depends(database.get_db)):
-    # Get current user from cookie
-    user = await get_current_user_from_cookie(request, db=db)
-
-    # Redirect to login if not authenticated
-    if not user:
-        return RedirectResponse(url="/login?next=/insights", status_code=303)
-
-    # Check if user is admin or top_user
-    if user.role not in ["admin", "top_user"]:
-        return RedirectResponse(url="/", status_code=303)
+def _build_insights_context(db: Session) -> dict:
+    """Collect the statistics shown on the insights page
 
-    # Get items from database
-    items = crud.get_all_items(db)
+    This runs blocking queries and aggregation, so the route calls it
+    through the threadpool to keep the event loop free.
+    """
+    # Inventory totals and per-category figures, aggregated in SQL
+    inventory = crud.get_inventory_summary(db)
 
     # Get sales statistics
     sales_stats = crud.get_sales_stats(db)
 
     # Calculate total inventory count
-    total_inventory = sum(item.quantity for item in items)
-
-    # Calculate unique categories and organize items by category
-    categories = set()
-    category_items = {}
-    category_values = {}
-
-    for item in items:
-        category = None
-        if hasattr(item, 'category') and item.category:
-            category = item.category
-        else:
-            # Extract first word as category (simplified approach)
-            if hasattr(item, 'item_name') and item.item_name:
-                category = item.item_name.split()[0] if item.item_name.split() else "Other"
-
-        if category:
-            categories.add(category)
-
-            # Add to category items count
-            if category not in category_items:
-                category_items[category] = 0
-            category_items[category] += 1
+    total_inventory = inventory["total_inventory"]
 
-            # Add to category value (quantity * purchase price)
-            if category not in category_values:
-                category_values[category] = 0
-            category_values[category] += item.quantity * item.purchase_price_per_unit
+    # Items are grouped by the first word of their name (there is no category column)
+    category_items = inventory["categories"]
+    category_values = inventory["category_values"]
 
     # Get low stock items (quantity < 5)
-    low_stock_items = [item for item in items if item.quantity < 5]
+    low_stock_items = crud.get_low_stock_items(db, threshold=5)
 
-    # Get all invoices for sales trend data
-    all_invoices = crud.get_all_invoices(db, limit=1000)  # Get more invoices for better data
-
-    # Prepare monthly sales data
+    # Read the pre-aggregated monthly rollups instead of scanning history
     import calendar
     from datetime import datetime
 
-    # Initialize monthly sales data with zeros
     current_year = datetime.now().year
-    monthly_sales = {month: 0 for month in range(1, 13)}
-
-    # Populate with actual data
-    for invoice in all_invoices:
-        if isinstance(invoice['date'], str):
-            try:
-                date = datetime.strptime(invoice['date'], '%Y-%m-%d')
-            except ValueError:
-                continue
-        else:
-            date = invoice['date']
-
-        if date.year == current_year:
-            monthly_sales[date.month] += invoice['total_amount']
+    current_month = datetime.now().month
+    month_labels = list(calendar.month_name)[1:]  # Get month names
+    rollups = crud.get_insight_rollups(db, current_year)
 
-    # Convert to list format for the chart
-    sales_trend_data = [round(monthly_sales[month], 2) for month in range(1, 13)]
-    sales_trend_labels = list(calendar.month_name)[1:]  # Get month names
+    # Sales trend for the current year
+    sales_trend_data = rollups["monthly_sales"]
+    sales_trend_labels = month_labels
 
     # Get payment method distribution
-    payment_methods = {}
-    for invoice in all_invoices:
-        method = invoice['payment_method']
-        if method not in payment_methods:
-            payment_methods[method] = 0
-        payment_methods[method] += invoice['total_amount']
-
-    # Convert to lists for the chart
-    payment_method_labels = list(payment_methods.keys())
-    payment_method_data = [round(payment_methods[method], 2) for method in payment_method_labels]
+    payment_method_labels = [row["method"] for row in rollups["payment_methods"]]
+    payment_method_data = [row["revenue"] for row in rollups["payment_methods"]]
+    payment_method_collected = [row["collected"] for row in rollups["payment_methods"]]
 
     # Prepare category distribution data
     category_distribution_labels = list(category_items.keys())
@@ -1019,108 +928,61 @@ async def insights_page(request: Request, db: Session = Depends(database.get_db)
 
     # Prepare inventory value distribution data
     inventory_value_labels = list(category_values.keys())
-    inventory_value_data = [round(category_values[category], 2) for category in inventory_value_labels]
-
-    # Get customer statistics
-    customers = crud.get_all_customers(db, limit=1000)
-
-    # Calculate customer statistics
-    total_customers = len(customers)
-    total_receivable = sum(customer.total_amount - customer.amount_paid for customer in customers)
+    inventory_value_data = [category_values[category] for category in inventory_value_labels]
 
-    # Count customers by payment status
-    fully_paid_count = sum(1 for customer in customers if customer.payment_status == "Fully Paid")
-    partially_paid_count = sum(1 for customer in customers if customer.payment_status == "Partially Paid")
-    unpaid_count = sum(1 for customer in customers if customer.payment_status == "Unpaid")
+    # Get customer statistics from SQL aggregates
+    customer_totals = crud.get_customer_stats(db)
+    total_customers = customer_totals["total_customers"]
 
     # Calculate percentage of fully paid customers
-    fully_paid_percentage = (fully_paid_count / total_customers * 100) if total_customers > 0 else 0
-
-    # Count new customers this month
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    new_customers_this_month = sum(
-        1 for customer in customers
-        if customer.created_at.month == current_month and customer.created_at.year == current_year
-    )
+    fully_paid_percentage = (customer_totals["fully_paid_count"] / total_customers * 100) if total_customers > 0 else 0
 
     # Prepare customer growth data (monthly)
-    monthly_customer_growth = {month: 0 for month in range(1, 13)}
-    for customer in customers:
-        if customer.created_at.year == current_year:
-            monthly_customer_growth[customer.created_at.month] += 1
-
-    customer_growth_labels = list(calendar.month_name)[1:]  # Get month names
-    customer_growth_data = [monthly_customer_growth[month] for month in range(1, 13)]
+    customer_growth_labels = month_labels
+    customer_growth_data = rollups["monthly_customers"]
+    new_customers_this_month = customer_growth_data[current_month - 1]
 
     # Prepare customer source distribution data (placeholder - add source field to customer model)
+    # Customers have no source field yet, so every customer counts as "Direct"
     customer_source_labels = ["Direct", "Referral", "Website", "Social Media", "Advertisement", "Other"]
-    customer_source_data = [
-        sum(1 for customer in customers if getattr(customer, 'source', 'Direct') == 'Direct'),
-        sum(1 for customer in customers if getattr(customer, 'source', '') == 'Referral'),
-        sum(1 for customer in customers if getattr(customer, 'source', '') == 'Website'),
-        sum(1 for customer in customers if getattr(customer, 'source', '') == 'Social Media'),
-        sum(1 for customer in customers if getattr(customer, 'source', '') == 'Advertisement'),
-        sum(1 for customer in customers if getattr(customer, 'source', '') not in ['Direct', 'Referral', 'Website', 'Social Media', 'Advertisement'])
-    ]
+    customer_source_data = [total_customers, 0, 0, 0, 0, 0]
 
-    # Get enquiry statistics
-    enquiries = crud.get_all_enquiries(db, limit=1000)
-
-    # Calculate enquiry statistics
-    total_enquiries = len(enquiries)
-
-    # Count enquiries by status (using quotation_given as a proxy for status)
-    open_count = sum(1 for enquiry in enquiries if not enquiry.quotation_given)
+    # Get enquiry statistics (using quotation_given as a proxy for status)
+    total_enquiries = rollups["total_enquiries"]
+    converted_count = rollups["total_conversions"]
+    open_count = total_enquiries - converted_count
     in_progress_count = 0  # Placeholder - add status field to enquiry model
-    converted_count = sum(1 for enquiry in enquiries if enquiry.quotation_given)
     closed_count = 0  # Placeholder - add status field to enquiry model
 
     # Calculate conversion rate
     conversion_rate = (converted_count / total_enquiries * 100) if total_enquiries > 0 else 0
 
     # Prepare enquiry trend data (monthly)
-    monthly_enquiry_trend = {month: 0 for month in range(1, 13)}
-    for enquiry in enquiries:
-        if enquiry.created_at.year == current_year:
-            monthly_enquiry_trend[enquiry.created_at.month] += 1
-
-    enquiry_trend_labels = list(calendar.month_name)[1:]  # Get month names
-    enquiry_trend_data = [monthly_enquiry_trend[month] for month in range(1, 13)]
+    enquiry_trend_labels = month_labels
+    enquiry_trend_data = rollups["monthly_enquiries"]
 
     # Prepare conversion rate data (monthly)
-    monthly_conversion_rates = []
-    for month in range(1, 13):
-        month_enquiries = sum(1 for enquiry in enquiries
-                             if enquiry.created_at.month == month and enquiry.created_at.year == current_year)
-        month_conversions = sum(1 for enquiry in enquiries
-                               if enquiry.created_at.month == month and enquiry.created_at.year == current_year
-                               and enquiry.quotation_given)
-
-        if month_enquiries > 0:
-            rate = (month_conversions / month_enquiries) * 100
-        else:
-            rate = 0
-        monthly_conversion_rates.append(round(rate, 1))
-
-    conversion_rate_labels = list(calendar.month_name)[1:]  # Get month names
-    conversion_rate_data = monthly_conversion_rates
+    conversion_rate_labels = month_labels
+    conversion_rate_data = [
+        round(conversions / enquiries * 100, 1) if enquiries > 0 else 0
+        for enquiries, conversions in zip(rollups["monthly_enquiries"], rollups["monthly_conversions"])
+    ]
 
     # Calculate average response time (placeholder - add response_time field to enquiry model)
     avg_response_time = "24 hours"  # Placeholder
 
     # Count open enquiries
-    open_enquiries = sum(1 for enquiry in enquiries if not enquiry.quotation_given)
+    open_enquiries = open_count
 
     # Create customer stats dictionary
     customer_stats = {
         "total_customers": total_customers,
-        "total_receivable": total_receivable,
+        "total_receivable": customer_totals["total_receivable"],
         "fully_paid_percentage": fully_paid_percentage,
         "new_customers_this_month": new_customers_this_month,
-        "fully_paid_count": fully_paid_count,
-        "partially_paid_count": partially_paid_count,
-        "unpaid_count": unpaid_count
+        "fully_paid_count": customer_totals["fully_paid_count"],
+        "partially_paid_count": customer_totals["partially_paid_count"],
+        "unpaid_count": customer_totals["unpaid_count"]
     }
 
     # Create enquiry stats dictionary
@@ -1149,220 +1011,74 @@ async def insights_page(request: Request, db: Session = Depends(database.get_db)
             "top_vendors": []
         }
 
-    return templates.TemplateResponse(
-        "insights.html",
-        {
-            "request": request,
-            "user": user,
-            "items": items,
-            "sales_stats": sales_stats,
-            "total_inventory": total_inventory,
-            "categories": len(categories),
-            "low_stock_items": low_stock_items,
-            "low_stock_count": len(low_stock_items),
-            # Chart data for inventory
-            "sales_trend_labels": sales_trend_labels,
-            "sales_trend_data": sales_trend_data,
-            "category_distribution_labels": category_distribution_labels,
-            "category_distribution_data": category_distribution_data,
-            "payment_method_labels": payment_method_labels,
-            "payment_method_data": payment_method_data,
-            "inventory_value_labels": inventory_value_labels,
-            "inventory_value_data": inventory_value_data,
-            # Customer statistics
-            "customer_stats": customer_stats,
-            "customer_growth_labels": customer_growth_labels,
-            "customer_growth_data": customer_growth_data,
-            "customer_source_labels": customer_source_labels,
-            "customer_source_data": customer_source_data,
-            # Enquiry statistics
-            "enquiry_stats": enquiry_stats,
-            "enquiry_trend_labels": enquiry_trend_labels,
-            "enquiry_trend_data": enquiry_trend_data,
-            "conversion_rate_labels": conversion_rate_labels,
-            "conversion_rate_data": conversion_rate_data,
-            # Expense statistics
-            "expense_stats": expense_stats
-        }
-    )
+    return {
+        "total_items": inventory["total_items"],
+        "sales_stats": sales_stats,
+        "total_inventory": total_inventory,
+        "categories": len(category_items),
+        "low_stock_items": low_stock_items,
+        "low_stock_count": len(low_stock_items),
+        # Chart data for inventory
+        "sales_trend_labels": sales_trend_labels,
+        "sales_trend_data": sales_trend_data,
+        "category_distribution_labels": category_distribution_labels,
+        "category_distribution_data": category_distribution_data,
+        "payment_method_labels": payment_method_labels,
+        "payment_method_data": payment_method_data,
+        "payment_method_collected": payment_method_collected,
+        "inventory_value_labels": inventory_value_labels,
+        "inventory_value_data": inventory_value_data,
+        # Customer statistics
+        "customer_stats": customer_stats,
+        "customer_growth_labels": customer_growth_labels,
+        "customer_growth_data": customer_growth_data,
+        "customer_source_labels": customer_source_labels,
+        "customer_source_data": customer_source_data,
+        # Enquiry statistics
+        "enquiry_stats": enquiry_stats,
+        "enquiry_trend_labels": enquiry_trend_labels,
+        "enquiry_trend_data": enquiry_trend_data,
+        "conversion_rate_labels": conversion_rate_labels,
+        "conversion_rate_data": conversion_rate_data,
+        # Expense statistics
+        "expense_stats": expense_stats
+    }
 
 
-@app.get("/info", response_class=HTMLResponse)
-async def info_page(request: Request, db: Session = Depends(database.get_db)):
+@app.get("/insights", response_class=HTMLResponse)
+async def insights_page(request: Request, db: Session = Depends(database.get_db)):
     # Get current user from cookie
     user = await get_current_user_from_cookie(request, db=db)
 
     # Redirect to login if not authenticated
     if not user:
-        return RedirectResponse(url="/login?next=/info", status_code=303)
-
-    return templates.TemplateResponse("info.html", {"request": request, "user": user})
-
-
-@app.post("/api/checkout")
-async def process_checkout(
-    buyer_name: str = Form(...),
-    buyer_gst: str = Form(""),  # Optional field
-    buyer_address: str = Form(...),
-    buyer_phone: str = Form(...),
-    buyer_email: str = Form(""),  # Optional field
-    invoice_date: str = Form(...),  # Added invoice date field
-    payment_method: str = Form(...),
-    payment_status: str = Form(...),  # Fully Paid, Partially Paid, Unpaid
-    amount_paid: str = Form(None),  # Optional, will be set based on payment_status
-    cart_items: str = Form(...),
-    db: Session = Depends(database.get_db)
-):
-    try:
-        # Parse cart items
-        items = json.loads(cart_items)
-
-        # Calculate totals with discounts
-        subtotal = sum(item["price"] * item["quantity"] for item in items)
-
-        # Calculate total discount
-        total_discount = sum(
-            (item["price"] * item["quantity"]) * ((item.get("discount", 0) or 0) / 100)
-            for item in items
-        )
-
-        # Calculate discounted subtotal
-        discounted_subtotal = subtotal - total_discount
-
-        # Calculate GST amount on discounted subtotal and round to 2 decimal places
-        gst_amount = sum(
-            round(
-                ((item["price"] * item["quantity"]) -
-                 ((item["price"] * item["quantity"]) * ((item.get("discount", 0) or 0) / 100))) *
-                (item["gst_rate"] / 100),
-                2
-            )
-            for item in items
-        )
-
-        total = discounted_subtotal + gst_amount
-
-        # Round all values to 2 decimal places
-        subtotal = round(subtotal, 2)
-        total_discount = round(total_discount, 2)
-        discounted_subtotal = round(discounted_subtotal, 2)
-        gst_amount = round(gst_amount, 2)
-        total = round(total, 2)
-
-        # Handle amount paid based on payment status
-        if payment_status == "Fully Paid":
-            amount_paid_value = total
-        elif payment_status == "Unpaid":
-            amount_paid_value = 0.0
-        else:  # Partially Paid
-            # Convert amount_paid to float, default to 0 if empty or invalid
-            try:
-                amount_paid_value = float(amount_paid) if amount_paid else 0.0
-                amount_paid_value = round(amount_paid_value, 2)
-
-                # Validate amount paid is not greater than total
-                if amount_paid_value > total:
-                    amount_paid_value = total
-                    payment_status = "Fully Paid"
-                elif amount_paid_value <= 0:
-                    amount_paid_value = 0.0
-                    payment_status = "Unpaid"
-            except ValueError:
-                amount_paid_value = 0.0
-                payment_status = "Unpaid"
-
-        # Generate invoice number
-        invoice_number = crud.generate_invoice_number(db)
-
-        # Set PDF path
-        pdf_path = f"invoices/{invoice_number}.pdf"
-
-        # Parse the invoice date from the form
-        try:
-            # Convert string date to datetime object
-            invoice_date_obj = datetime.strptime(invoice_date, '%Y-%m-%d')
-        except ValueError:
-            # If date parsing fails, use current date
-            invoice_date_obj = datetime.now()
-
-        # Create invoice data
-        invoice_data = {
-            "invoice_number": invoice_number,
-            "date": invoice_date_obj,  # Use the parsed date
-            "customer_name": buyer_name,
-            "customer_gst": buyer_gst,
-            "customer_address": buyer_address,
-            "customer_phone": buyer_phone,
-            "customer_email": buyer_email,
-            "payment_method": payment_method,
-            "payment_status": payment_status,
-            "amount_paid": amount_paid_value,
-            "items": [],
-            "subtotal": subtotal,
-            "total_discount": total_discount,
-            "discounted_subtotal": discounted_subtotal,
-            "total_gst": gst_amount,
-            "total_amount": total,
-            "pdf_path": pdf_path
-        }
-
-        # Add items to invoice
-        for item in items:
-            item_subtotal = item["price"] * item["quantity"]
-
-            # Get discount percentage (default to 0 if not present)
-            discount_percent = item.get("discount", 0) or 0
-
-            # Calculate discount amount
-            discount_amount = round(item_subtotal * (discount_percent / 100), 2)
-
-            # Calculate discounted subtotal
-            discounted_subtotal = item_subtotal - discount_amount
-
-            # Round GST amount to 2 decimal places (calculated on discounted amount)
-            item_gst = round(discounted_subtotal * (item["gst_rate"] / 100), 2)
+        return RedirectResponse(url="/login?next=/insights", status_code=303)
 
-            # Calculate total with GST
-            item_total = round(discounted_subtotal + item_gst, 2)
+    # Check if user is admin or top_user
+    if user.role not in ["admin", "top_user"]:
+        return RedirectResponse(url="/", status_code=303)
 
-            # Get item details from database
-            db_item = crud.get_item(db, item["id"])
-            hsn_code = db_item.hsn_code if db_item else "N/A"
+    # Gather the statistics in a worker thread
+    context = await run_in_threadpool(_build_insights_context, db)
+    context.update({"request": request, "user": user})
 
-            invoice_data["items"].append({
-                "item_code": item["id"],
-                "item_name": item["item_name"],
-                "hsn_code": hsn_code,
-                "price": round(item["price"], 2),
-                "quantity": item["quantity"],
-                "discount_percent": discount_percent,
-                "discount_amount": discount_amount,
-                "discounted_subtotal": discounted_subtotal,
-                "gst_rate": item["gst_rate"],
-                "gst_amount": item_gst,
-                "total": item_total
-            })
+    return templates.TemplateResponse("insights.html", context)
 
-            # Stock is already reserved when added to cart, so we don't need to update it again
-            # Just verify that the item exists
-            if not db_item:
-                print(f"Warning: Item {item['id']} not found in database")
 
-        # Save invoice to database
-        invoice = crud.create_invoice(db, invoice_data)
+@app.get("/info", response_class=HTMLResponse)
+async def info_page(request: Request, db: Session = Depends(database.get_db)):
+    # Get current user from cookie
+    user = await get_current_user_from_cookie(request, db=db)
 
-        # Generate PDF invoice
-        generate_pdf_invoice(invoice)
+    # Redirect to login if not authenticated
+    if not user:
+        return RedirectResponse(url="/login?next=/info", status_code=303)
 
-        # Update sales counter
-        crud.update_sales_counter(db, total)
+    return templates.TemplateResponse("info.html", {"request": request, "user": user})
 
-        return {"success": True, "invoice_id": invoice.invoice_number}
-    except Exception as e:
-        return {"success": False, "message": str(e)}
 
 @app.get("/api/invoices/view/{invoice_id}")
-async def view_invoice_pdf(invoice_id: str, db: Session = Depends(database.get_db)):
+def view_invoice_pdf(invoice_id: str, db: Session = Depends(database.get_db)):
     try:
         # Get invoice from database
         invoice = crud.get_invoice(db, invoice_id)
@@ -1373,20 +1089,14 @@ async def view_invoice_pdf(invoice_id: str, db: Session = Depends(database.get_d
         pdf_path = invoice.get("pdf_path", f"invoices/{invoice_id}.pdf")
         filename = os.path.basename(pdf_path)
 
-        # Check if PDF exists and has valid size
-        if not os.path.exists(pdf_path) or os.path.getsize(pdf_path) < 1000:  # Check if file is too small
-            print(f"PDF file missing or too small: {pdf_path}, size: {os.path.getsize(pdf_path) if os.path.exists(pdf_path) else 0} bytes")
-
-            # Try to regenerate the PDF
-            from app.core.pdf_generator import generate_pdf_invoice
-            print(f"Regenerating PDF for invoice {invoice_id}")
-            generate_pdf_invoice(invoice)
+        # Wait for a queued render, or queue one if the PDF is missing or too small
+        pdf_jobs.ensure_invoice_pdf(db, invoice_id, pdf_path)
 
-            # Check again if PDF exists and has valid size
-            if not os.path.exists(pdf_path):
-                return JSONResponse(status_code=404, content={"error": "Invoice PDF not found and could not be generated"})
-            elif os.path.getsize(pdf_path) < 1000:
-                return JSONResponse(status_code=500, content={"error": "Generated PDF file is too small and may be corrupted"})
+        # Check if PDF exists and has valid size
+        if not os.path.exists(pdf_path):
+            return JSONResponse(status_code=404, content={"error": "Invoice PDF not found and could not be generated"})
+        elif os.path.getsize(pdf_path) < 1000:
+            return JSONResponse(status_code=500, content={"error": "Generated PDF file is too small and may be corrupted"})
 
         # Use the mounted static directory to serve the file
         return RedirectResponse(url=f"/invoice-files/{filename}", status_code=303)
@@ -1398,7 +1108,7 @@ async def view_invoice_pdf(invoice_id: str, db: Session = Depends(database.get_d
         return JSONResponse(status_code=500, content={"error": f"Error viewing PDF: {str(e)}", "details": error_details})
 
 @app.get("/api/invoices/download/{invoice_id}")
-async def download_invoice_pdf(invoice_id: str, db: Session = Depends(database.get_db)):
+def download_invoice_pdf(invoice_id: str, db: Session = Depends(database.get_db)):
     try:
         # Get invoice from database
         invoice = crud.get_invoice(db, invoice_id)
@@ -1409,20 +1119,14 @@ async def download_invoice_pdf(invoice_id: str, db: Session = Depends(database.g
         pdf_path = invoice.get("pdf_path", f"invoices/{invoice_id}.pdf")
         filename = os.path.basename(pdf_path)
 
-        # Check if PDF exists and has valid size
-        if not os.path.exists(pdf_path) or os.path.getsize(pdf_path) < 1000:  # Check if file is too small
-            print(f"PDF file missing or too small: {pdf_path}, size: {os.path.getsize(pdf_path) if os.path.exists(pdf_path) else 0} bytes")
-
-            # Try to regenerate the PDF
-            from app.core.pdf_generator import generate_pdf_invoice
-            print(f"Regenerating PDF for invoice {invoice_id}")
-            generate_pdf_invoice(invoice)
+        # Wait for a queued render, or queue one if the PDF is missing or too small
+        pdf_jobs.ensure_invoice_pdf(db, invoice_id, pdf_path)
 
-            # Check again if PDF exists and has valid size
-            if not os.path.exists(pdf_path):
-                return JSONResponse(status_code=404, content={"error": "Invoice PDF not found and could not be generated"})
-            elif os.path.getsize(pdf_path) < 1000:
-                return JSONResponse(status_code=500, content={"error": "Generated PDF file is too small and may be corrupted"})
+        # Check if PDF exists and has valid size
+        if not os.path.exists(pdf_path):
+            return JSONResponse(status_code=404, content={"error": "Invoice PDF not found and could not be generated"})
+        elif os.path.getsize(pdf_path) < 1000:
+            return JSONResponse(status_code=500, content={"error": "Generated PDF file is too small and may be corrupted"})
 
         # For download, we'll still use FileResponse to set the content-disposition header
         return FileResponse(
@@ -1437,123 +1141,8 @@ async def download_invoice_pdf(invoice_id: str, db: Session = Depends(database.g
         print(f"Error details: {error_details}")
         return JSONResponse(status_code=500, content={"error": f"Error downloading PDF: {str(e)}", "details": error_details})
 
-@app.post("/api/reserve-stock")
-async def reserve_stock(
-    request: Request,
-    data: dict = Body(...),
-    db: Session = Depends(database.get_db)
-):
-    """Temporarily reserve stock for an item"""
-    try:
-        item_code = data.get("item_code")
-        quantity = data.get("quantity", 1)
-
-        if not item_code:
-            return JSONResponse(status_code=400, content={"success": False, "message": "Item code is required"})
-
-        # Get the item from the database
-        item = crud.get_item(db, item_code)
-        if not item:
-            return JSONResponse(status_code=404, content={"success": False, "message": "Item not found"})
-
-        # Check if there's enough stock
-        if item.quantity < quantity:
-            return JSONResponse(status_code=400, content={
-                "success": False,
-                "message": f"Not enough stock. Only {item.quantity} units available."
-            })
-
-        # Temporarily reduce the stock
-        result = crud.update_item_quantity(db, item_code, -quantity)
-        if result:
-            # Return the updated quantity in the response
-            return JSONResponse(content={
-                "success": True,
-                "message": "Stock reserved successfully",
-                "new_quantity": result.quantity
-            })
-        else:
-            return JSONResponse(status_code=500, content={"success": False, "message": "Failed to reserve stock"})
-    except Exception as e:
-        print(f"Error reserving stock: {e}")
-        return JSONResponse(status_code=500, content={"success": False, "message": str(e)})
-
-@app.post("/api/release-stock")
-async def release_stock(
-    data: dict = Body(...),
-    db: Session = Depends(database.get_db)
-):
-    """Release reserved stock for an item"""
-    try:
-        item_code = data.get("item_code")
-        quantity = data.get("quantity", 1)
-
-        if not item_code:
-            return JSONResponse(status_code=400, content={"success": False, "message": "Item code is required"})
-
-        # Get the item from the database
-        item = crud.get_item(db, item_code)
-        if not item:
-            return JSONResponse(status_code=404, content={"success": False, "message": "Item not found"})
-
-        # Return the stock
-        result = crud.update_item_quantity(db, item_code, quantity)
-        if result:
-            # Return the updated quantity in the response
-            return JSONResponse(content={
-                "success": True,
-                "message": "Stock released successfully",
-                "new_quantity": result.quantity
-            })
-        else:
-            return JSONResponse(status_code=500, content={"success": False, "message": "Failed to release stock"})
-    except Exception as e:
-        print(f"Error releasing stock: {e}")
-        return JSONResponse(status_code=500, content={"success": False, "message": str(e)})
-
-@app.post("/api/invoices/payment/{invoice_id}")
-async def add_payment_to_invoice(
-    invoice_id: str,
-    amount: float = Form(...),
-    payment_method: str = Form(...),
-    notes: str = Form(""),
-    db: Session = Depends(database.get_db)
-):
-    """Add a payment to an existing invoice"""
-    try:
-        # Create payment data
-        payment_data = {
-            "amount": amount,
-            "payment_method": payment_method,
-            "notes": notes,
-            "payment_date": datetime.now()
-        }
-
-        # Add payment to invoice
-        invoice = crud.add_payment(db, invoice_id, payment_data)
-
-        if not invoice:
-            return JSONResponse(status_code=404, content={"success": False, "message": "Invoice not found"})
-
-        # Regenerate the PDF with updated payment information
-        invoice_data = crud.get_invoice(db, invoice_id)
-        generate_pdf_invoice(invoice_data)
-
-        return JSONResponse(content={
-            "success": True,
-            "message": "Payment added successfully",
-            "invoice_id": invoice_id,
-            "payment_status": invoice.payment_status,
-            "amount_paid": invoice.amount_paid,
-            "balance_due": round(invoice.total_amount - invoice.amount_paid, 2)
-        })
-    except Exception as e:
-        print(f"Error adding payment: {e}")
-        return JSONResponse(status_code=500, content={"success": False, "message": str(e)})
-
-
 @app.delete("/api/invoices/delete/{invoice_id}")
-async def delete_invoice_api(invoice_id: str, db: Session = Depends(database.get_db)):
+def delete_invoice_api(invoice_id: str, db: Session = Depends(database.get_db)):
     """Delete an invoice"""
     try:
         # Get invoice from database
@@ -1580,7 +1169,7 @@ async def delete_invoice_api(invoice_id: str, db: Session = Depends(database.get
 
 
 @app.delete("/api/enquiries/delete/{enquiry_id}")
-async def delete_enquiry_api(enquiry_id: int, db: Session = Depends(database.get_db)):
+def delete_enquiry_api(enquiry_id: int, db: Session = Depends(database.get_db)):
     """Delete an enquiry directly via API"""
     try:
         print(f"Attempting to delete enquiry with ID: {enquiry_id}")
@@ -1605,7 +1194,7 @@ async def delete_enquiry_api(enquiry_id: int, db: Session = Depends(database.get
 
 
 @app.delete("/api/inventory/delete/{item_code}")
-async def delete_inventory_item(item_code: str, db: Session = Depends(database.get_db)):
+def delete_inventory_item(item_code: str, db: Session = Depends(database.get_db)):
     """Delete an inventory item directly"""
     try:
         print(f"Attempting to delete inventory item: {item_code}")
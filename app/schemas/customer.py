@@ -11,7 +11,7 @@ class CustomerPaymentBase(BaseModel):
 
 
 class CustomerPaymentCreate(CustomerPaymentBase):
-    pass
+    idempotency_key: Optional[str] = None  # Or the Idempotency-Key header
 
 
 class CustomerPayment(CustomerPaymentBase):
@@ -15,6 +15,56 @@ try {
     cart = [];
 }
 
+// Add click handlers to the "Add to Cart" and product "View Details" buttons
+// inside root (the document, or cards added to the page later)
+function bindCardButtons(root) {
+    root.querySelectorAll('.add-to-cart-btn').forEach(button => {
+        button.addEventListener('click', function() {
+            const itemId = this.getAttribute('data-id');
+            const itemName = this.getAttribute('data-name');
+            const price = this.getAttribute('data-price');
+            const gstRate = this.getAttribute('data-gst');
+            const quantity = this.getAttribute('data-quantity');
+            const itemType = this.getAttribute('data-type') || 'product';
+
+            addToCart(itemId, itemName, price, gstRate, parseInt(quantity, 10), itemType);
+        });
+    });
+
+    // Service buttons use inline onclick attributes in the HTML
+    root.querySelectorAll('.view-details-btn:not(.service-details-btn)').forEach(button => {
+        button.onclick = function(e) {
+            e.preventDefault();
+            e.stopPropagation();
+            openProductModal(this.getAttribute('data-id'));
+            return false;
+        };
+    });
+}
+
+// Random ID for carts and idempotency keys (randomUUID needs HTTPS)
+function newRandomId() {
+    return (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
+// ID of this browser's cart; the server keeps stock holds per cart
+function getCartId() {
+    let cartId = localStorage.getItem('cartId');
+    if (!cartId) {
+        cartId = newRandomId();
+        localStorage.setItem('cartId', cartId);
+    }
+    return cartId;
+}
+
+// Key sent as the Idempotency-Key header of a checkout or payment. Reuse it
+// when retrying the same submission so the server doesn't record it twice
+function newIdempotencyKey() {
+    return newRandomId();
+}
+
 // Increment quantity in input field
 function incrementQuantity(inputId, maxQuantity) {
     const input = document.getElementById(inputId);
@@ -135,6 +185,7 @@ function reserveStock(itemId, quantity) {
             'Content-Type': 'application/json',
         },
         body: JSON.stringify({
+            cart_id: getCartId(),
             item_code: itemId,
             quantity: quantity
         })
@@ -407,6 +458,7 @@ function releaseStock(itemId, quantity) {
             'Content-Type': 'application/json',
         },
         body: JSON.stringify({
+            cart_id: getCartId(),
             item_code: itemId,
             quantity: quantity
         })
@@ -2073,36 +2125,8 @@ document.addEventListener('DOMContentLoaded', function() {
     // Update cart count
     updateCartCount();
 
-    // Add event listeners to "Add to Cart" buttons
-    const addToCartButtons = document.querySelectorAll('.add-to-cart-btn');
-    addToCartButtons.forEach(button => {
-        button.addEventListener('click', function() {
-            const itemId = this.getAttribute('data-id');
-            const itemName = this.getAttribute('data-name');
-            const price = this.getAttribute('data-price');
-            const gstRate = this.getAttribute('data-gst');
-            const quantity = this.getAttribute('data-quantity');
-            const itemType = this.getAttribute('data-type') || 'product';
-
-            addToCart(itemId, itemName, price, gstRate, parseInt(quantity, 10), itemType);
-        });
-    });
-
-    // Service buttons now use inline onclick attributes in the HTML
-    console.log('Service buttons now use inline onclick attributes');
-
-    // Add direct click handlers to product buttons (non-service buttons)
-    document.querySelectorAll('.view-details-btn:not(.service-details-btn)').forEach(button => {
-        console.log('Adding direct click handler to product button:', button);
-        button.onclick = function(e) {
-            e.preventDefault();
-            e.stopPropagation();
-            const itemId = this.getAttribute('data-id');
-            console.log('Product button clicked directly, id:', itemId);
-            openProductModal(itemId);
-            return false;
-        };
-    });
+    // Add event listeners to "Add to Cart" and "View Details" buttons
+    bindCardButtons(document);
 
     // Add event listener to close modal button
     const closeModalBtn = document.querySelector('.close-modal');
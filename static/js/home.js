@@ -0,0 +1,230 @@
+/**
+ * Home page product and service cards
+ * Cards are loaded a page at a time from the paginated APIs instead of being
+ * rendered with the page, and more are fetched as the user scrolls down.
+ */
+
+function escapeHtml(value) {
+    return String(value === null || value === undefined ? '' : value)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;');
+}
+
+function renderProductCard(item) {
+    const code = escapeHtml(item.item_code);
+    const name = escapeHtml(item.item_name);
+    const inStock = item.quantity > 0;
+
+    // Same markup as the cards the page used to render on the server
+    const actions = inStock ? `
+        <div class="button-group">
+            <button class="add-to-cart-btn" data-id="${code}" data-name="${name}" data-price="${item.selling_price}"
+                data-gst="${item.gst_rate}" data-quantity="${item.quantity}" data-type="product">
+                Add to Cart
+            </button>
+            <button class="add-to-quote-btn" data-id="${code}" data-name="${name}" data-price="${item.selling_price}"
+                data-gst="${item.gst_rate}" data-quantity="${item.quantity}" data-type="product">
+                Add to Quote
+            </button>
+        </div>` : `
+        <button class="delete-item-btn" data-id="${code}" data-name="${name}">Delete Item</button>`;
+
+    return `
+        <div class="item-card" style="display: flex;">
+            <div class="item-image">
+                <div class="placeholder-image">
+                    <span>${escapeHtml(String(item.item_name || '').slice(0, 1))}</span>
+                </div>
+            </div>
+            <div class="item-details">
+                <h3>${name}</h3>
+                <div class="item-code">Code: ${code}</div>
+                <div class="item-meta">
+                    <div class="price-row">
+                        <span class="price-label">Buy Price:</span>
+                        <span class="price-value">₹${escapeHtml(item.purchase_price_per_unit)}</span>
+                    </div>
+                    <div class="price-row">
+                        <span class="price-label">GST:</span>
+                        <span class="price-value">${escapeHtml(item.gst_rate)}%</span>
+                    </div>
+                    <div class="price-row">
+                        <span class="price-label">Margin:</span>
+                        <span class="price-value">${escapeHtml(item.margin)}%</span>
+                    </div>
+                    <div class="price-row">
+                        <span class="price-label">Selling Price:</span>
+                        <span class="price-value">₹${item.selling_price}</span>
+                    </div>
+                </div>
+                <div class="item-stock ${item.quantity < 5 ? 'low-stock' : ''}" data-id="${code}">
+                    ${inStock ? `<span>In Stock: ${item.quantity}</span>` : '<span class="out-of-stock">Out of Stock</span>'}
+                </div>
+            </div>
+            <div class="item-actions">
+                <div class="quantity-input-container">
+                    <button class="quantity-btn-small qty-decrement">-</button>
+                    <input type="number" id="qty-${code}" class="quantity-input" value="1" min="1" max="${item.quantity}" ${inStock ? '' : 'disabled'}>
+                    <button class="quantity-btn-small qty-increment">+</button>
+                </div>
+                ${actions}
+                <button class="view-details-btn" data-id="${code}">View Details</button>
+            </div>
+        </div>`;
+}
+
+function renderServiceCard(service) {
+    const code = escapeHtml(service.service_code);
+    const name = escapeHtml(service.service_name);
+
+    return `
+        <div class="item-card service-card" style="display: flex;">
+            <div class="item-image service-image">
+                <div class="placeholder-image">
+                    <span>${escapeHtml(String(service.service_name || '').slice(0, 1))}</span>
+                </div>
+            </div>
+            <div class="item-details">
+                <h3>${name}</h3>
+                <div class="item-code">Code: ${code}</div>
+                <div class="item-meta">
+                    <div class="price-row">
+                        <span class="price-label">Price:</span>
+                        <span class="price-value">₹${escapeHtml(service.price)}</span>
+                    </div>
+                    <div class="price-row">
+                        <span class="price-label">GST:</span>
+                        <span class="price-value">${escapeHtml(service.gst_rate)}%</span>
+                    </div>
+                    <div class="price-row">
+                        <span class="price-label">Total Price:</span>
+                        <span class="price-value">₹${service.total_price}</span>
+                    </div>
+                </div>
+                <div class="service-employee">
+                    <span>Employee: ${escapeHtml(service.employee_name)}</span>
+                </div>
+            </div>
+            <div class="item-actions">
+                <div class="quantity-input-container">
+                    <button class="quantity-btn-small qty-decrement">-</button>
+                    <input type="number" id="qty-service-${code}" class="quantity-input" value="1" min="1">
+                    <button class="quantity-btn-small qty-increment">+</button>
+                </div>
+                <div class="button-group">
+                    <button class="add-to-cart-btn service-btn" data-id="${code}" data-name="${name}"
+                        data-price="${escapeHtml(service.price)}" data-gst="${escapeHtml(service.gst_rate)}" data-type="service">
+                        Add to Cart
+                    </button>
+                    <button class="add-to-quote-btn service-btn" data-id="${code}" data-name="${name}"
+                        data-price="${escapeHtml(service.price)}" data-gst="${escapeHtml(service.gst_rate)}" data-type="service">
+                        Add to Quote
+                    </button>
+                </div>
+                <button class="view-details-btn service-details-btn" data-id="${service.id}">View Details</button>
+            </div>
+        </div>`;
+}
+
+// Handlers for the buttons that used inline onclick attributes
+function bindCardExtras(card) {
+    const input = card.querySelector('.quantity-input');
+    const decrement = card.querySelector('.qty-decrement');
+    const increment = card.querySelector('.qty-increment');
+    if (input && decrement && increment) {
+        const max = input.getAttribute('max');
+        decrement.addEventListener('click', () => decrementQuantity(input.id));
+        increment.addEventListener('click', () => incrementQuantity(input.id, max ? parseInt(max, 10) : undefined));
+    }
+
+    const deleteButton = card.querySelector('.delete-item-btn');
+    if (deleteButton) {
+        deleteButton.addEventListener('click', function() {
+            confirmDeleteItem(this.getAttribute('data-id'), this.getAttribute('data-name'));
+        });
+    }
+
+    const serviceDetails = card.querySelector('.service-details-btn');
+    if (serviceDetails) {
+        serviceDetails.addEventListener('click', function() {
+            openServiceModal(parseInt(this.getAttribute('data-id'), 10));
+        });
+    }
+}
+
+/**
+ * Load cards into a container page by page
+ * @param {HTMLElement} container - .items-container with data-url and data-key
+ * @param {HTMLElement} moreButton - "Load more" button, also used as the scroll trigger
+ * @param {Function} render - Returns the card HTML for one record
+ */
+function setupCardList(container, moreButton, render) {
+    const url = container.getAttribute('data-url');
+    const key = container.getAttribute('data-key');
+    const noItems = container.querySelector('.no-items');
+    let cursor = null;
+    let loading = false;
+    let done = false;
+
+    function loadPage() {
+        if (loading || done) return;
+        loading = true;
+
+        const params = new URLSearchParams({ limit: 48 });
+        if (cursor !== null) params.set('cursor', cursor);
+
+        fetch(`${url}?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                const template = document.createElement('template');
+                template.innerHTML = (data[key] || []).map(render).join('');
+
+                template.content.querySelectorAll('.item-card').forEach(card => {
+                    bindCardButtons(card);
+                    bindQuoteButtons(card);
+                    bindCardExtras(card);
+                });
+                container.appendChild(template.content);
+
+                cursor = data.next_cursor;
+                done = cursor === null || cursor === undefined;
+                moreButton.style.display = done ? 'none' : 'inline-block';
+                if (noItems) {
+                    noItems.style.display = container.querySelector('.item-card') ? 'none' : 'block';
+                }
+            })
+            .catch(error => {
+                console.error(`Error loading ${key}:`, error);
+                moreButton.style.display = 'inline-block';
+            })
+            .finally(() => {
+                loading = false;
+            });
+    }
+
+    moreButton.addEventListener('click', loadPage);
+
+    // Fetch the next page as the end of the list scrolls into view
+    if ('IntersectionObserver' in window) {
+        new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) loadPage();
+        }, { rootMargin: '400px' }).observe(moreButton);
+    }
+
+    loadPage();
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const products = document.getElementById('product-cards');
+    const services = document.getElementById('service-cards');
+
+    if (products) {
+        setupCardList(products, document.getElementById('load-more-products'), renderProductCard);
+    }
+    if (services) {
+        setupCardList(services, document.getElementById('load-more-services'), renderServiceCard);
+    }
+});
@@ -1,13 +1,10 @@
 // Quote management
 let quoteItems = [];
 
-// Load quote from localStorage on page load
-document.addEventListener('DOMContentLoaded', function() {
-    loadQuoteFromStorage();
-    updateQuoteUI();
-
-    // Add event listeners to "Add to Quote" buttons
-    document.querySelectorAll('.add-to-quote-btn').forEach(button => {
+// Add click handlers to the "Add to Quote" buttons inside root (the document,
+// or cards added to the page later)
+function bindQuoteButtons(root) {
+    root.querySelectorAll('.add-to-quote-btn').forEach(button => {
         button.addEventListener('click', function() {
             const itemCode = this.getAttribute('data-id');
             const itemName = this.getAttribute('data-name');
@@ -37,6 +34,15 @@ document.addEventListener('DOMContentLoaded', function() {
             addToQuote(itemCode, itemName, price, gstRate, type, quantity);
         });
     });
+}
+
+// Load quote from localStorage on page load
+document.addEventListener('DOMContentLoaded', function() {
+    loadQuoteFromStorage();
+    updateQuoteUI();
+
+    // Add event listeners to "Add to Quote" buttons
+    bindQuoteButtons(document);
 
     // Close quote popup when clicking outside
     document.addEventListener('click', function(event) {
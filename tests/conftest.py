@@ -0,0 +1,96 @@
+import glob
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The engine opens ./db/sunmax.db, so run the tests from a scratch directory
+# to keep them away from the real database. Static files and templates are
+# also looked up relative to the working directory.
+os.chdir(tempfile.mkdtemp(prefix="sunmax-tests-"))
+os.makedirs("db", exist_ok=True)
+for folder in ("static", "templates"):
+    os.symlink(os.path.join(ROOT, folder), folder)
+
+
+CATALOG_WORDS = ["Solar", "Panel", "Inverter", "Battery", "Cable", "Mount", "Charge", "Controller", "Meter", "Switch"]
+
+
+def seed_catalog(db, rows):
+    """Add rows inventory items named from CATALOG_WORDS, so each word matches a large share"""
+    import random
+    from datetime import date
+
+    from app.db import models
+
+    pick = random.Random(1).choice
+    db.execute(models.InventoryItem.__table__.insert(), [
+        {
+            "item_code": f"SUN{i:06d}", "date": date.today(), "item_name": f"{pick(CATALOG_WORDS)} {pick(CATALOG_WORDS)} {i}",
+            "hsn_code": "8541", "gst_rate": 18.0, "purchase_price_per_unit": 1.0, "quantity": 1,
+            "supplier_name": pick(CATALOG_WORDS),
+        }
+        for i in range(1, rows + 1)
+    ])
+    db.commit()
+
+
+def table_scans(db, run):
+    """
+    Call run() and return the full table scans in the query plans of the
+    SELECT statements it executed (scans of FTS tables and subqueries aside)
+    """
+    from sqlalchemy import event
+
+    from app.db.database import engine
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        run()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    connection = db.connection()
+    tables = {row[0] for row in connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [
+        detail
+        for statement, parameters in statements
+        for *_, detail in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        if detail.startswith("SCAN ") and detail.split()[1] in tables and "VIRTUAL TABLE" not in detail
+    ]
+
+
+@pytest.fixture
+def db():
+    """Session on a fresh, fully migrated database"""
+    from app.db import crud
+    from app.db.database import SessionLocal, engine
+    from app.db.migrate import run_migrations
+    from app.core import user_cache
+
+    engine.dispose()
+    for path in glob.glob("db/sunmax.db*"):
+        os.remove(path)
+    run_migrations()
+
+    crud.invalidate_sales_stats()
+    crud.invalidate_catalog_caches()
+    crud.invalidate_page_counts()
+    user_cache.invalidate()
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
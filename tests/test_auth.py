@@ -0,0 +1,78 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import config
+from app.db import models
+
+
+def _add_user(db, password_hash):
+    db.add(models.User(email="staff@example.com", password=password_hash, name="Staff"))
+    db.commit()
+
+
+def _login(client, password):
+    return client.post("/api/auth/login", data={"username": "staff@example.com", "password": password})
+
+
+def _stored_hash(db):
+    db.expire_all()
+    return db.query(models.User).one().password
+
+
+def _old_hash(outdated):
+    from app.core.auth import pwd_context
+
+    if outdated == "cost":
+        old_context = pwd_context.copy(bcrypt__rounds=4, bcrypt__min_rounds=4, argon2__rounds=1, argon2__min_rounds=1)
+    else:
+        old_context = pwd_context.copy(default="argon2" if config.PASSWORD_HASH_SCHEME == "bcrypt" else "bcrypt")
+    return old_context.hash("secret")
+
+
+@pytest.mark.parametrize("outdated", ["cost", "scheme"])
+def test_outdated_hash_is_replaced_on_a_successful_login_only(db, outdated):
+    from app.core.auth import pwd_context
+    from app.main import app
+
+    old_hash = _old_hash(outdated)
+    _add_user(db, old_hash)
+    client = TestClient(app)
+
+    assert _login(client, "wrong").status_code == 401
+    assert _stored_hash(db) == old_hash
+
+    assert _login(client, "secret").status_code == 200
+    new_hash = _stored_hash(db)
+    assert new_hash != old_hash
+    assert pwd_context.identify(new_hash) == config.PASSWORD_HASH_SCHEME
+    assert not pwd_context.needs_update(new_hash)
+
+    # A current hash is kept as it is
+    assert _login(client, "secret").status_code == 200
+    assert _stored_hash(db) == new_hash
+
+
+def test_login_throughput(db):
+    from app.core.auth import pwd_context
+    from app.main import app
+
+    _add_user(db, pwd_context.hash("secret"))
+    client = TestClient(app)
+    started = time.perf_counter()
+    pwd_context.verify("secret", _stored_hash(db))
+    verify_seconds = time.perf_counter() - started
+
+    logins = 5
+    started = time.perf_counter()
+    for _ in range(logins):
+        assert _login(client, "secret").status_code == 200
+    seconds = time.perf_counter() - started
+
+    print(
+        f"\n{logins / seconds:.1f} logins/s with {config.PASSWORD_HASH_SCHEME} "
+        f"({verify_seconds * 1000:.0f} ms to verify one password)"
+    )
+    # A login costs one verification; a current hash is never rehashed
+    assert seconds / logins < verify_seconds * 1.5
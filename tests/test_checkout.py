@@ -0,0 +1,109 @@
+import json
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.db import crud, models
+from app.db.database import SessionLocal, engine
+
+LINES = 5
+
+
+def _add_items(db):
+    db.add_all([
+        models.InventoryItem(
+            item_code=f"SUN00{i}", date=date.today(), item_name=f"Panel {i}", hsn_code=f"854{i}",
+            gst_rate=18.0, purchase_price_per_unit=100.0, quantity=10,
+        )
+        for i in range(1, LINES + 1)
+    ])
+    db.commit()
+
+
+def _checkout(client, quantities):
+    return client.post("/api/checkout", data={
+        "buyer_name": "Asha", "buyer_address": "Pune", "buyer_phone": "9800000000",
+        "invoice_date": date.today().isoformat(), "payment_method": "Cash", "payment_status": "Fully Paid",
+        "cart_id": "page-1",
+        "cart_items": json.dumps([
+            {"id": item_code, "item_name": item_code, "price": 100.0, "quantity": quantity, "gst_rate": 18.0}
+            for item_code, quantity in quantities.items()
+        ]),
+    }).json()
+
+
+def _stock(db):
+    db.expire_all()
+    return {item.item_code: item.quantity for item in db.query(models.InventoryItem)}
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    from app.core import pdf_jobs
+    from app.main import app
+
+    monkeypatch.setattr(pdf_jobs, "start_job", lambda job: None)
+    _add_items(db)
+    client = TestClient(app)
+    # Part of the cart is held, the rest is taken at checkout
+    for item_code in ("SUN001", "SUN002"):
+        assert client.post("/api/reserve-stock", json={"cart_id": "page-1", "item_code": item_code, "quantity": 2}).json()["success"]
+    return client
+
+
+def test_multi_line_checkout_looks_up_hsn_codes_once_and_commits_once(db, client):
+    statements, commits = [], []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def record_commit(session):
+        commits.append(session)
+
+    event.listen(engine, "before_cursor_execute", record_statement)
+    event.listen(SessionLocal, "after_commit", record_commit)
+    try:
+        result = _checkout(client, {f"SUN00{i}": 2 for i in range(1, LINES + 1)})
+    finally:
+        event.remove(engine, "before_cursor_execute", record_statement)
+        event.remove(SessionLocal, "after_commit", record_commit)
+
+    assert result["success"], result
+    hsn_lookups = [statement for statement in statements if "inventory.hsn_code" in statement and "FROM inventory" in statement]
+    assert len(hsn_lookups) == 1
+    assert " IN (" in hsn_lookups[0]
+    assert len(commits) == 1
+    assert [item.hsn_code for item in db.query(models.InvoiceItem).order_by(models.InvoiceItem.item_code)] == [
+        f"854{i}" for i in range(1, LINES + 1)
+    ]
+
+
+def _fail_sales_counter(monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(crud, "_add_to_sales_counter", fail)
+
+
+@pytest.mark.parametrize("failure", ["stock", "write"])
+def test_failed_checkout_leaves_no_invoice_or_stock_change(db, client, monkeypatch, failure):
+    stock = _stock(db)
+    quantities = {f"SUN00{i}": 2 for i in range(1, LINES + 1)}
+    if failure == "stock":
+        # The last line is short of stock, after the others have been claimed
+        quantities[f"SUN00{LINES}"] = 11
+    else:
+        # Every line is claimed and the invoice added before this fails
+        _fail_sales_counter(monkeypatch)
+
+    result = _checkout(client, quantities)
+
+    assert not result["success"]
+    assert db.query(models.Invoice).count() == 0
+    assert db.query(models.InvoiceItem).count() == 0
+    assert db.query(models.PdfRenderJob).count() == 0
+    assert _stock(db) == stock
+    # The cart keeps its holds for another try
+    assert sorted((hold.item_code, hold.quantity) for hold in db.query(models.StockHold)) == [("SUN001", 2), ("SUN002", 2)]
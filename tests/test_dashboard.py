@@ -0,0 +1,107 @@
+import json
+import statistics
+import time
+from datetime import date
+
+from fastapi.testclient import TestClient
+
+from app.core import dashboard
+from app.db import crud, models
+
+
+def _add_item(db, item_code="SUN001", name="Panel 540W", quantity=10):
+    crud.create_item(db, {
+        "item_code": item_code, "date": date.today(), "item_name": name, "hsn_code": "8541",
+        "gst_rate": 18.0, "purchase_price_per_unit": 100.0, "quantity": quantity,
+    })
+
+
+def _checkout(client, quantity):
+    return client.post("/api/checkout", data={
+        "buyer_name": "Asha", "buyer_address": "Pune", "buyer_phone": "9800000000",
+        "invoice_date": date.today().isoformat(), "payment_method": "Cash", "payment_status": "Fully Paid",
+        "cart_items": json.dumps([{
+            "id": "SUN001", "item_name": "Panel 540W", "price": 150.0, "quantity": quantity, "gst_rate": 18.0,
+        }]),
+    }).json()
+
+
+def test_summary_reflects_inventory_changes_and_new_invoices(db, monkeypatch):
+    from app.core import pdf_jobs
+    from app.main import app
+
+    monkeypatch.setattr(pdf_jobs, "start_job", lambda job: None)
+    client = TestClient(app)
+    _add_item(db)
+    summary = dashboard.get_summary(db)
+    assert (summary["total_items"], summary["total_inventory"]) == (1, 10)
+    assert summary["sales_stats"]["total_sales"] == 0
+
+    _add_item(db, "SUN002", "Inverter 5kW", quantity=3)
+    summary = dashboard.get_summary(db)
+    assert (summary["total_items"], summary["total_inventory"], summary["low_stock_items"]) == (2, 13, 1)
+    assert summary["categories"] == {"Inverter": 1, "Panel": 1}
+
+    response = client.post("/api/inventory/update-quantity/SUN002", json={"quantity": 0})
+    assert response.status_code == 200
+    summary = dashboard.get_summary(db)
+    assert (summary["total_inventory"], summary["out_of_stock_items"]) == (10, 1)
+
+    assert _checkout(client, 4)["success"]
+    summary = dashboard.get_summary(db)
+    assert summary["total_inventory"] == 6
+    assert summary["sales_stats"]["total_sales"] == 1
+    assert summary["sales_stats"]["total_products_sold"] == 4
+
+
+def _time(function, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def test_dashboard_summary_load_time(db):
+    items, invoices = 100_000, 10_000
+    db.execute(models.InventoryItem.__table__.insert(), [
+        {
+            "item_code": f"SUN{i:06d}", "date": date.today(), "item_name": f"{('Panel', 'Inverter', 'Battery')[i % 3]} {i}",
+            "hsn_code": "8541", "gst_rate": 18.0, "purchase_price_per_unit": 100.0, "quantity": i % 20,
+        }
+        for i in range(items)
+    ])
+    db.execute(models.Invoice.__table__.insert(), [
+        {
+            "id": i + 1, "invoice_number": f"INV{i + 1:06d}", "date": date.today(),
+            "customer_name": f"Customer {i % 50}", "subtotal": 150.0, "total_gst": 27.0, "total_amount": 177.0,
+        }
+        for i in range(invoices)
+    ])
+    db.execute(models.InvoiceItem.__table__.insert(), [
+        {
+            "invoice_id": i + 1, "item_code": f"SUN{i:06d}", "item_name": "Panel", "hsn_code": "8541",
+            "quantity": 1, "price": 150.0, "discounted_subtotal": 150.0, "gst_rate": 18.0,
+            "gst_amount": 27.0, "total": 177.0,
+        }
+        for i in range(invoices)
+    ])
+    db.commit()
+
+    def cold():
+        crud.invalidate_catalog_caches()
+        crud.invalidate_sales_stats()
+        dashboard.get_summary(db)
+
+    cold_seconds = _time(cold, 5)
+    warm_seconds = _time(lambda: dashboard.get_summary(db), 50)
+
+    print(
+        f"\nDashboard summary with {items} items and {invoices} invoices: "
+        f"{cold_seconds * 1000:.1f} ms after a write, {warm_seconds * 1000:.2f} ms cached"
+    )
+    assert dashboard.get_summary(db)["total_items"] == items
+    # Page loads between writes never touch the inventory or invoice tables
+    assert warm_seconds < 0.005
+    assert warm_seconds < cold_seconds / 20
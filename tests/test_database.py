@@ -0,0 +1,127 @@
+import threading
+import time
+from datetime import date
+
+from app.core import config
+from app.db import crud, database, models
+from app.db.database import engine
+
+
+def _pragmas(connection):
+    return {
+        name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+        for name in ("journal_mode", "synchronous", "busy_timeout", "foreign_keys")
+    }
+
+
+def test_every_connection_gets_the_pragma_profile(db):
+    expected = {
+        "journal_mode": config.SQLITE_JOURNAL_MODE.lower(),
+        # synchronous reads back as a number: OFF, NORMAL, FULL, EXTRA
+        "synchronous": ["OFF", "NORMAL", "FULL", "EXTRA"].index(config.SQLITE_SYNCHRONOUS.upper()),
+        "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+        "foreign_keys": 1 if config.SQLITE_FOREIGN_KEYS.upper() == "ON" else 0,
+    }
+
+    # Two connections open at once, so the second is a new one and not the first reused
+    with engine.connect() as first, engine.connect() as second:
+        assert _pragmas(first) == expected
+        assert _pragmas(second) == expected
+
+
+def test_deleting_an_item_drops_its_stock_holds(db):
+    db.add(models.InventoryItem(
+        item_code="SUN001", date=date.today(), item_name="Panel", hsn_code="8541",
+        gst_rate=18.0, purchase_price_per_unit=100.0, quantity=5,
+    ))
+    db.commit()
+    assert crud.reserve_stock(db, "cart-1", "SUN001", 2) == (True, 3)
+
+    assert crud.delete_item(db, "SUN001")
+
+    assert db.query(models.StockHold).count() == 0
+
+
+# The stock list page and a reservation, as plain SQL so the threads spend
+# their time in SQLite rather than holding the GIL for ORM work
+STOCK_PAGE = "SELECT * FROM inventory ORDER BY date DESC, item_code DESC LIMIT 100"
+RESERVE = (
+    "UPDATE inventory SET quantity = quantity - 1 WHERE item_code = 'SUN0001' AND quantity >= 1",
+    "INSERT INTO stock_holds (cart_id, item_code, quantity, expires_at) VALUES (?, 'SUN0001', 1, '2099-01-01')",
+)
+
+
+def _reads_during_writes(db, seconds=1.5, readers=4):
+    """Read stock list pages from several threads while reservations are committed
+
+    Returns (pages read per second, slowest page in seconds, reservations per second).
+    """
+    db.execute(models.InventoryItem.__table__.insert(), [
+        {
+            "item_code": f"SUN{i:04d}", "date": date.today(), "item_name": f"Panel {i}", "hsn_code": "8541",
+            "gst_rate": 18.0, "purchase_price_per_unit": 10.0, "quantity": 1_000_000,
+        }
+        for i in range(2000)
+    ])
+    db.commit()
+
+    stop = threading.Event()
+    latencies, writes, errors = [], [], []
+
+    def write():
+        try:
+            with engine.connect() as connection:
+                while not stop.is_set():
+                    connection.exec_driver_sql(RESERVE[0])
+                    connection.exec_driver_sql(RESERVE[1], (f"bench-{len(writes)}",))
+                    connection.commit()
+                    writes.append(1)
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            with engine.connect() as connection:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    assert len(connection.exec_driver_sql(STOCK_PAGE).all()) == 100
+                    connection.rollback()
+                    latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    return len(latencies) / seconds, max(latencies), len(writes) / seconds
+
+
+def test_stock_reads_keep_up_during_writes(db, monkeypatch):
+    profile = _reads_during_writes(db)
+
+    # The same run on SQLite's defaults: rollback journal, fsync on every commit
+    db.close()
+    engine.dispose()
+    monkeypatch.setattr(database, "SQLITE_JOURNAL_MODE", "DELETE")
+    monkeypatch.setattr(database, "SQLITE_SYNCHRONOUS", "FULL")
+    db.execute(models.StockHold.__table__.delete())
+    db.execute(models.InventoryItem.__table__.delete())
+    db.commit()
+    assert db.connection().exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+    defaults = _reads_during_writes(db)
+
+    print(
+        f"\nStock pages during writes: {profile[0]:.0f}/s, slowest {profile[1] * 1000:.0f} ms, "
+        f"{profile[2]:.0f} reservations/s with the PRAGMA profile; {defaults[0]:.0f}/s, "
+        f"slowest {defaults[1] * 1000:.0f} ms, {defaults[2]:.0f} reservations/s with SQLite defaults"
+    )
+    # WAL readers never wait for a commit; with the rollback journal they
+    # are locked out while each one is written (>10x the reads here)
+    assert profile[0] > defaults[0] * 3
+    assert profile[1] < defaults[1] / 4
@@ -0,0 +1,111 @@
+import asyncio
+import inspect
+import time
+from datetime import date
+
+import httpx
+
+from app.db import models
+
+
+def _p99(samples):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def test_blocking_page_handlers_run_in_the_threadpool():
+    from app import main
+    from app.api import customers, enquiries, expenses, services
+
+    handlers = [
+        main.read_root, main.stock_page, main.invoices_page, main.invoice_page, main.users_page,
+        main.user_management_page, main.create_user_api, main.update_user_api, main.delete_user_api,
+        main.get_user_api, main.reset_password_api, services.generate_service_invoice,
+        customers.get_customers_page, customers.get_customer_details_page,
+        enquiries.get_enquiries_page, enquiries.new_enquiry_form, enquiries.edit_enquiry_form,
+        expenses.expenses_page, expenses.expense_details_page,
+    ]
+
+    assert [handler.__name__ for handler in handlers if inspect.iscoroutinefunction(handler)] == []
+
+
+def test_reserve_stock_latency_stays_flat_during_a_large_export(db):
+    from app.main import app
+
+    db.add(models.InventoryItem(
+        item_code="SUN001", date=date.today(), item_name="Panel", hsn_code="8541",
+        gst_rate=18.0, purchase_price_per_unit=100.0, quantity=1_000_000,
+    ))
+    invoices = 5_000
+    db.execute(models.Invoice.__table__.insert(), [
+        {
+            "id": i + 1, "invoice_number": f"INV{i + 1:06d}", "date": date.today(),
+            "customer_name": f"Customer {i}", "subtotal": 100.0, "total_gst": 18.0, "total_amount": 118.0,
+        }
+        for i in range(invoices)
+    ])
+    db.execute(models.InvoiceItem.__table__.insert(), [
+        {
+            "invoice_id": i + 1, "item_code": "SUN001", "item_name": "Panel", "hsn_code": "8541",
+            "quantity": 1, "price": 100.0, "discounted_subtotal": 100.0, "gst_rate": 18.0,
+            "gst_amount": 18.0, "total": 118.0,
+        }
+        for i in range(invoices)
+    ])
+    db.commit()
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async def reserve():
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/reserve-stock", json={"cart_id": "load-test", "item_code": "SUN001", "quantity": 1}
+                )
+                assert response.status_code == 200
+                return time.perf_counter() - started
+
+            await reserve()  # Warm up
+            baseline = [await reserve() for _ in range(50)]
+
+            export_started = time.perf_counter()
+            export = asyncio.create_task(client.get("/api/invoices/export-excel"))
+            during = []
+            while not export.done():
+                during.append(await reserve())
+            response = await export
+            export_seconds = time.perf_counter() - export_started
+
+            assert response.status_code == 200
+            return baseline, during, export_seconds
+
+    baseline, during, export_seconds = asyncio.run(run())
+
+    # The export has to overlap enough requests for the comparison to mean anything
+    assert export_seconds > 0.5
+    assert len(during) >= 20
+    # Blocking the event loop would hold every request for the whole export
+    assert _p99(during) < max(_p99(baseline) * 10, 0.1)
+    assert _p99(during) < export_seconds / 4
+
+
+def test_token_user_cache_miss_is_loaded_in_the_threadpool(db, monkeypatch):
+    from app.core import auth
+
+    db.add(models.User(email="staff@example.com", password="unused", name="Staff"))
+    db.commit()
+    token = auth.create_access_token({"sub": "staff@example.com"})
+    offloaded = []
+    run_in_threadpool = auth.run_in_threadpool
+
+    async def recording(function, *args):
+        offloaded.append(function.__name__)
+        return await run_in_threadpool(function, *args)
+
+    monkeypatch.setattr(auth, "run_in_threadpool", recording)
+
+    # The first lookup misses the user cache, the second is served from it
+    for _ in range(2):
+        assert asyncio.run(auth.get_current_user(token, db)).email == "staff@example.com"
+
+    assert offloaded == ["get_token_user"]
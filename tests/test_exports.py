@@ -0,0 +1,69 @@
+import io
+from datetime import date
+
+import openpyxl
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import models
+
+ROWS = 250
+
+
+def _seed(db):
+    today = date.today()
+    db.execute(models.InventoryItem.__table__.insert(), [
+        {
+            "item_code": f"SUN{i:04d}", "date": today, "item_name": f"Panel {i}", "hsn_code": "8541",
+            "gst_rate": 18.0, "purchase_price_per_unit": 10.0, "quantity": 1,
+        }
+        for i in range(ROWS)
+    ])
+    db.execute(models.Service.__table__.insert(), [
+        {
+            "service_code": f"SER{i:04d}", "date": today, "service_name": "Cleaning",
+            "employee_name": "Ravi", "price": 100.0,
+        }
+        for i in range(ROWS)
+    ])
+    db.execute(models.Customer.__table__.insert(), [
+        {
+            "customer_code": f"CUS{i:04d}", "date": today, "customer_name": f"Customer {i}",
+            "phone_no": f"98{i:08d}", "total_amount": 100.0,
+            "payment_status": "Unpaid" if i % 2 else "Fully Paid",
+        }
+        for i in range(ROWS)
+    ])
+    db.execute(models.Enquiry.__table__.insert(), [
+        {"enquiry_number": f"ENQ{i:04d}", "date": today, "customer_name": f"Customer {i}", "phone_no": "98"}
+        for i in range(ROWS)
+    ])
+    db.commit()
+
+
+def _sheet_rows(content):
+    workbook = openpyxl.load_workbook(io.BytesIO(content))
+    sheet = workbook.worksheets[0]
+    return sheet, list(sheet.iter_rows(min_row=2))
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("/api/inventory/export-excel", ROWS),
+    ("/services/export-excel", ROWS),
+    ("/api/customers/export-excel", ROWS),
+    ("/api/customers/export-excel?status=Unpaid", ROWS // 2),
+    ("/api/customers/export-excel?search=customer 12", 11),
+    ("/api/enquiries/export-excel", ROWS),
+])
+def test_exports_are_not_capped_at_one_page(db, url, expected):
+    from app.main import app
+
+    _seed(db)
+
+    response = TestClient(app).get(url)
+
+    assert response.status_code == 200
+    sheet, rows = _sheet_rows(response.content)
+    assert len(rows) == expected
+    assert sheet["A1"].style == "export_header"
+    assert {cell.style for cell in rows[0]} <= {"export_cell", "export_number"}
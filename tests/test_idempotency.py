@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import idempotency
+from app.db import crud, models
+
+
+def _checkout(client, key, quantity=2):
+    return client.post("/api/checkout", headers={"Idempotency-Key": key}, data={
+        "buyer_name": "Asha", "buyer_address": "Pune", "buyer_phone": "9800000000",
+        "invoice_date": date.today().isoformat(), "payment_method": "Cash", "payment_status": "Fully Paid",
+        "cart_id": "page-1",
+        "cart_items": json.dumps([{
+            "id": "SUN001", "item_name": "Panel", "price": 100.0, "quantity": quantity, "gst_rate": 18.0,
+        }]),
+    })
+
+
+def _invoices(db):
+    db.expire_all()
+    return [invoice.invoice_number for invoice in db.query(models.Invoice)]
+
+
+def _stock(db):
+    db.expire_all()
+    return crud.get_item(db, "SUN001").quantity
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    from app.core import pdf_jobs
+    from app.main import app
+
+    monkeypatch.setattr(pdf_jobs, "start_job", lambda job: None)
+    db.add(models.InventoryItem(
+        item_code="SUN001", date=date.today(), item_name="Panel", hsn_code="8541",
+        gst_rate=18.0, purchase_price_per_unit=100.0, quantity=5,
+    ))
+    db.commit()
+    return TestClient(app)
+
+
+def test_retried_checkout_replays_the_first_invoice(db, client):
+    first = _checkout(client, "key-1")
+    retry = _checkout(client, "key-1")
+
+    assert first.json()["success"]
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert _invoices(db) == [first.json()["invoice_id"]]
+    assert _stock(db) == 3
+
+
+def test_key_reused_for_another_request_is_rejected(db, client):
+    assert _checkout(client, "key-1").json()["success"]
+
+    response = _checkout(client, "key-1", quantity=1)
+
+    assert response.status_code == 422
+    assert len(_invoices(db)) == 1
+
+
+def test_concurrent_duplicate_waits_for_the_first_response(db, client, monkeypatch):
+    started, finish = threading.Event(), threading.Event()
+    create = crud.create_checkout_invoice
+
+    def slow_create(*args, **kwargs):
+        started.set()
+        assert finish.wait(5)
+        return create(*args, **kwargs)
+
+    monkeypatch.setattr(crud, "create_checkout_invoice", slow_create)
+    responses = {}
+
+    def send(name):
+        responses[name] = _checkout(client, "key-1")
+
+    first = threading.Thread(target=send, args=("first",))
+    first.start()
+    assert started.wait(5)
+    duplicate = threading.Thread(target=send, args=("duplicate",))
+    duplicate.start()
+    # The duplicate is polling for the result while the first is still running
+    time.sleep(idempotency._POLL_SECONDS * 3)
+    assert "duplicate" not in responses
+    finish.set()
+    first.join()
+    duplicate.join()
+
+    assert responses["first"].json()["success"]
+    assert responses["duplicate"].json() == responses["first"].json()
+    assert responses["duplicate"].headers["Idempotent-Replayed"] == "true"
+    assert len(_invoices(db)) == 1
+
+
+def test_failed_checkout_releases_its_key(db, client):
+    result = _checkout(client, "key-1", quantity=6).json()
+
+    assert not result["success"]
+    assert db.get(models.IdempotencyKey, ("checkout", "key-1")) is None
+    # The client can retry with the same key once the request can succeed
+    crud.get_item(db, "SUN001").quantity = 6
+    db.commit()
+    assert _checkout(client, "key-1", quantity=6).json()["success"]
+    assert len(_invoices(db)) == 1
+
+
+def test_committed_checkout_is_never_run_again(db, client, monkeypatch):
+    # The server stops after the invoice is committed but before its response is stored
+    save = crud.save_idempotent_response
+    monkeypatch.setattr(crud, "save_idempotent_response", lambda *args: None)
+    assert _checkout(client, "key-1").json()["success"]
+    monkeypatch.setattr(crud, "save_idempotent_response", save)
+
+    record = db.get(models.IdempotencyKey, ("checkout", "key-1"))
+    assert record.completed_at is not None
+    assert record.status_code is None
+    # Long enough ago that an unfinished claim would be taken over
+    record.created_at = datetime.now() - idempotency.STALE_CLAIM - timedelta(minutes=1)
+    db.commit()
+
+    retry = _checkout(client, "key-1")
+
+    assert retry.status_code == 409
+    assert len(_invoices(db)) == 1
+    assert _stock(db) == 3
@@ -0,0 +1,43 @@
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+from conftest import ROOT
+
+# Cumulative import time of app.main reported by -X importtime. About 1.4s
+# locally, nearly all of it FastAPI, SQLAlchemy and pydantic; the budget
+# leaves room for slower machines but not for pandas or reportlab (~1s more)
+IMPORT_BUDGET_SECONDS = 2.5
+
+# Only imported by the functions that need them
+DEFERRED_MODULES = ("pandas", "openpyxl", "reportlab")
+
+
+def _import_app_main(cwd):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=cwd, env={**os.environ, "PYTHONPATH": ROOT}, capture_output=True, text=True, check=True,
+    )
+    # Lines look like "import time:   self [us] | cumulative | name"
+    times = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)$", line)
+        if match:
+            times[match.group(3)] = int(match.group(1)) / 1_000_000
+    return times
+
+
+def test_importing_app_main_is_fast_and_touches_nothing_on_disk():
+    with tempfile.TemporaryDirectory() as cwd:
+        # The app serves these from the working directory
+        for folder in ("static", "templates"):
+            os.symlink(os.path.join(ROOT, folder), os.path.join(cwd, folder))
+
+        times = _import_app_main(cwd)
+
+        assert sorted(os.listdir(cwd)) == ["static", "templates"]
+
+    assert [module for module in DEFERRED_MODULES if module in times] == []
+    assert times["app.main"] < IMPORT_BUDGET_SECONDS
@@ -0,0 +1,210 @@
+import csv
+import io
+import time
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import crud, models
+
+ITEM_COLUMNS = [
+    "item_code", "item_name", "hsn_code", "purchase_price_per_unit", "margin", "gst_rate", "quantity",
+    "unit_of_measurement", "supplier_name", "supplier_gst_number",
+]
+
+
+def _csv(columns, rows):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return output.getvalue().encode()
+
+
+def _upload(url, content, **form):
+    from app.main import app
+
+    return TestClient(app).post(url, files={"file": ("sheet.csv", content, "text/csv")}, data=form).json()
+
+
+def _item_row(item_code="", name="Panel", price="100", quantity="5"):
+    return [item_code, name, "8541", price, "10", "18", quantity, "No.s", "Acme", ""]
+
+
+def _item(item_code, name, quantity=1):
+    return models.InventoryItem(
+        item_code=item_code, date=date.today(), item_name=name, hsn_code="8541",
+        gst_rate=18.0, purchase_price_per_unit=1.0, quantity=quantity,
+    )
+
+
+def _record_allocations(monkeypatch):
+    """Record the (prefix, count) of every sequence allocation"""
+    calls = []
+    allocate = crud.allocate_sequence
+
+    def recording(db, prefix, *args, count=1, **kwargs):
+        calls.append((prefix, count))
+        return allocate(db, prefix, *args, count=count, **kwargs)
+
+    monkeypatch.setattr(crud, "allocate_sequence", recording)
+    return calls
+
+
+def test_sheet_with_new_existing_and_invalid_rows(db, monkeypatch):
+    db.add_all([_item("SUN001", "Old Panel"), _item("SUN002", "Old Inverter")])
+    db.commit()
+    allocations = _record_allocations(monkeypatch)
+
+    result = _upload("/api/inventory/import-excel", _csv(ITEM_COLUMNS, [
+        _item_row("SUN001", "Panel 540W", quantity="7"),
+        _item_row(name="Battery"),
+        _item_row(name="Cable", price="abc"),
+        _item_row(name="Inverter 5kW"),
+        _item_row(name=""),
+        _item_row("SUN002", "Inverter 3kW"),
+    ]))
+
+    assert (result["created_count"], result["updated_count"], result["error_count"]) == (2, 2, 2)
+    assert result["errors"] == ["Row 4: purchase_price_per_unit must be a number", "Row 6: item_name is required"]
+    items = {item.item_code: (item.item_name, item.quantity) for item in db.query(models.InventoryItem)}
+    assert items == {
+        "SUN001": ("Panel 540W", 7), "SUN002": ("Inverter 3kW", 5),
+        "SUN003": ("Battery", 5), "SUN004": ("Inverter 5kW", 5),
+    }
+    # Both new codes come from a single allocation
+    assert [call for call in allocations if call[1] > 0] == [("SUN", 2)]
+
+
+def test_all_or_nothing_sheet_with_an_invalid_row_saves_nothing(db):
+    result = _upload("/api/inventory/import-excel", _csv(ITEM_COLUMNS, [
+        _item_row(name="Battery"), _item_row(name="Cable", quantity="2.5"),
+    ]), all_or_nothing="true")
+
+    assert (result["created_count"], result["error_count"]) == (0, 1)
+    assert db.query(models.InventoryItem).count() == 0
+
+
+def _import_rows(names):
+    # A row without an HSN code passes to the database and fails its NOT NULL constraint
+    return list(enumerate((
+        {
+            "item_name": name, "hsn_code": None if name == "Broken" else "8541", "gst_rate": 18.0,
+            "purchase_price_per_unit": 1.0, "quantity": 1, "date": date.today(),
+        }
+        for name in names
+    ), start=2))
+
+
+def test_failed_batch_is_retried_row_by_row(db):
+    result = crud.bulk_import_items(db, _import_rows(["A", "B", "C", "Broken", "E"]), batch_size=2)
+
+    assert result == {"created": 4, "updated": 0, "errors": [(5, result["errors"][0][1])]}
+    assert "NOT NULL" in result["errors"][0][1]
+    assert sorted(item.item_name for item in db.query(models.InventoryItem)) == ["A", "B", "C", "E"]
+
+
+def test_all_or_nothing_import_rolls_back_every_batch(db, monkeypatch):
+    allocations = _record_allocations(monkeypatch)
+
+    result = crud.bulk_import_items(db, _import_rows(["A", "B", "C", "Broken", "E"]), all_or_nothing=True, batch_size=2)
+
+    assert result["created"] == 0
+    assert [row_number for row_number, _ in result["errors"]] == [4]
+    db.rollback()
+    assert db.query(models.InventoryItem).count() == 0
+    assert allocations == [("SUN", 5)]
+
+
+@pytest.mark.parametrize("rows", [1_000, 10_000, 100_000])
+def test_import_throughput(db, rows):
+    # A tenth of the rows update items that already exist
+    existing = rows // 10
+    db.execute(models.InventoryItem.__table__.insert(), [
+        {
+            "item_code": f"SUN{i:06d}", "date": date.today(), "item_name": f"Old {i}", "hsn_code": "8541",
+            "gst_rate": 18.0, "purchase_price_per_unit": 1.0, "quantity": 1,
+        }
+        for i in range(1, existing + 1)
+    ])
+    db.commit()
+    content = _csv(ITEM_COLUMNS, [
+        _item_row(f"SUN{i:06d}" if i <= existing else "", f"Panel {i}") for i in range(1, rows + 1)
+    ])
+
+    started = time.perf_counter()
+    result = _upload("/api/inventory/import-excel", content)
+    seconds = time.perf_counter() - started
+
+    print(f"\nImported {rows} inventory rows in {seconds:.2f}s ({rows / seconds:.0f} rows/s)")
+    assert (result["created_count"], result["updated_count"], result["error_count"]) == (rows - existing, existing, 0)
+    assert db.query(models.InventoryItem).count() == rows
+    # About 8k rows/s here, parsing included; the old path committed every row
+    assert rows / seconds > 2_000
+
+
+def _enquiries(count, broken=None):
+    return [
+        {
+            "date": date(2025, 4, 1), "customer_name": f"Customer {i}",
+            # phone_no is NOT NULL
+            "phone_no": None if i == broken else f"98{i:08d}", "quotation_given": i % 2 == 0,
+        }
+        for i in range(count)
+    ]
+
+
+def _services(count, broken=None):
+    return [
+        {
+            "date": date(2025, 4, 1), "service_name": "Panel cleaning",
+            # employee_name is NOT NULL
+            "employee_name": None if i == broken else "Ravi", "price": 500.0,
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("create, records, model, prefix", [
+    (crud.bulk_create_enquiries, _enquiries, models.Enquiry, "ENQ"),
+    (crud.bulk_create_services, _services, models.Service, "SRV"),
+])
+def test_batched_create_takes_one_block_of_numbers(db, monkeypatch, create, records, model, prefix):
+    allocations = _record_allocations(monkeypatch)
+
+    assert create(db, records(5), batch_size=2) == 5
+
+    assert allocations == [(prefix, 5)]
+    number_column = model.enquiry_number if model is models.Enquiry else model.service_code
+    assert sorted(number for (number,) in db.query(number_column)) == [f"{prefix}{i:03d}" for i in range(1, 6)]
+
+
+@pytest.mark.parametrize("create, records, model", [
+    (crud.bulk_create_enquiries, _enquiries, models.Enquiry),
+    (crud.bulk_create_services, _services, models.Service),
+])
+def test_failed_row_rolls_back_the_whole_batched_create(db, create, records, model):
+    # The bad row is in the last of three batches, after two have been written
+    with pytest.raises(Exception, match="NOT NULL"):
+        create(db, records(5, broken=4), batch_size=2)
+
+    assert db.query(model).count() == 0
+    assert db.query(models.MonthlyEnquiryRollup).count() == 0
+
+
+def test_enquiry_import_throughput(db):
+    rows = 10_000
+    content = _csv(["customer_name", "phone_no", "date", "quotation_given", "quotation_amount"], [
+        [f"Customer {i}", f"98{i:08d}", "2025-04-01", "Yes" if i % 2 else "No", "1500" if i % 2 else ""]
+        for i in range(rows)
+    ])
+
+    started = time.perf_counter()
+    result = _upload("/api/enquiries/import-excel", content)
+    seconds = time.perf_counter() - started
+
+    print(f"\nImported {rows} enquiries in {seconds:.2f}s")
+    assert result["count"] == rows
+    assert db.query(models.Enquiry).count() == rows
+    assert seconds < 10
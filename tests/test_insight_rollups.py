@@ -0,0 +1,122 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from app.db import crud, models
+from app.db.database import SessionLocal
+
+
+def _invoice(number, total, paid, method="Cash"):
+    return {
+        "invoice_number": number, "date": date(2026, 5, 10), "customer_name": "Asha",
+        "payment_method": method, "subtotal": total, "total_gst": 0.0, "total_amount": total,
+        "amount_paid": paid, "payment_status": "Partially Paid" if paid else "Unpaid", "items": [],
+    }
+
+
+def _collected(db):
+    return {
+        row.payment_method: row.amount_collected
+        for row in db.query(models.PaymentMethodRollup)
+    }
+
+
+def test_checkout_payment_counts_as_collected(db):
+    crud.create_invoice(db, _invoice("INV1", 1000.0, 400.0))
+    crud.add_payment(db, "INV1", {"amount": 100.0, "payment_method": "UPI"})
+
+    assert _collected(db) == {"Cash": 400.0, "UPI": 100.0}
+
+    rollups = crud.get_insight_rollups(db, 2026)
+    assert {row["method"]: row["collected"] for row in rollups["payment_methods"]} == {"Cash": 400.0}
+
+
+def test_deleting_an_invoice_removes_all_its_collections(db):
+    crud.create_invoice(db, _invoice("INV1", 1000.0, 400.0))
+    crud.add_payment(db, "INV1", {"amount": 100.0, "payment_method": "UPI"})
+
+    crud.delete_invoice(db, "INV1")
+
+    assert _collected(db) == {"Cash": 0.0, "UPI": 0.0}
+
+
+def test_rebuild_matches_incremental_rollups(db):
+    crud.create_invoice(db, _invoice("INV1", 1000.0, 400.0))
+    crud.create_invoice(db, _invoice("INV2", 500.0, 0.0, method="Card"))
+    crud.add_payment(db, "INV1", {"amount": 100.0, "payment_method": "UPI"})
+    crud.add_payment(db, "INV2", {"amount": 50.0, "payment_method": "Cash"})
+    incremental = crud.get_insight_rollups(db, 2026)
+    collected = _collected(db)
+
+    crud.rebuild_insight_rollups(db)
+
+    assert crud.get_insight_rollups(db, 2026) == incremental
+    assert _collected(db) == collected
+
+
+def test_rebuild_after_raw_table_clear(db):
+    crud.create_invoice(db, _invoice("INV1", 1000.0, 400.0))
+    assert crud.get_sales_stats(db)["total_sales"] == 1
+
+    # What the database management "clear table" action does
+    conn = sqlite3.connect("db/sunmax.db")
+    conn.execute("DELETE FROM invoices")
+    conn.commit()
+    conn.close()
+    crud.rebuild_insight_rollups(db)
+    crud.invalidate_sales_stats()
+
+    assert crud.get_insight_rollups(db, 2026)["monthly_sales"][4] == 0.0
+    assert crud.get_sales_stats(db)["total_sales"] == 0
+
+
+def test_inventory_summary_covers_every_item(db):
+    db.execute(models.InventoryItem.__table__.insert(), [
+        {
+            "item_code": f"SUN{i:04d}", "date": date.today(), "item_name": f"Panel {i}", "hsn_code": "8541",
+            "gst_rate": 18.0, "purchase_price_per_unit": 10.0, "quantity": i % 10,
+        }
+        for i in range(250)
+    ])
+    db.commit()
+
+    summary = crud.get_inventory_summary(db)
+
+    assert summary["total_items"] == 250
+    assert summary["category_values"] == {"Panel": 10.0 * sum(i % 10 for i in range(250))}
+    assert len(crud.get_low_stock_items(db)) == 125
+
+
+def test_parallel_invoices_in_a_new_month_share_one_rollup_row(db):
+    def create(i):
+        session = SessionLocal()
+        try:
+            crud.create_invoice(session, _invoice(f"INV{i}", 100.0, 0.0))
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(20) as pool:
+        list(pool.map(create, range(100)))
+
+    rollups = crud.get_insight_rollups(db, 2026)
+    assert rollups["monthly_sales"][4] == 10000.0
+    assert db.query(models.MonthlySalesRollup).one().invoice_count == 100
+
+
+def test_editing_an_invoice_keeps_its_later_payments(db, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.core import pdf_jobs
+    from app.main import app
+
+    monkeypatch.setattr(pdf_jobs, "_submit", lambda job_id: None)
+    crud.create_invoice(db, _invoice("INV1", 1000.0, 400.0))
+    crud.add_payment(db, "INV1", {"amount": 40.0, "payment_method": "UPI"})
+
+    response = TestClient(app).post("/api/invoices/update/INV1", json={"customer_name": "Asha Rao"})
+
+    assert response.json()["success"]
+    db.expire_all()
+    assert _collected(db) == {"Cash": 400.0, "UPI": 40.0}
+    collected = _collected(db)
+    crud.rebuild_insight_rollups(db)
+    assert _collected(db) == collected
@@ -0,0 +1,67 @@
+import glob
+import os
+import sqlite3
+
+from app.db import models
+from app.db.database import Base, engine
+from app.db.migrate import LATEST_VERSION, get_schema_version, run_migrations
+
+
+def _schema(path="db/sunmax.db"):
+    connection = sqlite3.connect(path)
+    try:
+        tables = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE '%fts%' "
+            "AND name NOT IN ('schema_version', 'sqlite_sequence')"
+        )]
+        return {
+            table: {
+                "columns": {row[1] for row in connection.execute(f"PRAGMA table_info({table})")},
+                "indexes": {
+                    row[1] for row in connection.execute(f"PRAGMA index_list({table})")
+                    if not row[1].startswith("sqlite_autoindex")
+                },
+            }
+            for table in tables
+        }
+    finally:
+        connection.close()
+
+
+def test_migrated_schema_matches_the_models(db):
+    assert get_schema_version() == LATEST_VERSION
+
+    expected = {
+        table.name: {
+            "columns": {column.name for column in table.columns},
+            "indexes": {index.name for index in table.indexes},
+        }
+        for table in Base.metadata.sorted_tables
+    }
+    assert _schema() == expected
+
+
+def test_tables_from_older_releases_get_the_missing_columns(db):
+    db.close()
+    engine.dispose()
+    for path in glob.glob("db/sunmax.db*"):
+        os.remove(path)
+
+    # An invoices table from before invoice types and stored PDFs
+    connection = sqlite3.connect("db/sunmax.db")
+    connection.execute(
+        "CREATE TABLE invoices (id INTEGER PRIMARY KEY, invoice_number VARCHAR NOT NULL, date DATE NOT NULL, "
+        "customer_name VARCHAR NOT NULL, subtotal FLOAT NOT NULL, total_gst FLOAT NOT NULL, "
+        "total_amount FLOAT NOT NULL)"
+    )
+    connection.execute(
+        "INSERT INTO invoices VALUES (1, 'INV001', '2024-01-05', 'Asha', 100.0, 18.0, 118.0)"
+    )
+    connection.commit()
+    connection.close()
+
+    assert run_migrations()
+
+    columns = _schema()["invoices"]["columns"]
+    assert {"invoice_type", "pdf_path", "payment_status", "amount_paid"} <= columns
+    assert columns == {column.name for column in models.Invoice.__table__.columns}
@@ -0,0 +1,90 @@
+import base64
+import json
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import crud, models
+
+ITEMS = 23
+LIMIT = 5
+
+
+def _add_items(db):
+    # Only three distinct dates, so most pages start and end inside a run of equal dates
+    db.add_all([
+        models.InventoryItem(
+            item_code=f"SUN{i:03d}", date=date(2025, 4, 1) + timedelta(days=i % 3), item_name=f"Panel {i}",
+            hsn_code="8541", gst_rate=18.0, purchase_price_per_unit=100.0, quantity=1,
+        )
+        for i in range(ITEMS)
+    ])
+    db.commit()
+    # The list order: newest date first, then item code
+    return [
+        item.item_code
+        for item in sorted(db.query(models.InventoryItem), key=lambda item: (item.date, item.item_code), reverse=True)
+    ]
+
+
+def _codes(page):
+    return [item.item_code for item in page["rows"]]
+
+
+def test_paging_forward_and_back_through_equal_dates(db):
+    expected = _add_items(db)
+
+    forward, pages = [], []
+    page = crud.get_stock_page(db, limit=LIMIT)
+    while True:
+        pages.append(page)
+        forward += _codes(page)
+        if not page["next_cursor"]:
+            break
+        page = crud.get_stock_page(db, after=page["next_cursor"], limit=LIMIT)
+
+    backward = []
+    page = crud.get_stock_page(db, last=True, limit=LIMIT)
+    while True:
+        backward = _codes(page) + backward
+        if not page["prev_cursor"]:
+            break
+        page = crud.get_stock_page(db, before=page["prev_cursor"], limit=LIMIT)
+
+    assert forward == expected
+    assert backward == expected
+    assert len(pages) == (ITEMS + LIMIT - 1) // LIMIT
+    assert pages[0]["prev_cursor"] is None
+    # Going back one page from any page gives the page before it
+    for previous, current in zip(pages, pages[1:]):
+        assert _codes(crud.get_stock_page(db, before=current["prev_cursor"], limit=LIMIT)) == _codes(previous)
+
+
+def _encoded(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    _encoded("garbage"),
+    _encoded(json.dumps({"date": "2025-04-01"})),
+    _encoded(json.dumps(["2025-04-01"])),
+    _encoded(json.dumps(["yesterday", "SUN001"])),
+    _encoded(json.dumps([[2025, 4, 1], "SUN001"])),
+    # A real cursor cut short
+    crud.encode_cursor([date(2025, 4, 2), "SUN010"])[:-3],
+])
+@pytest.mark.parametrize("direction", ["after", "before"])
+def test_tampered_cursor_gets_the_first_page(db, cursor, direction):
+    from app.main import app
+
+    expected = _add_items(db)
+
+    assert crud.decode_cursor(cursor, (models.InventoryItem.date, models.InventoryItem.item_code)) is None
+    response = TestClient(app).get("/api/inventory/stock", params={direction: cursor, "limit": LIMIT})
+
+    assert response.status_code == 200
+    result = response.json()
+    assert [item["item_code"] for item in result["items"]] == expected[:LIMIT]
+    assert result["prev_cursor"] is None
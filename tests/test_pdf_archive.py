@@ -0,0 +1,92 @@
+import asyncio
+import io
+import os
+import zipfile
+from datetime import date
+
+import httpx
+
+from app.core import pdf_archive
+from app.core.auth import create_access_token
+from app.db import crud, models
+
+
+class _Request:
+    """Stand-in for a Starlette request whose client goes away after `chunks` reads"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def is_disconnected(self):
+        self.chunks -= 1
+        return self.chunks <= 0
+
+
+def _cached_documents(count, size=200 * 1024):
+    documents = []
+    for i in range(count):
+        path = os.path.abspath(f"cached_{i}.pdf")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        documents.append((f"INV{i}", {}, path))
+    return documents
+
+
+def _collect(request, documents):
+    async def run():
+        return [chunk async for chunk in pdf_archive.stream_invoice_zip_response(request, documents)]
+    return asyncio.run(run())
+
+
+def test_export_stops_when_the_client_disconnects():
+    documents = _cached_documents(5)
+
+    complete = b"".join(_collect(_Request(10_000), documents))
+    assert len(zipfile.ZipFile(io.BytesIO(complete)).namelist()) == 5
+
+    partial = _collect(_Request(2), documents)
+    assert len(partial) == 2
+    assert sum(map(len, partial)) < len(complete) / 4
+
+
+def test_render_pool_is_shared_and_spawned():
+    try:
+        pool = pdf_archive._get_pool()
+        assert pdf_archive._get_pool() is pool
+        assert pool._mp_context.get_start_method() == "spawn"
+    finally:
+        pdf_archive.shutdown()
+    assert pdf_archive._pool is None
+
+
+def test_bulk_export_requires_a_user(db):
+    from app.main import app
+
+    crud.create_invoice(db, {
+        "invoice_number": "INV1", "date": date.today(), "customer_name": "Asha", "payment_method": "Cash",
+        "subtotal": 100.0, "total_gst": 18.0, "total_amount": 118.0, "items": [],
+        "pdf_path": "invoices/INV1.pdf",
+    })
+    # Token checks never look at the password hash
+    db.add(models.User(email="staff@example.com", password="unused", name="Staff"))
+    db.commit()
+    token = create_access_token({"sub": "staff@example.com"})
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            anonymous = await client.get("/api/invoices/export-pdf-zip")
+            signed_in = await client.get(
+                "/api/invoices/export-pdf-zip", headers={"Authorization": f"Bearer {token}"}
+            )
+            return anonymous, signed_in
+
+    try:
+        anonymous, signed_in = asyncio.run(run())
+    finally:
+        pdf_archive.shutdown()
+
+    assert anonymous.status_code == 401
+    assert signed_in.status_code == 200
+    assert len(zipfile.ZipFile(io.BytesIO(signed_in.content)).namelist()) == 1
+    assert db.query(models.PdfCacheEntry).count() == 1
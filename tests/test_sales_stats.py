@@ -0,0 +1,94 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from app.db import crud, models
+from app.db.database import engine
+
+
+def _add_sales(db, lines):
+    """Insert one inventory item and `lines` invoice lines for it, ten lines per invoice"""
+    db.add(models.InventoryItem(
+        item_code="SUN001", date=date.today(), item_name="Panel", hsn_code="8541",
+        gst_rate=18.0, purchase_price_per_unit=100.0, quantity=10,
+    ))
+    invoice_count = max(lines // 10, 1)
+    db.execute(models.Invoice.__table__.insert(), [
+        {
+            "id": i + 1, "invoice_number": f"INV{i + 1:06d}", "date": date.today(),
+            "customer_name": f"Customer {i % 50}", "subtotal": 1500.0, "total_gst": 270.0,
+            "total_amount": 1770.0,
+        }
+        for i in range(invoice_count)
+    ])
+    db.execute(models.InvoiceItem.__table__.insert(), [
+        {
+            "invoice_id": i % invoice_count + 1, "item_code": "SUN001", "item_name": "Panel",
+            "hsn_code": "8541", "quantity": 1, "price": 150.0, "discounted_subtotal": 150.0,
+            "gst_rate": 18.0, "gst_amount": 27.0, "total": 177.0,
+        }
+        for i in range(lines)
+    ])
+    db.commit()
+
+
+def _count_queries(func):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return result, len(statements)
+
+
+@pytest.mark.parametrize("lines", [10, 1_000, 100_000])
+def test_sales_stats_query_count_is_constant(db, lines):
+    _add_sales(db, lines)
+
+    stats, queries = _count_queries(lambda: crud.get_sales_stats(db))
+
+    assert stats["total_products_sold"] == lines
+    assert stats["cost_of_goods_sold"] == 100.0 * lines
+    # Counter read, the aggregates, and the counter update; no per-line lookups
+    assert queries <= 12
+
+
+def test_sales_stats_cache_and_invalidation(db):
+    _add_sales(db, 10)
+
+    first = crud.get_sales_stats(db)
+    _, queries = _count_queries(lambda: crud.get_sales_stats(db))
+    assert queries == 0
+
+    # Callers get their own copy, nested lists included
+    first["top_buyers"].clear()
+    assert crud.get_sales_stats(db)["top_buyers"]
+
+    crud.invalidate_sales_stats()
+    _, queries = _count_queries(lambda: crud.get_sales_stats(db))
+    assert queries > 0
+
+
+def test_sales_stats_computed_before_invalidation_are_not_cached(db, monkeypatch):
+    _add_sales(db, 10)
+
+    # Simulate a write landing while the stats are being computed
+    original = crud.get_sales_counter
+
+    def counter_then_write(session):
+        counter = original(session)
+        crud.invalidate_sales_stats()
+        return counter
+
+    monkeypatch.setattr(crud, "get_sales_counter", counter_then_write)
+    crud.get_sales_stats(db)
+    monkeypatch.setattr(crud, "get_sales_counter", original)
+
+    _, queries = _count_queries(lambda: crud.get_sales_stats(db))
+    assert queries > 0
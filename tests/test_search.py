@@ -0,0 +1,76 @@
+import statistics
+import time
+from datetime import date
+
+from sqlalchemy import text
+
+from app.db import crud, models, search_index
+from app.db.migrate import main as migrate
+from conftest import seed_catalog, table_scans
+
+
+def _add_items(db, *names):
+    for number, name in enumerate(names, start=1):
+        db.add(models.InventoryItem(
+            item_code=f"SUN{number:03d}", date=date.today(), item_name=name, hsn_code="8541",
+            gst_rate=18.0, purchase_price_per_unit=1.0, quantity=1,
+        ))
+    db.commit()
+
+
+def _codes(items):
+    return [item.item_code for item in items]
+
+
+def test_part_of_a_code_finds_the_item(db):
+    _add_items(db, "Solar Panel 540W", "Inverter 5kW", "Battery 150Ah")
+
+    assert _codes(crud.search_items(db, "001")) == ["SUN001"]
+    assert _codes(crud.search_items(db, "un00")) == ["SUN001", "SUN002", "SUN003"]
+    assert _codes(crud.search_items(db, "sun002")) == ["SUN002"]
+    # Word prefixes still match names, ranked as before
+    assert _codes(crud.search_items(db, "sola pan")) == ["SUN001"]
+
+
+def test_code_matches_come_first_and_page_without_repeats(db):
+    _add_items(db, "Panel", "Panel", "Panel 003")
+
+    first = search_index.ranked_search(db, models.InventoryItem, "003", limit=1)
+    rest = search_index.ranked_search(db, models.InventoryItem, "003", limit=5, offset=1)
+
+    assert _codes(first) == ["SUN003"]
+    assert rest == []
+
+
+def test_rebuild_rekeys_the_inventory_index_after_rowids_change(db):
+    _add_items(db, "Solar Panel 540W", "Inverter 5kW")
+
+    # What a VACUUM is allowed to do to a table without an INTEGER PRIMARY KEY
+    db.execute(text("UPDATE inventory SET rowid = rowid + 1000"))
+    db.commit()
+    assert _codes(crud.search_items(db, "inverter")) == []
+
+    assert migrate(["--rebuild-search"]) == 0
+
+    assert _codes(crud.search_items(db, "inverter")) == ["SUN002"]
+
+
+def test_search_at_100k_rows_is_fast_and_never_scans_the_table(db):
+    seed_catalog(db, 100_000)
+
+    # Broad words, no match, a number inside names and codes, part of a code
+    for query in ("inverter", "zzz", "panel", "12345", "001", "sun0001", "sola pan"):
+        def search():
+            return search_index.ranked_search(db, models.InventoryItem, query, limit=20)
+
+        assert table_scans(db, search) == []
+        timings = []
+        for _ in range(5):
+            started = time.perf_counter()
+            search()
+            timings.append((time.perf_counter() - started) * 1000)
+        took_ms = statistics.median(timings)
+        print(f"\nSearch for {query!r} over 100k items: {took_ms:.1f} ms")
+        assert took_ms < 10
+
+    assert _codes(search_index.ranked_search(db, models.InventoryItem, "12345", limit=3))[0] == "SUN012345"
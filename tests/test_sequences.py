@@ -0,0 +1,86 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from app.db import crud, models
+from app.db.database import SessionLocal
+
+THREADS = 20
+
+
+def _in_parallel(func, calls):
+    """Run func(i) for every i in range(calls) across THREADS threads, all released together"""
+    barrier = threading.Barrier(THREADS)
+
+    def worker(indexes):
+        barrier.wait()
+        session = SessionLocal()
+        try:
+            return [func(session, i) for i in indexes]
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        chunks = pool.map(worker, [range(t, calls, THREADS) for t in range(THREADS)])
+        return [value for chunk in chunks for value in chunk]
+
+
+def test_parallel_allocations_are_unique_and_gapless(db):
+    numbers = _in_parallel(lambda session, i: crud.allocate_sequence(session, "TST"), 500)
+
+    assert sorted(numbers) == list(range(1, 501))
+
+
+def test_parallel_first_use_seeds_once_from_existing_codes(db):
+    db.add(models.InventoryItem(
+        item_code="SUN1000", date=date.today(), item_name="Panel", hsn_code="8541",
+        gst_rate=18.0, purchase_price_per_unit=1.0, quantity=1,
+    ))
+    db.commit()
+
+    codes = _in_parallel(lambda session, i: crud.generate_item_code(session), 200)
+
+    assert len(set(codes)) == 200
+    assert sorted(int(code[3:]) for code in codes) == list(range(1001, 1201))
+
+
+def test_parallel_checkouts_get_distinct_invoice_numbers(db):
+    def checkout(session, i):
+        invoice = crud.create_invoice(session, {
+            "date": date.today(), "customer_name": f"Customer {i}", "payment_method": "Cash",
+            "subtotal": 100.0, "total_gst": 18.0, "total_amount": 118.0, "items": [],
+        })
+        return invoice.invoice_number
+
+    numbers = _in_parallel(checkout, 200)
+
+    assert len(set(numbers)) == 200
+    assert db.query(models.Invoice).count() == 200
+
+
+def test_bulk_import_codes_never_collide_with_supplied_codes(db):
+    for number in range(1, 4):
+        db.add(models.InventoryItem(
+            item_code=f"SUN{number:03d}", date=date.today(), item_name=f"Existing {number}", hsn_code="8541",
+            gst_rate=18.0, purchase_price_per_unit=1.0, quantity=1,
+        ))
+    db.commit()
+
+    def row(name, item_code=None):
+        data = {
+            "item_name": name, "hsn_code": "8541", "gst_rate": 18.0, "purchase_price_per_unit": 1.0,
+            "quantity": 1, "date": date.today(),
+        }
+        if item_code:
+            data["item_code"] = item_code
+        return data
+
+    result = crud.bulk_import_items(db, list(enumerate([
+        row("Supplied Five", "SUN005"), row("New A"), row("New B"), row("New C"),
+    ], start=2)))
+
+    assert result == {"created": 4, "updated": 0, "errors": []}
+    names = {item.item_code: item.item_name for item in db.query(models.InventoryItem)}
+    assert names["SUN005"] == "Supplied Five"
+    assert sorted(names[code] for code in ("SUN006", "SUN007", "SUN008")) == ["New A", "New B", "New C"]
+    assert crud.generate_item_code(db) == "SUN009"
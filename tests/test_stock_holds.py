@@ -0,0 +1,196 @@
+import json
+import threading
+from datetime import date, datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from app.db import crud, models
+from app.db.database import SessionLocal
+
+STOCK = 100
+# Demand is well above STOCK in the concurrent tests
+RESERVATIONS = 300
+PAGES = 100
+UNITS = 3
+
+
+def _add_item(db, quantity=STOCK):
+    db.add(models.InventoryItem(
+        item_code="SUN001", date=date.today(), item_name="Panel", hsn_code="8541",
+        gst_rate=18.0, purchase_price_per_unit=100.0, quantity=quantity,
+    ))
+    db.commit()
+
+
+def _checkout(client, quantity, cart_id=None):
+    form = {
+        "buyer_name": "Asha", "buyer_address": "Pune", "buyer_phone": "9800000000",
+        "invoice_date": date.today().isoformat(), "payment_method": "Cash", "payment_status": "Fully Paid",
+        "cart_items": json.dumps([{
+            "id": "SUN001", "item_name": "Panel", "price": 100.0, "quantity": quantity, "gst_rate": 18.0,
+        }]),
+    }
+    if cart_id:
+        form["cart_id"] = cart_id
+    return client.post("/api/checkout", data=form).json()
+
+
+def _stock(db):
+    db.expire_all()
+    return crud.get_item(db, "SUN001").quantity
+
+
+def _expire_all(db):
+    return crud.expire_stock_holds(db, datetime.now() + timedelta(days=1))
+
+
+def _run_together(target, count):
+    """Run target(i) for every i in range(count), each in its own thread, all released at once"""
+    start = threading.Barrier(count)
+    errors = []
+
+    def run(i):
+        try:
+            start.wait()
+            target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def _watch_stock(lowest):
+    """Record the lowest quantity on hand until the returned event is set"""
+    done = threading.Event()
+
+    def watch():
+        session = SessionLocal()
+        try:
+            while not done.is_set():
+                lowest[0] = min(lowest[0], _stock(session))
+                session.rollback()
+        finally:
+            session.close()
+
+    watching = threading.Thread(target=watch)
+    watching.start()
+    return done, watching
+
+
+def test_holds_require_a_cart_id(db):
+    from app.main import app
+
+    _add_item(db)
+    client = TestClient(app)
+
+    for url in ("/api/reserve-stock", "/api/release-stock"):
+        response = client.post(url, json={"item_code": "SUN001", "quantity": 2})
+        assert response.status_code == 400
+        assert response.json()["message"] == "Cart ID is required"
+
+    assert _stock(db) == STOCK
+    assert db.query(models.StockHold).count() == 0
+
+
+def test_checkout_without_a_cart_id_takes_stock_from_inventory_only(db, monkeypatch):
+    from app.core import pdf_jobs
+    from app.main import app
+
+    monkeypatch.setattr(pdf_jobs, "start_job", lambda job: None)
+    _add_item(db)
+    client = TestClient(app)
+    assert client.post("/api/reserve-stock", json={"cart_id": "page-1", "item_code": "SUN001", "quantity": 2}).json()["success"]
+
+    assert _checkout(client, 3)["success"]
+
+    # Another page's hold is left alone
+    assert _stock(db) == STOCK - 2 - 3
+    assert [(hold.cart_id, hold.quantity) for hold in db.query(models.StockHold)] == [("page-1", 2)]
+    assert _expire_all(db) == 1
+    assert _stock(db) == STOCK - 3
+
+
+def test_hundreds_of_concurrent_reservations_never_oversell(db):
+    _add_item(db)
+    reserved = []
+    lowest = [STOCK]
+    done, watching = _watch_stock(lowest)
+
+    def reserve(i):
+        session = SessionLocal()
+        try:
+            if crud.reserve_stock(session, f"cart-{i}", "SUN001", 1)[0]:
+                reserved.append(i)
+        finally:
+            session.close()
+
+    try:
+        _run_together(reserve, RESERVATIONS)
+    finally:
+        done.set()
+        watching.join()
+
+    assert len(reserved) == STOCK
+    assert lowest[0] >= 0
+    assert _stock(db) == 0
+    assert db.query(models.StockHold).count() == STOCK
+
+
+def test_concurrent_reserve_checkout_and_expiry_keep_sold_stock_out(db, monkeypatch):
+    from app.core import pdf_jobs
+    from app.main import app
+
+    monkeypatch.setattr(pdf_jobs, "start_job", lambda job: None)
+    _add_item(db)
+    client = TestClient(app)
+    sold = []
+    lowest = [STOCK]
+    done, watching = _watch_stock(lowest)
+
+    def page(i):
+        cart_id = f"page-{i}"
+        held = 0
+        for _ in range(UNITS):
+            response = client.post("/api/reserve-stock", json={"cart_id": cart_id, "item_code": "SUN001", "quantity": 1})
+            held += response.json()["success"]
+        if held < UNITS:
+            # Sold out: hand back what this page got
+            client.post("/api/release-stock", json={"cart_id": cart_id, "item_code": "SUN001", "quantity": UNITS})
+            return
+        # The sweeper may have expired the holds, in which case the
+        # checkout takes the stock again or finds it sold out
+        if _checkout(client, UNITS, cart_id)["success"]:
+            sold.append(UNITS)
+
+    def sweeper():
+        # Expires every hold it sees, racing the pages between reserve and checkout
+        session = SessionLocal()
+        try:
+            while not sweeping_done.is_set():
+                _expire_all(session)
+        finally:
+            session.close()
+
+    sweeping_done = threading.Event()
+    sweeping = threading.Thread(target=sweeper)
+    sweeping.start()
+    try:
+        _run_together(page, PAGES)
+    finally:
+        sweeping_done.set()
+        sweeping.join()
+        done.set()
+        watching.join()
+
+    # Demand is PAGES * UNITS, well over STOCK
+    assert 0 < sum(sold) <= STOCK
+    assert lowest[0] >= 0
+    _expire_all(db)
+    assert _stock(db) == STOCK - sum(sold)
+    assert db.query(models.StockHold).count() == 0
+    assert db.query(models.Invoice).count() == len(sold)
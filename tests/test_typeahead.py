@@ -0,0 +1,93 @@
+import statistics
+import time
+from datetime import date
+
+from app.core import dashboard, typeahead
+from app.db import crud, models
+from conftest import seed_catalog, table_scans
+
+
+def _add_item(db, item_code, name, quantity=5):
+    db.add(models.InventoryItem(
+        item_code=item_code, date=date.today(), item_name=name, hsn_code="8541",
+        gst_rate=18.0, purchase_price_per_unit=100.0, quantity=quantity,
+    ))
+    db.commit()
+
+
+def _all_pages(db, query, limit):
+    codes, cursor = [], None
+    while True:
+        page = typeahead.lookup(db, "items", query, limit, cursor)
+        codes += [match["code"] for match in page["matches"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return codes
+
+
+def test_pages_follow_name_then_code_order(db):
+    for i in range(25):
+        _add_item(db, f"SUN{i:03d}", f"Panel {24 - i:02d}")
+    # Same name as another item, told apart by the code
+    _add_item(db, "SUN100", "Panel 00")
+
+    first = typeahead.lookup(db, "items", "panel", 10)
+    assert not first["next_cursor"].isdigit()
+
+    expected = ["SUN024", "SUN100"] + [f"SUN{i:03d}" for i in range(23, -1, -1)]
+    assert _all_pages(db, "panel", 10) == expected
+
+
+def test_rows_added_before_the_cursor_do_not_repeat_matches(db):
+    for i in range(20):
+        _add_item(db, f"SUN{i:03d}", f"Panel {i:02d}")
+
+    first = typeahead.lookup(db, "items", "panel", 10)
+    _add_item(db, "SUN999", "Panel 00 spare")
+    second = typeahead.lookup(db, "items", "panel", 10, first["next_cursor"])
+
+    assert [match["code"] for match in second["matches"]] == [f"SUN{i:03d}" for i in range(10, 20)]
+
+
+def test_invoice_writes_keep_the_catalog_caches(db):
+    _add_item(db, "SUN001", "Panel")
+    typeahead.lookup(db, "items", "panel")
+    summary = dashboard.get_summary(db)
+    assert summary["sales_stats"]["total_sales"] == 0
+
+    crud.create_invoice(db, {
+        "date": date.today(), "customer_name": "Asha", "payment_method": "Cash",
+        "subtotal": 100.0, "total_gst": 18.0, "total_amount": 118.0, "items": [],
+    })
+
+    assert typeahead.lookup(db, "items", "panel")["cached"]
+    # The summary is kept but the sales figures shown with it are current
+    assert dashboard.get_summary(db)["sales_stats"]["total_sales"] == 1
+
+    crud.update_item(db, "SUN001", {"quantity": 2})
+
+    page = typeahead.lookup(db, "items", "panel")
+    assert not page["cached"]
+    assert page["matches"][0]["stock"] == 2
+    assert dashboard.get_summary(db)["total_inventory"] == 2
+
+
+def test_lookups_at_100k_rows_never_scan_the_table(db):
+    seed_catalog(db, 100_000)
+
+    for query in ("inverter", "zzz", "panel", "12345", "001", "sun0001", "sola pan"):
+        first = typeahead.lookup(db, "items", query)
+        pages = [lambda: typeahead.lookup(db, "items", query)]
+        if first["next_cursor"]:
+            pages.append(lambda: typeahead.lookup(db, "items", query, cursor=first["next_cursor"]))
+
+        timings = []
+        for page in pages:
+            typeahead.invalidate()
+            assert table_scans(db, page) == []
+            for _ in range(5):
+                typeahead.invalidate()
+                started = time.perf_counter()
+                page()
+                timings.append((time.perf_counter() - started) * 1000)
+        print(f"\nTypeahead for {query!r} over 100k items: {statistics.median(timings):.1f} ms")